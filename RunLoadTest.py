@@ -0,0 +1,145 @@
+#Load tests the job queue without a GPU, Discord, or network access.  Starts
+#fake webui backends on localhost, points a Queue Manager built from the
+#config at them, replays a trace of simulated /generate traffic, and prints
+#throughput and latency percentiles.
+#
+#Traces are made from a seed, so a run can be repeated against a different
+#config, or saved with --save-trace and replayed with --trace.
+
+
+#####  Imports  #####
+
+import argparse
+import asyncio
+import benchmarks.FakeWebui as fw
+import benchmarks.LoadGenerator as lg
+import json
+import pathlib as pl
+import src.managers.QueueMgr as qm
+
+#####  Package Variables  #####
+
+default_params = {'cfg' : 'src/config/config.json'}
+
+#####  Package Functions  #####
+
+def getArgs() -> argparse.Namespace:
+    """Reads the load test's command line.
+
+       Input: N/A.
+
+       Output: Namespace - The parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description="Load test the IGSD job queue against fake webui backends.")
+
+    parser.add_argument('--cfg', default=default_params['cfg'], help="The config file to build the Queue Manager from.")
+    parser.add_argument('--backends', type=int, default=1, help="How many fake webui backends to start.")
+    parser.add_argument('--slots', type=int, default=1, help="How many renders each fake backend runs at once.")
+    parser.add_argument('--latency', default='lognormal', choices=fw.LATENCY_KINDS, help="The render time distribution.")
+    parser.add_argument('--mean', type=float, default=0.5, help="The mean render time of a 512x512, 20 step image, in seconds.")
+    parser.add_argument('--spread', type=float, default=0.25, help="The lognormal sigma, or the uniform +/- range, of render times.")
+    parser.add_argument('--image-size', default='0x0', help="The WIDTHxHEIGHT of returned images, 0x0 to match the request.")
+    parser.add_argument('--guilds', type=int, default=10, help="How many Guilds send requests.")
+    parser.add_argument('--users', type=int, default=20, help="How many users each Guild has.")
+    parser.add_argument('--rate', type=float, default=1.0, help="Average requests per second.")
+    parser.add_argument('--duration', type=float, default=60.0, help="How many seconds of requests to send.")
+    parser.add_argument('--fixed-seed', type=float, default=0.0, help="The share of requests with a fixed seed, which can be cached.")
+    parser.add_argument('--seed', type=int, default=0, help="Seeds the trace and the render times.")
+    parser.add_argument('--timeout', type=float, default=600.0, help="How long to wait for queued jobs after the last request.")
+    parser.add_argument('--trace', default=None, help="Replay a saved trace instead of making one.")
+    parser.add_argument('--save-trace', default=None, help="Save the trace to this file.")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    return parser.parse_args()
+
+def getQueueOptions(cfg_path : str,
+                    urls     : list,
+                    slots    : int) -> dict:
+    """Returns the config's queue options, pointed at the fake backends and
+       with everything that needs the network, the disk, or other processes
+       turned off.
+
+       Input: cfg_path - The config file.
+              urls - The fake backends' URLs.
+              slots - The job count of each backend.
+
+       Output: dict - The Queue Manager's options.
+    """
+
+    with open(pl.Path(cfg_path).absolute()) as json_file:
+        opts = json.load(json_file)['queue_opts']
+
+    max_batch = opts['max_batch'] if 'max_batch' in opts else "1"
+
+    opts['backends'] = [{'url' : url, 'job_count' : str(slots), 'max_batch' : max_batch} for url in urls]
+
+    for option in ('broker', 'journal', 'metrics', 'roll_reservoir'):
+
+        if option in opts:
+
+            opts[option] = dict(opts[option], enabled="False")
+
+    opts.pop('webui_URL', None)
+
+    return opts
+
+async def runLoadTest(args : argparse.Namespace) -> dict:
+    """Starts the fake backends and the Queue Manager, then replays the trace.
+
+       Input: args - The parsed command line.
+
+       Output: dict - The load generator's report.
+    """
+
+    width, height = (int(x) for x in args.image_size.lower().split('x'))
+    webuis        = [fw.FakeWebui(opts={'latency' : {'kind'   : args.latency,
+                                                     'mean'   : args.mean,
+                                                     'spread' : args.spread,
+                                                     'seed'   : args.seed + x},
+                                        'slots'   : args.slots,
+                                        'width'   : width,
+                                        'height'  : height,
+                                        'port'    : 0}) for x in range(args.backends)]
+
+    if args.trace != None:
+
+        trace = lg.loadTrace(args.trace)
+
+    else:
+
+        trace = lg.makeTrace(opts={'seed'       : args.seed,
+                                   'guilds'     : args.guilds,
+                                   'users'      : args.users,
+                                   'duration'   : args.duration,
+                                   'rate'       : args.rate,
+                                   'fixed_seed' : args.fixed_seed})
+
+    if args.save_trace != None:
+
+        lg.saveTrace(trace=trace,
+                     path=args.save_trace)
+
+    try:
+        urls    = [x.start() for x in webuis]
+        manager = qm.Manager(manager_id = 0,
+                             opts       = getQueueOptions(cfg_path=args.cfg,
+                                                          urls=urls,
+                                                          slots=args.slots))
+        manager.run()
+
+        return await lg.LoadGenerator(manager = manager,
+                                      trace   = trace,
+                                      timeout = args.timeout).run()
+
+    finally:
+        for webui in webuis:
+
+            webui.stop()
+
+
+if __name__ == '__main__':
+    args   = getArgs()
+    report = asyncio.run(runLoadTest(args))
+
+    print(json.dumps(report, indent=4) if args.json else lg.formatReport(report))
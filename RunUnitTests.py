@@ -15,6 +15,7 @@ import unittest as unt
 #https://coverage.readthedocs.io/en/7.4.3/faq.html#q-why-do-the-bodies-of-functions-show-as-executed-but-the-def-lines-do-not
 cov = coverage.Coverage()
 cov.start()
+import tests.BenchmarksTests as bt
 import tests.CharactersTests as ct
 import tests.DbTests as dt
 import tests.ManagersTests as mt
@@ -40,21 +41,39 @@ def testUtilities():
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestNameRandomizer))
 
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=dt.TestMariadbIfc))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=dt.TestConnectionPool))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=dt.TestImageStore))
 
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestBackendManager))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestDailyEventManager))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestDegradePolicy))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestJobBroker))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestJobJournal))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestMetricsRegistry))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestQueueManager))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestProgressReporter))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestRateLimiter))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestRollReservoir))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestServiceEstimator))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=mt.TestJobScheduler))
     
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ct.TestCharacterJobsClass))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ct.TestProfileGenerator))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ct.TestRarityClass))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ct.TestStatsClass))
 
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestImageEncoder))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestJobFactory))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestResultCache))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestSDClient))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=ut.TestTagRandomizer))
 
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=uit.TestMenuPagination))
     suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=uit.TestDropdownFactory))
 
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=bt.TestFakeWebui))
+    suite.addTest(unt.defaultTestLoader.loadTestsFromTestCase(testCaseClass=bt.TestLoadGenerator))
+
     print(runner.run(suite))
 
 
@@ -0,0 +1,442 @@
+#A stand-in for the Stable Diffusion webui API, so the queue can be load tested
+#without a GPU or network access.  It answers txt2img, extra-single-image,
+#progress, memory, and interrupt requests on localhost, sleeping for a render
+#time drawn from a seeded distribution and returning real PNGs of a chosen
+#size.  Renders are limited to a number of slots, like a GPU.
+
+
+#####  Imports  #####
+
+import base64 as b64
+import http.server as hs
+import json
+import math
+import random
+import struct
+import threading as th
+import time
+from typing import Optional
+import zlib
+
+#####  Package Variables  #####
+
+#Render times are scaled from a 512x512, 20 step image.
+BASE_PIXELS        = 512 * 512
+BASE_STEPS         = 20
+LATENCY_KINDS      = ('exponential', 'fixed', 'lognormal', 'uniform')
+#Upscales don't have steps, so they cost a fixed share of a base render.
+UPSCALE_COST       = 0.25
+
+#####  Package Functions  #####
+
+def makePng(width  : int,
+            height : int,
+            seed   : int = 0) -> bytes:
+    """Makes an uncompressed RGB PNG of random noise.  The pixels are stored,
+       not deflated, so the file is about as large as a busy SD image.
+
+       Input: width - The image width in pixels.
+              height - The image height in pixels.
+              seed - Seeds the noise.
+
+       Output: bytes - The PNG file.
+    """
+
+    rng  = random.Random(seed)
+    row  = width * 3
+    #Every row starts with a 0 byte for the 'None' filter.
+    raw  = b''.join(b'\x00' + rng.randbytes(row) for y in range(height))
+
+    def chunk(kind : bytes,
+              data : bytes) -> bytes:
+
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw, 0)) +
+            chunk(b'IEND', b''))
+
+#####  Latency Class  #####
+
+class LatencyModel:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a render time model from the 'latency' options.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'kind' of distribution, the 'mean'
+                         render time of a base image in seconds, its 'spread'
+                         (the sigma of lognormal, or the +/- range of uniform),
+                         and a 'seed'.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.kind   = opts['kind']
+        self.mean   = float(opts['mean'])
+        self.spread = float(opts['spread'])
+        self.lock   = th.Lock()
+        self.rng    = random.Random(int(opts['seed']))
+
+        if self.kind not in LATENCY_KINDS:
+
+            raise ValueError(f"Latency must be one of {', '.join(LATENCY_KINDS)}, not {self.kind}!")
+
+        if self.mean < 0.0 or self.spread < 0.0:
+
+            raise ValueError(f"The latency mean and spread can't be negative, not {self.mean} and {self.spread}!")
+
+    def sample(self,
+               cost : float = 1.0) -> float:
+        """Returns how long a render should take.
+
+           Input: self - Pointer to the current object instance.
+                  cost - How many base images the render is worth.
+
+           Output: float - The render time in seconds.
+        """
+
+        mean = self.mean * cost
+
+        #The fake webui's handler threads share the generator, and draws have
+        #to be serialized to stay reproducible.
+        with self.lock:
+
+            if self.kind == 'fixed' or mean == 0.0:
+
+                return mean
+
+            if self.kind == 'uniform':
+
+                return max(0.0, mean + self.rng.uniform(-self.spread, self.spread) * cost)
+
+            if self.kind == 'exponential':
+
+                return self.rng.expovariate(1.0 / mean)
+
+            #Keeps the mean of the lognormal at 'mean'.
+            return self.rng.lognormvariate(math.log(mean) - self.spread ** 2 / 2, self.spread)
+
+#####  Handler Class  #####
+
+class FakeWebuiHandler(hs.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self,
+               data   : dict,
+               status : int = 200):
+        """Sends a JSON body over the kept-alive connection.
+
+           Input: self - Pointer to the current object instance.
+                  data - The body to send.
+                  status - The HTTP status code.
+
+           Output: none.
+        """
+
+        body = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Answers the progress and memory endpoints.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        if self.path.startswith('/sdapi/v1/progress'):
+
+            self._reply(self.server.webui.getProgress())
+
+        elif self.path.startswith('/sdapi/v1/memory'):
+
+            self._reply({'ram'  : {'free' : 0, 'used' : 0, 'total' : 0},
+                         'cuda' : {'system' : {'free' : 0, 'used' : 0, 'total' : 0}}})
+
+        else:
+
+            self._reply({'detail' : "Not Found"}, status=404)
+
+    def do_POST(self):
+        """Answers the render and interrupt endpoints.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        length = int(self.headers['Content-Length'] or 0)
+        body   = json.loads(self.rfile.read(length)) if length > 0 else {}
+
+        if self.path.startswith('/sdapi/v1/txt2img'):
+
+            self._reply(self.server.webui.txt2img(body))
+
+        elif self.path.startswith('/sdapi/v1/extra-single-image'):
+
+            self._reply(self.server.webui.upscale(body))
+
+        elif self.path.startswith('/sdapi/v1/interrupt'):
+
+            self.server.webui.interrupt()
+            self._reply({})
+
+        else:
+
+            self._reply({'detail' : "Not Found"}, status=404)
+
+    def log_message(self, format, *args):
+        """Keeps the server from printing every request.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        pass
+
+#####  Fake Webui Class  #####
+
+class FakeWebui:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a fake webui.  Nothing is served until start() is called.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'latency' options, how many renders
+                         may run at once ('slots'), the 'width' and 'height'
+                         of returned images (0 to use the request's), and
+                         the 'port' to listen on (0 for any free port).
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.latency   = LatencyModel(opts=opts['latency'])
+        self.slots     = th.BoundedSemaphore(int(opts['slots']))
+        self.width     = int(opts['width'])
+        self.height    = int(opts['height'])
+        self.port      = int(opts['port'])
+        self.images    = {}
+        self.lock      = th.Lock()
+        self.running   = {}
+        self.renders   = 0
+        self.server    = None
+        self.thread    = None
+
+    def _getImage(self,
+                  width  : int,
+                  height : int) -> str:
+        """Returns a base64 PNG of the configured size, made once per size.
+
+           Input: self - Pointer to the current object instance.
+                  width - The requested width, used if none was configured.
+                  height - The requested height, used if none was configured.
+
+           Output: str - The base64 image.
+        """
+
+        size = (self.width or width, self.height or height)
+
+        with self.lock:
+
+            if size not in self.images:
+
+                self.images[size] = b64.b64encode(makePng(width=size[0], height=size[1])).decode()
+
+            return self.images[size]
+
+    def _render(self,
+                duration : float,
+                steps    : int) -> bool:
+        """Holds a slot for a render's duration, or until it's interrupted.
+
+           Input: self - Pointer to the current object instance.
+                  duration - How long the render takes, in seconds.
+                  steps - The render's sampling steps, for progress.
+
+           Output: bool - False if the render was interrupted.
+        """
+
+        with self.slots:
+
+            render = {'start'       : time.monotonic(),
+                      'duration'    : duration,
+                      'steps'       : steps,
+                      'interrupted' : th.Event()}
+
+            with self.lock:
+
+                self.renders                 += 1
+                self.running[th.get_ident()]  = render
+
+            try:
+                return not render['interrupted'].wait(duration)
+
+            finally:
+                with self.lock:
+
+                    del self.running[th.get_ident()]
+
+    def txt2img(self,
+                body : dict) -> dict:
+        """Renders a txt2img request.
+
+           Input: self - Pointer to the current object instance.
+                  body - The request's JSON body.
+
+           Output: dict - The webui's response body.
+        """
+
+        width  = int(body.get('width', 512))
+        height = int(body.get('height', 512))
+        steps  = int(body.get('steps', BASE_STEPS))
+        count  = int(body.get('batch_size', 1)) * int(body.get('n_iter', 1))
+        seed   = int(body.get('seed', -1))
+        cost   = count * (width * height / BASE_PIXELS) * (steps / BASE_STEPS)
+
+        #The hires pass is a second render at the upscaled size.
+        if body.get('enable_hr', False):
+
+            scale   = float(body.get('hr_scale', 2))
+            width   = int(body.get('hr_resize_x', 0)) or int(width * scale)
+            height  = int(body.get('hr_resize_y', 0)) or int(height * scale)
+            cost   += count * (width * height / BASE_PIXELS) * (int(body.get('hr_second_pass_steps', 0)) or steps) / BASE_STEPS
+
+        self._render(duration=self.latency.sample(cost),
+                     steps=steps)
+
+        seeds = [(seed if seed != -1 else 1000) + x for x in range(count)]
+        info  = {'prompt'               : body.get('prompt', ""),
+                 'all_prompts'          : [body.get('prompt', "")] * count,
+                 'negative_prompt'      : body.get('negative_prompt', ""),
+                 'all_negative_prompts' : [body.get('negative_prompt', "")] * count,
+                 'seed'                 : seeds[0],
+                 'all_seeds'            : seeds,
+                 'subseed'              : -1,
+                 'all_subseeds'         : [-1] * count,
+                 'steps'                : steps,
+                 'width'                : width,
+                 'height'               : height,
+                 'sampler_name'         : body.get('sampler_name', "Euler a"),
+                 'cfg_scale'            : body.get('cfg_scale', 7.0),
+                 'batch_size'           : count,
+                 'infotexts'            : [""] * count}
+
+        return {'images'     : [self._getImage(width, height)] * count,
+                'parameters' : body,
+                'info'       : json.dumps(info)}
+
+    def upscale(self,
+                body : dict) -> dict:
+        """Renders an extra-single-image request.
+
+           Input: self - Pointer to the current object instance.
+                  body - The request's JSON body.
+
+           Output: dict - The webui's response body.
+        """
+
+        width  = int(body.get('upscaling_resize_w', 0)) or 1024
+        height = int(body.get('upscaling_resize_h', 0)) or 1024
+
+        self._render(duration=self.latency.sample(UPSCALE_COST),
+                     steps=0)
+
+        return {'html_info' : "",
+                'image'     : self._getImage(width, height)}
+
+    def getProgress(self) -> dict:
+        """Returns the progress of the oldest running render.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - A /sdapi/v1/progress response body.
+        """
+
+        with self.lock:
+
+            render = min(self.running.values(), key=lambda x: x['start'], default=None)
+
+        if render == None:
+
+            return {'progress' : 0.0, 'eta_relative' : 0.0, 'state' : {}, 'current_image' : None}
+
+        elapsed  = time.monotonic() - render['start']
+        progress = min(1.0, elapsed / render['duration']) if render['duration'] > 0.0 else 1.0
+
+        return {'progress'      : progress,
+                'eta_relative'  : max(0.0, render['duration'] - elapsed),
+                'state'         : {'sampling_step'  : int(progress * render['steps']),
+                                   'sampling_steps' : render['steps']},
+                'current_image' : None}
+
+    def interrupt(self):
+        """Stops every running render early, like the webui's interrupt.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            for render in self.running.values():
+
+                render['interrupted'].set()
+
+    def start(self) -> str:
+        """Starts serving on localhost from a daemon thread.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The URL to use as a backend.
+        """
+
+        self.server       = hs.ThreadingHTTPServer(('127.0.0.1', self.port), FakeWebuiHandler)
+        self.server.webui = self
+        self.thread       = th.Thread(target = self.server.serve_forever,
+                                      name   = f"Fake webui {self.server.server_address[1]}",
+                                      daemon = True)
+        self.thread.start()
+
+        return self.getUrl()
+
+    def getUrl(self) -> Optional[str]:
+        """Returns the URL the webui is served at.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The URL, or None if it isn't started.
+        """
+
+        if self.server == None:
+
+            return None
+
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def stop(self):
+        """Stops serving and interrupts any running renders.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.interrupt()
+
+        if self.server != None:
+
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,388 @@
+#Drives a Queue Manager with synthetic Discord traffic and measures how fast
+#jobs come back.  Traffic is a trace of timed /generate requests from many
+#simulated Guilds and users, made from a seed so the same load can be replayed
+#against different configs.  Traces can be saved and loaded as JSON lines.
+#Jobs go through Manager.add, the backend workers, and each job's post path,
+#with the Discord side replaced by simulated interactions.
+
+
+#####  Imports  #####
+
+import asyncio
+import collections as co
+import json
+import math
+import pathlib as pl
+import random
+import src.utilities.JobFactory as jf
+import time
+from typing import Optional
+
+#####  Package Variables  #####
+
+#Sizes the simulated users ask for, as (width, height).
+SIZES = ((512, 512), (512, 768), (768, 512))
+STEPS = (20, 25, 30)
+
+#####  Package Functions  #####
+
+def makeTrace(opts : dict) -> list:
+    """Makes a reproducible trace of /generate requests.  Arrivals are a
+       Poisson process, and lower numbered Guilds are busier, as on a real bot
+       where a few servers send most of the traffic.
+
+       Input: opts - A dict with the 'seed', the number of 'guilds', the
+                     'users' in each Guild, the trace's 'duration' in
+                     seconds, the average 'rate' of requests per second, and
+                     the share of requests with a 'fixed_seed'.
+
+       Output: list - The requests, in order, as dicts with the seconds after
+                      the start to send them 'at', the 'guild' and 'user'
+                      IDs, and the /generate 'options'.
+    """
+
+    rng      = random.Random(int(opts['seed']))
+    guilds   = int(opts['guilds'])
+    users    = int(opts['users'])
+    duration = float(opts['duration'])
+    rate     = float(opts['rate'])
+    weights  = [1.0 / (x + 1) for x in range(guilds)]
+    trace    = []
+    at       = 0.0
+
+    if guilds < 1 or users < 1 or rate <= 0.0:
+
+        raise ValueError(f"A trace needs at least 1 Guild and user and a positive rate, not {guilds}, {users}, and {rate}!")
+
+    while True:
+
+        at += rng.expovariate(rate)
+
+        if at >= duration:
+
+            break
+
+        guild         = rng.choices(range(guilds), weights=weights)[0]
+        width, height = rng.choice(SIZES)
+        seed          = rng.randrange(1, 2 ** 31) if rng.random() < float(opts['fixed_seed']) else -1
+
+        trace.append({'at'      : round(at, 6),
+                      'guild'   : 1000 + guild,
+                      'user'    : guild * users + rng.randrange(users) + 1,
+                      'options' : {'cfg_scale' : 7.0,
+                                   'height'    : height,
+                                   'n_prompt'  : "lowres, bad anatomy",
+                                   'prompt'    : f"benchmark prompt {rng.randrange(10)}",
+                                   'random'    : False,
+                                   'sampler'   : "Euler a",
+                                   'seed'      : seed,
+                                   'steps'     : rng.choice(STEPS),
+                                   'tag_cnt'   : 0,
+                                   'width'     : width}})
+
+    return trace
+
+def saveTrace(trace : list,
+              path  : str):
+    """Writes a trace as JSON lines.
+
+       Input: trace - The requests made by makeTrace.
+              path - Where to write it.
+
+       Output: N/A - Throws exceptions on error.
+    """
+
+    with open(pl.Path(path).absolute(), 'w') as trace_file:
+
+        for entry in trace:
+
+            trace_file.write(json.dumps(entry) + '\n')
+
+def loadTrace(path : str) -> list:
+    """Reads a trace written by saveTrace.
+
+       Input: path - The trace file.
+
+       Output: list - The requests, in order.
+    """
+
+    with open(pl.Path(path).absolute()) as trace_file:
+
+        return [json.loads(line) for line in trace_file if line.strip()]
+
+def getPercentile(values : list,
+                  pct    : float) -> float:
+    """Returns a nearest-rank percentile.
+
+       Input: values - The samples.
+              pct - The percentile, from 0 to 100.
+
+       Output: float - The percentile, or 0.0 with no samples.
+    """
+
+    if len(values) == 0:
+
+        return 0.0
+
+    ordered = sorted(values)
+
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+def formatReport(report : dict) -> str:
+    """Returns a load test report as text.
+
+       Input: report - A report from LoadGenerator.run.
+
+       Output: str - One line per measurement.
+    """
+
+    lines = [f"Requests:   {report['submitted']} sent, {report['accepted']} accepted, {report['rejected']} rejected",
+             f"Jobs:       {report['completed']} posted, {report['failed']} failed, {report['lost']} never posted",
+             f"Throughput: {report['throughput']:.3f} jobs/s over {report['elapsed']:.1f} s",
+             f"Latency:    p50 {report['p50']:.3f} s, p90 {report['p90']:.3f} s, p99 {report['p99']:.3f} s, max {report['max']:.3f} s",
+             f"Uploads:    {report['upload_bytes'] / max(1, report['completed']) / 1024:.1f} KiB per image"]
+
+    for reason, count in sorted(report['rejections'].items(), key=lambda x: -x[1]):
+
+        lines.append(f"Rejected:   {count} x {reason}")
+
+    return '\n'.join(lines)
+
+#####  Simulated Discord Classes  #####
+
+class SimulatedChannel:
+
+    def __init__(self,
+                 generator : 'LoadGenerator'):
+        """Creates a channel that counts what's posted to it.
+
+           Input: self - Pointer to the current object instance.
+                  generator - The load generator to report posts to.
+
+           Output: None.
+        """
+
+        self.generator = generator
+
+    async def send(self,
+                   content          : Optional[str] = None,
+                   allowed_mentions = None,
+                   file             = None,
+                   embed            = None,
+                   embeds           = None):
+        """Records the size of any posted image.
+
+           Input: self - Pointer to the current object instance.
+                  content - The message text.
+                  allowed_mentions - Who may be mentioned.
+                  file - An optional discord.File to upload.
+                  embed - An optional embed.
+                  embeds - Optional embeds.
+
+           Output: None.
+        """
+
+        if file != None:
+
+            self.generator.upload_bytes += len(file.fp.getbuffer())
+
+class SimulatedUser:
+
+    def __init__(self,
+                 user_id : int):
+        """Creates a user with just enough of discord.User for the jobs.
+
+           Input: self - Pointer to the current object instance.
+                  user_id - The user's ID.
+
+           Output: None.
+        """
+
+        self.id           = user_id
+        self.name         = f"user{user_id}"
+        self.display_name = self.name
+        self.mention      = f"<@{user_id}>"
+
+class SimulatedInteraction:
+
+    def __init__(self,
+                 guild_id  : int,
+                 user_id   : int,
+                 generator : 'LoadGenerator'):
+        """Creates an interaction with just enough of discord.Interaction for
+           the Queue Manager, the progress reporter, and the jobs.
+
+           Input: self - Pointer to the current object instance.
+                  guild_id - The Guild the command came from.
+                  user_id - The user that sent it.
+                  generator - The load generator to report posts to.
+
+           Output: None.
+        """
+
+        self.guild_id   = guild_id
+        self.channel_id = guild_id
+        self.user       = SimulatedUser(user_id)
+        self.channel    = SimulatedChannel(generator)
+
+    async def edit_original_response(self,
+                                     **kwargs):
+        """Accepts progress edits.
+
+           Input: self - Pointer to the current object instance.
+                  kwargs - The edit.
+
+           Output: None.
+        """
+
+        pass
+
+    async def delete_original_response(self):
+        """Accepts the progress message being deleted.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        pass
+
+#####  Generator Class  #####
+
+class LoadGenerator:
+
+    def __init__(self,
+                 manager,
+                 trace   : list,
+                 timeout : float):
+        """Creates a generator that will replay a trace against a Manager.
+
+           Input: self - Pointer to the current object instance.
+                  manager - A running Queue Manager.
+                  trace - The requests to send, from makeTrace or loadTrace.
+                  timeout - How long to wait for jobs after the last request
+                            before counting them as lost.
+
+           Output: None.
+        """
+
+        self.manager      = manager
+        self.trace        = trace
+        self.timeout      = timeout
+        self.accepted     = {}
+        self.latencies    = []
+        self.failed       = 0
+        self.rejections   = co.Counter()
+        self.upload_bytes = 0
+        self.first        = None
+        self.last         = None
+
+    async def _post(self,
+                    job      : jf.Job,
+                    metadata : dict):
+        """Posts a finished job the way the bot does and records its latency.
+
+           Input: self - Pointer to the current object instance.
+                  job - The finished job.
+                  metadata - The job's simulated Discord context.
+
+           Output: None.
+        """
+
+        submitted = self.accepted.pop(job.getJobId(), None)
+
+        if job.getStatusCode() != 200:
+
+            self.failed += 1
+            return
+
+        await job.post(metadata)
+
+        if submitted != None:
+
+            self.last = time.monotonic()
+            self.latencies.append(self.last - submitted)
+
+    def _submit(self,
+                entry : dict,
+                loop  : asyncio.AbstractEventLoop):
+        """Sends one request from the trace to the Manager.
+
+           Input: self - Pointer to the current object instance.
+                  entry - The request.
+                  loop - The loop jobs are posted from.
+
+           Output: None.
+        """
+
+        ctx      = SimulatedInteraction(guild_id  = entry['guild'],
+                                        user_id   = entry['user'],
+                                        generator = self)
+        job      = jf.JobFactory.getJob(type    = jf.JobTypeEnum.GENERATE,
+                                        ctx     = ctx,
+                                        options = dict(entry['options']))
+        metadata = {'ctx'     : ctx,
+                    'db_ifc'  : None,
+                    'loop'    : loop,
+                    'post_fn' : self._post,
+                    'tag_rng' : None}
+        now      = time.monotonic()
+        result   = self.manager.add(metadata = metadata,
+                                    job      = job)
+
+        #Only queued jobs are given a queue time.
+        if job.queued_at != None:
+
+            self.accepted[job.getJobId()] = now
+
+        else:
+
+            self.rejections[result.split('.')[0][:60]] += 1
+
+    async def run(self) -> dict:
+        """Sends the trace's requests at their times, then waits for every
+           accepted job to be posted.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - The report, see formatReport.
+        """
+
+        loop       = asyncio.get_running_loop()
+        self.first = time.monotonic()
+
+        for entry in self.trace:
+
+            delay = self.first + entry['at'] - time.monotonic()
+
+            if delay > 0.0:
+
+                await asyncio.sleep(delay)
+
+            self._submit(entry=entry,
+                         loop=loop)
+
+        accepted = len(self.accepted) + len(self.latencies) + self.failed
+        deadline = time.monotonic() + self.timeout
+
+        #Posts are handed to this loop, so it has to keep running while it waits.
+        while len(self.accepted) > 0 and time.monotonic() < deadline:
+
+            await asyncio.sleep(0.05)
+
+        elapsed = (self.last if self.last != None else time.monotonic()) - self.first
+
+        return {'submitted'    : len(self.trace),
+                'accepted'     : accepted,
+                'rejected'     : len(self.trace) - accepted,
+                'rejections'   : dict(self.rejections),
+                'completed'    : len(self.latencies),
+                'failed'       : self.failed,
+                'lost'         : len(self.accepted),
+                'elapsed'      : elapsed,
+                'throughput'   : len(self.latencies) / elapsed if elapsed > 0.0 else 0.0,
+                'p50'          : getPercentile(self.latencies, 50),
+                'p90'          : getPercentile(self.latencies, 90),
+                'p99'          : getPercentile(self.latencies, 99),
+                'max'          : max(self.latencies, default=0.0),
+                'upload_bytes' : self.upload_bytes}
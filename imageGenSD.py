@@ -22,6 +22,7 @@ import src.characters.RarityClass as rc
 import src.db.MariadbIfc as mdb
 import src.managers.DailyEventMgr as dem
 import src.managers.QueueMgr as qm
+import src.managers.RollReservoir as rr
 import src.ui.DropDownFactory as ddf
 import src.ui.MenuPagination as mp
 import src.utilities.JobFactory as jf
@@ -30,6 +31,7 @@ import src.utilities.TagRandomizer as tr
 import string
 import threading as th
 import time
+import types
 from typing import Literal, Optional
 
 #####  Package Variables  #####
@@ -48,9 +50,6 @@ db_ifc         = None
 dict_path      = ["","",""]
 IGSD_version   = '0.3.89'
 job_queue      = None
-job_worker     = None
-show_queue     = None
-show_worker    = None
 tag_randomizer = None
 #This will be modified in the future to accept user-supplied paths.
 #This file must be loaded prior to the logger to allow for user-provided
@@ -267,6 +266,48 @@ def bannedWordsFound(prompt: str, banned_words: str) -> bool:
 
     return result
 
+@IGSD_client.tree.command()
+@dac.checks.has_permissions(use_application_commands=True)
+async def cancel(interaction: dis.Interaction):
+    """Cancels the user's jobs from this Guild, whether they're waiting in
+       the queue or already being drawn.
+
+       Input  : interaction - the interaction context from Discord.
+
+       Output : None.
+    """
+
+    dis_log = log.getLogger('discord')
+    count   = job_queue.cancel(user_id  = interaction.user.id,
+                               guild_id = interaction.guild_id)
+
+    dis_log.debug(f"Cancelled {count} jobs for user {interaction.user.id} in Guild {interaction.guild_id}.")
+
+    if count > 0:
+        result = "Your job was cancelled."
+    else:
+        result = "You don't have any jobs to cancel."
+
+    await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=9.0)
+
+@IGSD_client.tree.command()
+@dac.checks.has_permissions(manage_guild=True) #The closest to 'be a mod' Discord has.
+async def flush(interaction: dis.Interaction):
+    """Cancels every job from this Guild, whether they're waiting in the
+       queue or already being drawn.
+
+       Input  : interaction - the interaction context from Discord.
+
+       Output : None.
+    """
+
+    dis_log = log.getLogger('discord')
+    count   = job_queue.flush(guild_id=interaction.guild_id)
+
+    dis_log.info(f"User {interaction.user.id} flushed {count} jobs from Guild {interaction.guild_id}.")
+
+    await interaction.response.send_message(f'Cancelled {count} jobs from this Guild.', ephemeral=True, delete_after=9.0)
+
 @IGSD_client.tree.command()
 @dac.checks.has_permissions(use_application_commands=True)
 @dac.describe(random=f"A flag to add between {params['tag_rng_opts']['min_rand_tag_cnt']} and {params['tag_rng_opts']['max_rand_tag_cnt']} random tags to the user prompt.  Does not count towards the maximum prompt length.",
@@ -309,8 +350,9 @@ async def generate(interaction: dis.Interaction,
         Output : N/A.
     """
 
-    dis_log = log.getLogger('discord')
-    error   = False;
+    dis_log      = log.getLogger('discord')
+    delete_after = 9.0
+    error        = False;
 
     if bannedWordsFound(prompt, params['options']['banned_words']) or bannedWordsFound(negative_prompt, params['options']['banned_neg_words']):
         result = f"Job ignored.  Please do not use words containing: {params['options']['banned_words']} in the positive prompt or {params['options']['banned_neg_words']} in the negative prompt."
@@ -341,7 +383,13 @@ async def generate(interaction: dis.Interaction,
         result = job_queue.add(metadata = metadata,
                                job      = job)
 
-    await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=9.0)
+        #The response is edited with the job's progress and deleted once the
+        #image is posted.
+        if job_queue.isReportingProgress(job):
+
+            delete_after = None
+
+    await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=delete_after)
 
 @IGSD_client.tree.command()
 @dac.checks.has_permissions(use_application_commands=True)
@@ -429,7 +477,6 @@ async def on_ready():
     global daily_mgr_th
     global db_ifc
     global job_queue
-    global show_queue
     global tag_randomizer
     global worker
 
@@ -461,16 +508,13 @@ async def on_ready():
     dis_log.debug(f"Creating Job Queue Manager.")
     job_queue = qm.Manager(manager_id = 0,
                            opts       = params['queue_opts'])
-    job_worker = th.Thread(target = job_queue.putJob,
-                           name   = "Job Queue mgr",
-                           daemon = True)
 
-    dis_log.debug(f"Creating Show Queue Manager.")
-    show_queue = qm.Manager(manager_id = 1,
-                            opts       = params['queue_opts'])
-    show_worker = th.Thread(target = show_queue.putJob,
-                            name   = "Show Queue mgr",
-                            daemon = True)
+    if 'roll_reservoir' in params['queue_opts'] and params['queue_opts']['roll_reservoir']['enabled'] == "True":
+
+        dis_log.debug(f"Creating Roll Reservoir.")
+        job_queue.setReservoir(rr.RollReservoir(opts    = params['queue_opts']['roll_reservoir'],
+                                                prompt  = params['options']['prompts'],
+                                                tag_rng = tag_randomizer))
 
     dis_log.debug(f"Creating DB Interface.")
     db_ifc = mdb.MariadbIfc(options=params['db_opts'])
@@ -482,9 +526,9 @@ async def on_ready():
                              daemon = True)
 
     daily_mgr_th.start()
+    recoverJobs()
     #Only start the job queue once all other tasks are ready.
-    job_worker.start()
-    show_worker.start()
+    job_queue.run()
 
     print('------')
 
@@ -515,6 +559,43 @@ async def post(job      : jf.Job,
 
         await job.post(metadata)
 
+def recoverJobs():
+    """Re-queues the generate and roll jobs the last run accepted but never
+       posted, using the channel they were requested from.  Other jobs are
+       only quick reads or tests, so they're just logged.
+
+        Input  : None.
+
+        Output : N/A.
+    """
+
+    dis_log = log.getLogger('discord')
+
+    for state, job, info in job_queue.recover():
+
+        channel = IGSD_client.get_channel(info['channel_id']) if info['channel_id'] != None else None
+
+        if channel == None or not job.isReplayable():
+
+            dis_log.warning(f"Not replaying job {job.getJobId()} for user {job.getUserId()}, it was {state.name} when the bot stopped.")
+            continue
+
+        #The original interaction has expired, but posting only needs the
+        #channel.
+        ctx      = types.SimpleNamespace(channel    = channel,
+                                         channel_id = info['channel_id'],
+                                         guild_id   = job.getGuild())
+        metadata = {'ctx'     : ctx,
+                    'db_ifc'  : db_ifc,
+                    'loop'    : IGSD_client.getLoop(),
+                    'post_fn' : post,
+                    'tag_rng' : tag_randomizer
+                   }
+        result   = job_queue.add(metadata = metadata,
+                                 job      = job,
+                                 replay   = True)
+        dis_log.info(f"Replaying job {job.getJobId()} for user {job.getUserId()}: {result}")
+
 @IGSD_client.tree.command()
 @dac.checks.has_permissions(use_application_commands=True)
 @dac.describe(tier="Which tier to manage character assignments in.  1 means 'Base', 6 means 'Master'.") #TODO: cycle through the tiers?
@@ -623,7 +704,7 @@ async def roll(interaction: dis.Interaction):
         result = job_queue.add(metadata = metadata,
                                job      = job)
 
-        await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=9.0)
+        await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=None if job_queue.isReportingProgress(job) else 9.0)
 
 @IGSD_client.tree.command()
 @dac.checks.has_permissions(use_application_commands=True)
@@ -652,7 +733,7 @@ async def showprofile(interaction : dis.Interaction,
                      'db_ifc'  : db_ifc,
                      'loop'    : IGSD_client.getLoop(),
                      'post_fn' : post,
-                     'queue'   : show_queue
+                     'queue'   : job_queue
                     }
     rarity_values = None if rarity == None else int(rarity.value)
 
@@ -674,8 +755,8 @@ async def showprofile(interaction : dis.Interaction,
                                    ctx     = interaction,
                                    options = opts)
         dis_log.debug(f"Posting SHOW job {job} to the queue.")
-        result = show_queue.add(metadata = metadata,
-                                job      = job)
+        result = job_queue.add(metadata = metadata,
+                               job      = job)
 
         await interaction.response.send_message(f'{result}')
     else:
@@ -725,8 +806,8 @@ async def showprofile(interaction : dis.Interaction,
                                            ctx     = interaction,
                                            options = opts)
                 dis_log.debug(f"Posting SHOW job {job} to the queue.")
-                result = show_queue.add(metadata = metadata,
-                                        job      = job)
+                result = job_queue.add(metadata = metadata,
+                                       job      = job)
 
                 await interaction.response.send_message(f'{result}')
 
@@ -769,7 +850,7 @@ async def showsummary(interaction : dis.Interaction,
                 'db_ifc'  : db_ifc,
                 'loop'    : IGSD_client.getLoop(),
                 'post_fn' : post,
-                'queue'   : show_queue
+                'queue'   : job_queue
                }
 
 
@@ -791,8 +872,8 @@ async def showsummary(interaction : dis.Interaction,
                                            options = opts)
 
                 dis_log.debug(f"Posting CHARACTERS SUMMARY job {job} to the queue.")
-                result = show_queue.add(metadata = metadata,
-                                        job      = job)
+                result = job_queue.add(metadata = metadata,
+                                       job      = job)
 
             case SummaryChoices.Economy:
 
@@ -802,8 +883,8 @@ async def showsummary(interaction : dis.Interaction,
                                            options = opts)
 
                 dis_log.debug(f"Posting ECONOMY SUMMARY job {job} to the queue.")
-                result = show_queue.add(metadata = metadata,
-                                        job      = job)
+                result = job_queue.add(metadata = metadata,
+                                       job      = job)
 
             case SummaryChoices.Inventory:
 
@@ -813,8 +894,8 @@ async def showsummary(interaction : dis.Interaction,
                                            options = opts)
 
                 dis_log.debug(f"Posting INVENTORY SUMMARY job {job} to the queue.")
-                result = show_queue.add(metadata = metadata,
-                                        job      = job)
+                result = job_queue.add(metadata = metadata,
+                                       job      = job)
 
             case _:
 
@@ -844,8 +925,8 @@ async def testget(interaction: dis.Interaction):
                                ctx  = interaction)
 
     dis_log.debug(f"Posting test GET job {job} to the queue.")
-    result = show_queue.add(metadata = metadata,
-                            job      = job)
+    result = job_queue.add(metadata = metadata,
+                           job      = job)
 
     await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=9.0)
 
@@ -924,8 +1005,8 @@ async def testshowprofile(interaction: dis.Interaction):
     job = jf.JobFactory.getJob(type = jf.JobTypeEnum.TEST_SHOW,
                                ctx  = interaction)
     dis_log.debug(f"Posting test SHOW job {job} to the queue.")
-    result = show_queue.add(metadata = metadata,
-                            job      = job)
+    result = job_queue.add(metadata = metadata,
+                           job      = job)
 
     await interaction.response.send_message(f'{result}', ephemeral=True, delete_after=9.0)
 
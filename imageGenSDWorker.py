@@ -0,0 +1,82 @@
+#Runs IGSD image jobs on a machine other than the one running the Discord bot.
+#Copy the bot's config.json to the GPU machine, point its 'backends' at the
+#local webui, and its 'broker' at the bot.  Each backend job slot gets its own
+#connection to the bot.
+
+
+#####  Imports  #####
+
+import json
+import logging as log
+import logging.handlers as lh
+import pathlib as pl
+import src.managers.BackendMgr as bm
+import src.managers.JobBroker as jb
+import threading as th
+
+#####  Package Variables  #####
+
+default_params = {'cfg' : 'src/config/config.json'}
+
+#####  Package Functions  #####
+
+def Startup():
+    """Starts a worker for every job slot of every configured backend and runs
+       them until the process is stopped.
+
+        Input  : None.
+
+        Output : N/A.
+    """
+
+    cfg_path = pl.Path(default_params['cfg'])
+
+    try:
+        with open(cfg_path.absolute()) as json_file:
+            params = json.load(json_file)
+
+    except OSError as err:
+        print(f"Can't load the config file from path: {cfg_path.absolute()}!")
+        exit(-3)
+
+    opts = params['queue_opts']
+
+    worker_log = log.getLogger('job_worker')
+    worker_log.setLevel(opts['log_lvl'])
+    log_path = pl.Path(f"{opts['log_name_queue']}_worker")
+
+    logHandler = lh.RotatingFileHandler(filename=log_path.absolute(),
+                                        encoding=opts['log_encoding'],
+                                        maxBytes=int(opts['max_bytes']),
+                                        backupCount=int(opts['log_file_cnt'])
+    )
+    formatter = log.Formatter('[{asctime}] [{levelname:<8}] {name}: {message}',
+                              opts['date_fmt'],
+                              style='{'
+    )
+    logHandler.setFormatter(formatter)
+    worker_log.addHandler(logHandler)
+
+    workers = []
+
+    for backend in bm.getBackendOptions(opts):
+
+        for slot in range(int(backend['job_count'])):
+
+            worker = jb.JobWorker(opts    = opts['broker'],
+                                  web_url = backend['url'])
+            thread = th.Thread(target = worker.run,
+                               name   = f"Remote worker {backend['url']} {slot}",
+                               daemon = True)
+            workers.append(thread)
+            thread.start()
+
+    print(f"Started {len(workers)} workers for broker {opts['broker']['host']}:{opts['broker']['port']}.")
+
+    for thread in workers:
+
+        thread.join()
+
+
+if __name__ == '__main__':
+    Startup()
@@ -53,6 +53,43 @@ class Profile:
         self.creator  = int(opts['creator']) if opts['creator'] != None else self.owner
         self.desc     = opts['desc']         if opts['desc']    != None else sc.getDescription(self.rarity)
 
+    def getSummary(self) -> 'ProfileSummary':
+        """Returns the fields of this profile that lists and dropdowns show.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: ProfileSummary - the profile's summary.
+        """
+
+        return ProfileSummary(opts={'id'      : self.id,
+                                    'name'    : self.name,
+                                    'rarity'  : self.rarity,
+                                    'average' : self.stats.average,
+                                    'job'     : self.job})
+
+#####  Profile Summary Class  #####
+
+class ProfileSummary:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates the few fields of a profile that lists and dropdowns show,
+           so they don't load the description, info, and stats of a Profile.
+           The full Profile is loaded by ID when it's shown.
+
+           Input: self - Pointer to the current object instance.
+                  opts - a dict with the profile's 'id', 'name', 'rarity',
+                         stat 'average', and 'job'.
+
+           Output: None.
+        """
+
+        self.average = float(opts['average'])
+        self.id      = str(opts['id'])
+        self.job     = opts['job']
+        self.name    = opts['name']
+        self.rarity  = opts['rarity']
+
 #####  Package Functions  #####
 
 def getDefaultJobData() -> dict:
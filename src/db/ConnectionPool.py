@@ -0,0 +1,282 @@
+#A bounded pool of MariaDB connections, so the Discord loop, the queue's
+#workers, and the daily event thread don't all share one socket.  Each thread
+#checks out its own connection for the length of a DB call, and calls made
+#while it holds one reuse it.  Connections are pinged before reuse if they've
+#been idle a while, and closed once they've been idle too long.  Each
+#connection also keeps the prepared statements made on it.
+
+
+#####  Imports  #####
+
+import collections as co
+import contextlib as cl
+import mariadb
+import threading as th
+import time
+from typing import Callable, Iterator
+
+#####  Pool Class  #####
+
+class ConnectionPool:
+
+    def __init__(self,
+                 connect : Callable,
+                 opts    : dict):
+        """Creates an empty pool.  Connections are opened as they're needed.
+
+           Input: self - Pointer to the current object instance.
+                  connect - Opens a new connection.
+                  opts - A dict with the max 'size', how many seconds a
+                         connection may be idle before it's pinged
+                         ('ping_interval') or closed ('idle_timeout'), and how
+                         long to wait for a free connection
+                         ('checkout_timeout').
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.connect          = connect
+        self.size             = int(opts['size'])
+        self.ping_interval    = float(opts['ping_interval'])
+        self.idle_timeout     = float(opts['idle_timeout'])
+        self.checkout_timeout = float(opts['checkout_timeout'])
+        #Idle connections and when they were returned, most recent last.
+        self.idle             = co.deque()
+        self.lock             = th.Lock()
+        self.local            = th.local()
+        self.open             = 0
+        #Prepared statement cursors, by the ID of the connection they're on.
+        self.statements       = {}
+
+        if self.size < 1:
+
+            raise ValueError(f"The DB pool needs at least 1 connection, not {self.size}!")
+
+        self.slots = th.BoundedSemaphore(self.size)
+
+    def add(self,
+            connection):
+        """Gives the pool a connection that was opened elsewhere, like the one
+           used to validate the install.
+
+           Input: self - Pointer to the current object instance.
+                  connection - The open connection.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.open += 1
+            self.idle.append((connection, time.monotonic()))
+
+    def _dropStatements(self,
+                        connection):
+        """Closes a connection's prepared statements, so they're prepared
+           again the next time they're used.
+
+           Input: self - Pointer to the current object instance.
+                  connection - The connection the statements are on.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            statements = self.statements.pop(id(connection), {})
+
+        for cursor in statements.values():
+
+            try:
+                cursor.close()
+
+            except mariadb.Error:
+                pass
+
+    def _close(self,
+               connection):
+        """Closes a connection the pool is dropping.
+
+           Input: self - Pointer to the current object instance.
+                  connection - The connection to close.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.open -= 1
+
+        self._dropStatements(connection)
+
+        try:
+            connection.close()
+
+        except mariadb.Error:
+            pass
+
+    def _checkout(self):
+        """Returns a healthy idle connection, or a new one.  The caller must
+           hold a slot.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Connection - The connection to use.
+        """
+
+        while True:
+
+            with self.lock:
+
+                if len(self.idle) == 0:
+
+                    break
+
+                #The most recently used connection is the least likely to
+                #have been dropped by the server.
+                connection, returned = self.idle.pop()
+
+            idle = time.monotonic() - returned
+
+            if idle >= self.idle_timeout:
+
+                self._close(connection)
+                continue
+
+            if idle >= self.ping_interval:
+
+                try:
+                    connection.ping()
+
+                except mariadb.Error:
+                    self._close(connection)
+                    continue
+
+            return connection
+
+        connection = self.connect()
+
+        with self.lock:
+
+            self.open += 1
+
+        return connection
+
+    def _checkin(self,
+                 connection):
+        """Returns a connection to the pool and closes any others that have
+           been idle too long.
+
+           Input: self - Pointer to the current object instance.
+                  connection - The connection to return.
+
+           Output: None.
+        """
+
+        now   = time.monotonic()
+        stale = []
+
+        with self.lock:
+
+            while len(self.idle) > 0 and now - self.idle[0][1] >= self.idle_timeout:
+
+                stale.append(self.idle.popleft()[0])
+
+            self.idle.append((connection, now))
+
+        for connection in stale:
+
+            self._close(connection)
+
+    @cl.contextmanager
+    def connection(self) -> Iterator:
+        """Checks out a connection for the current thread.  Nested checkouts
+           on the same thread share it, so a DB call can use others.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Connection - The thread's connection, returned to the pool
+                                when the outermost checkout ends.
+        """
+
+        if getattr(self.local, 'connection', None) != None:
+
+            yield self.local.connection
+            return
+
+        if not self.slots.acquire(timeout=self.checkout_timeout):
+
+            raise TimeoutError(f"No DB connection was free after {self.checkout_timeout} seconds!")
+
+        connection = None
+        broken     = False
+
+        try:
+            connection            = self._checkout()
+            self.local.connection = connection
+
+            yield connection
+
+        except mariadb.InterfaceError:
+            #The connection itself failed, so it shouldn't be reused.
+            broken = True
+            raise
+
+        except mariadb.Error:
+            #The connection is fine, but a failed statement may have left its
+            #cursor unusable.
+            self._dropStatements(connection)
+            raise
+
+        finally:
+            self.local.connection = None
+
+            if connection != None:
+
+                if broken:
+
+                    self._close(connection)
+
+                else:
+
+                    self._checkin(connection)
+
+            self.slots.release()
+
+    def getCurrent(self):
+        """Returns the connection checked out by the current thread.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Connection - The connection, or None if there isn't one.
+        """
+
+        return getattr(self.local, 'connection', None)
+
+    def getStatements(self) -> dict:
+        """Returns the prepared statements of the connection checked out by
+           the current thread.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - Cursors by the statement they were prepared for.
+                          Dropped with the connection.
+        """
+
+        connection = self.getCurrent()
+
+        with self.lock:
+
+            return self.statements.setdefault(id(connection), {})
+
+    def getOpenCount(self) -> int:
+        """Returns how many connections the pool has open.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: int - Open connections, idle or checked out.
+        """
+
+        with self.lock:
+
+            return self.open
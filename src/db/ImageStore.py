@@ -0,0 +1,113 @@
+#An optional on-disk store for the pictures of rolled profiles, so the DB only
+#keeps a reference to each one instead of the image itself.  Files are named
+#by the SHA-256 of their contents, which makes storing the same image twice a
+#no-op, and are sharded into two levels of directories by the start of the
+#hash so no directory grows too large.  Writes go to a temporary file that's
+#renamed into place, so a crash never leaves a partial image behind.
+
+
+#####  Imports  #####
+
+import hashlib
+import os
+import pathlib as pl
+import re
+import tempfile
+
+#####  Package Variables  #####
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+#####  Image Store Class  #####
+
+class ImageStore:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a store rooted at the configured path, making the folder if
+           needed.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the store's 'path', and whether to
+                         'fsync' each image before it's referenced.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.root  = pl.Path(opts['path']).absolute()
+        self.fsync = opts['fsync'].lower() == "true" if 'fsync' in opts else True
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def getPath(self,
+                digest : str) -> pl.Path:
+        """Returns where an image is stored.
+
+           Input: self - Pointer to the current object instance.
+                  digest - The image's SHA-256, as hex.
+
+           Output: Path - The image's file, which may not exist.
+        """
+
+        #The hash comes from the DB, so it's checked before it becomes a path.
+        if HASH_PATTERN.match(digest) == None:
+
+            raise ValueError(f"{digest} isn't a SHA-256 image hash!")
+
+        return self.root / digest[0:2] / digest[2:4] / f"{digest}.png"
+
+    def put(self,
+            data : bytes) -> str:
+        """Stores an image, unless one with the same contents already is.
+
+           Input: self - Pointer to the current object instance.
+                  data - The image.
+
+           Output: str - The image's SHA-256, as hex, to reference it by.
+        """
+
+        digest = hashlib.sha256(data).hexdigest()
+        path   = self.getPath(digest)
+
+        if path.exists():
+
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        #The temporary file is in the same folder so the rename is atomic.
+        handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+
+                temp_file.write(data)
+
+                if self.fsync:
+
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+
+            os.replace(temp_path, path)
+
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        return digest
+
+    def get(self,
+            digest : str) -> bytes:
+        """Returns a stored image.
+
+           Input: self - Pointer to the current object instance.
+                  digest - The image's SHA-256, as hex.
+
+           Output: bytes - The image, or empty if it isn't stored.
+        """
+
+        try:
+            return self.getPath(digest).read_bytes()
+
+        except FileNotFoundError:
+            return b""
@@ -8,6 +8,7 @@
 #####  Imports  #####
 
 from enum import IntEnum
+import functools as ft
 import json
 import logging as log
 import logging.handlers as lh
@@ -20,12 +21,34 @@ import src.characters.CharacterJobs as cj
 import src.characters.ProfileGenerator as pg
 import src.characters.RarityClass as rc
 import src.characters.StatsClass as sc
+import src.db.ConnectionPool as cp
+import src.db.ImageStore as ims
 import sys
 import threading as th
 from typing import Literal, Optional
 
 #####  Package Variables  #####
 
+#####  Package Functions  #####
+
+def pooled(method):
+    """Wraps a MariadbIfc method so it runs on a connection checked out from
+       the pool.  Methods called from inside it share that connection.
+
+       Input: method - The method to wrap.
+
+       Output: function - The wrapped method.
+    """
+
+    @ft.wraps(method)
+    def wrapper(self, *args, **kwargs):
+
+        with self.pool.connection():
+
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 #####  Mariadb Interface Class  #####
 
 class MariadbIfc:
@@ -78,7 +101,10 @@ class MariadbIfc:
 
             self.args      = options
             self.cmds      = {}
-            self.con       = None
+            self.pool      = None
+            store_opts     = options['image_store'] if 'image_store' in options else {'enabled' : "False"}
+            #Pictures are kept in the DB unless a store is configured.
+            self.store     = ims.ImageStore(store_opts) if store_opts['enabled'].lower() == "true" else None
 
             self.db_log = log.getLogger('mariadb')
             self.db_log.setLevel(options['log_lvl'])
@@ -132,6 +158,62 @@ class MariadbIfc:
             self.db_log.info(f"Successfully connected to database: host: {options['host']} port: {options['port']} username: {options['user_name']} db: {options['database']}")
             self.db_log.debug(f"Loaded commands: {self.db_cmds} {self.cmds['pic']} {self.cmds['econ']} {paths['inv']} {self.cmds['prof']} {self.cmds['user']}")
 
+    def _connect(self,
+                 database : Optional[str] = None):
+        """Opens a new connection to the server.
+
+           Input: self - Pointer to the current object instance.
+                  database - The database to use, or None before it exists.
+
+           Output: Connection - The new connection.  Throws mariadb.Error on
+                                failure.
+        """
+
+        kwargs = {} if database == None else {'database' : database}
+
+        connection = mariadb.connect(host=self.args['host'],
+                                     port=int(self.args['port']),
+                                     user=self.args['user_name'],
+                                     password=self.args['password'],
+                                     autocommit=True,
+                                     **kwargs)
+
+        connection.auto_reconnect = bool(self.args['auto_reconnect'])
+
+        return connection
+
+    def _execute(self,
+                 cmd    : str,
+                 params : tuple = ()):
+        """Runs a query template with its parameters bound, as a prepared
+           statement on the connection the current thread checked out.  Each
+           connection keeps a cursor per template, so the server only parses a
+           template once per connection and values like images are sent in the
+           binary protocol instead of being pasted into the SQL.  Only valid
+           inside a pooled method.
+
+           Input: self - Pointer to the current object instance.
+                  cmd - The query template, with a ? per parameter.
+                  params - The values to bind, in order.
+
+           Output: Cursor - The cursor holding the results.
+        """
+
+        statements = self.pool.getStatements()
+
+        if cmd not in statements:
+
+            #Buffered, so a method can run another template before it's read
+            #every row of the last one.
+            statements[cmd] = self.pool.getCurrent().cursor(buffered=True,
+                                                            prepared=True)
+
+        cursor = statements[cmd]
+        cursor.execute(cmd, params)
+
+        return cursor
+
+    @pooled
     def assignKeyGenWork(self,
                          count       : int,
                          profile_ids : list,
@@ -151,7 +233,6 @@ class MariadbIfc:
             Output: N/A.
         """
         cmd        = ""
-        cursor     = self.con.cursor(buffered=False)
         ID         = 0
         work_tier  = cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value + tier
         #This is a workaround to the cursor interpreting None as 'None'
@@ -168,14 +249,15 @@ class MariadbIfc:
             new_entry[count + 2] = profile_ids[slot]
             count += 1
 
-        cmd  = (self.cmds['prof']['put_workers']) % (new_entry[0], new_entry[1], new_entry[2], new_entry[3], new_entry[4], new_entry[5], new_entry[6])
-        self.db_log.debug(f"Updating user's keygen work list for tier {tier}: {cmd}")
-        cursor.execute(cmd)
+        cmd  = self.cmds['prof']['put_workers']
+        self.db_log.debug(f"Updating user's keygen work list for tier {tier}: {cmd} {new_entry}")
+        self._execute(cmd, tuple(new_entry))
 
-        cmd = (self.cmds['econ']['put_keygen_count']) % (f'+ {count}', user_id)
-        self.db_log.debug(f"Updating user's econ keygen count: {cmd}")
-        cursor.execute(cmd)
+        cmd = self.cmds['econ']['put_keygen_count']
+        self.db_log.debug(f"Updating user's econ keygen count by {count}: {cmd}")
+        self._execute(cmd, (count, user_id))
 
+    @pooled
     def createNewUser(self,
                       id : str) -> bool:
         """Creates a new user profile in all assocaited tables, if needed.
@@ -186,37 +268,36 @@ class MariadbIfc:
             Output: bool - True if a user was created.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = False
 
         #TODO: Better user/profile management.
         self.db_log.info(f"Checking if user {id} exists")
-        cmd = (self.cmds['user']['get_user']) % (id)
+        cmd = self.cmds['user']['get_user']
         self.db_log.debug(f"Executing get user command: {cmd}")
-        cursor.execute(cmd)
-        user_profile = cursor.fetchone()
+        user_profile = self._execute(cmd, (id,)).fetchone()
 
         if user_profile == None:
 
-            cmd = (self.cmds['user']['put_new']) % (id)
+            cmd = self.cmds['user']['put_new']
             self.db_log.debug(f"Preparing to create user: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (id,))
             self.db_log.info(f"Created user")
 
-            cmd = (self.cmds['econ']['put_new']) % (id)
+            cmd = self.cmds['econ']['put_new']
             self.db_log.debug(f"Preparing to create user econ entry: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (id,))
             self.db_log.info(f"Updated user's economy entries.")
 
-            cmd = (self.cmds['inv']['put_new']) % (id)
+            cmd = self.cmds['inv']['put_new']
             self.db_log.debug(f"Creating user {id}'s ivnentory table: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (id,))
             self.db_log.info(f"Creatied user {id}'s inventory table")
 
             result = True
 
         return result
 
+    @pooled
     def dailyDone(self,
                   id  : Optional[str] = "x'fffffffffffffffffffffffffffffffe'") -> bool:
         """Returns whether a user has already completed their daily actions.
@@ -227,21 +308,20 @@ class MariadbIfc:
             Output: bool - True if the user has already done their dailies.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = False
 
         if not self.createNewUser(id) :
 
-            cmd = (self.cmds['user']['get_user']) % (id)
+            cmd = self.cmds['user']['get_user']
             self.db_log.debug(f"Executing get user command: {cmd}")
-            cursor.execute(cmd)
-            user_profile = cursor.fetchone()
+            user_profile = self._execute(cmd, (id,)).fetchone()
 
             result = bool(user_profile[int(self.cmds['user']['daily_index'])])
             self.db_log.debug(f"User's daily value: {result}")
 
         return result
 
+    @pooled
     def getAssignParams(self,
                         user_id : int) -> dict:
         """Returns the all worker parameters and current assigned workers for a
@@ -253,15 +333,12 @@ class MariadbIfc:
             Output: dict - the current user keygen stats.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         results = {}
 
         self.db_log.info(f"Getting keygen worker limit for user {user_id}")
-        cmd = (self.cmds['econ']['get_keygen_params']) % (user_id)
+        cmd = self.cmds['econ']['get_keygen_params']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchone()
+        result = self._execute(cmd, (user_id,)).fetchone()
         self.db_log.debug(f"Got result: {result}")
 
         if result:
@@ -278,9 +355,9 @@ class MariadbIfc:
 
         prof = {}
 
-        cmd = (self.cmds['prof']['get_workers']) % (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value, user_id)
+        cmd = self.cmds['prof']['get_workers']
         self.db_log.debug(f"Getting current user keygen worker allocation: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value, user_id))
         #This is returned as a tuple, so either way it has to be converted to a
         #dict at some point.
         result = cursor.fetchall()
@@ -292,6 +369,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getDropdown(self,
                     user_id : int) -> bool:
         """Returns the 'dropdown active' status of a user.  The current
@@ -304,12 +382,11 @@ class MariadbIfc:
         """
 
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = False
 
-        cmd = (self.cmds['user']['get_dropdown']) % (user_id)
+        cmd = self.cmds['user']['get_dropdown']
         self.db_log.debug(f"Executing get dropdown state command {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (user_id,))
 
         result = bool((cursor.fetchone())[0])
 
@@ -317,9 +394,10 @@ class MariadbIfc:
 
         return result
 
+    @pooled
     def getImage(self,
                  picture_id : Optional[str] = None,
-                 profile_id : Optional[str] = "ffffffff-ffff-ffff-ffff-fffffffffffe") -> str:
+                 profile_id : Optional[str] = "ffffffff-ffff-ffff-ffff-fffffffffffe") -> bytes:
         """Returns the profile image for a given profile.
 
             Input: self - Pointer to the current object instance.
@@ -328,10 +406,10 @@ class MariadbIfc:
                    profile_id - optional profile ID for the picture, defaults
                                 to the test image.
 
-            Output: The image associated with the profile, if any.
+            Output: bytes - The PNG associated with the profile, or empty if
+                            there isn't one.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = None
         pic_id = 0
 
@@ -339,23 +417,23 @@ class MariadbIfc:
 
             self.db_log.info(f"Getting picture ID")
 
-            cmd = (self.cmds['prof']['get_profile']) % (profile_id)
+            cmd = self.cmds['prof']['get_profile']
             self.db_log.debug(f"Executing get profile command {cmd}")
-            cursor.execute(cmd)
+            cursor = self._execute(cmd, (profile_id,))
 
             profile = cursor.fetchone()
 
             if profile == None:
 
                 self.db_log.warn(f"Could not find the profile {profile_id} in the DB!")
-                return ""
+                return b""
 
             picture_id = profile[int(self.cmds['prof']['pic_id_index'])]
 
         self.db_log.info(f"Getting picture.")
-        cmd = (self.cmds['pic']['get_image']) % picture_id
+        cmd = self.cmds['pic']['get_image']
         self.db_log.debug(f"Executing get picture command {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (picture_id,))
         #The cursor object doesn't appear to actually provide a better way
         #to determine if the cursor has a result.
         img = cursor.fetchone()
@@ -363,13 +441,25 @@ class MariadbIfc:
         if (img == None):
 
             self.db_log.warning(f"Picture ID {picture_id} not found!")
-            return ""
+            return b""
+
+        #Pictures saved while the image store was enabled only have a hash.
+        elif len(img[0]) == 0 and img[1] != None:
+
+            if self.store == None:
+
+                self.db_log.warning(f"Picture ID {picture_id} is in the image store, which isn't enabled!")
+                return b""
+
+            self.db_log.debug(f"Reading picture {img[1]} from the image store")
+            return self.store.get(img[1])
 
         else:
 
-            self.db_log.debug(f"Got picture: {img[0]}")
+            self.db_log.debug(f"Got picture: {len(img[0])} bytes")
             return img[0]
 
+    @pooled
     def getProfile(self,
                    id : Optional[str] = "ffffffff-ffff-ffff-ffff-fffffffffffe") -> Optional[pg.Profile]:
         """Returns a given profile for a given user.
@@ -380,12 +470,11 @@ class MariadbIfc:
             Output: str - The profile object found by the search, if any.
         """
         cmd     = ""
-        cursor  = self.con.cursor(buffered=False)
         profile = None
         result  = None
 
         self.db_log.info(f"Getting profile")
-        cursor.execute((self.cmds['prof']['get_profile']) % id)
+        cursor = self._execute(self.cmds['prof']['get_profile'], (id,))
         #The cursor object doesn't appear to actually provide a better way
         #to determine if the cursor has a result.
         result = cursor.fetchone()
@@ -401,6 +490,7 @@ class MariadbIfc:
 
         return profile
 
+    @pooled
     def getProfiles(self,
                     name    : str,
                     rarity  : list,
@@ -412,26 +502,26 @@ class MariadbIfc:
                    name - string to match like the profile name.
                    rarity - An optional rarity to search for.
 
-            Output: list - A list of all profiles found, if any.  An empty list if not.
+            Output: list - A ProfileSummary for each profile found, if any.  An empty list if not.
         """
         cmd     = ""
-        cursor  = self.con.cursor(buffered=False)
         results = []
 
         self.db_log.info(f"Getting profiles matching {name} for user {user_id} with rarities {rarity}")
-        cmd = (self.cmds['prof']['get_owned_profs_byname']) % (user_id, f"%{name}%", rarity)
+        cmd = self.cmds['prof']['get_owned_profs_byname']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (user_id, f"%{name}%", str(rarity)))
 
         for x in cursor:
 
             self.db_log.debug(f"Adding result: {x}")
-            results.append(self.mapQueryToProfile(query=x))
+            results.append(self.mapQueryToSummary(query=x))
 
         self.db_log.debug(f"Got results: {results}")
 
         return results
 
+    @pooled
     def getKeyGenParams(self,
                         user_id : int) -> dict:
         """Returns the Keygen parameters and current assigned workers for a
@@ -443,15 +533,12 @@ class MariadbIfc:
             Output: dict - the current user keygen stats.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         results = {}
 
         self.db_log.info(f"Getting keygen worker limit for user {user_id}")
-        cmd = (self.cmds['econ']['get_keygen_params']) % (user_id)
+        cmd = self.cmds['econ']['get_keygen_params']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchone()
+        result = self._execute(cmd, (user_id,)).fetchone()
         self.db_log.debug(f"Got result: {result}")
 
         if result:
@@ -468,9 +555,9 @@ class MariadbIfc:
 
         prof = {}
 
-        cmd = (self.cmds['prof']['get_workers']) % (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value, user_id)
+        cmd = self.cmds['prof']['get_workers']
         self.db_log.debug(f"Getting current user keygen worker allocation: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value, user_id))
         #This is returned as a tuple, so either way it has to be converted to a
         #dict at some point.
         result = cursor.fetchall()
@@ -482,6 +569,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getKeyGenProfiles(self,
                           tier_data : dict,
                           user_id   : int) -> list:
@@ -491,10 +579,9 @@ class MariadbIfc:
                    tier_data - the key gen parameters for the user.
                    user_id - user ID to interrogate for profiles.
 
-            Output: list - A list of all profiles found, if any.  None if not.
+            Output: list - A ProfileSummary for each profile found, if any.  An empty list if not.
         """
         cmd     = ""
-        cursor  = self.con.cursor(buffered=False)
         #This is a workaround to the cursor interpreting None as 'None'.
         ids    = [INDICATOR.NULL for x in range(0, int(self.cmds['econ']['max_workers']))]
         index   = 0
@@ -515,22 +602,23 @@ class MariadbIfc:
         data = tuple(ids)
         self.db_log.debug(f"IDs are: {ids}")
 
-        cmd  = (self.cmds['prof']['get_all_workers']) % data
+        cmd  = self.cmds['prof']['get_all_workers']
         self.db_log.debug(f"Getting all of a user's keygen profiles: {cmd}")
         #This must be done as implemented due to how the mariadb python cursor
         #handles (or rather, doesn't handle) NULL entries. See
         #https://mariadb-corporation.github.io/mariadb-connector-python/usage.html#using-indicators
-        cursor.execute(self.cmds['prof']['get_all_workers'], data)
+        cursor = self._execute(cmd, data)
 
         for x in cursor:
 
             self.db_log.debug(f"Adding result: {x}")
-            results.append(self.mapQueryToProfile(query=x))
+            results.append(self.mapQueryToSummary(query=x))
 
         self.db_log.debug(f"Got results: {results}")
 
         return results
 
+    @pooled
     def getSummaryCharacters(self,
                              user_id : int) -> dict:
         """Returns db-calcualted stats about a user's character profiles.
@@ -543,7 +631,6 @@ class MariadbIfc:
 
         armed      = 0
         cmd        = ""
-        cursor     = self.con.cursor(buffered=False)
         equipped   = 0
         losses     = 0
         made_owned = 0
@@ -557,9 +644,9 @@ class MariadbIfc:
         working    = 0
 
         self.db_log.info(f"Getting character stats for user {user_id}")
-        cmd = (self.cmds['prof']['get_profs_summary']) % (user_id)
+        cmd = self.cmds['prof']['get_profs_summary']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (user_id,))
 
         for x in cursor:
 
@@ -612,6 +699,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getSummaryEconomy(self,
                           user_id    : int) -> dict:
         """Returns the db-stored state of a user's economy.
@@ -623,15 +711,12 @@ class MariadbIfc:
         """
 
         count      = 1
-        cursor     = self.con.cursor(buffered=False)
         results    = {}
 
         self.db_log.info(f"Getting econ stats for user {user_id}")
-        cmd = (self.cmds['econ']['get_econ_summary']) % (user_id)
+        cmd = self.cmds['econ']['get_econ_summary']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchone()
+        result = self._execute(cmd, (user_id,)).fetchone()
 
         if result:
 
@@ -652,6 +737,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getSummaryInventory(self,
                             user_id : int) -> dict:
         """Returns the db-stored contents of a user's Inventory.
@@ -663,15 +749,12 @@ class MariadbIfc:
         """
 
         count   = 2
-        cursor  = self.con.cursor(buffered=False)
         results = {}
 
         self.db_log.info(f"Getting inventory for user {user_id}")
-        cmd = (self.cmds['inv']['get_inventory']) % (user_id)
+        cmd = self.cmds['inv']['get_inventory']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchone()
+        result = self._execute(cmd, (user_id,)).fetchone()
 
         if result:
 
@@ -689,6 +772,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getUnoccupiedProfiles(self,
                               user_id : int) -> list:
         """Returns all profiles not marked as 'occupied' for a given user.
@@ -696,26 +780,26 @@ class MariadbIfc:
             Input: self - Pointer to the current object instance.
                    user_id - user ID to interrogate for profiles.
 
-            Output: list - A list of all profiles found, if any.  None if not.
+            Output: list - A ProfileSummary for each profile found, if any.  An empty list if not.
         """
         cmd     = ""
-        cursor  = self.con.cursor(buffered=False)
         results = []
 
         self.db_log.info(f"Getting unoccupied profiles for user {user_id}")
-        cmd = (self.cmds['prof']['get_unoccupied_profs']) % (user_id)
+        cmd = self.cmds['prof']['get_unoccupied_profs']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (user_id,))
 
         for x in cursor:
 
             self.db_log.debug(f"Adding result: {x}")
-            results.append(self.mapQueryToProfile(query=x))
+            results.append(self.mapQueryToSummary(query=x))
 
         self.db_log.debug(f"Got results: {results}")
 
         return results
 
+    @pooled
     def getUsersProfiles(self,
                          rarity  : list,
                          user_id : int) -> list:
@@ -724,26 +808,26 @@ class MariadbIfc:
             Input: self - Pointer to the current object instance.
                    user_id - user ID to interrogate for profiles.
 
-            Output: list - A list of all profiles found, if any.  An empty list if not.
+            Output: list - A ProfileSummary for each profile found, if any.  An empty list if not.
         """
         cmd     = ""
-        cursor  = self.con.cursor(buffered=False)
         results = []
 
         self.db_log.info(f"Getting profiles for user {user_id} with rarity {rarity}")
-        cmd = (self.cmds['prof']['get_owned_profs']) % (user_id, rarity)
+        cmd = self.cmds['prof']['get_owned_profs']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
+        cursor = self._execute(cmd, (user_id, str(rarity)))
 
         for x in cursor:
 
             self.db_log.debug(f"Adding result: {x}")
-            results.append(self.mapQueryToProfile(query=x))
+            results.append(self.mapQueryToSummary(query=x))
 
         self.db_log.debug(f"Got results: {results}")
 
         return results
 
+    @pooled
     def getWorkerCountsInTier(self,
                               user_id : int) -> dict:
         """Returns the count of workers assigned to each tier of a job for a
@@ -755,17 +839,14 @@ class MariadbIfc:
             Output: dict - A dict of worker stats sorted by group, if any.
         """
 
-        cursor     = self.con.cursor(buffered=False)
         JOB_ID     = 0
         JOB_COUNT  = 1
         results    = {}
 
         self.db_log.info(f"Getting worker stats for user {user_id}")
-        cmd = (self.cmds['prof']['get_worker_counts']) % (user_id)
+        cmd = self.cmds['prof']['get_worker_counts']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchall()
+        result = self._execute(cmd, (user_id,)).fetchall()
 
         if result:
 
@@ -780,6 +861,7 @@ class MariadbIfc:
 
         return results
 
+    @pooled
     def getWorkersInJob(self,
                         job     : int,
                         user_id : int) -> list:
@@ -793,15 +875,12 @@ class MariadbIfc:
             Output: list - A lsit of worker stats sorted by group, if any.
         """
 
-        cursor  = self.con.cursor(buffered=False)
         results = []
 
         self.db_log.info(f"Getting workers in job {job} for user {user_id}")
-        cmd = (self.cmds['prof']['get_workers_job']) % (job, user_id)
+        cmd = self.cmds['prof']['get_workers_job']
         self.db_log.debug(f"Executing command: {cmd}")
-        cursor.execute(cmd)
-
-        result = cursor.fetchall()
+        result = self._execute(cmd, (job, user_id)).fetchall()
 
         if result:
 
@@ -846,6 +925,25 @@ class MariadbIfc:
 
         return workers
 
+    def mapQueryToSummary(self,
+                          query : tuple) -> pg.ProfileSummary:
+        """Maps a row of a projected profile query to a ProfileSummary.  List
+           and dropdown queries only select the columns they show, instead of
+           the full profile with its description and info.
+
+           Input: self - Pointer to the current object instance.
+                  query - a tuple of the profile's ID, name, rarity, stat
+                          average, and job.
+
+           Output: ProfileSummary - the query converted into a summary.
+        """
+
+        return pg.ProfileSummary(opts={'id'      : query[0],
+                                       'name'    : query[1],
+                                       'rarity'  : rc.RarityList(int(query[2])),
+                                       'average' : query[3],
+                                       'job'     : cj.CharacterJobTypeEnum(int(query[4]))})
+
     def mapQueryToProfile(self,
                           query : tuple) -> pg.Profile:
         """Maps the full return of a profile query to a Profile object.  This is
@@ -895,6 +993,7 @@ class MariadbIfc:
 
         return profile
 
+    @pooled
     def putDropdown(self,
                     user_id : int,
                     state   : bool):
@@ -908,12 +1007,12 @@ class MariadbIfc:
         """
 
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
 
-        cmd = (self.cmds['user']['put_dropdown']) % (state, user_id)
-        self.db_log.debug(f"Executing put dropdown state command {cmd}")
-        cursor.execute(cmd)
+        cmd = self.cmds['user']['put_dropdown']
+        self.db_log.debug(f"Executing put dropdown state command {cmd} {state}")
+        self._execute(cmd, (state, user_id))
 
+    @pooled
     def removeKeyGenWork(self,
                          profile_ids : list,
                          tier        : int,
@@ -931,7 +1030,6 @@ class MariadbIfc:
             Output: N/A.
         """
         cmd        = ""
-        cursor     = self.con.cursor(buffered=False)
         ID         = 0
         new_entry  = [workers[x][ID] for x in range (0, len(workers))]
 
@@ -949,14 +1047,15 @@ class MariadbIfc:
         new_entry.insert(0, user_id)
         new_entry.insert(0, cj.CharacterJobTypeEnum.UNOCCUPIED.value)
 
-        cmd  = (self.cmds['prof']['put_workers']) % (new_entry[0], new_entry[1], new_entry[2], new_entry[3], new_entry[4], new_entry[5], new_entry[6])
-        self.db_log.debug(f"Updating user's keygen work list for tier {tier}: {cmd}")
-        cursor.execute(cmd)
+        cmd  = self.cmds['prof']['put_workers']
+        self.db_log.debug(f"Updating user's keygen work list for tier {tier}: {cmd} {new_entry}")
+        self._execute(cmd, tuple(new_entry))
 
-        cmd = (self.cmds['econ']['put_keygen_count']) % (f'- {len(profile_ids)}', user_id)
-        self.db_log.debug(f"Updating user's econ keygen count: {cmd}")
-        cursor.execute(cmd)
+        cmd = self.cmds['econ']['put_keygen_count']
+        self.db_log.debug(f"Updating user's econ keygen count by -{len(profile_ids)}: {cmd}")
+        self._execute(cmd, (-len(profile_ids), user_id))
 
+    @pooled
     def resetDailyRoll(self):
         """Resets the 'daily' boolean for all user profiles, allowing them to
            perform another round of daily actions.
@@ -966,7 +1065,6 @@ class MariadbIfc:
             Output: N/A.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = None
 
         self.db_log.warning(f"Preparing to reset daily rolls.")
@@ -975,36 +1073,37 @@ class MariadbIfc:
 
         try:
 
-            cursor.execute(cmd)
+            self._execute(cmd)
 
         except Exception as err:
 
             self.db_log.error(f"Failed to reset daily value!: {err=}")
 
+    @pooled
     def saveRoll(self,
-                 id      : Optional[str] = "x'fffffffffffffffffffffffffffffffe'",
-                 img     : Optional[str] = None,
-                 info    : dict          = None,
-                 profile : pg.Profile    = None):
+                 id      : Optional[str]   = "x'fffffffffffffffffffffffffffffffe'",
+                 img     : Optional[bytes] = None,
+                 info    : dict            = None,
+                 profile : pg.Profile      = None):
         """Created a UUID for the given profile.  Assumes daily limits have
            already been verified before calling.
 
             Input: self - Pointer to the current object instance.
                    id - user ID to link the profile to.
+                   img - the decoded PNG to store.
                    info - the picture metadata to store.
                    profile - The profile to link the image to.
 
             Output: N/A.
         """
         cmd        = ""
-        cursor     = self.con.cursor(buffered=False)
         entry      = profile
         entry.info = info
         owned      = None
         result     = None
 
 
-        cursor.execute((self.cmds['prof']['get_profile']) % id)
+        cursor = self._execute(self.cmds['prof']['get_profile'], (id,))
         #The cursor object doesn't appear to actually provide a better way
         #to determine if the cursor has a result.
         for x in cursor:
@@ -1027,32 +1126,37 @@ class MariadbIfc:
 
         else:
 
-            cmd = (self.cmds['prof']['put_new']) % (self.db_cmds['default_id'], id, entry.creator, entry.stats.agility, entry.stats.defense, entry.stats.endurance, entry.stats.luck, entry.stats.strength, entry.desc, entry.favorite, json.dumps(entry.info), entry.name, entry.rarity.value, entry.stats.average)
+            cmd = self.cmds['prof']['put_new']
             self.db_log.debug(f"Preparing to add profile: {cmd}")
-            cursor.execute(cmd)
+            #The configured ID is a hex literal, so it's bound as the bytes it
+            #spells out.
+            default_id = bytes.fromhex(self.db_cmds['default_id'].removeprefix("0x"))
+            cursor = self._execute(cmd, (default_id, id, entry.creator, entry.stats.agility, entry.stats.defense, entry.stats.endurance, entry.stats.luck, entry.stats.strength, entry.desc, entry.favorite, json.dumps(entry.info), entry.name, entry.rarity.value, entry.stats.average))
             #We don't actually know the GUID until we get it back from the DB.
             pr_uid=cursor.fetchone()
             profile.id = pr_uid[0]
             self.db_log.info(f"Stored profile with UID {pr_uid}")
 
-            cmd = (self.cmds['pic']['put_new']) % ('0x' + str(pr_uid[0]).replace('-',''), pr_uid[1], json.dumps(entry.info), img)
-            self.db_log.debug(f"Preparing to add picture: {cmd}")
-            cursor.execute(cmd)
+            #With an image store, the row only references the file by hash.
+            picture, picture_hash = (img, None) if self.store == None else (b"", self.store.put(img))
+
+            cmd = self.cmds['pic']['put_new']
+            self.db_log.debug(f"Preparing to add picture: {cmd} {picture_hash}")
+            cursor = self._execute(cmd, (str(pr_uid[0]), pr_uid[1], json.dumps(entry.info), picture, picture_hash))
             pi_uid=cursor.fetchone()
             self.db_log.info(f"Stored picture with UID {pi_uid}")
 
             #It's only possible to link the picture to the profile after its
             #UUID is generated.
-            cmd = (self.cmds['prof']['put_img_id']) % (pi_uid[0], pr_uid[0])
+            cmd = self.cmds['prof']['put_img_id']
             self.db_log.debug(f"Updating Profile to reference picture UUID: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (str(pi_uid[0]), str(pr_uid[0])))
             self.db_log.info(f"Linked picture id {pi_uid[0]} to profile {pr_uid[0]}")
 
             #This needs to be last to get both UIDs.
-            cmd = (self.cmds['user']['get_owned']) % (id)
+            cmd = self.cmds['user']['get_owned']
             self.db_log.debug(f"Getting user {id}'s owned dict: {cmd}")
-            cursor.execute(cmd)
-            str_owned = cursor.fetchone()
+            str_owned = self._execute(cmd, (id,)).fetchone()
 
             try:
 
@@ -1072,18 +1176,19 @@ class MariadbIfc:
             owned[key] = pi_uid[0]
             self.db_log.debug(f"Associated profile {pr_uid[0]} with user {id} as: {owned[key]}")
 
-            cmd = (self.cmds['user']['set_owned']) % (json.dumps(owned), id)
+            cmd = self.cmds['user']['set_owned']
             self.db_log.debug(f"Updating user {id} owned dict: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (json.dumps(owned), id))
             self.db_log.info(f"Updated user {id}'s owned dict")
 
             #Finally, now that the roll has been fully saved and connected to
             #the user's profile, mark their daily roll as complete.
-            cmd = (self.cmds['user']['set_daily_roll']) % (id)
+            cmd = self.cmds['user']['set_daily_roll']
             self.db_log.debug(f"Updating user {id} owned dict: {cmd}")
-            cursor.execute(cmd)
+            self._execute(cmd, (id,))
             self.db_log.info(f"Updated user {id}'s owned dict")
 
+    @pooled
     def updateDailyKeyGenWork(self):
         """Creates keys for all users that have assigned workers to keygen
            creation before daily reset.
@@ -1093,7 +1198,6 @@ class MariadbIfc:
             Output: N/A.
         """
         cmd    = ""
-        cursor = self.con.cursor(buffered=False)
         result = None
         T0     = 1
         T1     = 2
@@ -1110,20 +1214,18 @@ class MariadbIfc:
             #TODO: find the sordid single-line statement capable of doing this,
             #instead of by-user.  The current user list is small enough that
             #the waste is okay, but it should be corrected.
-            cmd = (self.cmds['prof']['get_workers_daily']) % (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t1.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t2.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t3.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t4.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value)
+            cmd = self.cmds['prof']['get_workers_daily']
             self.db_log.debug(f"Executing update daily Key Gen counts command: {cmd}")
-            cursor.execute(cmd)
-
-            results = cursor.fetchall()
+            results = self._execute(cmd, (cj.CharacterJobTypeEnum.KEY_GENERATION_t0.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t1.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t2.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t3.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t4.value, cj.CharacterJobTypeEnum.KEY_GENERATION_t5.value)).fetchall()
             self.db_log.debug(f"Found users to udpate: {results}")
 
             #Reminder that the cursor returns all results as tuples.
             for row in results:
 
                 #The query guarantees a value of 0 in any unassigned tiers.
-                cmd = (self.cmds['inv']['put_key_daily']) % (row[T0], row[T1], row[T2], row[T3], row[T4], row[T5], row[USER])
-                self.db_log.debug(f"Updating users keys with new values: {cmd}")
-                cursor.execute(cmd)
+                cmd = self.cmds['inv']['put_key_daily']
+                self.db_log.debug(f"Updating users keys with new values: {cmd} {row}")
+                self._execute(cmd, (row[T0], row[T1], row[T2], row[T3], row[T4], row[T5], row[USER]))
                 self.db_log.info(f"Updated user {row[USER]}'s keys")
 
         except Exception as err:
@@ -1145,14 +1247,7 @@ class MariadbIfc:
         #complexity.
         #(The script would need to invoke mariadb as sudo with root).
         try:
-            #TODO: convert to a threadpool
-            self.con = mariadb.connect(host=self.args['host'],
-                                       port=int(self.args['port']),
-                                       user=self.args['user_name'],
-                                       password=self.args['password'],
-                                       autocommit=True)
-
-            self.con.auto_reconnect = bool(self.args['auto_reconnect'])
+            connection = self._connect()
 
         except mariadb.Error as err:
 
@@ -1162,9 +1257,9 @@ class MariadbIfc:
         try:
 
             #The interface requries the cursor.
-            cursor = self.con.cursor(buffered=False)
+            cursor = connection.cursor(buffered=False)
             cursor.execute((self.db_cmds['create_db']) % self.args['database'])
-            self.con.database = self.args['database']
+            connection.database = self.args['database']
 
             for table in self.cmds.values():
 
@@ -1190,6 +1285,15 @@ class MariadbIfc:
             self.db_log.error(f"Error running mariadb commands: {err=}")
             return all_ok
 
+        #The pool opens the rest of its connections on the DB it just made.
+        pool_opts = self.args['pool'] if 'pool' in self.args else {'size'             : "1",
+                                                                   'ping_interval'    : "60",
+                                                                   'idle_timeout'     : "3600",
+                                                                   'checkout_timeout' : "30"}
+        self.pool = cp.ConnectionPool(connect = lambda: self._connect(database=self.args['database']),
+                                      opts    = pool_opts)
+        self.pool.add(connection)
+
         all_ok = True;
 
         return all_ok
@@ -0,0 +1,372 @@
+#Tracks the Stable Diffusion webui backends a Queue Manager can send work to,
+#including how many jobs each backend may run at once and whether it is
+#currently considered usable.
+#
+#Each backend has a circuit breaker.  After enough consecutive failures the
+#circuit opens and the backend gets no work until 'open_time' has passed.  It
+#is then half-open: the next success (a job or a health probe) closes it, and
+#the next failure opens it again.
+
+
+#####  Imports  #####
+
+from enum import IntEnum, verify, UNIQUE
+import requests as req
+import threading as th
+import time
+from typing import Optional
+from urllib.parse import urljoin
+
+#####  Package Variables  #####
+
+#A cheap webui endpoint that only answers if the API is up.
+HEALTH_PATH    = '/sdapi/v1/memory'
+#Stops the image the webui is currently rendering.
+INTERRUPT_PATH = '/sdapi/v1/interrupt'
+#The pipeline stages a backend can run: base images, and upscales split off
+#from them.
+STAGE_TXT2IMG  = 'txt2img'
+STAGE_UPSCALE  = 'upscale'
+
+#####  Enum Classes  #####
+
+@verify(UNIQUE)
+class BreakerStateEnum(IntEnum):
+
+    CLOSED    = 0
+    OPEN      = 1
+    HALF_OPEN = 2
+
+#####  Package Functions  #####
+
+def getBackendOptions(opts : dict) -> list:
+    """Returns a list of per-backend option dicts built from the queue options.
+       Older configs only provide a single 'webui_URL', so it is treated as a
+       one-element backend list.  Backends that don't specify a 'job_count',
+       'max_batch', or circuit breaker settings inherit the queue-wide value.
+
+       Input: opts - the queue options, usually straight from config.json.
+
+       Output: list - a list of dicts with at least 'url' and 'job_count'.
+    """
+
+    backends = []
+    entries  = opts['backends'] if 'backends' in opts else [opts['webui_URL']]
+
+    for entry in entries:
+
+        #Allowing bare strings keeps short configs readable.
+        backend = {'url' : entry} if isinstance(entry, str) else dict(entry)
+
+        if 'job_count' not in backend:
+
+            backend['job_count'] = opts['job_count'] if 'job_count' in opts else 1
+
+        if 'max_batch' not in backend:
+
+            backend['max_batch'] = opts['max_batch'] if 'max_batch' in opts else 1
+
+        for key in ('failure_threshold', 'open_time'):
+
+            if key not in backend and 'circuit_breaker' in opts:
+
+                backend[key] = opts['circuit_breaker'][key]
+
+        backends.append(backend)
+
+    if len(backends) == 0:
+
+        raise ValueError("At least one webui backend must be configured!")
+
+    return backends
+
+#####  Backend Class  #####
+
+class Backend:
+
+    def __init__(self,
+                 backend_id : int,
+                 opts       : dict):
+        """Holds the connection details and runtime state of a single webui
+           instance.  Every worker bound to this backend shares the object, so
+           all state changes are made under the instance lock.
+
+           Input: self - Pointer to the current object instance.
+                  backend_id - The backend's index in the Manager's list.
+                  opts - A dict with the backend's 'url' and 'job_count', and
+                         optionally how many images it renders per call, its
+                         circuit breaker settings, and which 'stages' it runs.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.id        = backend_id
+        self.url       = opts['url']
+        self.max_jobs  = int(opts['job_count'])
+        self.max_batch = int(opts['max_batch']) if 'max_batch' in opts else 1
+        self.stages    = set(x.strip() for x in opts['stages'].split(',')) if 'stages' in opts else {STAGE_TXT2IMG, STAGE_UPSCALE}
+        self.active    = 0
+        self.completed = 0
+        self.failures  = 0
+        self.healthy   = True
+        self.lock      = th.Lock()
+        #Without breaker settings a backend is only ever half-open after a
+        #failure, keeping it usable like before breakers existed.
+        self.failure_threshold = int(opts['failure_threshold']) if 'failure_threshold' in opts else 1
+        self.open_time         = float(opts['open_time']) if 'open_time' in opts else 0.0
+        self.opened_at         = 0.0
+        self.state             = BreakerStateEnum.CLOSED
+        #Average lengths of the backend's busy and idle periods, used to pace
+        #jobs by how loaded the backend has been.
+        self.busy_time         = 0.0
+        self.changed_at        = time.monotonic()
+        self.idle_time         = 0.0
+
+        if self.max_jobs < 1:
+
+            raise ValueError(f"Backend {self.url} must allow at least 1 job, not {self.max_jobs}!")
+
+        if self.max_batch < 1:
+
+            raise ValueError(f"Backend {self.url} must render at least 1 image per call, not {self.max_batch}!")
+
+        if self.failure_threshold < 1:
+
+            raise ValueError(f"Backend {self.url} must allow at least 1 failure before opening its circuit, not {self.failure_threshold}!")
+
+        if len(self.stages) == 0 or not self.stages <= {STAGE_TXT2IMG, STAGE_UPSCALE}:
+
+            raise ValueError(f"Backend {self.url} must run '{STAGE_TXT2IMG}', '{STAGE_UPSCALE}', or both, not {self.stages}!")
+
+    def __repr__(self) -> str:
+        """Returns a short description of the backend for logging.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The backend's ID, URL, and load.
+        """
+
+        return f"Backend({self.id}, {self.url}, {self.active}/{self.max_jobs}, healthy={self.healthy}, {self.state.name})"
+
+    def _updateState(self):
+        """Moves an open circuit to half-open once 'open_time' has passed.
+           Must be called with the lock held.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        if self.state == BreakerStateEnum.OPEN and time.monotonic() - self.opened_at >= self.open_time:
+
+            self.state = BreakerStateEnum.HALF_OPEN
+
+    def _endPeriod(self,
+                   busy : bool):
+        """Adds the busy or idle period that just ended to its average.  Must
+           be called with the lock held.
+
+           Input: self - Pointer to the current object instance.
+                  busy - Whether the backend had been running jobs.
+
+           Output: None.
+        """
+
+        now             = time.monotonic()
+        length          = now - self.changed_at
+        self.changed_at = now
+
+        if busy:
+
+            self.busy_time += 0.2 * (length - self.busy_time)
+
+        else:
+
+            self.idle_time += 0.2 * (length - self.idle_time)
+
+    def getPause(self,
+                 cooldown : float) -> float:
+        """Returns how long a worker should rest the backend after a job.  The
+           full cooldown only applies while the backend is kept busy, and
+           shrinks as it spends more time idle.
+
+           Input: self - Pointer to the current object instance.
+                  cooldown - The pause for a fully loaded backend, in seconds.
+
+           Output: float - Seconds to pause.
+        """
+
+        with self.lock:
+
+            total = self.busy_time + self.idle_time
+
+            if total <= 0.0:
+
+                return 0.0
+
+            return cooldown * self.busy_time / total
+
+    def hasStage(self,
+                 stage : str) -> bool:
+        """Returns whether the backend runs a pipeline stage.
+
+           Input: self - Pointer to the current object instance.
+                  stage - STAGE_TXT2IMG or STAGE_UPSCALE.
+
+           Output: bool - True if jobs for the stage may be sent to it.
+        """
+
+        return stage in self.stages
+
+    def isAvailable(self) -> bool:
+        """Returns whether the backend's circuit allows sending it work.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - False while the circuit is open.
+        """
+
+        with self.lock:
+
+            self._updateState()
+
+            return self.state != BreakerStateEnum.OPEN
+
+    def acquire(self) -> bool:
+        """Claims one of the backend's job slots, if any are free.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if a slot was claimed.
+        """
+
+        with self.lock:
+
+            self._updateState()
+
+            if self.active >= self.max_jobs or self.state == BreakerStateEnum.OPEN:
+
+                return False
+
+            if self.active == 0:
+
+                self._endPeriod(busy=False)
+
+            self.active += 1
+
+        return True
+
+    def record(self,
+               success : bool):
+        """Records the outcome of a request to the backend and updates its
+           circuit.  A single success is enough to mark the backend healthy
+           again.
+
+           Input: self - Pointer to the current object instance.
+                  success - Whether the webui request completed.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self._updateState()
+
+            if success:
+
+                self.failures = 0
+                self.healthy  = True
+                self.state    = BreakerStateEnum.CLOSED
+
+            else:
+
+                self.failures += 1
+                self.healthy   = False
+
+                if self.state == BreakerStateEnum.HALF_OPEN or self.failures >= self.failure_threshold:
+
+                    self.opened_at = time.monotonic()
+                    self.state     = BreakerStateEnum.OPEN
+
+    def release(self,
+                success : Optional[bool]):
+        """Returns a job slot and records the outcome of the job that used it.
+
+           Input: self - Pointer to the current object instance.
+                  success - Whether the webui request completed, or None if
+                            the job never reached the webui.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.active = max(0, self.active - 1)
+
+            if self.active == 0:
+
+                self._endPeriod(busy=True)
+
+            if success:
+
+                self.completed += 1
+
+        if success != None:
+
+            self.record(success=success)
+
+    def probe(self,
+              timeout : float) -> Optional[bool]:
+        """Checks whether the webui API is answering and records the result.
+           Probes are skipped while the circuit is open, so a dead backend
+           is only checked once every 'open_time'.
+
+           Input: self - Pointer to the current object instance.
+                  timeout - How long to wait for the webui, in seconds.
+
+           Output: bool - Whether the backend answered, or None if skipped.
+        """
+
+        if not self.isAvailable():
+
+            return None
+
+        try:
+            success = req.get(url=urljoin(self.url, HEALTH_PATH), timeout=timeout).status_code == 200
+
+        except req.exceptions.RequestException:
+            success = False
+
+        self.record(success=success)
+
+        return success
+
+    def interrupt(self,
+                  timeout : float) -> bool:
+        """Asks the webui to stop the image it's rendering.  The webui runs
+           requests one at a time, so only the oldest request sent to it is
+           affected, and it returns early with whatever was finished.
+
+           Input: self - Pointer to the current object instance.
+                  timeout - How long to wait for the webui, in seconds.
+
+           Output: bool - Whether the webui accepted the interrupt.
+        """
+
+        try:
+            return req.post(url=urljoin(self.url, INTERRUPT_PATH), timeout=timeout).status_code == 200
+
+        except req.exceptions.RequestException:
+            return False
+
+    def isIdle(self) -> bool:
+        """Returns whether the backend is healthy and has no jobs running.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if nothing is running on the backend.
+        """
+
+        with self.lock:
+
+            return self.healthy and self.active == 0
@@ -0,0 +1,76 @@
+#Trades image quality for throughput while the queue is busy.  Once the queue
+#is deeper, or the wait longer, than the configured thresholds, new jobs are
+#given a cheaper profile: fewer steps, no hires pass, or a smaller image.
+#Jobs already queued keep what they asked for.
+
+
+#####  Imports  #####
+
+from typing import Optional
+
+#####  Policy Class  #####
+
+class DegradePolicy:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a policy from the config's 'degrade' options.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'queue_depth' and 'wait' thresholds,
+                         and the 'max_steps', 'hires', 'scale', 'min_size',
+                         and 'step_size' of the degraded profile.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.depth     = int(opts['queue_depth'])
+        self.wait      = float(opts['wait'])
+        self.max_steps = int(opts['max_steps'])
+        self.hires     = opts['hires'] == "True"
+        self.scale     = float(opts['scale'])
+        self.min_size  = int(opts['min_size'])
+        self.step_size = max(1, int(opts['step_size']))
+
+        if self.scale <= 0.0 or self.scale > 1.0:
+
+            raise ValueError(f"The degraded resolution scale must be in (0, 1], not {self.scale}!")
+
+    def usesWait(self) -> bool:
+        """Returns whether the policy needs the queue's estimated wait, which
+           is only worth computing if there's a wait threshold.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if getProfile should be given the wait.
+        """
+
+        return self.wait > 0.0
+
+    def getProfile(self,
+                   depth : int,
+                   wait  : float) -> Optional[dict]:
+        """Returns the limits a new job should be held to, if the queue is
+           busy enough to need them.  A threshold of 0 is never reached.
+
+           Input: self - Pointer to the current object instance.
+                  depth - How many jobs are waiting.
+                  wait - The new job's estimated wait, in seconds.
+
+           Output: dict - The 'max_steps' (0 for no cap), whether 'hires' is
+                          allowed, the resolution 'scale', and the 'min_size'
+                          and 'step_size' to keep it to.  None if the job can
+                          run as asked.
+        """
+
+        busy = (self.depth > 0 and depth >= self.depth) or (self.wait > 0.0 and wait >= self.wait)
+
+        if not busy:
+
+            return None
+
+        return {'max_steps' : self.max_steps,
+                'hires'     : self.hires,
+                'scale'     : self.scale,
+                'min_size'  : self.min_size,
+                'step_size' : self.step_size}
@@ -0,0 +1,357 @@
+#Lets image workers on other computers pull jobs from a Queue Manager, so the
+#GPUs don't have to share a machine with the Discord bot.
+#
+#Workers and the broker trade (BrokerMessageEnum, payload) tuples of
+#picklable data, so anything with send() and recv() can carry them.  The
+#broker uses multiprocessing connections, which need nothing but a socket
+#and authenticate both ends with a shared key.  Jobs are pickles, so the key
+#must be kept secret and the port kept off the public internet.
+
+
+#####  Imports  #####
+
+from enum import IntEnum, verify, UNIQUE
+import logging as log
+import multiprocessing.connection as mpc
+import src.utilities.JobFactory as jf
+import src.utilities.SDClient as sc
+import threading as th
+import time
+from typing import Callable, Optional
+
+#####  Enum Classes  #####
+
+@verify(UNIQUE)
+class BrokerMessageEnum(IntEnum):
+
+    #Worker -> broker: ready for a job, no payload.
+    GET    = 0
+    #Broker -> worker: a (job, seconds left or None) tuple.
+    JOB    = 1
+    #Worker -> broker: the job, with its result set.
+    RESULT = 2
+    #Broker -> worker: the broker is stopping, no payload.
+    STOP   = 3
+
+#####  Broker Class  #####
+
+class JobBroker:
+
+    def __init__(self,
+                 opts       : dict,
+                 get_job    : Callable[[float], Optional[jf.Job]],
+                 finish_job : Callable[[jf.Job, float], None],
+                 is_running : Callable[[], bool],
+                 broker_log : log.Logger):
+        """Creates a broker that isn't listening yet.  The Queue Manager
+           supplies the jobs workers run and takes back their results.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'host' and 'port' to listen on and
+                         the shared 'authkey'.
+                  get_job - Waits up to the given seconds for a job a worker
+                            can run, returning None if there isn't one.
+                  finish_job - Posts a job once its result is set, given the
+                               seconds the worker spent on it.
+                  is_running - Returns False once the broker should stop.
+                  broker_log - Where to log workers coming and going.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.address    = (opts['host'], int(opts['port']))
+        self.authkey    = opts['authkey'].encode()
+        self.broker_log = broker_log
+        self.count      = 0
+        self.finish_job = finish_job
+        self.get_job    = get_job
+        self.is_running = is_running
+        self.listener   = None
+        self.lock       = th.Lock()
+        self.workers    = []
+
+    def listen(self):
+        """Opens the broker's socket.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None - Throws OSError if the address can't be used.
+        """
+
+        self.listener = mpc.Listener(address = self.address,
+                                     authkey = self.authkey)
+
+    def accept(self) -> Optional[mpc.Connection]:
+        """Waits for a worker to connect and authenticate.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Connection - The worker's connection, or None if it didn't
+                                have the right key.  Throws OSError once the
+                                broker is closed.
+        """
+
+        try:
+            return self.listener.accept()
+
+        except mpc.AuthenticationError:
+            return None
+
+    def close(self):
+        """Stops accepting workers.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        if self.listener != None:
+
+            self.listener.close()
+
+    def addWorker(self,
+                  count : int):
+        """Adjusts how many workers are connected.
+
+           Input: self - Pointer to the current object instance.
+                  count - 1 for a new worker, -1 for one that left.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.count += count
+
+    def getWorkerCount(self) -> int:
+        """Returns how many workers are connected, each able to run one job.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: int - The number of connected workers.
+        """
+
+        with self.lock:
+
+            return self.count
+
+    def acceptWorkers(self):
+        """Accepts remote workers and serves each from its own thread until
+           the broker is stopped.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.is_running():
+
+            try:
+                conn = self.accept()
+
+            except (OSError, EOFError) as err:
+                #The listener was closed, or a worker gave up mid-handshake.
+                if not self.is_running():
+
+                    return
+
+                self.broker_log.warning(f"Unable to accept a remote worker: {err}")
+                continue
+
+            if conn == None:
+
+                self.broker_log.warning(f"Rejected a remote worker with the wrong key.")
+                continue
+
+            worker = th.Thread(target = self.serveWorker,
+                               args   = (conn,),
+                               name   = "Broker remote worker",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+    def serveWorker(self,
+                    conn):
+        """Hands jobs to a remote worker one at a time and finishes them
+           with the results it sends back.  A job in flight when the worker
+           goes away fails, since it may have been rendered already.
+
+           Input: self - Pointer to the current object instance.
+                  conn - The worker's connection.
+
+           Output: None.
+        """
+
+        self.addWorker(1)
+
+        try:
+            while self.is_running():
+
+                kind, payload = conn.recv()
+
+                if kind != BrokerMessageEnum.GET:
+
+                    self.broker_log.warning(f"Remote worker sent {kind} instead of asking for a job, disconnecting.")
+                    break
+
+                job = self._getJob()
+
+                if job == None:
+
+                    conn.send((BrokerMessageEnum.STOP, None))
+                    break
+
+                self.runJob(conn=conn,
+                            job=job)
+
+        except (EOFError, OSError) as err:
+            self.broker_log.warning(f"Lost a remote worker: {err}")
+
+        except Exception as err:
+            self.broker_log.error(f"Exception serving a remote worker, disconnecting: {err}")
+
+        finally:
+            self.addWorker(-1)
+            conn.close()
+
+    def _getJob(self) -> Optional[jf.Job]:
+        """Waits for a job a remote worker can run.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Job - The job to send, or None if the broker was stopped.
+        """
+
+        while self.is_running():
+
+            job = self.get_job(1.0)
+
+            if job != None:
+
+                return job
+
+        return None
+
+    def runJob(self,
+               conn,
+               job  : jf.Job):
+        """Sends a job to a remote worker, waits for its result, and
+           finishes it.
+
+           Input: self - Pointer to the current object instance.
+                  conn - The worker's connection.
+                  job - The job to run.
+
+           Output: None - Throws EOFError or OSError if the worker goes away,
+                          or whatever else went wrong, after failing the job.
+        """
+
+        start = time.monotonic()
+
+        try:
+            conn.send((BrokerMessageEnum.JOB, (job, job.getTimeout())))
+            kind, done = conn.recv()
+
+            if kind != BrokerMessageEnum.RESULT or done.getJobId() != job.getJobId():
+
+                raise EOFError(f"Remote worker answered job {job.getJobId()} with {kind}")
+
+            #The worker's copy is thrown away so the Manager's bookkeeping
+            #keeps pointing at the job it accepted.
+            job.setResult(done.result)
+
+        #Anything that goes wrong, like a job that can't be pickled, still
+        #has to release the job's reservation.
+        except Exception as err:
+            lost = isinstance(err, (EOFError, OSError))
+
+            job.setResult(sc.SDResponse(status_code = 502,
+                                        reason      = "Lost the connection to the image worker." if lost else "The image worker failed.",
+                                        data        = {}))
+            self.finish_job(job, time.monotonic() - start)
+            raise
+
+        self.finish_job(job, time.monotonic() - start)
+
+#####  Worker Class  #####
+
+class JobWorker:
+
+    def __init__(self,
+                 opts    : dict,
+                 web_url : str):
+        """Creates a worker that runs the broker's jobs on a local webui.
+
+           Input: self - Pointer to the current object instance.
+                  opts - The same broker options the Queue Manager uses, plus
+                         how long to wait before reconnecting.
+                  web_url - The webui to run jobs on.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.address     = (opts['host'], int(opts['port']))
+        self.authkey     = opts['authkey'].encode()
+        self.keep_going  = True
+        self.retry_delay = float(opts['retry_delay'])
+        self.web_url     = web_url
+        self.worker_log  = log.getLogger('job_worker')
+
+    def run(self):
+        """Pulls and runs jobs until stopped, reconnecting whenever the
+           broker goes away.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.keep_going:
+
+            try:
+                with mpc.Client(address = self.address,
+                                authkey = self.authkey) as conn:
+
+                    self.worker_log.info(f"Connected to the broker at {self.address} for {self.web_url}.")
+                    self.serve(conn)
+
+            except (EOFError, OSError, mpc.AuthenticationError) as err:
+                self.worker_log.warning(f"Lost the broker at {self.address}: {err}")
+
+            time.sleep(self.retry_delay)
+
+    def serve(self,
+              conn):
+        """Runs jobs from a single connection until the broker stops.
+
+           Input: self - Pointer to the current object instance.
+                  conn - A connection to the broker.
+
+           Output: None - Throws EOFError or OSError if the connection drops.
+        """
+
+        while self.keep_going:
+
+            conn.send((BrokerMessageEnum.GET, None))
+            kind, payload = conn.recv()
+
+            if kind == BrokerMessageEnum.STOP:
+
+                return
+
+            job, timeout = payload
+
+            #The broker's deadline is on its own clock, so it's rebuilt from
+            #the time the job has left.
+            job.setDeadline(time.monotonic() + timeout if timeout != None else None)
+
+            try:
+                job.doWork(web_url=self.web_url)
+
+            except Exception as err:
+                self.worker_log.error(f"Exception doing work for Job {job.getJobId()} on {self.web_url}: {err}")
+                job.setResult(sc.SDResponse(status_code = 502,
+                                            reason      = "The image worker couldn't reach its webui.",
+                                            data        = {}))
+
+            conn.send((BrokerMessageEnum.RESULT, job))
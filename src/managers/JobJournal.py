@@ -0,0 +1,221 @@
+#Keeps an append-only, on-disk record of every job a Queue Manager accepts so
+#unfinished work can be replayed (or at least reported) after a restart.
+#
+#Records are length-prefixed pickles.  Only the 'queued' record carries the
+#job itself, pickled as it was queued, keeping later state changes to a few
+#dozen bytes each.
+
+
+#####  Imports  #####
+
+from enum import IntEnum, verify, UNIQUE
+import os
+import pathlib as pl
+import pickle
+import struct
+import threading as th
+from typing import Optional
+
+#####  Package Variables  #####
+
+#Big-endian unsigned length of the pickled record that follows.
+RECORD_HEADER = struct.Struct('>I')
+
+#####  Enum Classes  #####
+
+@verify(UNIQUE)
+class JournalStateEnum(IntEnum):
+
+    QUEUED     = 0
+    DISPATCHED = 1
+    COMPLETED  = 2
+    POSTED     = 3
+    DROPPED    = 4
+
+#####  Journal Class  #####
+
+class JobJournal:
+
+    def __init__(self,
+                 opts : dict):
+        """Opens (or creates) the journal file and loads any jobs left
+           unfinished by the last run.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the journal 'path', how many records to
+                         write between compactions, and whether to fsync.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.compact_every = int(opts['compact_every'])
+        self.fsync         = opts['fsync'] == "True"
+        self.lock          = th.Lock()
+        self.path          = pl.Path(opts['path']).absolute()
+        #Job ID -> [state, pickled job, info] for every job that isn't done.
+        self.pending       = {}
+        self.records       = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._load()
+        #Starting from a compacted file keeps replays from growing forever.
+        self._compact()
+
+    def _load(self):
+        """Rebuilds the pending jobs from the journal file.  A partial record
+           at the end, from a crash mid-write, is ignored.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        if not self.path.exists():
+
+            return
+
+        with open(self.path, 'rb') as journal:
+
+            while True:
+
+                header = journal.read(RECORD_HEADER.size)
+
+                if len(header) < RECORD_HEADER.size:
+
+                    break
+
+                data = journal.read(RECORD_HEADER.unpack(header)[0])
+
+                try:
+                    self._apply(pickle.loads(data))
+
+                except Exception:
+                    break
+
+    def _apply(self,
+               record : tuple):
+        """Updates the pending jobs with a single record.
+
+           Input: self - Pointer to the current object instance.
+                  record - A (state, job ID, pickled job, info) tuple.
+
+           Output: None.
+        """
+
+        state, job_id, job_data, info = record
+
+        #Compacted records carry the job alongside its latest state.
+        if job_data != None:
+
+            self.pending[job_id] = [state, job_data, info]
+
+        elif state in (JournalStateEnum.POSTED, JournalStateEnum.DROPPED):
+
+            self.pending.pop(job_id, None)
+
+        elif job_id in self.pending:
+
+            self.pending[job_id][0] = state
+
+    def _write(self,
+               journal,
+               record : tuple):
+        """Appends a single length-prefixed record to an open file.
+
+           Input: self - Pointer to the current object instance.
+                  journal - The file to write to.
+                  record - A (state, job ID, pickled job, info) tuple.
+
+           Output: None.
+        """
+
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+        journal.write(RECORD_HEADER.pack(len(data)) + data)
+
+    def _compact(self):
+        """Rewrites the journal with one record per pending job.  The new file
+           is swapped in atomically so a crash leaves one file or the other.
+           Must be called with the lock held or before the journal is shared.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+
+        with open(temp_path, 'wb') as journal:
+
+            for job_id, (state, job_data, info) in self.pending.items():
+
+                self._write(journal, (state, job_id, job_data, info))
+
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        os.replace(temp_path, self.path)
+
+        self.file    = open(self.path, 'ab')
+        self.records = len(self.pending)
+
+    def record(self,
+               state : JournalStateEnum,
+               job   : object,
+               info  : Optional[dict] = None):
+        """Appends a job's new state to the journal.  The job itself is only
+           stored when it's queued, as it would be replayed.
+
+           Input: self - Pointer to the current object instance.
+                  state - The job's new state.
+                  job - The job whose state changed.
+                  info - Picklable data needed to replay the job, if queued.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        job_data = pickle.dumps(job.getReplayCopy(), protocol=pickle.HIGHEST_PROTOCOL) if state == JournalStateEnum.QUEUED else None
+        record   = (state, job.getJobId(), job_data, info)
+
+        with self.lock:
+
+            self._apply(record)
+            self._write(self.file, record)
+            #Flushing hands the record to the OS, which is enough to survive
+            #the bot crashing.  fsync also survives the machine crashing.
+            self.file.flush()
+
+            if self.fsync:
+
+                os.fsync(self.file.fileno())
+
+            self.records += 1
+
+            if self.records >= self.compact_every + len(self.pending):
+
+                self.file.close()
+                self._compact()
+
+    def getPending(self) -> list:
+        """Returns every job that was accepted but never posted.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: list - (state, job, info) tuples, oldest first.
+        """
+
+        with self.lock:
+
+            return [(state, pickle.loads(job_data), info) for state, job_data, info in self.pending.values()]
+
+    def close(self):
+        """Closes the journal file.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.file.close()
@@ -0,0 +1,418 @@
+#Schedules the Queue Manager's jobs.  Each job priority gets its own lane,
+#lanes are served by smooth weighted round-robin, and Guilds take turns inside
+#a lane.  The scheduler also owns the per-Guild reservations that limit how
+#many jobs each Guild and user may have queued.
+
+
+#####  Imports  #####
+
+import collections as co
+from enum import IntEnum, verify, UNIQUE
+import queue
+import src.utilities.JobFactory as jf
+import threading as th
+from typing import Optional
+
+#####  Enum Classes  #####
+
+@verify(UNIQUE)
+class ScheduleResultEnum(IntEnum):
+
+    ACCEPTED            = 0
+    TOO_MANY_GUILDS     = 1
+    TOO_MANY_GUILD_JOBS = 2
+    DUPLICATE_JOB       = 3
+
+#####  Queue Class  #####
+
+class JobScheduler:
+
+    def __init__(self,
+                 depth   : int,
+                 weights : dict):
+        """Replaces the old FIFO queue with one lane per job priority.  Lanes
+           are served by smooth weighted round-robin so latency-sensitive
+           work keeps moving while a backlog of images builds up.  Inside a
+           lane Guilds take turns, so one busy Guild can't starve the rest.
+           Also owns the per-Guild bookkeeping the Manager used to keep.
+
+           Input: self - Pointer to the current object instance.
+                  depth - How many jobs may be waiting across all lanes.
+                  weights - A JobPriorityEnum to int dict of lane weights.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.depth   = depth
+        self.weights = {lane : int(weights[lane]) for lane in jf.JobPriorityEnum}
+        self.credits = {lane : 0 for lane in jf.JobPriorityEnum}
+        #Each lane is an ordered dict of Guild -> ordered dict of job ID ->
+        #job, the first Guild being the next one served.  Keying the jobs by
+        #ID lets a cancelled job be removed without searching the lanes.
+        self.lanes   = {lane : co.OrderedDict() for lane in jf.JobPriorityEnum}
+        self.queued  = {}
+        self.jobs    = {}
+        self.count   = 0
+        self.ready   = th.Condition()
+
+        for lane, weight in self.weights.items():
+
+            if weight < 1:
+
+                raise ValueError(f"Lane {lane.name} must have a weight of at least 1, not {weight}!")
+
+    def _getKey(self,
+                job : jf.Job):
+        """Returns the key a job's bookkeeping is stored under.  Read-only
+           jobs don't change anything, so users may have one alongside a job
+           that's waiting on the webui, like the old separate show queue.  A
+           pre-rendered roll is interactive but still a roll, so it's keyed
+           like one.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to get a key for.
+
+           Output: The user ID, paired with the lane for read-only jobs.
+        """
+
+        if job.isReadOnly():
+
+            return (job.getUserId(), jf.JobPriorityEnum.INTERACTIVE)
+
+        return job.getUserId()
+
+    def reserve(self,
+                job            : jf.Job,
+                metadata       : dict,
+                max_guilds     : int,
+                max_guild_reqs : int) -> ScheduleResultEnum:
+        """Checks the Guild and user limits for a job and records its
+           metadata if they pass.  The job isn't runnable until it's put.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to reserve a spot for.
+                  metadata - Unpicklable data needed to post the result.
+                  max_guilds - How many Guilds may have jobs at once.
+                  max_guild_reqs - How many jobs a single Guild may have.
+
+           Output: ScheduleResultEnum - Whether the reservation was made.
+        """
+
+        with self.ready:
+
+            if job.getGuild() not in self.jobs:
+
+                if len(self.jobs) >= max_guilds:
+
+                    return ScheduleResultEnum.TOO_MANY_GUILDS
+
+                self.jobs[job.getGuild()] = {}
+
+            guild_jobs = self.jobs[job.getGuild()]
+
+            #This is a form of rate-limiting; limiting a guild to X posts
+            #instead of attempting to track timing.
+            if len(guild_jobs) >= max_guild_reqs:
+
+                if len(guild_jobs) == 0:
+
+                    del self.jobs[job.getGuild()]
+
+                return ScheduleResultEnum.TOO_MANY_GUILD_JOBS
+
+            #IDs are only removed after the job is done, so this always loses
+            #the race against a user re-submitting.
+            if self._getKey(job) in guild_jobs:
+
+                return ScheduleResultEnum.DUPLICATE_JOB
+
+            guild_jobs[self._getKey(job)] = metadata
+
+        return ScheduleResultEnum.ACCEPTED
+
+    def put(self,
+            job : jf.Job):
+        """Makes a reserved job runnable by adding it to its lane.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to queue.
+
+           Output: None - Throws queue.Full if the scheduler is at depth.
+        """
+
+        with self.ready:
+
+            if self.count >= self.depth:
+
+                raise queue.Full
+
+            lane = self.lanes[job.getPriority()]
+
+            if job.getGuild() not in lane:
+
+                lane[job.getGuild()] = co.OrderedDict()
+
+            lane[job.getGuild()][job.getJobId()] = job
+            self.queued[job.getJobId()]           = job
+            self.count                           += 1
+            #Workers may only serve some lanes, so all of them have to look.
+            self.ready.notify_all()
+
+    def requeue(self,
+                jobs : list):
+        """Returns jobs that were taken but couldn't be run to the front of
+           their lanes, so they're the next ones served.  They already held a
+           place in the queue, so the depth isn't checked.
+
+           Input: self - Pointer to the current object instance.
+                  jobs - The jobs to put back, in the order they were taken.
+
+           Output: None.
+        """
+
+        with self.ready:
+
+            for job in reversed(jobs):
+
+                lane = self.lanes[job.getPriority()]
+
+                if job.getGuild() not in lane:
+
+                    lane[job.getGuild()] = co.OrderedDict()
+
+                lane.move_to_end(job.getGuild(), last=False)
+                lane[job.getGuild()][job.getJobId()] = job
+                lane[job.getGuild()].move_to_end(job.getJobId(), last=False)
+                self.queued[job.getJobId()]           = job
+                self.count                           += 1
+
+            self.ready.notify_all()
+
+    def _next(self,
+              lanes : tuple) -> Optional[jf.Job]:
+        """Pops the next job using smooth weighted round-robin across the
+           non-empty lanes, then round-robin across the lane's Guilds.  Must
+           be called with the condition held.
+
+           Input: self - Pointer to the current object instance.
+                  lanes - Which lanes the caller is allowed to take from.
+
+           Output: Job - The next job, or None if the lanes are empty.
+        """
+
+        ready = [lane for lane in lanes if len(self.lanes[lane]) > 0]
+
+        if len(ready) == 0:
+
+            return None
+
+        total = 0
+
+        for lane in ready:
+
+            self.credits[lane] += self.weights[lane]
+            total              += self.weights[lane]
+
+        #Ties go to the first, most latency-sensitive, lane.
+        lane = max(ready, key=lambda x: self.credits[x])
+        self.credits[lane] -= total
+
+        guilds         = self.lanes[lane]
+        guild, pending = next(iter(guilds.items()))
+        job_id, job    = pending.popitem(last=False)
+
+        if len(pending) > 0:
+
+            guilds.move_to_end(guild)
+
+        else:
+
+            del guilds[guild]
+
+        del self.queued[job_id]
+        self.count -= 1
+
+        return job
+
+    def get(self,
+            block   : bool = True,
+            timeout : Optional[float] = None,
+            lanes   : Optional[tuple] = None) -> jf.Job:
+        """Returns the next job to run, waiting for one if asked to.
+
+           Input: self - Pointer to the current object instance.
+                  block - Whether to wait for a job to be put.
+                  timeout - How long to wait, or None to wait forever.
+                  lanes - Which lanes to take from, defaulting to all of them.
+
+           Output: Job - The next job.  Throws queue.Empty if none arrive.
+        """
+
+        lanes = tuple(jf.JobPriorityEnum) if lanes == None else tuple(lanes)
+
+        with self.ready:
+
+            job = self._next(lanes)
+
+            while job == None:
+
+                if not block or not self.ready.wait(timeout):
+
+                    raise queue.Empty
+
+                job = self._next(lanes)
+
+        return job
+
+    def take(self,
+             priority : jf.JobPriorityEnum,
+             key      : str,
+             limit    : int) -> list:
+        """Removes up to 'limit' queued jobs with the given batch key from a
+           lane, oldest first within each Guild.
+
+           Input: self - Pointer to the current object instance.
+                  priority - The lane to search.
+                  key - The batch key the jobs must have.
+                  limit - The most jobs to take.
+
+           Output: list - The jobs taken, which may be empty.
+        """
+
+        taken = []
+
+        with self.ready:
+
+            guilds = self.lanes[priority]
+
+            for guild in list(guilds.keys()):
+
+                if len(taken) >= limit:
+
+                    break
+
+                pending = guilds[guild]
+
+                for job_id, job in list(pending.items()):
+
+                    if len(taken) < limit and job.getBatchKey() == key:
+
+                        taken.append(pending.pop(job_id))
+                        del self.queued[job_id]
+
+                if len(pending) == 0:
+
+                    del guilds[guild]
+
+            self.count -= len(taken)
+
+        return taken
+
+    def remove(self,
+               job_id : str) -> Optional[jf.Job]:
+        """Removes a job that's still waiting to be run.  The job keeps its
+           reservation until it's released.
+
+           Input: self - Pointer to the current object instance.
+                  job_id - The ID of the job to remove.
+
+           Output: Job - The removed job, or None if it isn't queued.
+        """
+
+        with self.ready:
+
+            job = self.queued.pop(job_id, None)
+
+            if job == None:
+
+                return None
+
+            guilds  = self.lanes[job.getPriority()]
+            pending = guilds[job.getGuild()]
+            del pending[job_id]
+
+            if len(pending) == 0:
+
+                del guilds[job.getGuild()]
+
+            self.count -= 1
+
+        return job
+
+    def wait(self,
+             timeout : float):
+        """Waits until a job is put or the timeout expires.
+
+           Input: self - Pointer to the current object instance.
+                  timeout - The most time to wait, in seconds.
+
+           Output: None.
+        """
+
+        with self.ready:
+
+            self.ready.wait(timeout)
+
+    def release(self,
+                job : jf.Job) -> Optional[dict]:
+        """Forgets a job's reservation, and its Guild if it was the Guild's
+           last job.
+
+           Input: self - Pointer to the current object instance.
+                  job - The finished or rejected job.
+
+           Output: dict - The job's metadata, or None if it wasn't reserved.
+        """
+
+        with self.ready:
+
+            if job.getGuild() not in self.jobs:
+
+                return None
+
+            metadata = (self.jobs[job.getGuild()]).pop(self._getKey(job), None)
+
+            if len(self.jobs[job.getGuild()]) == 0:
+
+                del self.jobs[job.getGuild()]
+
+        return metadata
+
+    def getMetadata(self,
+                    job : jf.Job) -> Optional[dict]:
+        """Returns a job's metadata without releasing its reservation.
+
+           Input: self - Pointer to the current object instance.
+                  job - The reserved job.
+
+           Output: dict - The job's metadata, or None if it isn't reserved.
+        """
+
+        with self.ready:
+
+            return self.jobs.get(job.getGuild(), {}).get(self._getKey(job))
+
+    def qsize(self) -> int:
+        """Returns how many jobs are waiting to be run.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: int - The number of queued jobs.
+        """
+
+        with self.ready:
+
+            return self.count
+
+    def getWaiting(self) -> dict:
+        """Returns a snapshot of the queued jobs in each lane, in roughly the
+           order they'll be served.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - A JobPriorityEnum to list of jobs dict.
+        """
+
+        with self.ready:
+
+            return {lane : [job for pending in guilds.values() for job in pending.values()] for lane, guilds in self.lanes.items()}
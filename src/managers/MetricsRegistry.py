@@ -0,0 +1,500 @@
+#Records how the queue is performing, like how long jobs wait and how long the
+#webui takes, and serves it over HTTP in the Prometheus text format so it can
+#be scraped or just read with a browser.
+#
+#Histograms use fixed buckets so recording a value is a single increment, and
+#the bot never has to keep the values themselves.
+
+
+#####  Imports  #####
+
+import bisect
+import http.server as hs
+import logging as log
+import math
+import threading as th
+from typing import Callable, Optional
+
+#####  Package Variables  #####
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_PATH = '/metrics'
+
+#####  Package Functions  #####
+
+def formatValue(value : float) -> str:
+    """Returns a sample value the way the text format expects it.
+
+       Input: value - The value to format.
+
+       Output: str - The formatted value.
+    """
+
+    if math.isinf(value):
+
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+def escapeLabel(value : str) -> str:
+    """Escapes a label value for the text format.
+
+       Input: value - The raw label value.
+
+       Output: str - The escaped value.
+    """
+
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+#####  Metric Classes  #####
+
+class Metric:
+
+    #The TYPE the text format reports.
+    kind = "untyped"
+
+    def __init__(self,
+                 name      : str,
+                 help_text : str,
+                 labels    : tuple = ()):
+        """Creates a metric with no samples.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  labels - The names of the labels each sample has.
+
+           Output: None.
+        """
+
+        self.help_text = help_text
+        self.labels    = tuple(labels)
+        self.lock      = th.Lock()
+        self.name      = name
+        #Label value tuple -> the samples for those labels.
+        self.values    = {}
+
+    def _getKey(self,
+                labels : dict) -> tuple:
+        """Returns the label values in the metric's label order.
+
+           Input: self - Pointer to the current object instance.
+                  labels - A label name to value dict.
+
+           Output: tuple - The label values.  Throws ValueError if the labels
+                           don't match the metric's.
+        """
+
+        if len(labels) != len(self.labels) or any(x not in labels for x in self.labels):
+
+            raise ValueError(f"Metric {self.name} needs labels {self.labels}, not {tuple(labels.keys())}!")
+
+        return tuple(str(labels[x]) for x in self.labels)
+
+    def _formatLabels(self,
+                      key   : tuple,
+                      extra : tuple = ()) -> str:
+        """Returns a sample's label set.
+
+           Input: self - Pointer to the current object instance.
+                  key - The label values, in the metric's label order.
+                  extra - More (name, value) pairs, like a bucket's bound.
+
+           Output: str - The label set, or nothing if there are no labels.
+        """
+
+        pairs = list(zip(self.labels, key)) + list(extra)
+
+        if len(pairs) == 0:
+
+            return ""
+
+        return "{" + ",".join(f'{name}="{escapeLabel(value)}"' for name, value in pairs) + "}"
+
+    def _getSamples(self) -> list:
+        """Returns the metric's current samples.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: list - (sample name suffix, label set, value) tuples.
+        """
+
+        return []
+
+    def render(self) -> str:
+        """Returns the metric in the text format.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The metric's HELP, TYPE, and sample lines.
+        """
+
+        lines = [f"# HELP {self.name} {self.help_text}",
+                 f"# TYPE {self.name} {self.kind}"]
+
+        for suffix, labels, value in self._getSamples():
+
+            lines.append(f"{self.name}{suffix}{labels} {formatValue(value)}")
+
+        return "\n".join(lines) + "\n"
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def inc(self,
+            amount : float = 1.0,
+            **labels):
+        """Adds to the counter for the given labels.
+
+           Input: self - Pointer to the current object instance.
+                  amount - How much to add, which can't be negative.
+                  labels - The sample's label values.
+
+           Output: None.
+        """
+
+        key = self._getKey(labels)
+
+        with self.lock:
+
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self,
+            **labels) -> float:
+        """Returns the counter for the given labels.
+
+           Input: self - Pointer to the current object instance.
+                  labels - The sample's label values.
+
+           Output: float - The count, 0 if nothing was counted.
+        """
+
+        key = self._getKey(labels)
+
+        with self.lock:
+
+            return self.values.get(key, 0.0)
+
+    def _getSamples(self) -> list:
+
+        with self.lock:
+
+            return [("", self._formatLabels(key), value) for key, value in sorted(self.values.items())]
+
+class Gauge(Metric):
+
+    kind = "gauge"
+
+    def __init__(self,
+                 name      : str,
+                 help_text : str,
+                 read      : Callable[[], dict],
+                 labels    : tuple = ()):
+        """Creates a gauge that's read when the metrics are rendered, so it
+           never has to be kept up to date.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  read - Returns a label value tuple to value dict.
+                  labels - The names of the labels each sample has.
+
+           Output: None.
+        """
+
+        super().__init__(name      = name,
+                         help_text = help_text,
+                         labels    = labels)
+        self.read = read
+
+    def _getSamples(self) -> list:
+
+        return [("", self._formatLabels(tuple(str(x) for x in key)), value) for key, value in sorted(self.read().items())]
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    def __init__(self,
+                 name      : str,
+                 help_text : str,
+                 buckets   : tuple,
+                 labels    : tuple = ()):
+        """Creates a histogram with fixed bucket bounds.  A +Inf bucket is
+           always added.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  buckets - The upper bounds of the buckets.
+                  labels - The names of the labels each sample has.
+
+           Output: None - Throws ValueError if there are no buckets.
+        """
+
+        super().__init__(name      = name,
+                         help_text = help_text,
+                         labels    = labels)
+
+        self.buckets = tuple(sorted(float(x) for x in buckets if not math.isinf(float(x))))
+
+        if len(self.buckets) == 0:
+
+            raise ValueError(f"Histogram {name} needs at least one bucket!")
+
+    def observe(self,
+                value : float,
+                **labels):
+        """Records a value.
+
+           Input: self - Pointer to the current object instance.
+                  value - The value to record.
+                  labels - The sample's label values.
+
+           Output: None.
+        """
+
+        key = self._getKey(labels)
+
+        with self.lock:
+
+            if key not in self.values:
+
+                #Per-bucket counts, with the last one for +Inf, then the sum.
+                self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            entry = self.values[key]
+            #Buckets include their upper bound.
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1]                                          += value
+
+    def getCount(self,
+                 **labels) -> int:
+        """Returns how many values were recorded for the given labels.
+
+           Input: self - Pointer to the current object instance.
+                  labels - The sample's label values.
+
+           Output: int - The number of values recorded.
+        """
+
+        key = self._getKey(labels)
+
+        with self.lock:
+
+            return sum(self.values[key][0]) if key in self.values else 0
+
+    def _getSamples(self) -> list:
+
+        samples = []
+
+        with self.lock:
+
+            for key, (counts, total) in sorted(self.values.items()):
+
+                running = 0
+
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+
+                    running += count
+                    samples.append(("_bucket", self._formatLabels(key, (('le', formatValue(bound)),)), running))
+
+                samples.append(("_sum", self._formatLabels(key), total))
+                samples.append(("_count", self._formatLabels(key), running))
+
+        return samples
+
+#####  Registry Class  #####
+
+class MetricsRegistry:
+
+    def __init__(self):
+        """Creates an empty registry.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.lock    = th.Lock()
+        self.metrics = {}
+
+    def _register(self,
+                  metric : Metric) -> Metric:
+        """Adds a metric to the registry.
+
+           Input: self - Pointer to the current object instance.
+                  metric - The metric to add.
+
+           Output: Metric - The metric.  Throws ValueError if the name is taken.
+        """
+
+        with self.lock:
+
+            if metric.name in self.metrics:
+
+                raise ValueError(f"Metric {metric.name} is already registered!")
+
+            self.metrics[metric.name] = metric
+
+        return metric
+
+    def counter(self,
+                name      : str,
+                help_text : str,
+                labels    : tuple = ()) -> Counter:
+        """Creates and registers a counter.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  labels - The names of the labels each sample has.
+
+           Output: Counter - The new counter.
+        """
+
+        return self._register(Counter(name      = name,
+                                      help_text = help_text,
+                                      labels    = labels))
+
+    def gauge(self,
+              name      : str,
+              help_text : str,
+              read      : Callable[[], dict],
+              labels    : tuple = ()) -> Gauge:
+        """Creates and registers a gauge that's read on demand.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  read - Returns a label value tuple to value dict.
+                  labels - The names of the labels each sample has.
+
+           Output: Gauge - The new gauge.
+        """
+
+        return self._register(Gauge(name      = name,
+                                    help_text = help_text,
+                                    read      = read,
+                                    labels    = labels))
+
+    def histogram(self,
+                  name      : str,
+                  help_text : str,
+                  buckets   : tuple,
+                  labels    : tuple = ()) -> Histogram:
+        """Creates and registers a histogram.
+
+           Input: self - Pointer to the current object instance.
+                  name - The metric's name.
+                  help_text - A one-line description of the metric.
+                  buckets - The upper bounds of the buckets.
+                  labels - The names of the labels each sample has.
+
+           Output: Histogram - The new histogram.
+        """
+
+        return self._register(Histogram(name      = name,
+                                        help_text = help_text,
+                                        buckets   = buckets,
+                                        labels    = labels))
+
+    def render(self) -> str:
+        """Returns every metric in the text format.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The exposition text.
+        """
+
+        with self.lock:
+
+            metrics = list(self.metrics.values())
+
+        return "".join(x.render() for x in metrics)
+
+#####  Server Class  #####
+
+class MetricsServer:
+
+    def __init__(self,
+                 opts     : dict,
+                 registry : MetricsRegistry):
+        """Creates a server that isn't listening yet.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'host' and 'port' to serve on.
+                  registry - The metrics to serve.
+
+           Output: None.
+        """
+
+        self.address    = (opts['host'], int(opts['port']))
+        self.metric_log = log.getLogger('metrics')
+        self.registry   = registry
+        self.server     = None
+
+    def start(self):
+        """Starts serving the metrics from a background thread.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None - Throws OSError if the address can't be used.
+        """
+
+        registry   = self.registry
+        metric_log = self.metric_log
+
+        class MetricsHandler(hs.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                if self.path.split('?', 1)[0] != METRICS_PATH:
+
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+
+                metric_log.debug(format % args)
+
+        self.server = hs.ThreadingHTTPServer(self.address, MetricsHandler)
+        self.server.daemon_threads = True
+
+        th.Thread(target = self.server.serve_forever,
+                  name   = "Metrics server",
+                  daemon = True).start()
+
+    def getPort(self) -> Optional[int]:
+        """Returns the port the server is listening on, which may have been
+           picked by the OS.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: int - The port, or None if the server isn't running.
+        """
+
+        return self.server.server_address[1] if self.server != None else None
+
+    def stop(self):
+        """Stops the server.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        if self.server != None:
+
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
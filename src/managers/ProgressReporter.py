@@ -0,0 +1,407 @@
+#Reports the progress of running jobs by editing the user's original command
+#response.  Each busy backend's /sdapi/v1/progress endpoint is polled at a
+#fixed rate, and edits to each response are coalesced so only the latest
+#progress is ever sent, and never faster than Discord allows.
+#
+#Pillow is optional.  Without it previews are sent at whatever size the
+#webui makes them.
+
+
+#####  Imports  #####
+
+import base64 as b64
+import discord as dis
+import functools as ft
+import io
+import requests as req
+import src.managers.ServiceEstimator as se
+import threading as th
+import time
+from typing import Optional
+from urllib.parse import urljoin
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+#####  Reporter Class  #####
+
+class ProgressReporter:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a reporter with nothing to watch.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with how often to poll and edit, and whether
+                         and how large to send previews.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.edit_interval = float(opts['edit_interval'])
+        self.lock          = th.Lock()
+        self.poll_interval = float(opts['poll_interval'])
+        self.preview       = opts['preview'] == "True"
+        self.preview_size  = int(opts['preview_size'])
+        #Backend ID -> (backend, job ID lists of each batch sent to it, oldest
+        #first).
+        self.running       = {}
+        #Backend ID -> exponentially weighted average sampling steps/second.
+        self.step_rates    = {}
+        #Backend ID -> (sampling step, time.monotonic()) from the last poll.
+        self.steps         = {}
+        #Job ID -> the Discord metadata and edit state of a watched job.
+        self.watched       = {}
+
+        if self.poll_interval <= 0.0 or self.edit_interval <= 0.0:
+
+            raise ValueError(f"Progress intervals must be positive, not {self.poll_interval} and {self.edit_interval}!")
+
+    def watch(self,
+              job      : object,
+              metadata : dict):
+        """Starts tracking an accepted job so its response can be edited once
+           it's running.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job that was queued.
+                  metadata - The job's Discord context and event loop.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.watched[job.getJobId()] = {'last_edit' : 0.0,
+                                            'metadata'  : metadata,
+                                            'pending'   : False}
+
+    def unwatch(self,
+                job : object):
+        """Stops tracking a job that was rejected before it was queued.  Its
+           response is left alone since it carries the rejection.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job that was being watched.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.watched.pop(job.getJobId(), None)
+
+    def isWatching(self,
+                   job : object) -> bool:
+        """Returns whether a job's response will be edited with its progress.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to check.
+
+           Output: bool - True if the job is being tracked.
+        """
+
+        with self.lock:
+
+            return job.getJobId() in self.watched
+
+    def start(self,
+              backend : object,
+              batch   : list):
+        """Records that a batch is running on a backend, so the backend gets
+           polled.  The webui renders requests in the order they arrive, so
+           only the oldest batch on a backend is shown the progress.
+
+           Input: self - Pointer to the current object instance.
+                  backend - The webui instance running the batch.
+                  batch - The jobs sent to it.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            job_ids = [x.getJobId() for x in batch if x.getJobId() in self.watched]
+
+            if len(job_ids) == 0:
+
+                return
+
+            if backend.id not in self.running:
+
+                self.running[backend.id] = (backend, [])
+                self.steps.pop(backend.id, None)
+
+            self.running[backend.id][1].append(job_ids)
+
+    def finish(self,
+               batch : list):
+        """Stops tracking a batch and removes the progress responses, since
+           the results are posted separately.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs that finished or were abandoned.
+
+           Output: None.
+        """
+
+        finished = []
+
+        with self.lock:
+
+            for job in batch:
+
+                if job.getJobId() in self.watched:
+
+                    finished.append(self.watched.pop(job.getJobId()))
+
+            job_ids = [x.getJobId() for x in batch]
+
+            for backend_id, (backend, batches) in list(self.running.items()):
+
+                batches[:] = [x for x in batches if x[0] not in job_ids]
+
+                if len(batches) == 0:
+
+                    del self.running[backend_id]
+
+        for entry in finished:
+
+            metadata = entry['metadata']
+            metadata['loop'].call_soon_threadsafe(ft.partial(metadata['loop'].create_task,
+                                                             self._delete(metadata),
+                                                             name="progress"))
+
+    def getStepRate(self,
+                    backend_id : int) -> Optional[float]:
+        """Returns how fast a backend has been sampling, for capacity
+           planning.
+
+           Input: self - Pointer to the current object instance.
+                  backend_id - The backend's ID.
+
+           Output: float - Average sampling steps per second, or None if the
+                           backend hasn't been measured.
+        """
+
+        with self.lock:
+
+            return self.step_rates.get(backend_id)
+
+    def poll(self):
+        """Checks the progress of every backend running a watched job and
+           edits the jobs' responses if they're due an update.  Makes at most
+           one request per busy backend.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            running = [(backend, batches[0]) for backend, batches in self.running.values()]
+
+        for backend, job_ids in running:
+
+            try:
+                result = req.get(url=urljoin(backend.url, '/sdapi/v1/progress'),
+                                 params={'skip_current_image' : not self.preview},
+                                 timeout=self.poll_interval)
+
+                if result.status_code != 200:
+
+                    continue
+
+                progress = result.json()
+
+            except (req.exceptions.RequestException, ValueError):
+                #Progress is best-effort, the job itself reports failures.
+                continue
+
+            self._updateStepRate(backend_id = backend.id,
+                                 state      = progress.get('state', {}))
+
+            content = self._getContent(progress)
+            preview = self._getPreview(progress)
+
+            for job_id in job_ids:
+
+                self._edit(job_id  = job_id,
+                           content = content,
+                           preview = preview)
+
+    def _updateStepRate(self,
+                        backend_id : int,
+                        state      : dict):
+        """Updates a backend's sampling rate from the step reported by the
+           latest poll.
+
+           Input: self - Pointer to the current object instance.
+                  backend_id - The backend that was polled.
+                  state - The webui's progress state.
+
+           Output: None.
+        """
+
+        step = state.get('sampling_step')
+        now  = time.monotonic()
+
+        if step == None:
+
+            return
+
+        with self.lock:
+
+            if backend_id in self.steps:
+
+                last_step, last_time = self.steps[backend_id]
+
+                if step > last_step and now > last_time:
+
+                    rate = (step - last_step) / (now - last_time)
+                    self.step_rates[backend_id] = rate if backend_id not in self.step_rates else 0.8 * self.step_rates[backend_id] + 0.2 * rate
+
+            self.steps[backend_id] = (step, now)
+
+    def _getContent(self,
+                    progress : dict) -> str:
+        """Returns the progress message for a webui progress response.
+
+           Input: self - Pointer to the current object instance.
+                  progress - The decoded /sdapi/v1/progress response.
+
+           Output: str - The text to edit the response to.
+        """
+
+        state   = progress.get('state', {})
+        content = f"Your image is {round(100 * float(progress.get('progress', 0.0)))}% done"
+
+        if state.get('sampling_steps', 0) > 0:
+
+            content += f" (step {state['sampling_step']} of {state['sampling_steps']})"
+
+        if float(progress.get('eta_relative', 0.0)) > 0.0:
+
+            content += f", about {se.formatDuration(float(progress['eta_relative']))} left"
+
+        return content + "."
+
+    def _getPreview(self,
+                    progress : dict) -> Optional[bytes]:
+        """Returns the preview image to attach, shrunk to fit 'preview_size'
+           if Pillow is installed.
+
+           Input: self - Pointer to the current object instance.
+                  progress - The decoded /sdapi/v1/progress response.
+
+           Output: bytes - A PNG, or None if there's no preview to send.
+        """
+
+        if not self.preview or not progress.get('current_image'):
+
+            return None
+
+        data = b64.b64decode(progress['current_image'].split(",", 1)[-1])
+
+        if Image == None:
+
+            return data
+
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+
+                image.thumbnail((self.preview_size, self.preview_size))
+                output = io.BytesIO()
+                image.save(output, format='PNG')
+
+                return output.getvalue()
+
+        except OSError:
+            return None
+
+    def _edit(self,
+              job_id  : str,
+              content : str,
+              preview : Optional[bytes]):
+        """Edits a job's response unless it was edited too recently or an
+           edit is still being sent.  Skipped updates aren't queued, the next
+           poll just sends newer progress.
+
+           Input: self - Pointer to the current object instance.
+                  job_id - The job to update.
+                  content - The progress message.
+                  preview - An optional preview image.
+
+           Output: None.
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            entry = self.watched.get(job_id)
+
+            if entry == None or entry['pending'] or now - entry['last_edit'] < self.edit_interval:
+
+                return
+
+            entry['last_edit'] = now
+            entry['pending']   = True
+
+        #Edits are made from the polling thread, so they're handed to the
+        #loop to start.
+        loop = entry['metadata']['loop']
+        loop.call_soon_threadsafe(ft.partial(loop.create_task,
+                                             self._send(entry   = entry,
+                                                        content = content,
+                                                        preview = preview),
+                                             name="progress"))
+
+    async def _send(self,
+                    entry   : dict,
+                    content : str,
+                    preview : Optional[bytes]):
+        """Sends a progress edit to Discord.  Runs in the main asyncio loop.
+
+           Input: self - Pointer to the current object instance.
+                  entry - The watched job's state.
+                  content - The progress message.
+                  preview - An optional preview image.
+
+           Output: None.
+        """
+
+        try:
+            if preview == None:
+                await entry['metadata']['ctx'].edit_original_response(content=content)
+
+            else:
+                await entry['metadata']['ctx'].edit_original_response(content     = content,
+                                                                      attachments = [dis.File(io.BytesIO(preview), filename="preview.png")])
+
+        except dis.HTTPException:
+            #The user may have dismissed the response.
+            pass
+
+        finally:
+            entry['pending'] = False
+
+    async def _delete(self,
+                      metadata : dict):
+        """Removes a finished job's progress response.  Runs in the main
+           asyncio loop.
+
+           Input: self - Pointer to the current object instance.
+                  metadata - The job's Discord context.
+
+           Output: None.
+        """
+
+        try:
+            await metadata['ctx'].delete_original_response()
+
+        except dis.HTTPException:
+            pass
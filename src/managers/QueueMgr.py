@@ -7,16 +7,46 @@
 
 #####  Imports  #####
 
+import asyncio
+import concurrent.futures as cf
 import logging as log
 import logging.handlers as lh
-import multiprocessing as mp
+import math
 import pathlib as pl
 import queue
+import random
 import requests as req
+import src.managers.BackendMgr as bm
+import src.managers.DegradePolicy as dp
+import src.managers.JobBroker as jb
+import src.managers.JobJournal as jj
+import src.managers.JobScheduler as js
+import src.managers.MetricsRegistry as mr
+import src.managers.ProgressReporter as pr
+import src.managers.RateLimiter as rl
+import src.managers.ServiceEstimator as se
+import src.utilities.ImageEncoder as ie
 import src.utilities.JobFactory as jf
+import src.utilities.ResultCache as rc
+import src.utilities.SDClient as sc
+import threading as th
 import time
+from typing import Awaitable, Callable, Optional
 
-#####  Queue Class  #####
+#####  Package Variables  #####
+
+#Interactive jobs read from the bot's DB, so they're never sent to remote
+#workers.
+REMOTE_LANES      = tuple(x for x in jf.JobPriorityEnum if x != jf.JobPriorityEnum.INTERACTIVE)
+#Interactive workers never touch their backend, so they ignore its circuit.
+INTERACTIVE_LANES = (jf.JobPriorityEnum.INTERACTIVE,)
+
+#Histogram bucket bounds, in seconds.  Waits stretch from instant interactive
+#reads to a long backlog, renders from a quick test to a large batch, and
+#posts are usually well under a second.
+WAIT_BUCKETS    = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+REQUEST_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+POST_BUCKETS    = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
 #####  Package Functions  #####
 
@@ -55,39 +85,452 @@ class Manager:
         logHandler.setFormatter(formatter)
         self.queue_log.addHandler(logHandler)
 
-        self.flush_queue = False
         self.id          = manager_id
         self.keep_going  = True
-        self.jobs = {}
+        self.workers     = []
 
         #It's possible all opts are provided directly from config.json,
         #requiring them to be cast appropriately for the manager.  This also
         #allows the caller to never have to worry about casting the types
         #correctly for a config file and definition it doesn't own.
+        self.batch_window   = float(opts['batch_window']) if 'batch_window' in opts else 0.0
         self.depth          = int(opts['depth'])
         self.job_cooldown   = float(opts['job_cooldown'])
         self.max_guilds     = int(opts['max_guilds'])
         self.max_guild_reqs = int(opts['max_guild_reqs'])
-        self.web_url        = opts['webui_URL']
+        self.backends       = [bm.Backend(backend_id = x,
+                                          opts       = backend) for x, backend in enumerate(bm.getBackendOptions(opts))]
+        self.web_url        = self.backends[0].url
+        #Interactive workers only serve the interactive lane so reads never
+        #wait behind a backend that's busy rendering.
+        self.interactive_workers = int(opts['interactive_workers']) if 'interactive_workers' in opts else 0
+        #Decoding results and DB writes are too slow for the main asyncio
+        #loop, so they're done here before the result is handed to it.
+        self.post_workers        = int(opts['post_workers']) if 'post_workers' in opts else 0
+        self.post_pool           = cf.ThreadPoolExecutor(max_workers        = self.post_workers,
+                                                         thread_name_prefix = f"Queue {manager_id} post") if self.post_workers > 0 else None
+        weights                  = opts['lane_weights'] if 'lane_weights' in opts else {}
+
+        #The async client is optional since threads are simpler to debug and
+        #a single backend gains little from it.
+        client_opts     = opts['sd_client'] if 'sd_client' in opts else {'enabled' : "False"}
+        self.sd_client  = sc.SDClient(opts=client_opts) if client_opts['enabled'] == "True" else None
+        self.free_slots = None
+        self.reservoir  = None
+
+        #Retries and deadlines are optional so a single local backend behaves
+        #the same as it always has.
+        retry_opts          = opts['retry'] if 'retry' in opts else {'attempts' : "1", 'base_delay' : "0.0", 'max_delay' : "0.0"}
+        self.retry_attempts = int(retry_opts['attempts'])
+        self.retry_base     = float(retry_opts['base_delay'])
+        self.retry_max      = float(retry_opts['max_delay'])
+        self.job_deadline   = float(opts['job_deadline']) if 'job_deadline' in opts else 0.0
+        breaker_opts        = opts['circuit_breaker'] if 'circuit_breaker' in opts else {'probe_interval' : "0.0", 'probe_timeout' : "0.0"}
+        self.probe_interval = float(breaker_opts['probe_interval'])
+        self.probe_timeout  = float(breaker_opts['probe_timeout'])
+        #Interrupts are as cheap to answer as a health probe.
+        self.interrupt_timeout = self.probe_timeout if self.probe_timeout > 0.0 else 5.0
+
+        #Service times are always tracked, but jobs are only turned away if
+        #admission control is enabled.
+        admission_opts  = opts['admission'] if 'admission' in opts else {'enabled'          : "False",
+                                                                         'action'           : "reject",
+                                                                         'alpha'            : "0.2",
+                                                                         'initial_estimate' : "30.0",
+                                                                         'slo'              : "0.0"}
+        self.admission  = admission_opts['enabled'] == "True"
+        self.defer      = admission_opts['action'] == "defer"
+        self.slo        = float(admission_opts['slo'])
+        self.estimator  = se.ServiceEstimator(opts=admission_opts)
+
+        limit_opts        = opts['rate_limits'] if 'rate_limits' in opts else {'enabled' : "False"}
+        self.rate_limiter = rl.RateLimiter(opts=limit_opts) if limit_opts['enabled'] == "True" else None
+
+        #Degrading is optional since some bots would rather users wait for
+        #the image they asked for.
+        degrade_opts        = opts['degrade'] if 'degrade' in opts else {'enabled' : "False"}
+        self.degrade_policy = dp.DegradePolicy(opts=degrade_opts) if degrade_opts['enabled'] == "True" else None
+
+        #Splitting the upscale off costs an extra webui call per job, so it's
+        #only worth it with several backends or a preview to post.
+        upscale_opts         = opts['upscale'] if 'upscale' in opts else {'enabled' : "False", 'preview' : "False"}
+        self.split_upscale   = upscale_opts['enabled'] == "True"
+        self.upscale_preview = upscale_opts['preview'] == "True"
+
+        #The broker is optional since most bots share a machine with their
+        #webui.  'local_workers' lets the bot machine skip rendering entirely.
+        broker_opts        = opts['broker'] if 'broker' in opts else {'enabled' : "False", 'local_workers' : "True"}
+        self.broker        = jb.JobBroker(opts       = broker_opts,
+                                          get_job    = self._takeRemoteJob,
+                                          finish_job = self._finishRemoteJob,
+                                          is_running = lambda: self.keep_going,
+                                          broker_log = self.queue_log) if broker_opts['enabled'] == "True" else None
+        self.local_workers = broker_opts['local_workers'] == "True" or self.broker == None
+
+        progress_opts = opts['progress'] if 'progress' in opts else {'enabled' : "False"}
+        self.progress = pr.ProgressReporter(opts=progress_opts) if progress_opts['enabled'] == "True" else None
+
+        #Only fixed-seed generates can be cached, so there's no point paying
+        #for the disk space unless users actually repeat them.
+        cache_opts        = opts['result_cache'] if 'result_cache' in opts else {'enabled' : "False"}
+        self.result_cache = rc.ResultCache(opts=cache_opts) if cache_opts['enabled'] == "True" else None
+
+        #Display copies are made in the post pool, so they don't hold up the
+        #workers or the Discord loop.
+        encoding_opts      = opts['image_encoding'] if 'image_encoding' in opts else {'enabled' : "False"}
+        self.image_encoder = ie.ImageEncoder(opts=encoding_opts) if encoding_opts['enabled'] == "True" else None
+
+        #Pillow is optional, so a missing install only shows up as images
+        #being posted unchanged.
+        if self.image_encoder != None and ie.Image == None:
+
+            self.queue_log.warning("Image encoding is enabled but Pillow isn't installed, images will be posted as the webui made them.")
+
+        elif self.image_encoder != None and not self.image_encoder.isNeeded():
+
+            self.queue_log.warning("Image encoding is enabled but won't change anything, check its 'format' and 'max_size'.")
+
+        if self.progress != None and self.progress.preview and pr.Image == None:
+
+            self.queue_log.warning("Progress previews are enabled but Pillow isn't installed, previews will be sent at full size.")
+
+        #The journal is optional since it costs a few writes per job.
+        journal_opts = opts['journal'] if 'journal' in opts else {'enabled' : "False"}
+        self.journal = None
+
+        if journal_opts['enabled'] == "True":
+
+            self.journal = jj.JobJournal(opts={'compact_every' : journal_opts['compact_every'],
+                                               'fsync'         : journal_opts['fsync'],
+                                               'path'          : f"{journal_opts['path']}_{manager_id}"})
+
+        self.queue = js.JobScheduler(depth   = self.depth,
+                                     weights = {lane : weights[lane.name.lower()] if lane.name.lower() in weights else 1 for lane in jf.JobPriorityEnum})
+
+        #Metrics are always recorded since it's only a few increments per
+        #job, but they're only served if enabled.
+        metrics_opts        = opts['metrics'] if 'metrics' in opts else {'enabled' : "False"}
+        self.metrics        = mr.MetricsRegistry()
+        self.metrics_server = mr.MetricsServer(opts=metrics_opts,
+                                               registry=self.metrics) if metrics_opts['enabled'] == "True" else None
+        self._registerMetrics()
+
+        #Each piece of shared state has one owner.  The scheduler owns the
+        #lanes and per-Guild reservations behind its condition, the Manager
+        #owns the indexes below behind cancel_lock, and the asyncio loop owns
+        #the Discord objects.  Workers only hand results to the loop with
+        #call_soon_threadsafe, and other processes, like remote workers and
+        #image encoders, only ever see copies of jobs or image bytes.
+        #
+        #Accepted jobs are indexed until they finish so they can be cancelled
+        #whether they're still queued or already running.
+        self.cancel_lock = th.Lock()
+        #Job ID -> job, for every job that was queued and hasn't finished.
+        self.accepted    = {}
+        #User ID -> the IDs of the user's accepted jobs.
+        self.user_jobs   = {}
+        #Backend ID -> (backend, the batches sent to it, oldest first).
+        self.running     = {}
+        #IDs of jobs cancelled after a worker took them from the scheduler.
+        self.cancelled   = set()
+        #IDs of the first job of each batch the webui was told to interrupt.
+        self.interrupted = set()
+
+    def _registerMetrics(self):
+        """Creates the Manager's metrics.  Gauges are read from the queue and
+           backends whenever the metrics are served.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.job_waits     = self.metrics.histogram(name      = 'igsd_job_wait_seconds',
+                                                    help_text = "Time from a job being queued to a worker taking it.",
+                                                    buckets   = WAIT_BUCKETS,
+                                                    labels    = ('lane',))
+        self.request_times = self.metrics.histogram(name      = 'igsd_sd_request_seconds',
+                                                    help_text = "Time each batch spent on the webui, retries included.",
+                                                    buckets   = REQUEST_BUCKETS,
+                                                    labels    = ('backend', 'result'))
+        self.post_times    = self.metrics.histogram(name      = 'igsd_post_seconds',
+                                                    help_text = "Time spent preparing a result in the post pool and sending it from the Discord loop.",
+                                                    buckets   = POST_BUCKETS,
+                                                    labels    = ('stage',))
+        self.degraded      = self.metrics.counter(name      = 'igsd_jobs_degraded_total',
+                                                  help_text = "Jobs given a cheaper profile because the queue was busy.",
+                                                  labels    = ('lane',))
+        self.rejections    = self.metrics.counter(name      = 'igsd_jobs_rejected_total',
+                                                  help_text = "Jobs turned away when they were added, by reason.",
+                                                  labels    = ('reason',))
+        self.backend_jobs  = self.metrics.counter(name      = 'igsd_backend_jobs_total',
+                                                  help_text = "Jobs each backend finished, by whether the webui call succeeded.",
+                                                  labels    = ('backend', 'result'))
+        self.metrics.gauge(name      = 'igsd_queue_depth',
+                           help_text = "Jobs waiting in each lane.",
+                           read      = lambda: {(lane.name.lower(),) : len(jobs) for lane, jobs in self.queue.getWaiting().items()},
+                           labels    = ('lane',))
+        self.metrics.gauge(name      = 'igsd_backend_active_jobs',
+                           help_text = "Jobs each local backend is running.",
+                           read      = lambda: {(x.id,) : x.active for x in self.backends},
+                           labels    = ('backend',))
+        self.metrics.gauge(name      = 'igsd_remote_workers',
+                           help_text = "Remote workers connected to the broker.",
+                           read      = lambda: {() : self.broker.getWorkerCount() if self.broker != None else 0})
+
+    def cancel(self,
+               user_id  : int,
+               guild_id : Optional[int] = None) -> int:
+        """Cancels a user's jobs.  Queued jobs are removed outright, and
+           running jobs have their results dropped and are interrupted once
+           nothing else is waiting on their webui call.
+
+           Input: self - Pointer to the current object instance.
+                  user_id - The user whose jobs should be cancelled.
+                  guild_id - Only cancel jobs from this Guild, if given.
+
+           Output: int - How many jobs were cancelled.
+        """
+
+        with self.cancel_lock:
+
+            jobs = [self.accepted[x] for x in self.user_jobs.get(user_id, ()) if guild_id == None or self.accepted[x].getGuild() == guild_id]
+
+        count = sum(self._cancelJob(x) for x in jobs)
+
+        self._interruptAbandoned()
+        self.queue_log.info(f"Cancelled {count} jobs from user {user_id}.")
+
+        return count
+
+    def flush(self,
+              guild_id : Optional[int] = None) -> int:
+        """Cancels every accepted job, or every job from a Guild, the same
+           way cancel() does for a single user.
+
+           Input: self - Pointer to the current object instance.
+                  guild_id - Only flush jobs from this Guild, if given.
+
+           Output: int - How many jobs were cancelled.
+        """
+
+        with self.cancel_lock:
+
+            jobs = [x for x in self.accepted.values() if guild_id == None or x.getGuild() == guild_id]
+
+        count = sum(self._cancelJob(x) for x in jobs)
+
+        self._interruptAbandoned()
+        self.queue_log.info(f"Flushed {count} jobs from Guild {guild_id}.")
+
+        return count
+
+    def _cancelJob(self,
+                   job : jf.Job) -> bool:
+        """Cancels a single accepted job.  A running job keeps its place in
+           the running list so its webui call can be interrupted, but its
+           reservation is released right away so the user may post again.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to cancel.
+
+           Output: bool - Whether the job was cancelled, False if it already
+                          finished or was cancelled.
+        """
+
+        if self.queue.remove(job.getJobId()) != None:
+
+            self._untrack([job])
+            self._journal(state=jj.JournalStateEnum.DROPPED,
+                          job=job)
+
+        else:
+
+            #The job is dropped once its worker is done with it.
+            with self.cancel_lock:
+
+                if job.getJobId() not in self.accepted or job.getJobId() in self.cancelled:
+
+                    return False
+
+                self.cancelled.add(job.getJobId())
+
+        self.queue.release(job)
+
+        if self.progress != None:
 
-        #This may eventually be implemented as a concurrent futures ProcessPool
-        #to allow future versions to invoke workers across computers (e.g.
-        #subprocess_exec with TCP/UDP data to/from a set of remote terminals).
-        self.queue = mp.Queue(self.depth)
+            self.progress.finish([job])
 
-    def flush(self):
-        """Sets the 'flush' flag true to enable the job queue to flush jobs
-           when able.
+        return True
+
+    def _track(self,
+               job : jf.Job):
+        """Indexes an accepted job so it can be found by its ID or user.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job being queued.
+
+           Output: None.
+        """
+
+        with self.cancel_lock:
+
+            self.accepted[job.getJobId()] = job
+            self.user_jobs.setdefault(job.getUserId(), set()).add(job.getJobId())
+
+    def _untrack(self,
+                 batch : list) -> set:
+        """Forgets finished or removed jobs.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs to forget.
+
+           Output: set - The IDs of the jobs that were cancelled while
+                         running, whose results must be dropped.
+        """
+
+        cancelled = set()
+
+        with self.cancel_lock:
+
+            for job in batch:
+
+                self.accepted.pop(job.getJobId(), None)
+                user_jobs = self.user_jobs.get(job.getUserId())
+
+                if user_jobs != None:
+
+                    user_jobs.discard(job.getJobId())
+
+                    if len(user_jobs) == 0:
+
+                        del self.user_jobs[job.getUserId()]
+
+                if job.getJobId() in self.cancelled:
+
+                    self.cancelled.discard(job.getJobId())
+                    cancelled.add(job.getJobId())
+
+        return cancelled
+
+    def _refundRateLimit(self,
+                         job     : jf.Job,
+                         counted : bool):
+        """Gives back the rate limit tokens of a job that was turned away
+           after it was counted.
+
+           Input: self - Pointer to the current object instance.
+                  job - The rejected job.
+                  counted - Whether the job took tokens.
+
+           Output: None.
+        """
+
+        if counted:
+
+            self.rate_limiter.refund(user_id=job.getUserId(),
+                                     guild_id=job.getGuild())
+
+    def _unwatch(self,
+                 job : jf.Job):
+        """Stops reporting progress for a job that was never queued.
+
+           Input: self - Pointer to the current object instance.
+                  job - The rejected job.
+
+           Output: None.
+        """
+
+        if self.progress != None:
+
+            self.progress.unwatch(job)
+
+    def _startRunning(self,
+                      backend : bm.Backend,
+                      batch   : list):
+        """Records that a batch was sent to a backend, so it can be
+           interrupted if it's abandoned.
+
+           Input: self - Pointer to the current object instance.
+                  backend - The webui instance running the batch.
+                  batch - The jobs sent to it.
+
+           Output: None.
+        """
+
+        with self.cancel_lock:
+
+            if backend.id not in self.running:
+
+                self.running[backend.id] = (backend, [])
+
+            self.running[backend.id][1].append(batch)
+
+    def _stopRunning(self,
+                     backend : bm.Backend,
+                     batch   : list):
+        """Records that a backend is done with a batch.  The next batch on
+           the backend becomes the one it's rendering, so it's interrupted
+           if it was abandoned while it waited.
+
+           Input: self - Pointer to the current object instance.
+                  backend - The webui instance that ran the batch.
+                  batch - The jobs sent to it.
+
+           Output: None.
+        """
+
+        with self.cancel_lock:
+
+            batches    = self.running[backend.id][1]
+            batches[:] = [x for x in batches if x[0].getJobId() != batch[0].getJobId()]
+            self.interrupted.discard(batch[0].getJobId())
+
+            if len(batches) == 0:
+
+                del self.running[backend.id]
+
+        self._interruptAbandoned()
+
+    def _interruptAbandoned(self):
+        """Interrupts each backend whose current batch nobody is waiting on,
+           because every job in it was cancelled or ran past its deadline,
+           so the GPU moves on to work that will be posted.  A batch is only
+           interrupted once, since a second interrupt could stop the next
+           request instead.
 
            Input: self - Pointer to the current object instance.
 
-           Output: none.
+           Output: None.
         """
-        self.flush_queue = True
+
+        targets = []
+
+        with self.cancel_lock:
+
+            for backend, batches in self.running.values():
+
+                current = batches[0]
+
+                if current[0].getJobId() not in self.interrupted and all(x.getJobId() in self.cancelled or x.isExpired() for x in current):
+
+                    self.interrupted.add(current[0].getJobId())
+                    targets.append((backend, current))
+
+        for backend, batch in targets:
+
+            if backend.interrupt(timeout=self.interrupt_timeout):
+
+                self.queue_log.info(f"Interrupted abandoned Jobs: {batch} on {backend}.")
+
+            else:
+
+                self.queue_log.warning(f"Unable to interrupt abandoned Jobs: {batch} on {backend}.")
 
     def add(self,
             metadata : dict,
-            job      : jf.Job) -> str:
+            job      : jf.Job,
+            replay   : bool = False) -> str:
         """Passes queued jobs to the worker tasks.  Is effectively the 'main'
            of the class.  Workers return the image prompt and queue object id
            when complete.  The Manager should post the result to the main thread
@@ -96,138 +539,1452 @@ class Manager:
            Input: self - Pointer to the current object instance.
                   metadata - Unpicklable data needed to post a result to Discord.
                   job - Sanitized data to potentially add to the queue.
+                  replay - Whether the job is being recovered from the
+                           journal, and so was already randomized.
 
            Output: str - Result of the job scheduling attempt.
         """
 
-        #TODO: consider removing to have a single dict of 1 action per user to
-        #ensure users can't submit multiple rolls.
-        #TODO2: consider having non-affect commands (like show) go to a
-        #different queue to allow the commands to process in parallel.
-        #TODO3: consider having a lock around 2 trackers, 1 per user and 1 for
-        #jobs per guild, to ensure 1 global job per user and limit spam
-        #from a server (including user/account flooding from a server).
-        if job.getGuild() not in self.jobs:
+        #A pre-rendered roll turns the job into a quick post, so it has to be
+        #applied before the job is reserved in a lane.
+        entry = self.reservoir.take(job.getReservoirKey()) if self.reservoir != None and not replay else None
+
+        if entry != None:
+
+            job.usePrerendered(entry)
+
+        result = self.queue.reserve(job            = job,
+                                    metadata       = metadata,
+                                    max_guilds     = self.max_guilds,
+                                    max_guild_reqs = self.max_guild_reqs)
 
-            if len(self.jobs) >= self.max_guilds :
+        if result != js.ScheduleResultEnum.ACCEPTED:
+
+            self._returnPrerendered(entry)
+            self.rejections.inc(reason=result.name.lower())
+
+        match result:
+
+            case js.ScheduleResultEnum.TOO_MANY_GUILDS:
 
                 self.queue_log.warning(f"Trying to add guild {job.getGuild()} goes over Guild limit {self.max_guilds}!")
                 return "Bot is currently servicing the maximum number of allowed Guilds."
 
-            else:
-                #Asyncio and Threading are suppose to be GIL safe, making this
-                #safe.  Change this if that changes.
-                self.jobs[job.getGuild()] = {}
+            case js.ScheduleResultEnum.TOO_MANY_GUILD_JOBS:
+
+                self.queue_log.warning(f"User {job.getUserId()}'s job excedded the Guild job limit {self.max_guild_reqs}!")
+                return "Unable to add your job, too many jobs from this Guild are already in the queue."
+
+            case js.ScheduleResultEnum.DUPLICATE_JOB:
+
+                self.queue_log.debug(f"Job id {job.getUserId()} alraedy exists!")
+                #In the future, this can be modified by converting ID into a
+                #snowflake, allowing users to post multiple jobs.
+                return "You already have a job on the queue, please wait until it's finished."
+
+        #Replayed jobs were already counted, and reads are already limited to
+        #one per user at a time.
+        counted = self.rate_limiter != None and not replay and not job.isReadOnly()
 
-        #This is a form of rate-limiting; limiting a guild to X posts instead
-        #of attempting to track timing.
-        if len(self.jobs[job.getGuild()]) >= self.max_guild_reqs:
+        if counted:
 
-            self.queue_log.warning(f"User {job.getUserId()}'s job excedded the Guild job limit {self.max_guild_reqs}!")
+            limited = self.rate_limiter.check(user_id=job.getUserId(),
+                                              guild_id=job.getGuild())
 
-            if len(self.jobs[job.getGuild()]) == 0:
+            if limited != None:
 
-                del self.jobs[job.getGuild()]
+                scope, wait = limited
 
-            return "Unable to add your job, too many jobs from this Guild are already in the queue."
+                self._returnPrerendered(entry)
+                self.queue.release(job)
+                self.rejections.inc(reason=f"rate_limit_{scope.name.lower()}")
+                self.queue_log.warning(f"Rate limited job from ID {job.getUserId()} in Guild {job.getGuild()} by the {scope.name} limit for {wait:.1f}s.")
 
-        #This isn't an elif to avoid duplicating the contents. ID is also only
-        #deleted after the job is done, so this function always loses the race.
-        if job.getUserId() not in self.jobs[job.getGuild()]:
+                match scope:
 
-            (self.jobs[job.getGuild()])[job.getUserId()] = metadata
-            self.queue_log.debug(f"Added new job from Guild {job.getGuild()} to ID {job.getUserId()}.")
+                    case rl.LimitScopeEnum.USER:
 
-        else :
+                        return f"You're sending jobs too quickly, please wait {se.formatDuration(wait)} before trying again."
 
-            self.queue_log.debug(f"Job id {job.getUserId()} alraedy exists!")
-            #In the future, this can be modified by converting ID into a
-            #snowflake, allowing users to post multiple jobs.
-            return "You already have a job on the queue, please wait until it's finished."
+                    case rl.LimitScopeEnum.GUILD:
+
+                        return f"This Guild is sending jobs too quickly, please wait {se.formatDuration(wait)} before trying again."
+
+                    case rl.LimitScopeEnum.GLOBAL:
+
+                        return f"The bot is getting too many jobs right now, please wait {se.formatDuration(wait)} before trying again."
+
+        #Replayed jobs were already accepted once, so they're never shed.
+        eta = self._estimateWait(job) if self.admission and not replay else 0.0
+
+        if eta > self.slo and not self.defer:
+
+            self._returnPrerendered(entry)
+            self._refundRateLimit(job=job,
+                                  counted=counted)
+            self.queue.release(job)
+
+            if eta == math.inf:
+
+                self.rejections.inc(reason="no_backends")
+                self.queue_log.warning(f"Rejecting job from ID {job.getUserId()}, no backends are available.")
+                return "No image servers are available right now, please try again later."
+
+            self.rejections.inc(reason="over_slo")
+            self.queue_log.warning(f"Rejecting job from ID {job.getUserId()}, its estimated finish of {eta:.1f}s is over the {self.slo}s SLO.")
+            return f"The queue is too busy right now, your job would take about {se.formatDuration(eta)}.  Please try again later."
+
+        #Replayed jobs were already degraded and split, or not, when first
+        #accepted.
+        if self.degrade_policy != None and not replay:
+
+            self._degrade(job=job,
+                          eta=eta)
+
+        if self.split_upscale and not replay:
+
+            job.splitUpscale()
+
+        self.queue_log.debug(f"Added new job from Guild {job.getGuild()} to ID {job.getUserId()}.")
+
+        #Replayed jobs get a fresh deadline since the old one was measured
+        #from a clock that didn't survive the restart.
+        job.setDeadline(time.monotonic() + self.job_deadline if self.job_deadline > 0.0 else None)
 
-            #Else rate limit
         try:
 
             #This is both the latest time possible to get the randomized tags
             #and the safest time, since a user's job is already recorded,
             #preventing them from spamming jobs if the randomizer takes a
             #long time for some reason.
-            if job.getRandomize() :
+            if job.getRandomize() and not replay:
 
                 job.doRandomize(metadata['tag_rng'])
 
-            #The Metadata can't be pickeled, meaning we can only send data
-            #through the queue.
+            #This has to be recorded before a worker can take the job so the
+            #journal never sees the job dispatched before it was queued.
+            self._journal(state=jj.JournalStateEnum.QUEUED,
+                          job=job,
+                          info={'channel_id' : getattr(metadata['ctx'], 'channel_id', None)})
+            self._track(job)
+
+            #Interactive jobs finish too quickly to be worth reporting on.
+            #Replayed jobs have no response left to edit.  The job is watched
+            #before it's queued so a fast worker can't finish it first.
+            if self.progress != None and job.getPriority() != jf.JobPriorityEnum.INTERACTIVE and not replay:
+
+                self.progress.watch(job=job,
+                                    metadata=metadata)
+
+            job.setQueuedTime(time.monotonic())
             self.queue.put(job)
 
         except queue.Full as err:
 
-            (self.jobs[job.getGuild()]).pop(job.getUserId())
+            self._returnPrerendered(entry)
+            self._refundRateLimit(job=job,
+                                  counted=counted)
+            self._untrack([job])
+            self._unwatch(job)
+            self.queue.release(job)
+            self._journal(state=jj.JournalStateEnum.DROPPED,
+                          job=job)
+            self.rejections.inc(reason="queue_full")
             self.queue_log.warning(f" Encountered a full queue for job with metadata: {job}, {err}!")
 
             return "The work queue is currently full, please wait a bit before making another job."
 
         except Exception as err:
 
-            (self.jobs[job.getGuild()]).pop(job.getUserId())
+            self._returnPrerendered(entry)
+            self._refundRateLimit(job=job,
+                                  counted=counted)
+            self._untrack([job])
+            self._unwatch(job)
+            self.queue.release(job)
+            self._journal(state=jj.JournalStateEnum.DROPPED,
+                          job=job)
+            self.rejections.inc(reason="error")
             self.queue_log.error(f" Unable to add job to queue for job with metadata: {job}, {err}!")
 
             return "Unable to add your job to the queue.  Are you sending more than text and numbers?"
 
+        if eta > self.slo:
+
+            if eta == math.inf:
+
+                return "Your job was added to the queue, but no image servers are available right now.  Please wait for it to finish before posting another."
+
+            return f"Your job was added to the queue, but the queue is busy and it will take about {se.formatDuration(eta)}.  Please wait for it to finish before posting another."
+
         return "Your job was added to the queue.  Please wait for it to finish before posting another."
 
-    def putJob(self) :
+    def _degrade(self,
+                 job : jf.Job,
+                 eta : float):
+        """Gives a new job a cheaper profile if the queue is busy enough
+           for the degrade policy.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job being added.
+                  eta - The job's estimated wait, if admission control already
+                        worked it out.
+
+           Output: None.
+        """
+
+        if not self.admission and self.degrade_policy.usesWait():
+
+            eta = self._estimateWait(job)
+
+        profile = self.degrade_policy.getProfile(depth=self.queue.qsize(),
+                                                 wait=eta)
+
+        if profile != None and job.degrade(profile):
+
+            self.degraded.inc(lane=job.getPriority().name.lower())
+            self.queue_log.info(f"Degraded job from ID {job.getUserId()} for a busy queue: {job.degraded}.")
+
+    def putJob(self,
+               backend : Optional[bm.Backend] = None,
+               lanes   : Optional[tuple] = None) :
         """Should be instantiated as an independent proecss for putting and
            getting data from the SD server.  Results are provided back to the
            main IGSD thread via the supplied event loop.  Has no knowledge of
-           Guilds or how to post the provided image to the jobor.
+           Guilds or how to post the provided image to the jobor.  Several
+           workers may run this function at once, each bound to a backend.
 
             Input: self - Pointer to the current object instance.
+                   backend - Which webui instance to send work to, defaults
+                             to the first configured backend.
+                   lanes - Which priority lanes to serve, defaults to all.
 
             Output: None - Throws exceptions on error.
         """
 
+        backend = self.backends[0] if backend == None else backend
+
         while self.keep_going:
 
-            if self.flush_queue:
+            #Workers for a backend with an open circuit leave the jobs to
+            #healthy backends until it's ready to be tried again.
+            if lanes != INTERACTIVE_LANES and not backend.isAvailable():
+
+                time.sleep(1.0)
+                continue
+
+            #Waking up periodically lets the worker notice it was stopped.
+            try:
+                job = self.queue.get(timeout=1.0,
+                                     lanes=lanes)
+
+            except queue.Empty:
+                continue
+
+            #Interactive jobs only read from the DB, so they don't take up
+            #one of the backend's slots.
+            uses_backend = job.getPriority() != jf.JobPriorityEnum.INTERACTIVE
+            batch        = self._getBatch(job=job,
+                                          backend=backend) if uses_backend else [job]
+
+            if uses_backend:
+
+                batch = self._dropAbandoned(batch)
+
+                if len(batch) == 0:
+
+                    continue
+
+            self.queue_log.debug(f"Jobs are: {batch} on {backend}")
+
+            if uses_backend and len(batch) == 1 and self._answerFromCache(batch[0]):
+
+                continue
+
+            #The reservoir may hold the last slot, or the circuit may have
+            #opened since it was checked, so the jobs wait for a free slot.
+            if uses_backend and not backend.acquire():
 
-                self.flush_queue = False
+                self.queue_log.debug(f"No free slot on {backend}, requeueing: {batch}")
+                self.queue.requeue(batch)
+                time.sleep(1.0)
                 continue
 
-            job = self.queue.get()
+            success = self._doWork(batch=batch,
+                                   backend=backend)
+
+            if uses_backend:
+
+                backend.release(success=success)
+
+            self._finishJobs(batch)
+
+            #Only a busy backend needs resting, so the pause follows its
+            #recent load instead of always holding up the worker.
+            pause = backend.getPause(self.job_cooldown) if uses_backend else 0.0
+
+            if pause > 0.0:
+
+                time.sleep(pause)
+        return
+
+    def dispatchJobs(self):
+        """Used instead of the putJob workers when the async SD client is
+           enabled.  A single thread takes jobs from the scheduler and hands
+           them to the client's loop as soon as any backend has a free slot,
+           so many requests can be in flight without a thread for each.
+
+            Input: self - Pointer to the current object instance.
+
+            Output: None - Throws exceptions on error.
+        """
+
+        while self.keep_going:
 
-            self.queue_log.debug(f"Job is: {job}")
             try:
-                job.doWork(web_url=self.web_url)
+                job = self.queue.get(timeout=1.0)
 
-            except Exception as err:
-                self.queue_log.error(f"Exception doing work for Job: {err}, {job}.")
+            except queue.Empty:
+                continue
+
+            if job.getPriority() == jf.JobPriorityEnum.INTERACTIVE:
+
+                self._doWork(batch=[job],
+                             backend=self.backends[0])
+                self._finishJobs([job])
+                continue
 
-            if len(self.jobs[job.getGuild()]) == 0:
+            if self._answerFromCache(job):
 
-                self.queue_log.debug(f"Removing empty Guild {job.getGuild()} from the list.")
-                del self.jobs[job.getGuild()]
                 continue
 
-            metadata = (self.jobs[job.getGuild()]).pop(job.getUserId())
-            self.queue_log.debug(f"Posting job result to Discord from metadata: {metadata}")
-            metadata['loop'].create_task(metadata['post_fn'](job=job, metadata=metadata),
-                                         name="reply")
+            #The job is held until a slot frees up on a backend whose circuit
+            #isn't open, which is no different from it waiting at the front
+            #of the scheduler.
+            backend = self._waitForBackend(job)
+
+            if backend == None:
+
+                continue
 
-            if self.job_cooldown > 0.0:
+            #The first job was checked while waiting for the backend.
+            batch = self._getBatch(job=job,
+                                   backend=backend)
+            batch = batch[:1] + self._dropAbandoned(batch[1:])
 
-                time.sleep(self.job_cooldown)
+            self.queue_log.debug(f"Dispatching jobs: {batch} to {backend}")
+            self.sd_client.submit(self._runJobsAsync(batch=batch,
+                                                     backend=backend))
         return
 
-    def run(self):
-        """Should spawn the process that puts job jobs to the SD server.
-           Is the freamework for multiple concurrent jobs, but will need to be
-           modified to actually support them.
+    async def _runJobsAsync(self,
+                            batch   : list,
+                            backend : bm.Backend):
+        """Runs a batch on the SD client's loop, then returns its backend slot
+           and posts the results.
 
            Input: self - Pointer to the current object instance.
+                  batch - The jobs to send together.
+                  backend - The webui instance whose slot was claimed.
 
-           Output: None - Results are posted to a pipe.
+           Output: None.
+        """
+
+        success  = False
+        rendered = True
+
+        self._recordDispatch(batch)
+        start = time.monotonic()
+
+        if self.progress != None:
+
+            self.progress.start(backend=backend,
+                                batch=batch)
+
+        self._startRunning(backend=backend,
+                           batch=batch)
+
+        try:
+            if len(batch) > 1:
+                await self._retryAsync(work=lambda: jf.doBatchWorkAsync(jobs=batch,
+                                                                        web_url=backend.url,
+                                                                        client=self.sd_client),
+                                       batch=batch,
+                                       backend=backend)
+
+            elif self.result_cache != None and batch[0].getCacheKey() != None:
+
+                rendered = False
+
+                async def compute():
+                    nonlocal rendered
+
+                    rendered = True
+                    await self._retryAsync(work=lambda: batch[0].doWorkAsync(web_url=backend.url,
+                                                                             client=self.sd_client),
+                                           batch=batch,
+                                           backend=backend)
+                    return batch[0].result
+
+                batch[0].setResult(await self.result_cache.fetchAsync(key=batch[0].getCacheKey(),
+                                                                      compute=compute))
+
+            else:
+                await self._retryAsync(work=lambda: batch[0].doWorkAsync(web_url=backend.url,
+                                                                         client=self.sd_client),
+                                       batch=batch,
+                                       backend=backend)
+
+            success = True
+            elapsed = time.monotonic() - start
+
+            if rendered:
+
+                self._recordRequest(batch=batch,
+                                    backend=str(backend.id),
+                                    elapsed=elapsed,
+                                    success=True)
+                self._recordServiceTime(batch=batch,
+                                        backend=backend,
+                                        elapsed=elapsed)
+
+            for job in batch:
+
+                self._journal(state=jj.JournalStateEnum.COMPLETED,
+                              job=job)
+
+        except Exception as err:
+            self.queue_log.error(f"Exception doing async work for Jobs: {err}, {batch} on {backend}.")
+
+            if rendered:
+
+                self._recordRequest(batch=batch,
+                                    backend=str(backend.id),
+                                    elapsed=time.monotonic() - start,
+                                    success=False)
+            #A request that timed out is still being rendered.
+            self._interruptAbandoned()
+
+        self._stopRunning(backend=backend,
+                          batch=batch)
+        self._finishJobs(batch)
+
+        pause = backend.getPause(self.job_cooldown)
+
+        if pause > 0.0:
+
+            await asyncio.sleep(pause)
+
+        #A result another request rendered says nothing about the backend.
+        backend.release(success=success if rendered else None)
+        self.free_slots.release()
+
+    def _doWork(self,
+                batch   : list,
+                backend : bm.Backend) -> Optional[bool]:
+        """Runs a batch of jobs on a backend, blocking until it's done.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs to send together.
+                  backend - The webui instance to send them to.
+
+           Output: bool - Whether the work completed without an exception, or
+                          None if the webui wasn't asked, like when another
+                          request rendered a cached result.
         """
-        self.queue_log.info(f"Queue Manager {self.id} starting workers.")
-        #This may, someday, need to be a proper multiprocessing queue.
-        #jobs = [QueueObject(x) for x in range(self.depth)], in a loop
+
+        self._recordDispatch(batch)
+        start = time.monotonic()
+
+        if self.progress != None:
+
+            self.progress.start(backend=backend,
+                                batch=batch)
+
+        #Interactive jobs never reach the webui, so there's nothing to
+        #interrupt.
+        uses_backend = batch[0].getPriority() != jf.JobPriorityEnum.INTERACTIVE
+        rendered     = uses_backend
+
+        if uses_backend:
+
+            self._startRunning(backend=backend,
+                               batch=batch)
+
+        try:
+            if len(batch) > 1:
+                self._retry(work=lambda: jf.doBatchWork(jobs=batch,
+                                                        web_url=backend.url),
+                            batch=batch,
+                            backend=backend)
+
+            elif self.result_cache != None and batch[0].getCacheKey() != None:
+
+                rendered = False
+
+                def compute():
+                    nonlocal rendered
+
+                    rendered = True
+                    self._retry(work=lambda: batch[0].doWork(web_url=backend.url),
+                                batch=batch,
+                                backend=backend)
+                    return batch[0].result
+
+                batch[0].setResult(self.result_cache.fetch(key=batch[0].getCacheKey(),
+                                                           compute=compute))
+
+            else:
+                self._retry(work=lambda: batch[0].doWork(web_url=backend.url),
+                            batch=batch,
+                            backend=backend)
+
+            elapsed = time.monotonic() - start
+
+            #Only renders say how long the webui takes.
+            if rendered:
+
+                self._recordRequest(batch=batch,
+                                    backend=str(backend.id),
+                                    elapsed=elapsed,
+                                    success=True)
+                self._recordServiceTime(batch=batch,
+                                        backend=backend,
+                                        elapsed=elapsed)
+
+            for job in batch:
+
+                self._journal(state=jj.JournalStateEnum.COMPLETED,
+                              job=job)
+
+            return True if rendered or not uses_backend else None
+
+        except Exception as err:
+            self.queue_log.error(f"Exception doing work for Jobs: {err}, {batch} on {backend}.")
+
+            if rendered:
+
+                self._recordRequest(batch=batch,
+                                    backend=str(backend.id),
+                                    elapsed=time.monotonic() - start,
+                                    success=False)
+
+            #A request that timed out is still being rendered.
+            self._interruptAbandoned()
+
+        finally:
+            if uses_backend:
+
+                self._stopRunning(backend=backend,
+                                  batch=batch)
+
+        return False if rendered or not uses_backend else None
+
+    def _answerFromCache(self,
+                         job : jf.Job) -> bool:
+        """Posts a job's result straight from the result cache, so a repeated
+           request doesn't take up one of a backend's slots.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job about to be worked on.
+
+           Output: bool - Whether the job was answered and finished.
+        """
+
+        if self.result_cache == None or job.getCacheKey() == None:
+
+            return False
+
+        result = self.result_cache.get(job.getCacheKey())
+
+        if result == None:
+
+            return False
+
+        self._recordDispatch([job])
+        job.setResult(result)
+        self._journal(state=jj.JournalStateEnum.COMPLETED,
+                      job=job)
+        self._finishJobs([job])
+
+        return True
+
+    def _recordDispatch(self,
+                        batch : list):
+        """Records that a worker took a batch, and how long its jobs waited
+           in the queue.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs about to be worked on.
+
+           Output: None.
+        """
+
+        for job in batch:
+
+            self._journal(state=jj.JournalStateEnum.DISPATCHED,
+                          job=job)
+            wait = job.getWaitTime()
+
+            if wait != None:
+
+                self.job_waits.observe(wait,
+                                       lane=job.getPriority().name.lower())
+
+    def _recordRequest(self,
+                       batch   : list,
+                       backend : str,
+                       elapsed : float,
+                       success : bool):
+        """Records how long a batch's webui call took and counts its jobs
+           towards the backend's throughput.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs that were worked on.
+                  backend - The backend's ID, or 'remote' for remote workers.
+                  elapsed - How long the work took, in seconds.
+                  success - Whether the call succeeded.
+
+           Output: None.
+        """
+
+        result = "success" if success else "failure"
+
+        self.request_times.observe(elapsed,
+                                   backend=backend,
+                                   result=result)
+        self.backend_jobs.inc(len(batch),
+                              backend=backend,
+                              result=result)
+
+    def _recordServiceTime(self,
+                           batch   : list,
+                           backend : bm.Backend,
+                           elapsed : float):
+        """Records how long each job in a finished batch held its backend
+           slot.  The pause after the job holds the slot too, and a batch's
+           jobs share its time.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs that were worked on.
+                  backend - The webui instance that ran them.
+                  elapsed - How long the work took, in seconds.
+
+           Output: None.
+        """
+
+        seconds = (elapsed + backend.getPause(self.job_cooldown)) / len(batch)
+
+        for job in batch:
+
+            self.estimator.record(job=job,
+                                  seconds=seconds)
+
+    def _getRetryDelay(self,
+                       attempt : int,
+                       batch   : list,
+                       backend : bm.Backend) -> Optional[float]:
+        """Returns how long to wait before retrying a failed request.  The
+           wait is a random fraction of an exponentially growing delay, so
+           workers that failed together don't all retry together.
+
+           Input: self - Pointer to the current object instance.
+                  attempt - How many attempts have failed so far.
+                  batch - The jobs being worked on.
+                  backend - The webui instance the jobs were sent to.
+
+           Output: float - Seconds to wait, or None if the request shouldn't
+                           be retried.
+        """
+
+        if attempt >= self.retry_attempts or not backend.isAvailable():
+
+            return None
+
+        delay = random.uniform(0.0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1)))
+
+        #Retrying a job that can't finish in time only delays the ones behind
+        #it.
+        if any(x.deadline != None and time.monotonic() + delay >= x.deadline for x in batch):
+
+            return None
+
+        return delay
+
+    def _checkResults(self,
+                      batch : list):
+        """Fails a batch the webui answered with an error, so it's retried
+           and counted against the backend like one that got no answer.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs that were just worked on.
+
+           Output: None - Throws requests.HTTPError if a job's request failed.
+        """
+
+        #Interactive jobs never reach the webui.
+        if batch[0].getPriority() == jf.JobPriorityEnum.INTERACTIVE:
+
+            return
+
+        for job in batch:
+
+            if job.getStatusCode() != 200:
+
+                raise req.exceptions.HTTPError(f"The webui answered job {job.getJobId()} with {job.getStatusCode()} {job.getReason()}")
+
+    def _retry(self,
+               work    : Callable,
+               batch   : list,
+               backend : bm.Backend):
+        """Calls 'work' until it succeeds or can't be retried.  Only the final
+           outcome counts towards the backend's circuit breaker.
+
+           Input: self - Pointer to the current object instance.
+                  work - Sends the jobs' request when called.
+                  batch - The jobs being worked on.
+                  backend - The webui instance the jobs are sent to.
+
+           Output: None - Throws the last exception if every attempt failed.
+        """
+
+        attempt = 0
+
+        while True:
+
+            try:
+                result = work()
+                self._checkResults(batch)
+
+                return result
+
+            except Exception as err:
+                attempt += 1
+                delay    = self._getRetryDelay(attempt=attempt,
+                                               batch=batch,
+                                               backend=backend)
+
+                if delay == None:
+
+                    raise
+
+                self.queue_log.warning(f"Attempt {attempt} failed for Jobs: {batch} on {backend}, retrying in {delay:.2f}s: {err}")
+                time.sleep(delay)
+
+    async def _retryAsync(self,
+                          work    : Callable[[], Awaitable],
+                          batch   : list,
+                          backend : bm.Backend):
+        """The same as _retry, for work done on the SD client's loop.
+
+           Input: self - Pointer to the current object instance.
+                  work - Returns an awaitable that sends the jobs' request.
+                  batch - The jobs being worked on.
+                  backend - The webui instance the jobs are sent to.
+
+           Output: None - Throws the last exception if every attempt failed.
+        """
+
+        attempt = 0
+
+        while True:
+
+            try:
+                result = await work()
+                self._checkResults(batch)
+
+                return result
+
+            except Exception as err:
+                attempt += 1
+                delay    = self._getRetryDelay(attempt=attempt,
+                                               batch=batch,
+                                               backend=backend)
+
+                if delay == None:
+
+                    raise
+
+                self.queue_log.warning(f"Attempt {attempt} failed for Jobs: {batch} on {backend}, retrying in {delay:.2f}s: {err}")
+                await asyncio.sleep(delay)
+
+    def _dropAbandoned(self,
+                       batch : list) -> list:
+        """Fails any jobs whose deadline passed while they waited, so their
+           users hear back instead of the jobs holding up a backend.  Jobs
+           cancelled after leaving the scheduler are dropped silently.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs about to be worked on.
+
+           Output: list - The jobs that still have time left.
+        """
+
+        with self.cancel_lock:
+
+            cancelled = [x for x in batch if x.getJobId() in self.cancelled]
+
+        expired = [x for x in batch if x.isExpired() and x not in cancelled]
+
+        if len(cancelled) > 0:
+
+            self._finishJobs(cancelled)
+
+        if len(expired) == 0:
+
+            return [x for x in batch if x not in cancelled]
+
+        for job in expired:
+
+            job.setResult(sc.SDResponse(status_code = 504,
+                                        reason      = "Timed out waiting for a webui backend.",
+                                        data        = {}))
+
+        self.queue_log.warning(f"Dropping expired Jobs: {expired}")
+        self._finishJobs(expired)
+
+        return [x for x in batch if x not in expired and x not in cancelled]
+
+    def _waitForBackend(self,
+                        job : jf.Job) -> Optional[bm.Backend]:
+        """Claims a free slot on a backend whose circuit isn't open, waiting
+           for one if needed.  Used by the async dispatcher.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job the slot is for.
+
+           Output: Backend - The claimed backend, or None if the Manager was
+                             stopped or the job expired while waiting.
+        """
+
+        while self.keep_going:
+
+            if len(self._dropAbandoned([job])) == 0:
+
+                return None
+
+            if not self.free_slots.acquire(timeout=1.0):
+
+                continue
+
+            stage   = bm.STAGE_UPSCALE if job.getPriority() == jf.JobPriorityEnum.UPSCALE else bm.STAGE_TXT2IMG
+            backend = next((x for x in self.backends if x.hasStage(stage) and x.acquire()), None)
+
+            if backend != None:
+
+                return backend
+
+            #Every backend with a free slot has an open circuit, or can't
+            #run the job's stage.
+            self.free_slots.release()
+            time.sleep(1.0)
+
+        return None
+
+    def probeBackends(self):
+        """Periodically checks every backend's health endpoint so failures
+           are noticed before a job is sent to a dead backend, and backends
+           with an open circuit are closed again as soon as they recover.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.keep_going:
+
+            for backend in self.backends:
+
+                result = backend.probe(timeout=self.probe_timeout)
+
+                if result == False:
+
+                    self.queue_log.warning(f"Health probe failed for {backend}.")
+
+            time.sleep(self.probe_interval)
+
+    def _takeRemoteJob(self,
+                       timeout : float) -> Optional[jf.Job]:
+        """Takes a job a remote worker can run from the scheduler.  Given to
+           the broker.
+
+           Input: self - Pointer to the current object instance.
+                  timeout - How many seconds to wait for one.
+
+           Output: Job - The job to send, or None if there wasn't one.
+        """
+
+        try:
+            job = self.queue.get(timeout=timeout,
+                                 lanes=REMOTE_LANES)
+
+        except queue.Empty:
+            return None
+
+        if len(self._dropAbandoned([job])) == 0:
+
+            return None
+
+        self._recordDispatch([job])
+
+        return job
+
+    def _finishRemoteJob(self,
+                         job     : jf.Job,
+                         elapsed : float):
+        """Records a job a remote worker ran and posts its result.  Given to
+           the broker.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job, with its result set.
+                  elapsed - How many seconds the worker had it.
+
+           Output: None.
+        """
+
+        self._recordRequest(batch=[job],
+                            backend="remote",
+                            elapsed=elapsed,
+                            success=job.getStatusCode() == 200)
+
+        if job.getStatusCode() == 200:
+
+            self.estimator.record(job=job,
+                                  seconds=elapsed)
+            self._journal(state=jj.JournalStateEnum.COMPLETED,
+                          job=job)
+
+        self._finishJobs([job])
+
+    def isReportingProgress(self,
+                            job : jf.Job) -> bool:
+        """Returns whether a job's command response will be edited with its
+           progress, and so shouldn't be deleted by the caller.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job that was added.
+
+           Output: bool - True if the job's progress is being reported.
+        """
+
+        return self.progress != None and self.progress.isWatching(job)
+
+    def reportProgress(self):
+        """Polls the progress of running jobs and updates their responses
+           until the Manager is stopped.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.keep_going:
+
+            try:
+                self.progress.poll()
+
+            except Exception as err:
+                self.queue_log.error(f"Exception reporting job progress: {err}")
+
+            time.sleep(self.progress.poll_interval)
+
+    def _finishJobs(self,
+                    batch : list):
+        """Releases each job's reservation and posts its result to Discord.
+
+           Input: self - Pointer to the current object instance.
+                  batch - The jobs that were worked on.
+
+           Output: None.
+        """
+
+        if self.progress != None:
+
+            self.progress.finish(batch)
+
+        cancelled = self._untrack(batch)
+
+        for job in batch:
+
+            #A cancelled job's reservation was already released, and may
+            #belong to the user's next job by now.
+            if job.getJobId() in cancelled:
+
+                self.queue_log.debug(f"Job {job.getJobId()} was cancelled, dropping the result.")
+                self._journal(state=jj.JournalStateEnum.DROPPED,
+                              job=job)
+                continue
+
+            #The base image is only posted once it's upscaled, unless the
+            #upscale couldn't be queued.
+            if job.getUpscale() != None and job.getStatusCode() == 200 and self._queueUpscale(job):
+
+                continue
+
+            metadata = self.queue.release(job)
+
+            if metadata == None:
+
+                self.queue_log.debug(f"No reservation for job {job} in Guild {job.getGuild()}, dropping the result.")
+                self._journal(state=jj.JournalStateEnum.DROPPED,
+                              job=job)
+                continue
+
+            #A failed upscale falls back to its base image, which was already
+            #posted if previews are on.
+            if job.getBaseJob() != None and job.getStatusCode() != 200:
+
+                self.queue_log.warning(f"Unable to upscale job {job.getJobId()}, keeping its base image: {job.getStatusCode()} {job.getReason()}")
+
+                if self.upscale_preview:
+
+                    self._journal(state=jj.JournalStateEnum.POSTED,
+                                  job=job)
+                    continue
+
+                job = job.getBaseJob()
+
+            self._submitPost(job=job,
+                             metadata=metadata)
+
+    def _queueUpscale(self,
+                      job : jf.Job) -> bool:
+        """Queues the upscale stage of a job whose base image is done.  The
+           job keeps its reservation until the upscale is posted.
+
+           Input: self - Pointer to the current object instance.
+                  job - The finished base job.
+
+           Output: bool - Whether the upscale was queued.  If not, the base
+                          image should be posted as the job's result.
+        """
+
+        metadata = self.queue.getMetadata(job)
+
+        if metadata == None:
+
+            return False
+
+        try:
+            upscale = jf.UpscaleJob(job)
+
+        except Exception as err:
+            self.queue_log.error(f"Unable to start the upscale of job {job.getJobId()}, posting its base image: {err}")
+            return False
+
+        self._track(upscale)
+        upscale.setQueuedTime(time.monotonic())
+
+        try:
+            self.queue.put(upscale)
+
+        except queue.Full:
+            self._untrack([upscale])
+            self.queue_log.warning(f"No room to upscale job {job.getJobId()}, posting its base image.")
+            return False
+
+        if self.upscale_preview:
+
+            self._submitPost(job=job,
+                             metadata=metadata,
+                             final=False)
+
+        return True
+
+    def _submitPost(self,
+                    job      : jf.Job,
+                    metadata : dict,
+                    final    : bool = True):
+        """Posts a job from the post pool, or right away without one.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to post.
+                  metadata - The job's Discord context and event loop.
+                  final - Whether this is the job's result, rather than a
+                          preview.
+
+           Output: None.
+        """
+
+        if self.post_pool != None:
+
+            self.post_pool.submit(self._postJob,
+                                  job=job,
+                                  metadata=metadata,
+                                  final=final)
+
+        else:
+
+            self._postJob(job=job,
+                          metadata=metadata,
+                          final=final)
+
+    def _postJob(self,
+                 job      : jf.Job,
+                 metadata : dict,
+                 final    : bool = True):
+        """Prepares a finished job's response, then hands it to the main
+           asyncio loop to send.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to post.
+                  metadata - The job's Discord context and event loop.
+                  final - Whether this is the job's result, rather than a
+                          preview.
+
+           Output: None.
+        """
+
+        #Failed jobs only post their error.
+        if job.getStatusCode() == 200:
+
+            start = time.monotonic()
+
+            try:
+                job.preparePost(metadata=metadata,
+                                encoder=self.image_encoder)
+
+            except Exception as err:
+                #post() tries again and reports the error from the loop.
+                self.queue_log.error(f"Unable to prepare job {job} for posting: {err}")
+
+            #A roll the user had already done for the day leaves its image
+            #for someone else.
+            self._returnPrerendered(job.getUnusedPrerendered())
+
+            self.post_times.observe(time.monotonic() - start,
+                                    stage="prepare")
+
+        self.queue_log.debug(f"Posting job result to Discord from metadata: {metadata}")
+        #asyncio loops aren't thread safe, so the post is handed to the loop
+        #to start on its own thread.
+        metadata['loop'].call_soon_threadsafe(self._sendPost, job, metadata, time.monotonic())
+
+        if final:
+
+            self._journal(state=jj.JournalStateEnum.POSTED,
+                          job=job)
+
+    def _sendPost(self,
+                  job      : jf.Job,
+                  metadata : dict,
+                  sent     : float):
+        """Starts sending a prepared job's response.  Must be run on the
+           job's asyncio loop.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to post.
+                  metadata - The job's Discord context and event loop.
+                  sent - When the post was handed to the loop.
+
+           Output: None.
+        """
+
+        task = metadata['loop'].create_task(metadata['post_fn'](job=job, metadata=metadata),
+                                            name="reply")
+        #Sending includes waiting for the loop to get to the task.
+        task.add_done_callback(lambda x: self.post_times.observe(time.monotonic() - sent,
+                                                                 stage="send"))
+
+    def _estimateWait(self,
+                      job : jf.Job) -> float:
+        """Returns how long a new job would take to finish given the current
+           queue and the recent service times of each job type.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job being admitted.
+
+           Output: float - The expected seconds until the job finishes.
+        """
+
+        #Interactive jobs skip the backends, so they're never held up.
+        if job.getPriority() == jf.JobPriorityEnum.INTERACTIVE:
+
+            return 0.0
+
+        usable = [x for x in self.backends if x.isAvailable()] if self.local_workers else []
+        #Remote workers each run one job at a time.
+        remote = self.broker.getWorkerCount() if self.broker != None else 0
+
+        return self.estimator.estimateWait(job       = job,
+                                           waiting   = self.queue.getWaiting(),
+                                           weights   = self.queue.weights,
+                                           in_flight = sum(x.active for x in usable),
+                                           slots     = sum(x.max_jobs for x in usable) + remote)
+
+    def _returnPrerendered(self,
+                           entry : Optional[dict]):
+        """Puts a pre-rendered roll back in the reservoir if a job that took
+           it couldn't be queued.
+
+           Input: self - Pointer to the current object instance.
+                  entry - The roll, or None if the job didn't take one.
+
+           Output: None.
+        """
+
+        if entry != None:
+
+            self.reservoir.putBack(entry)
+
+    def fillReservoir(self):
+        """Renders rolls into the Roll Reservoir whenever no jobs are waiting
+           and a backend is idle.  A job that arrives mid-render waits for at
+           most one image, since the webui runs requests in order.  With the
+           async dispatcher, each render also takes one of its free slots.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.keep_going:
+
+            backend = next((x for x in self.backends if x.isIdle() and x.hasStage(bm.STAGE_TXT2IMG)), None)
+            ready   = not self.reservoir.isFull() and self.queue.qsize() == 0 and backend != None
+            #The dispatcher only looks for a backend once it has a free slot,
+            #so a render that skipped the count would leave it claiming a slot
+            #that doesn't exist until the render finishes.
+            slot    = ready and (self.free_slots == None or self.free_slots.acquire(blocking=False))
+
+            if not slot or not backend.acquire():
+
+                if slot and self.free_slots != None:
+
+                    self.free_slots.release()
+
+                time.sleep(self.reservoir.poll_interval)
+                continue
+
+            success = False
+
+            try:
+                success = self.reservoir.render(web_url=backend.url,
+                                                timeout=self.job_deadline if self.job_deadline > 0.0 else None)
+                self.queue_log.debug(f"Rendered a roll for the reservoir on {backend}, {len(self.reservoir)} ready.")
+
+            except Exception as err:
+                self.queue_log.error(f"Exception rendering a roll for the reservoir on {backend}: {err}")
+
+            backend.release(success=success)
+
+            if self.free_slots != None:
+
+                self.free_slots.release()
+
+            if not success:
+
+                time.sleep(self.reservoir.poll_interval)
+
+    def setReservoir(self,
+                     reservoir):
+        """Gives the Manager a Roll Reservoir to hand out and fill.  Must be
+           called before run().
+
+           Input: self - Pointer to the current object instance.
+                  reservoir - The RollReservoir to use.
+
+           Output: None.
+        """
+
+        self.reservoir = reservoir
+
+    def _journal(self,
+                 state : jj.JournalStateEnum,
+                 job   : jf.Job,
+                 info  : Optional[dict] = None):
+        """Records a job's state change if the journal is enabled.  Journal
+           errors are logged rather than failing the job.
+
+           Input: self - Pointer to the current object instance.
+                  state - The job's new state.
+                  job - The job whose state changed.
+                  info - Data needed to replay the job, if it was queued.
+
+           Output: None.
+        """
+
+        if self.journal == None:
+
+            return
+
+        try:
+            self.journal.record(state=state,
+                                job=job,
+                                info=info)
+
+        except Exception as err:
+            self.queue_log.error(f"Unable to journal job {job} as {state.name}: {err}")
+
+    def recover(self) -> list:
+        """Returns the jobs the last run accepted but never posted, and marks
+           them dropped.  The caller decides which can be replayed through
+           add() and which can only be reported.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: list - (JournalStateEnum, Job, info dict) tuples.
+        """
+
+        if self.journal == None:
+
+            return []
+
+        pending = self.journal.getPending()
+
+        for state, job, info in pending:
+
+            self.queue_log.warning(f"Recovered job {job.getJobId()} from user {job.getUserId()} left {state.name}.")
+            self._journal(state=jj.JournalStateEnum.DROPPED,
+                          job=job)
+
+        return pending
+
+    def _getBatch(self,
+                  job     : jf.Job,
+                  backend : bm.Backend) -> list:
+        """Gathers jobs that can share a webui call with the given job.  Waits
+           up to 'batch_window' seconds for enough compatible jobs to fill the
+           backend's batch, taking them from the job's own lane.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job that was just taken from the scheduler.
+                  backend - The webui instance the batch will be sent to.
+
+           Output: list - The jobs to send, starting with the given job.
+        """
+
+        batch = [job]
+        key   = job.getBatchKey()
+
+        if key == None or backend.max_batch <= 1:
+
+            return batch
+
+        deadline = time.monotonic() + self.batch_window
+
+        while True:
+
+            batch += self.queue.take(priority = job.getPriority(),
+                                     key      = key,
+                                     limit    = backend.max_batch - len(batch))
+            remaining = deadline - time.monotonic()
+
+            if len(batch) >= backend.max_batch or remaining <= 0.0:
+
+                break
+
+            self.queue.wait(timeout=remaining)
+
+        return batch
+
+    def _getBackendLanes(self,
+                         backend : bm.Backend) -> Optional[tuple]:
+        """Returns the lanes a backend's workers should serve, based on the
+           stages it runs.
+
+           Input: self - Pointer to the current object instance.
+                  backend - The webui instance the workers are bound to.
+
+           Output: tuple - The lanes to serve, or None for all of them.
+        """
+
+        if not backend.hasStage(bm.STAGE_UPSCALE):
+
+            return tuple(x for x in jf.JobPriorityEnum if x != jf.JobPriorityEnum.UPSCALE)
+
+        if not backend.hasStage(bm.STAGE_TXT2IMG):
+
+            return (jf.JobPriorityEnum.UPSCALE,)
+
+        return None
+
+    def run(self):
+        """Spawns the worker threads that put jobs to the SD servers.  Each
+           backend gets as many workers as its 'job_count' allows, all pulling
+           from the same scheduler, plus any interactive-only workers.  With
+           the async SD client, a single dispatcher replaces the per-slot
+           workers.  With the broker, remote workers pull jobs too, and may
+           replace the local backends entirely.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None - Results are posted to a pipe.
+        """
+        self.queue_log.info(f"Queue Manager {self.id} starting workers for backends: {self.backends}")
+
+        if not self.local_workers:
+
+            self.queue_log.info(f"Queue Manager {self.id} is leaving the rendering to remote workers.")
+
+        elif self.sd_client != None:
+
+            self.free_slots = th.Semaphore(sum(x.max_jobs for x in self.backends))
+            worker          = th.Thread(target = self.dispatchJobs,
+                                        name   = f"Queue {self.id} async dispatcher",
+                                        daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+        else:
+
+            for backend in self.backends:
+
+                for slot in range(backend.max_jobs):
+
+                    worker = th.Thread(target = self.putJob,
+                                       args   = (backend, self._getBackendLanes(backend)),
+                                       name   = f"Queue {self.id} backend {backend.id} worker {slot}",
+                                       daemon = True)
+                    self.workers.append(worker)
+                    worker.start()
+
+        if self.metrics_server != None:
+
+            self.metrics_server.start()
+            self.queue_log.info(f"Queue Manager {self.id} serving metrics on port {self.metrics_server.getPort()}.")
+
+        if self.broker != None:
+
+            self.broker.listen()
+            worker = th.Thread(target = self.broker.acceptWorkers,
+                               name   = f"Queue {self.id} broker",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+        if self.probe_interval > 0.0 and self.local_workers:
+
+            worker = th.Thread(target = self.probeBackends,
+                               name   = f"Queue {self.id} health probe",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+        if self.progress != None:
+
+            worker = th.Thread(target = self.reportProgress,
+                               name   = f"Queue {self.id} progress reporter",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+        if self.reservoir != None and self.local_workers:
+
+            worker = th.Thread(target = self.fillReservoir,
+                               name   = f"Queue {self.id} roll reservoir",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
+
+        #Without local workers, nothing else would serve interactive jobs.
+        interactive_workers = self.interactive_workers if self.local_workers else max(1, self.interactive_workers)
+
+        for slot in range(interactive_workers):
+
+            worker = th.Thread(target = self.putJob,
+                               args   = (self.backends[0], INTERACTIVE_LANES),
+                               name   = f"Queue {self.id} interactive worker {slot}",
+                               daemon = True)
+            self.workers.append(worker)
+            worker.start()
@@ -0,0 +1,237 @@
+#Limits how quickly users, Guilds, and the bot as a whole may submit jobs.
+#Each scope uses token buckets, which allow short bursts while holding the
+#long-term rate to the bucket's refill rate.
+
+
+#####  Imports  #####
+
+import collections as co
+from enum import IntEnum, verify, UNIQUE
+import threading as th
+import time
+from typing import Optional
+
+#####  Enum Classes  #####
+
+@verify(UNIQUE)
+class LimitScopeEnum(IntEnum):
+
+    USER   = 0
+    GUILD  = 1
+    GLOBAL = 2
+
+#####  Bucket Class  #####
+
+class TokenBucket:
+
+    def __init__(self,
+                 rate  : float,
+                 burst : float,
+                 now   : float):
+        """Creates a full bucket.
+
+           Input: self - Pointer to the current object instance.
+                  rate - How many tokens are added per second.
+                  burst - The most tokens the bucket holds.
+                  now - The current time.monotonic() time.
+
+           Output: None.
+        """
+
+        self.burst   = burst
+        self.rate    = rate
+        self.tokens  = burst
+        self.updated = now
+
+    def _refill(self,
+                now : float):
+        """Adds the tokens earned since the last update.
+
+           Input: self - Pointer to the current object instance.
+                  now - The current time.monotonic() time.
+
+           Output: None.
+        """
+
+        self.tokens  = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def getWait(self,
+                now : float) -> float:
+        """Returns how long until the bucket has a token.
+
+           Input: self - Pointer to the current object instance.
+                  now - The current time.monotonic() time.
+
+           Output: float - Seconds to wait, 0 if a token is available.
+        """
+
+        self._refill(now)
+
+        if self.tokens >= 1.0:
+
+            return 0.0
+
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        """Removes a token.  getWait must have just returned 0.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.tokens -= 1.0
+
+    def give(self):
+        """Returns a token that was taken, up to the bucket's size.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+    def isFull(self,
+               now : float) -> bool:
+        """Returns whether the bucket would be full by now, and so is no
+           different from a new one.
+
+           Input: self - Pointer to the current object instance.
+                  now - The current time.monotonic() time.
+
+           Output: bool - True if the bucket can be forgotten.
+        """
+
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+#####  Limiter Class  #####
+
+class RateLimiter:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates a limiter with no history.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the 'per_minute' rate and 'burst' size
+                         for the 'user', 'guild', and 'global' scopes.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.limits = {}
+        self.lock   = th.Lock()
+
+        for scope in LimitScopeEnum:
+
+            limit = opts[scope.name.lower()]
+            rate  = float(limit['per_minute']) / 60.0
+            burst = float(limit['burst'])
+
+            if rate <= 0.0 or burst < 1.0:
+
+                raise ValueError(f"The {scope.name.lower()} rate limit needs a positive rate and a burst of at least 1, not {rate * 60.0} and {burst}!")
+
+            self.limits[scope] = (rate, burst)
+
+        #Scope -> ID -> bucket, least recently used first.  The global scope
+        #has a single bucket.
+        self.buckets = {scope : co.OrderedDict() for scope in LimitScopeEnum}
+
+    def _getBucket(self,
+                   scope : LimitScopeEnum,
+                   key   : object,
+                   now   : float) -> TokenBucket:
+        """Returns the bucket for an ID, creating it if needed.  A bucket that
+           would have refilled is the same as a new one, so the least recently
+           used bucket is dropped if it has, keeping memory bounded without
+           a scan.  Must be called with the lock held.
+
+           Input: self - Pointer to the current object instance.
+                  scope - Which kind of ID the key is.
+                  key - The user or Guild ID.
+                  now - The current time.monotonic() time.
+
+           Output: TokenBucket - The ID's bucket.
+        """
+
+        buckets = self.buckets[scope]
+
+        if len(buckets) > 0:
+
+            oldest_key, oldest = next(iter(buckets.items()))
+
+            if oldest_key != key and oldest.isFull(now):
+
+                del buckets[oldest_key]
+
+        if key not in buckets:
+
+            rate, burst  = self.limits[scope]
+            buckets[key] = TokenBucket(rate  = rate,
+                                       burst = burst,
+                                       now   = now)
+
+        buckets.move_to_end(key)
+
+        return buckets[key]
+
+    def check(self,
+              user_id  : int,
+              guild_id : int) -> Optional[tuple]:
+        """Takes a token from the user's, Guild's, and global buckets if all
+           three have one.  Nothing is taken if any of them is empty.
+
+           Input: self - Pointer to the current object instance.
+                  user_id - The user submitting the job.
+                  guild_id - The Guild the job was submitted from.
+
+           Output: tuple - The (LimitScopeEnum, seconds to wait) of the limit
+                           hit, or None if the job may proceed.
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            buckets = {LimitScopeEnum.USER   : self._getBucket(LimitScopeEnum.USER, user_id, now),
+                       LimitScopeEnum.GUILD  : self._getBucket(LimitScopeEnum.GUILD, guild_id, now),
+                       LimitScopeEnum.GLOBAL : self._getBucket(LimitScopeEnum.GLOBAL, None, now)}
+
+            for scope, bucket in buckets.items():
+
+                wait = bucket.getWait(now)
+
+                if wait > 0.0:
+
+                    return (scope, wait)
+
+            for bucket in buckets.values():
+
+                bucket.take()
+
+        return None
+
+    def refund(self,
+               user_id  : int,
+               guild_id : int):
+        """Gives back the tokens check() took for a job that was turned away
+           afterwards, so a rejected job costs nothing.
+
+           Input: self - Pointer to the current object instance.
+                  user_id - The user that submitted the job.
+                  guild_id - The Guild the job was submitted from.
+
+           Output: None.
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            self._getBucket(LimitScopeEnum.USER, user_id, now).give()
+            self._getBucket(LimitScopeEnum.GUILD, guild_id, now).give()
+            self._getBucket(LimitScopeEnum.GLOBAL, None, now).give()
@@ -0,0 +1,147 @@
+#Keeps a small stock of pre-rendered /roll images.  Rolls take no user input,
+#so they can be rendered whenever the webui backends would otherwise be idle
+#and handed out instantly, smoothing the rush after each daily reset.
+
+
+#####  Imports  #####
+
+import collections as co
+import requests as req
+import src.characters.ProfileGenerator as pg
+import src.utilities.SDClient as sc
+import threading as th
+from typing import Optional
+from urllib.parse import urljoin
+
+#####  Reservoir Class  #####
+
+class RollReservoir:
+
+    def __init__(self,
+                 opts    : dict,
+                 prompt  : str,
+                 tag_rng):
+        """Creates an empty reservoir.  The Queue Manager fills it while its
+           backends are idle.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the reservoir 'depth' and how often to
+                         check for idle backends.
+                  prompt - The base prompt every roll uses.
+                  tag_rng - The Tag Randomizer that adds tags to each roll.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.depth         = int(opts['depth'])
+        self.entries       = co.deque()
+        self.lock          = th.Lock()
+        self.poll_interval = float(opts['poll_interval'])
+        self.prompt        = prompt
+        self.tag_rng       = tag_rng
+
+    def __len__(self) -> int:
+        """Returns how many rolls are ready.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: int - The number of pre-rendered rolls.
+        """
+
+        with self.lock:
+
+            return len(self.entries)
+
+    def isFull(self) -> bool:
+        """Returns whether the reservoir has as many rolls as it may hold.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if no more rolls should be rendered.
+        """
+
+        return len(self) >= self.depth
+
+    def render(self,
+               web_url : str,
+               timeout : Optional[float] = None) -> bool:
+        """Renders a roll the same way a RollJob would and stores it.  Blocks
+           until the webui responds.
+
+           Input: self - Pointer to the current object instance.
+                  web_url - The idle backend to render on.
+                  timeout - How long the webui may take, or None to wait
+                            forever.
+
+           Output: bool - Whether a roll was added.
+        """
+
+        post_data           = pg.getDefaultJobData()
+        post_data['prompt'] = self.prompt
+        post_data['seed']   = -1
+
+        tag_data                 = self.tag_rng.getRandomTags(int(post_data['tag_cnt']))
+        post_data['prompt']     += tag_data[0]
+        post_data['tags_added']  = tag_data[1]
+
+        result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=post_data, timeout=timeout)
+
+        if result.status_code != 200:
+
+            return False
+
+        entry = {'post_data' : post_data,
+                 'prompt'    : self.prompt,
+                 'result'    : sc.SDResponse(status_code = result.status_code,
+                                             reason      = result.reason,
+                                             data        = result.json())}
+
+        with self.lock:
+
+            if len(self.entries) >= self.depth:
+
+                return False
+
+            self.entries.append(entry)
+
+        return True
+
+    def take(self,
+             prompt : Optional[str]) -> Optional[dict]:
+        """Removes the oldest roll rendered from the given base prompt.
+
+           Input: self - Pointer to the current object instance.
+                  prompt - The base prompt the caller's roll would use.
+
+           Output: dict - The roll's post data and result, or None if there
+                          isn't one.
+        """
+
+        if prompt == None:
+
+            return None
+
+        with self.lock:
+
+            for entry in self.entries:
+
+                if entry['prompt'] == prompt:
+
+                    self.entries.remove(entry)
+                    return entry
+
+        return None
+
+    def putBack(self,
+                entry : dict):
+        """Returns an unused roll to the front of the reservoir.
+
+           Input: self - Pointer to the current object instance.
+                  entry - A roll from take().
+
+           Output: None.
+        """
+
+        with self.lock:
+
+            self.entries.appendleft(entry)
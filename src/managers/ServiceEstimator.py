@@ -0,0 +1,144 @@
+#Estimates how long jobs take on a backend and how long a new job would wait
+#behind the ones already queued, so the Queue Manager can turn away work it
+#can't finish in a reasonable time instead of letting it time out.
+
+
+#####  Imports  #####
+
+import math
+import src.utilities.JobFactory as jf
+import threading as th
+
+#####  Package Functions  #####
+
+def formatDuration(seconds : float) -> str:
+    """Returns a rough, human readable length of time for user messages.
+
+       Input: seconds - The length of time.
+
+       Output: str - Something like '40 seconds' or '3 minutes'.
+    """
+
+    if seconds < 90.0:
+
+        count, unit = max(1, round(seconds)), "second"
+
+    elif seconds < 5400.0:
+
+        count, unit = round(seconds / 60.0), "minute"
+
+    else:
+
+        count, unit = round(seconds / 3600.0), "hour"
+
+    return f"{count} {unit}" if count == 1 else f"{count} {unit}s"
+
+#####  Estimator Class  #####
+
+class ServiceEstimator:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates an estimator with no history.  Every job type starts at
+           'initial_estimate' until it has been timed.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the smoothing factor 'alpha' and the
+                         'initial_estimate' in seconds.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.alpha    = float(opts['alpha'])
+        self.initial  = float(opts['initial_estimate'])
+        self.lock     = th.Lock()
+        #Job class name -> exponentially weighted average service time.
+        self.averages = {}
+
+        if self.alpha <= 0.0 or self.alpha > 1.0:
+
+            raise ValueError(f"The service time smoothing factor must be in (0, 1], not {self.alpha}!")
+
+    def record(self,
+               job     : jf.Job,
+               seconds : float):
+        """Adds a measured service time to the job type's average.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job that finished.
+                  seconds - How long it held its backend slot.
+
+           Output: None.
+        """
+
+        key = type(job).__name__
+
+        with self.lock:
+
+            if key not in self.averages:
+
+                self.averages[key] = seconds
+
+            else:
+
+                self.averages[key] += self.alpha * (seconds - self.averages[key])
+
+    def estimate(self,
+                 job : jf.Job) -> float:
+        """Returns how long a job of this type usually holds a backend slot.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job to estimate.
+
+           Output: float - The expected service time in seconds.
+        """
+
+        with self.lock:
+
+            return self.averages.get(type(job).__name__, self.initial)
+
+    def estimateWait(self,
+                     job       : jf.Job,
+                     waiting   : dict,
+                     weights   : dict,
+                     in_flight : int,
+                     slots     : int) -> float:
+        """Returns how long a new job would take to finish, counting the work
+           the scheduler will serve before it.  Every job already in the
+           job's lane is ahead of it, and other lanes get their weighted
+           share of dequeues in the meantime.  Jobs already running are
+           assumed to be half done.
+
+           Input: self - Pointer to the current object instance.
+                  job - The job being admitted.
+                  waiting - A lane -> list of queued jobs snapshot.
+                  weights - The scheduler's lane weights.
+                  in_flight - How many jobs the backends are running.
+                  slots - How many jobs the usable backends can run at once.
+
+           Output: float - The expected seconds until the job finishes, or
+                           infinity if no backend can take it.
+        """
+
+        if slots < 1:
+
+            return math.inf
+
+        own    = job.getPriority()
+        ahead  = waiting.get(own, [])
+        rounds = len(ahead) + 1
+        work   = sum(self.estimate(x) for x in ahead)
+
+        for lane, jobs in waiting.items():
+
+            #Interactive jobs don't hold a backend slot.
+            if lane == own or lane == jf.JobPriorityEnum.INTERACTIVE:
+
+                continue
+
+            count  = min(len(jobs), math.ceil(rounds * weights[lane] / weights[own]))
+            work  += sum(self.estimate(x) for x in jobs[:count])
+
+        work += in_flight * self.estimate(job) / 2.0
+
+        return work / slots + self.estimate(job)
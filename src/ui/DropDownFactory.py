@@ -183,7 +183,7 @@ class KeyGenDropdown(DynamicDropdown):
         for choice in choices:
 
             #all occupeid workers have been filtered out at the parent.
-            if choice.stats.average >= sc.getRangeAverageList()[self.tier] and choice not in self.choices :
+            if choice.average >= sc.getRangeAverageList()[self.tier] and choice not in self.choices :
 
                 self.choices.append(choice)
 
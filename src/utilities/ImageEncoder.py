@@ -0,0 +1,151 @@
+#Shrinks finished images before they're posted.  The webui returns PNGs that
+#are often several MB, so a display copy is transcoded to WebP or JPEG and
+#scaled to fit Discord's preview, which cuts the upload time of every post.
+#Rolls still save the webui's original PNG to the DB.
+#
+#Pillow is optional.  Without it images are posted as the webui made them.
+
+
+#####  Imports  #####
+
+import concurrent.futures as cf
+import io
+import multiprocessing as mp
+from typing import Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+#####  Package Variables  #####
+
+#The Pillow format and file extension of each supported output format.
+FORMATS = {'jpeg' : ('JPEG', 'jpg'),
+           'png'  : ('PNG',  'png'),
+           'webp' : ('WEBP', 'webp')}
+
+#####  Package Functions  #####
+
+def encodeImage(data     : bytes,
+                format   : str,
+                quality  : int,
+                max_size : int) -> Tuple[bytes, str]:
+    """Makes the display copy of an image.  A package function so it can be
+       run in another process.
+
+       Input: data - The decoded PNG from the webui.
+              format - A key of FORMATS.
+              quality - The output quality, from 1 to 100.
+              max_size - The longest side in pixels, or 0 to keep the size.
+
+       Output: tuple - The image to post, and its file name.  The original is
+                       kept if it can't be read or the copy wouldn't be any
+                       smaller.
+    """
+
+    pil_format, extension = FORMATS[format]
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+
+            display = image
+
+            if max_size > 0:
+
+                display = image.copy()
+                display.thumbnail((max_size, max_size))
+
+            #JPEG has no alpha channel.
+            if pil_format == 'JPEG' and display.mode not in ('RGB', 'L'):
+
+                display = display.convert('RGB')
+
+            output = io.BytesIO()
+            display.save(output, format=pil_format, quality=quality, optimize=True)
+
+    except OSError:
+        return data, 'image.png'
+
+    if output.tell() >= len(data):
+
+        return data, 'image.png'
+
+    return output.getvalue(), f'image.{extension}'
+
+#####  Encoder Class  #####
+
+class ImageEncoder:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates an encoder from the config's 'image_encoding' options.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the output 'format', its 'quality', the
+                         'max_size' in pixels of the longest side, and how
+                         many 'processes' to encode in, 0 for the caller's
+                         thread.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.format   = opts['format'].lower()
+        self.quality  = int(opts['quality'])
+        self.max_size = int(opts['max_size'])
+        processes     = int(opts['processes']) if 'processes' in opts else 0
+        self.pool     = None
+
+        if self.format not in FORMATS:
+
+            raise ValueError(f"Images can only be encoded as {', '.join(FORMATS)}, not {self.format}!")
+
+        if self.quality < 1 or self.quality > 100:
+
+            raise ValueError(f"The image quality must be from 1 to 100, not {self.quality}!")
+
+        if self.max_size < 0:
+
+            raise ValueError(f"The max image size can't be negative, not {self.max_size}!")
+
+        #Encoding is CPU bound, so it only uses more cores in other processes.
+        #They're spawned rather than forked since the bot is multithreaded.
+        if processes > 0 and Image != None:
+
+            self.pool = cf.ProcessPoolExecutor(max_workers = processes,
+                                               mp_context  = mp.get_context('spawn'))
+
+    def isNeeded(self) -> bool:
+        """Returns whether encoding would change anything.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - False if Pillow isn't installed or images would be
+                          posted as the PNGs they already are.
+        """
+
+        return Image != None and (self.format != 'png' or self.max_size > 0)
+
+    def encode(self,
+               data : bytes) -> Tuple[bytes, str]:
+        """Returns the display copy of an image, made in the encoder's
+           processes if it has any.
+
+           Input: self - Pointer to the current object instance.
+                  data - The decoded PNG from the webui.
+
+           Output: tuple - The image to post, and its file name.
+        """
+
+        if not self.isNeeded():
+
+            return data, 'image.png'
+
+        if self.pool != None:
+
+            return self.pool.submit(encodeImage, data, self.format, self.quality, self.max_size).result()
+
+        return encodeImage(data=data,
+                           format=self.format,
+                           quality=self.quality,
+                           max_size=self.max_size)
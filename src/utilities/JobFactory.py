@@ -6,8 +6,10 @@
 
 from abc import ABC, abstractmethod
 import base64 as b64
+import copy
 import discord as dis
 from enum import IntEnum, verify, UNIQUE
+import hashlib
 import io
 import json
 import requests as req
@@ -15,14 +17,37 @@ import src.db.MariadbIfc as mdb
 import src.characters.CharacterJobs as cj
 import src.characters.ProfileGenerator as pg
 import src.characters.RarityClass as rc
+import src.utilities.ImageEncoder as ie
+import time
 from typing import Optional
 from urllib.parse import urljoin
+import uuid
 
 #####  Package Variables  #####
 
+#Keys that are only used by IGSD or that differ per job in a batch, and so
+#don't stop two txt2img jobs from sharing a webui call.
+BATCH_IGNORED_KEYS = ('random', 'seed', 'tag_cnt', 'tags_added')
+#Keys that only IGSD uses, and so don't change the webui's output.
+CACHE_IGNORED_KEYS = ('random', 'tag_cnt', 'tags_added')
+#Info keys the webui fills with one value per image in a batch.
+BATCH_IMAGE_KEYS   = ('all_negative_prompts', 'all_prompts', 'all_seeds', 'all_subseeds', 'infotexts')
+
 #####  Abstract Classes  #####
 class Job(ABC):
 
+    #The time.monotonic() time the Queue Manager gives up on the job by, set
+    #when the job is accepted.
+    deadline  = None
+    #What post() sends, once preparePost() has done the slow work for it.
+    prepared  = None
+    #The time.monotonic() time the job was queued, for the wait metrics.
+    queued_at = None
+    #What the Queue Manager's degrade policy changed, if anything.
+    degraded  = None
+    #The settings of an upscale split off into its own stage, if any.
+    upscale   = None
+
     @abstractmethod
     def doWork(self,
                web_url: str):
@@ -40,6 +65,22 @@ class Job(ABC):
 
         pass
 
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+        """Does the job's work through the asyncio SD client instead of
+           blocking a thread.  Jobs that don't talk to the webui do their
+           (lack of) work directly.
+
+           Input: self - Pointer to the current object instance.
+                  web_url - a URL to a place to do work.
+                  client - The SDClient to send requests with.
+
+           Output: N/A.
+        """
+
+        self.doWork(web_url=web_url)
+
     @abstractmethod
     def doRandomize(self,
                     tag_src):
@@ -79,6 +120,14 @@ class Job(ABC):
         embed.add_field(name='Randomized', value=info['random'])
         embed.add_field(name='Tags Added to Prompt', value=info['tags_added'])
 
+        if info.get('degraded') != None:
+
+            embed.add_field(name='Reduced for a Busy Queue', value=", ".join(info['degraded']))
+
+        if info.get('upscaled') != None:
+
+            embed.add_field(name='Upscaled', value=info['upscaled'])
+
         return embed
 
     def _getEmbedBaseForSummaryCharacters(self) -> dis.Embed:
@@ -241,6 +290,170 @@ class Job(ABC):
         return dis.AllowedMentions(everyone = False,
                                    users    = [FakeUser(id) for id in ids])
 
+    def _getTxt2ImgBatchKey(self) -> Optional[str]:
+        """Returns a key that is equal for any two txt2img jobs the webui can
+           render in the same call.  The webui only accepts one prompt per
+           call, so the jobs must match in everything but their random seed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The job's batch key, or None if it has a fixed seed.
+        """
+
+        if int(self.post_data['seed']) != -1:
+
+            return None
+
+        data = {key : value for key, value in self.post_data.items() if key not in BATCH_IGNORED_KEYS}
+
+        return f"{type(self).__name__}:{json.dumps(data, sort_keys=True)}"
+
+    def _degradeTxt2Img(self,
+                        profile : dict) -> bool:
+        """Holds a txt2img job's settings to a degraded profile.  Only
+           settings over the profile's limits are changed.
+
+           Input: self - Pointer to the current object instance.
+                  profile - The limits from the Queue Manager's degrade policy.
+
+           Output: bool - Whether anything was changed.
+        """
+
+        changes = []
+        steps   = int(self.post_data['steps'])
+
+        if profile['max_steps'] > 0 and steps > profile['max_steps']:
+
+            self.post_data['steps'] = profile['max_steps']
+            changes.append(f"{steps} to {profile['max_steps']} steps")
+
+        if not profile['hires'] and self.post_data.get('enable_hr', False):
+
+            self.post_data['enable_hr'] = False
+            changes.append("no hires pass")
+
+        width  = int(self.post_data['width'])
+        height = int(self.post_data['height'])
+        sizes  = []
+
+        for size in (width, height):
+
+            #Sizes stay on the same grid /generate rounds to.
+            scaled = int(size * profile['scale'])
+            scaled = max(profile['min_size'], scaled - scaled % profile['step_size'])
+            sizes.append(min(size, scaled))
+
+        if sizes != [width, height]:
+
+            self.post_data['width'], self.post_data['height'] = sizes
+            changes.append(f"{width}x{height} to {sizes[0]}x{sizes[1]}")
+
+            #A kept hires pass would upscale to the original size anyway.
+            for key, size, new_size in (('hr_resize_x', width, sizes[0]), ('hr_resize_y', height, sizes[1])):
+
+                if int(self.post_data.get(key, 0)) > 0:
+
+                    self.post_data[key] = int(self.post_data[key]) * new_size // size
+
+        if len(changes) == 0:
+
+            return False
+
+        self.degraded = changes
+
+        return True
+
+    def _splitTxt2ImgUpscale(self) -> bool:
+        """Takes the hires upscale out of a txt2img job's request so it can
+           be run as its own stage.  The same size is asked for, but the
+           upscale isn't followed by a second diffusion pass.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - Whether the job had an upscale to split off.
+        """
+
+        if not self.post_data.get('enable_hr', False):
+
+            return False
+
+        self.upscale                = {'upscaler' : self.post_data['hr_upscaler'],
+                                       'scale'    : float(self.post_data.get('hr_scale', 2)),
+                                       'width'    : int(self.post_data.get('hr_resize_x', 0)),
+                                       'height'   : int(self.post_data.get('hr_resize_y', 0))}
+        self.post_data['enable_hr'] = False
+
+        return True
+
+    def splitUpscale(self) -> bool:
+        """Splits the job's upscale off into its own stage, so the GPU can
+           start the next job's base image while this one is upscaled.  Most
+           jobs have no upscale, or post their image somewhere it can't be
+           replaced.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - Whether the job now needs an upscale stage.
+        """
+
+        return False
+
+    def getUpscale(self) -> Optional[dict]:
+        """Returns the settings of the job's upscale stage.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - The 'upscaler', and the target 'width' and 'height'
+                          or the 'scale' if they're 0.  None if the job has no
+                          upscale stage.
+        """
+
+        return self.upscale
+
+    def getBaseJob(self) -> Optional['Job']:
+        """Returns the job whose image this job works on.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Job - The base job, or None if this job is its own.
+        """
+
+        return None
+
+    def degrade(self,
+                profile : dict) -> bool:
+        """Makes the job cheaper to render while the queue is busy.  Most
+           jobs have nothing to degrade.
+
+           Input: self - Pointer to the current object instance.
+                  profile - The limits from the Queue Manager's degrade policy.
+
+           Output: bool - Whether the job was changed.
+        """
+
+        return False
+
+    def getBatchKey(self) -> Optional[str]:
+        """Returns a key shared by jobs that can be sent to the webui together.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The job's batch key, or None if it can't be batched.
+        """
+
+        return None
+
+    def getCacheKey(self) -> Optional[str]:
+        """Returns a key for caching the job's result, if the webui will
+           always return the same result for it.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The job's cache key, or None if it can't be cached.
+        """
+
+        return None
+
     def getGuild(self) -> int:
         """Returns the Guild (Discord Server) ID originating this request.
 
@@ -251,6 +464,26 @@ class Job(ABC):
 
         return self.guild
 
+    def getJobId(self) -> str:
+        """Returns the unique ID the Job Factory gave this request.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - the job's ID.
+        """
+
+        return self.job_id
+
+    def getPriority(self) -> 'JobPriorityEnum':
+        """Returns which scheduling lane this request belongs in.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: JobPriorityEnum - the job's priority class.
+        """
+
+        return self.priority
+
     def getRandomize(self) -> bool:
         """Returns whether this request should have randomized tags added.
 
@@ -281,6 +514,151 @@ class Job(ABC):
 
         return self.result.status_code
 
+    def setJobId(self,
+                 job_id : str):
+        """Sets the job's unique ID, like when replaying a journaled job.
+
+           Input: self - Pointer to the current object instance.
+                  job_id - The ID to use.
+
+           Output: N/A.
+        """
+
+        self.job_id = job_id
+
+    def setResult(self,
+                  result):
+        """Stores the webui's response for this job when the work was done on
+           the job's behalf, like as part of a batch.
+
+           Input: self - Pointer to the current object instance.
+                  result - A requests.Response or BatchResult.
+
+           Output: N/A.
+        """
+
+        self.result = result
+
+    def setDeadline(self,
+                    deadline : Optional[float]):
+        """Sets when the job should be abandoned if it hasn't finished.
+
+           Input: self - Pointer to the current object instance.
+                  deadline - A time.monotonic() time, or None for no limit.
+
+           Output: N/A.
+        """
+
+        self.deadline = deadline
+
+    def getTimeout(self) -> Optional[float]:
+        """Returns how long a webui request may take before the job's deadline
+           passes.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: float - Seconds left, or None if the job has no deadline.
+        """
+
+        if self.deadline == None:
+
+            return None
+
+        #Some clients treat a zero timeout as no timeout at all.
+        return max(0.001, self.deadline - time.monotonic())
+
+    def isExpired(self) -> bool:
+        """Returns whether the job's deadline has passed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if the job should be abandoned.
+        """
+
+        return self.deadline != None and time.monotonic() >= self.deadline
+
+    def setQueuedTime(self,
+                      queued_at : Optional[float]):
+        """Sets when the job was put in the queue.
+
+           Input: self - Pointer to the current object instance.
+                  queued_at - A time.monotonic() time, or None to forget it.
+
+           Output: N/A.
+        """
+
+        self.queued_at = queued_at
+
+    def getWaitTime(self) -> Optional[float]:
+        """Returns how long the job has been waiting since it was queued.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: float - Seconds waited, or None if it was never queued.
+        """
+
+        if self.queued_at == None:
+
+            return None
+
+        return max(0.0, time.monotonic() - self.queued_at)
+
+    def getReservoirKey(self) -> Optional[str]:
+        """Returns the base prompt of a request that a pre-rendered image
+           could answer.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: str - The request's base prompt, or None if it needs a live
+                         render.
+        """
+
+        return None
+
+    def getUnusedPrerendered(self) -> Optional[dict]:
+        """Returns the pre-rendered image the job was answered with, if its
+           response didn't use it.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - The reservoir entry, or None if there isn't one.
+        """
+
+        return None
+
+    def getReplayCopy(self):
+        """Returns what the job journal stores to rebuild the job after a
+           restart.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: Job - The job as it should be replayed.
+        """
+
+        return self
+
+    def isReplayable(self) -> bool:
+        """Returns whether the job is worth replaying after a restart.  Other
+           jobs are only quick reads or tests.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if the job should be queued again.
+        """
+
+        return False
+
+    def isReadOnly(self) -> bool:
+        """Returns whether the job only reads from the DB, so a user may have
+           one alongside a job that changes something.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: bool - True if the job doesn't change anything.
+        """
+
+        return self.getPriority() == JobPriorityEnum.INTERACTIVE
+
     def getUserId(self) -> int:
         """Returns the (Discord) user ID that originated this request.
 
@@ -291,11 +669,90 @@ class Job(ABC):
 
         return self.user_id
 
+    def preparePost(self,
+                    metadata : dict,
+                    encoder  : Optional[ie.ImageEncoder] = None):
+        """Does the slow part of posting the job's response, like decoding
+           and transcoding images and any DB work, so post() only has to send
+           it.  The Queue Manager calls this from its post pool, off the main
+           asyncio loop.
+
+           Input: self - Pointer to the current object instance.
+                  metadata - Context from the command needed to post correctly.
+                  encoder - Makes the display copy of the job's image, if set.
+
+           Output: N/A - Throws exceptions on error.
+        """
+
+        self.prepared = self._prepare(metadata)
+
+        self._encodePrepared(prepared=self.prepared,
+                             encoder=encoder)
+
+    def _encodePrepared(self,
+                        prepared : dict,
+                        encoder  : Optional[ie.ImageEncoder]):
+        """Swaps a prepared response's image for its display copy.
+
+           Input: self - Pointer to the current object instance.
+                  prepared - The job-specific data post() sends.
+                  encoder - Makes the display copy, if set.
+
+           Output: None.
+        """
+
+        if encoder != None and prepared.get('image') != None:
+
+            prepared['image'], prepared['filename'] = encoder.encode(prepared['image'])
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
+        """Returns whatever post() needs that's slow to make.  Most jobs
+           have nothing to prepare.
+
+           Input: self - Pointer to the current object instance.
+                  metadata - Context from the command needed to post correctly.
+
+           Output: dict - The job-specific data post() sends.
+        """
+
+        return {}
+
+    def _getPrepared(self,
+                     metadata : dict) -> dict:
+        """Returns the prepared response, preparing it now if nothing called
+           preparePost() first.
+
+           Input: self - Pointer to the current object instance.
+                  metadata - Context from the command needed to post correctly.
+
+           Output: dict - The job-specific data post() sends.
+        """
+
+        if self.prepared == None:
+
+            self.preparePost(metadata)
+
+        return self.prepared
+
+    def _decodeImage(self,
+                     images : list) -> bytes:
+        """Returns the image to post from a webui response's image list.
+
+           Input: self - Pointer to the current object instance.
+                  images - The base64 images the webui returned.
+
+           Output: bytes - The last image, decoded.
+        """
+
+        return b64.b64decode(images[-1].split(",", 1)[0])
+
     @abstractmethod
     async def post(self,
                    metadata : dict):
         """Posts the job's response data to Discord, including handling
-           command-specific formatting.
+           command-specific formatting.  Runs in the main asyncio loop, so
+           anything slow belongs in _prepare().
 
            Input: self - Pointer to the current object instance.
                   metadata - Context from the command needed to post correctly.
@@ -320,6 +777,52 @@ class JobTypeEnum(IntEnum):
     TEST_ROLL               =    8
     TEST_SHOW               =    9
 
+@verify(UNIQUE)
+class JobPriorityEnum(IntEnum):
+
+    #Lower values are more latency sensitive.  Each lane gets its own weight
+    #in the Queue Manager's scheduler.
+    INTERACTIVE = 0
+    DAILY       = 1
+    GENERATE    = 2
+    ADMIN       = 3
+    #The upscale stage of a job whose base image is done.
+    UPSCALE     = 4
+
+#####  Result Classes  #####
+
+class BatchResult:
+
+    def __init__(self,
+                 status_code : int,
+                 reason      : str,
+                 data        : dict):
+        """Holds one job's share of a batched webui response.  Provides the
+           parts of requests.Response the jobs use so post() doesn't need to
+           know whether the job was batched.
+
+           Input: self - Pointer to the current object instance.
+                  status_code - The HTTP status of the batched request.
+                  reason - The HTTP reason of the batched request.
+                  data - This job's images, parameters, and info.
+
+           Output: N/A.
+        """
+
+        self.data        = data
+        self.reason      = reason
+        self.status_code = status_code
+
+    def json(self) -> dict:
+        """Returns this job's part of the response body.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - The same keys the webui returns for a single job.
+        """
+
+        return self.data
+
 #####  Job Classes  #####
 
 class GenerateJob(Job):
@@ -348,31 +851,72 @@ class GenerateJob(Job):
         self.post_data['steps']        = options['steps']
         self.post_data['tag_cnt']      = options['tag_cnt']
         self.post_data['width']        = options['width']
+        self.priority                  = JobPriorityEnum.GENERATE
         self.randomize                 = bool(options['random'])
         self.result                    = req.Response()
         self.user_id                   = ctx.user.id
 
+    def getCacheKey(self) -> Optional[str]:
+
+        #A random seed means a new image every time.
+        if int(self.post_data['seed']) == -1:
+
+            return None
+
+        data = {key : value for key, value in self.post_data.items() if key not in CACHE_IGNORED_KEYS}
+
+        return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    def getBatchKey(self) -> Optional[str]:
+
+        return self._getTxt2ImgBatchKey()
+
+    def isReplayable(self) -> bool:
+
+        return True
+
+    def degrade(self,
+                profile : dict) -> bool:
+
+        return self._degradeTxt2Img(profile)
+
+    def splitUpscale(self) -> bool:
+
+        return self._splitTxt2ImgUpscale()
+
     def doWork(self,
                web_url : str):
 
-        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data)
+        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data, timeout=self.getTimeout())
 
-    async def post(self,
-                   metadata : dict):
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        self.result = await client.post(web_url=web_url, path='/sdapi/v1/txt2img', json=self.post_data, timeout=self.getTimeout())
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
 
         json_result             = self.result.json()
         info_dict               = json.loads(json_result['info'])
         info_dict['random']     = self.randomize
         info_dict['tags_added'] = self.post_data['tags_added']
-        embed                   = self._getEmbedBaseForGenerate(info=info_dict)
+        info_dict['degraded']   = self.degraded
+
+        return {'image' : self._decodeImage(json_result['images']),
+                'info'  : info_dict}
+
+    async def post(self,
+                   metadata : dict):
 
-        for i in json_result['images']:
-            image = io.BytesIO(b64.b64decode(i.split(",", 1)[0]))
+        prepared = self._getPrepared(metadata)
+        embed    = self._getEmbedBaseForGenerate(info=prepared['info'])
 
         await metadata['ctx'].channel.send(content=f"<@{self.user_id}>",
                                            allowed_mentions=self._getMentions(ids=[self.user_id]),
-                                           file=dis.File(fp=image,
-                                                         filename='image.png'),
+                                           file=dis.File(fp=io.BytesIO(prepared['image']),
+                                                         filename=prepared.get('filename', 'image.png')),
                                            embed=embed)
 
     def doRandomize(self,
@@ -400,19 +944,100 @@ class RollJob(Job):
         self.post_data           = pg.getDefaultJobData()
         self.post_data['prompt'] = options['prompt']
         self.post_data['seed']   = options['seed']
+        self.prerendered         = False
+        self.priority            = JobPriorityEnum.DAILY
         self.randomize           = bool(options['random'])
         self.result              = req.Response()
         self.user_id             = ctx.user.id
         self.profile             = pg.Profile(opts=pg.getDefaultOptions(creator = self.user_id,
                                                                         owner   = self.user_id))
 
+    def getReservoirKey(self) -> Optional[str]:
+
+        #Only rolls made the usual way look like a pre-rendered one.
+        if not self.randomize or int(self.post_data['seed']) != -1:
+
+            return None
+
+        return self.post_data['prompt']
+
+    def usePrerendered(self,
+                       entry : dict):
+        """Answers the roll with an image from the Roll Reservoir.  The job
+           no longer needs a backend, so it moves to the interactive lane.
+
+           Input: self - Pointer to the current object instance.
+                  entry - A roll taken from the reservoir.
+
+           Output: N/A.
+        """
+
+        self.post_data       = entry['post_data']
+        self.prerendered     = True
+        self.priority        = JobPriorityEnum.INTERACTIVE
+        self.randomize       = False
+        self.result          = entry['result']
+        self.reservoir_entry = entry
+
+    def getUnusedPrerendered(self) -> Optional[dict]:
+
+        #The roll wasn't saved if the user already rolled today.
+        if not self.prerendered or self.prepared == None or self.prepared['saved']:
+
+            return None
+
+        return self.reservoir_entry
+
+    def isReadOnly(self) -> bool:
+
+        #A pre-rendered roll is still saved like any other.
+        return False
+
+    def getReplayCopy(self):
+
+        if not self.prerendered:
+
+            return self
+
+        #The pre-rendered image is several MB, so a replayed roll renders its
+        #prompt again instead.
+        replay                 = copy.copy(self)
+        replay.prerendered     = False
+        replay.priority        = JobPriorityEnum.DAILY
+        replay.reservoir_entry = None
+        replay.result          = req.Response()
+
+        return replay
+
+    def isReplayable(self) -> bool:
+
+        return True
+
+    def getBatchKey(self) -> Optional[str]:
+
+        return self._getTxt2ImgBatchKey()
+
     def doWork(self,
                web_url : str):
 
-        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data)
+        if self.prerendered:
 
-    async def post(self,
-                   metadata : dict):
+            return
+
+        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data, timeout=self.getTimeout())
+
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        if self.prerendered:
+
+            return
+
+        self.result = await client.post(web_url=web_url, path='/sdapi/v1/txt2img', json=self.post_data, timeout=self.getTimeout())
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
 
         json_result = self.result.json()
         info_dict   = json.loads(json_result['info'])
@@ -421,21 +1046,33 @@ class RollJob(Job):
         #/roll command cross different servers while the image is being
         #generated.  It's non-atomic so there's still a small window for
         #duplicate rolls, but is acceptable for now.
-        if not metadata['db_ifc'].dailyDone(self.user_id):
+        if metadata['db_ifc'].dailyDone(self.user_id):
 
-            metadata['db_ifc'].saveRoll(id=self.user_id,
-                                        img=json_result['images'][0],
-                                        info=info_dict,
-                                        profile=self.profile)
-            embeds = self._getEmbedBaseForProfiles()
+            return {'saved' : False}
+
+        image = self._decodeImage(json_result['images'])
+
+        metadata['db_ifc'].saveRoll(id=self.user_id,
+                                    img=image,
+                                    info=info_dict,
+                                    profile=self.profile)
+
+        return {'image' : image,
+                'saved' : True}
+
+    async def post(self,
+                   metadata : dict):
+
+        prepared = self._getPrepared(metadata)
 
-            for i in json_result['images']:
-                image = io.BytesIO(b64.b64decode(i.split(",", 1)[0]))
+        if prepared['saved']:
+
+            embeds = self._getEmbedBaseForProfiles()
 
             await metadata['ctx'].channel.send(content=f"<@{self.user_id}>",
                                                allowed_mentions=self._getMentions(ids=[self.user_id]),
-                                               file=dis.File(fp=image,
-                                                             filename='image.png'),
+                                               file=dis.File(fp=io.BytesIO(prepared['image']),
+                                                             filename=prepared.get('filename', 'image.png')),
                                                embeds=embeds)
 
     def doRandomize(self,
@@ -461,6 +1098,7 @@ class ShowSummaryCharactersJob(Job):
 
         self.author             = ctx.user.id
         self.guild              = ctx.guild_id
+        self.priority           = JobPriorityEnum.INTERACTIVE
         self.randomize          = False
         self.result             = req.Response()
         self.result.reason      = "OK"
@@ -472,10 +1110,17 @@ class ShowSummaryCharactersJob(Job):
                web_url: str):
         pass
 
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        self.summary = metadata['db_ifc'].getSummaryCharacters(user_id=self.user_id)
+
+        return {}
+
     async def post(self,
                    metadata : dict):
 
-        self.summary = metadata['db_ifc'].getSummaryCharacters(user_id=self.user_id)
+        self._getPrepared(metadata)
 
         if not self.summary:
 
@@ -513,6 +1158,7 @@ class ShowSummaryEconomyJob(Job):
 
         self.author             = ctx.user.id
         self.guild              = ctx.guild_id
+        self.priority           = JobPriorityEnum.INTERACTIVE
         self.randomize          = False
         self.result             = req.Response()
         self.result.reason      = "OK"
@@ -524,10 +1170,17 @@ class ShowSummaryEconomyJob(Job):
                web_url: str):
         pass
 
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        self.summary = metadata['db_ifc'].getSummaryEconomy(user_id=self.user_id)
+
+        return {}
+
     async def post(self,
                    metadata : dict):
 
-        self.summary = metadata['db_ifc'].getSummaryEconomy(user_id=self.user_id)
+        self._getPrepared(metadata)
 
         if not self.summary:
 
@@ -566,6 +1219,7 @@ class ShowSummaryInventoryJob(Job):
 
         self.author             = ctx.user.id
         self.guild              = ctx.guild_id
+        self.priority           = JobPriorityEnum.INTERACTIVE
         self.randomize          = False
         self.result             = req.Response()
         self.result.reason      = "OK"
@@ -577,10 +1231,17 @@ class ShowSummaryInventoryJob(Job):
                web_url: str):
         pass
 
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        self.summary = metadata['db_ifc'].getSummaryInventory(user_id=self.user_id)
+
+        return {}
+
     async def post(self,
                    metadata : dict):
 
-        self.summary = metadata['db_ifc'].getSummaryInventory(user_id=self.user_id)
+        self._getPrepared(metadata)
 
         if not self.summary:
 
@@ -619,6 +1280,7 @@ class ShowProfileJob(Job):
 
         self.id                 = options['id']
         self.guild              = ctx.guild_id
+        self.priority           = JobPriorityEnum.INTERACTIVE
         self.randomize          = False
         self.result             = req.Response()
         self.result.reason      = "OK"
@@ -629,10 +1291,23 @@ class ShowProfileJob(Job):
                web_url: str):
         pass
 
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        self.profile = metadata['db_ifc'].getProfile(self.id)
+
+        if not self.profile:
+
+            return {}
+
+        self.db_img = metadata['db_ifc'].getImage(profile_id=self.id)
+
+        return {'image' : self.db_img}
+
     async def post(self,
                    metadata : dict):
 
-        self.profile = metadata['db_ifc'].getProfile(self.id)
+        prepared = self._getPrepared(metadata)
 
         if not self.profile:
 
@@ -642,14 +1317,11 @@ class ShowProfileJob(Job):
             await metadata['ctx'].channel.send(content=f"<@{self.user_id}>", embed=embed)
 
         else:
-            embeds      = self._getEmbedBaseForProfiles()
-            self.db_img = metadata['db_ifc'].getImage(profile_id=self.id)
-
-            image = io.BytesIO(b64.b64decode(self.db_img))
+            embeds = self._getEmbedBaseForProfiles()
 
             await metadata['ctx'].edit_original_response(content=f"<@{self.user_id}>",
-                                                         attachments=[dis.File(fp=image,
-                                                                               filename='image.png')],
+                                                         attachments=[dis.File(fp=io.BytesIO(prepared['image']),
+                                                                               filename=prepared.get('filename', 'image.png'))],
                                                          embeds=embeds)
 
     def doRandomize(self,
@@ -671,6 +1343,7 @@ class TestGetJob(Job):
         """
 
         self.guild     = ctx.guild_id
+        self.priority  = JobPriorityEnum.ADMIN
         self.randomize = False
         self.result    = req.Response()
         self.user_id   = ctx.user.id
@@ -680,6 +1353,12 @@ class TestGetJob(Job):
 
         self.result = req.get(url=urljoin(web_url, '/sdapi/v1/memory'), timeout=5)
 
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        self.result = await client.get(web_url=web_url, path='/sdapi/v1/memory', timeout=5)
+
     async def post(self,
                    metadata : dict):
 
@@ -711,31 +1390,47 @@ class TestPostJob(Job):
 
         self.guild     = ctx.guild_id
         self.post_data = pg.getDefaultJobData()
+        self.priority  = JobPriorityEnum.ADMIN
         self.randomize = False
         self.result    = req.Response()
         self.user_id   = ctx.user.id
 
+    def getBatchKey(self) -> Optional[str]:
+
+        return self._getTxt2ImgBatchKey()
+
     def doWork(self,
                web_url : str):
 
-        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data)
+        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data, timeout=self.getTimeout())
 
-    async def post(self,
-                   metadata : dict):
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        self.result = await client.post(web_url=web_url, path='/sdapi/v1/txt2img', json=self.post_data, timeout=self.getTimeout())
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
 
         json_result             = self.result.json()
         info_dict               = json.loads(json_result['info'].replace('\n', ' '))
         info_dict['random']     = False
         info_dict['tags_added'] = ""
-        embed                   = self._getEmbedBaseForGenerate(info=info_dict)
 
-        for i in json_result['images']:
-            image = io.BytesIO(b64.b64decode(i.split(",", 1)[0]))
+        return {'image' : self._decodeImage(json_result['images']),
+                'info'  : info_dict}
+
+    async def post(self,
+                   metadata : dict):
+
+        prepared = self._getPrepared(metadata)
+        embed    = self._getEmbedBaseForGenerate(info=prepared['info'])
 
         await metadata['ctx'].channel.send(content=f"<@{self.user_id}>",
                                            allowed_mentions=self._getMentions(ids=[self.user_id]),
-                                           file=dis.File(fp=image,
-                                                         filename='image.png'),
+                                           file=dis.File(fp=io.BytesIO(prepared['image']),
+                                                         filename=prepared.get('filename', 'image.png')),
                                            embed=embed)
 
     def doRandomize(self,
@@ -759,6 +1454,7 @@ class TestRollJob(Job):
         self.guild     = ctx.guild_id
         self.post_data = pg.getDefaultJobData()
         self.profile   = pg.getDefaultProfile()
+        self.priority  = JobPriorityEnum.ADMIN
         self.randomize = False
         self.result    = req.Response()
         self.user_id   = ctx.user.id
@@ -766,21 +1462,29 @@ class TestRollJob(Job):
     def doWork(self,
                web_url : str):
 
-        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data)
+        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=self.post_data, timeout=self.getTimeout())
+
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        self.result = await client.post(web_url=web_url, path='/sdapi/v1/txt2img', json=self.post_data, timeout=self.getTimeout())
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        return {'image' : self._decodeImage(self.result.json()['images'])}
 
     async def post(self,
                    metadata : dict):
 
-        embeds      = self._getEmbedBaseForProfiles()
-        json_result = self.result.json()
-
-        for i in json_result['images']:
-            image = io.BytesIO(b64.b64decode(i.split(",", 1)[0]))
+        prepared = self._getPrepared(metadata)
+        embeds   = self._getEmbedBaseForProfiles()
 
         await metadata['ctx'].channel.send(content=f"<@{self.user_id}>",
                                            allowed_mentions=self._getMentions(ids=[self.user_id]),
-                                           file=dis.File(fp=image,
-                                                         filename='image.png'),
+                                           file=dis.File(fp=io.BytesIO(prepared['image']),
+                                                         filename=prepared.get('filename', 'image.png')),
                                            embeds=embeds)
 
     def doRandomize(self,
@@ -804,6 +1508,7 @@ class TestShowJob(Job):
         self.guild              = ctx.guild_id
         self.profile            = ""
         self.result             = req.Response()
+        self.priority           = JobPriorityEnum.ADMIN
         self.randomize          = False
         self.result.reason      = "OK"
         self.result.status_code = 200
@@ -813,25 +1518,117 @@ class TestShowJob(Job):
                web_url : str):
         pass
 
-    async def post(self,
-                   metadata : dict):
+    def _prepare(self,
+                 metadata : dict) -> dict:
 
         self.profile = metadata['db_ifc'].getProfile()
         self.db_img  = metadata['db_ifc'].getImage()
-        embeds       = self._getEmbedBaseForProfiles()
 
-        image = io.BytesIO(b64.b64decode(self.db_img))
+        return {'image' : self.db_img}
+
+    async def post(self,
+                   metadata : dict):
+
+        prepared = self._getPrepared(metadata)
+        embeds   = self._getEmbedBaseForProfiles()
 
         await metadata['ctx'].channel.send(content=f"<@{self.user_id}>",
                                            allowed_mentions=self._getMentions(ids=[self.user_id]),
-                                           file=dis.File(fp=image,
-                                                         filename='image.png'),
+                                           file=dis.File(fp=io.BytesIO(prepared['image']),
+                                                         filename=prepared.get('filename', 'image.png')),
                                            embeds=embeds)
 
     def doRandomize(self,
                     tag_src):
         pass
 
+class UpscaleJob(Job):
+
+    def __init__(self,
+                 job : Job):
+        """Creates the upscale stage of a job whose base image is done.  It
+           shares the base job's ID, user, and deadline, so it's cancelled
+           and posted the same way.  Built by the Queue Manager rather than
+           the Job Factory since it has no command of its own.
+
+           Input: self - Pointer to the current object instance.
+                  job - The finished base job, with an upscale split off.
+
+           Output: N/A.
+        """
+
+        upscale        = job.getUpscale()
+        self.base      = job
+        self.deadline  = job.deadline
+        self.guild     = job.getGuild()
+        self.job_id    = job.getJobId()
+        #A size of 0 means the webui's hires pass would have used the scale.
+        self.post_data = {'image'              : job.result.json()['images'][-1],
+                          'resize_mode'        : 1 if upscale['width'] > 0 and upscale['height'] > 0 else 0,
+                          'upscaler_1'         : upscale['upscaler'],
+                          'upscaling_resize'   : upscale['scale'],
+                          'upscaling_resize_h' : upscale['height'],
+                          'upscaling_resize_w' : upscale['width']}
+        self.priority  = JobPriorityEnum.UPSCALE
+        self.randomize = False
+        self.result    = req.Response()
+        self.user_id   = job.getUserId()
+
+    def getBaseJob(self) -> Optional[Job]:
+
+        return self.base
+
+    def doWork(self,
+               web_url : str):
+
+        self.result = req.post(url=urljoin(web_url, '/sdapi/v1/extra-single-image'), json=self.post_data, timeout=self.getTimeout())
+
+    async def doWorkAsync(self,
+                          web_url : str,
+                          client):
+
+        self.result = await client.post(web_url=web_url, path='/sdapi/v1/extra-single-image', json=self.post_data, timeout=self.getTimeout())
+
+    def _prepare(self,
+                 metadata : dict) -> dict:
+
+        #The base job's post is reused with the upscaled image, on a copy so
+        #a preview of the base image can still be posting.
+        prepared          = dict(self.base._getPrepared(metadata))
+        prepared['image'] = self._decodeImage([self.result.json()['image']])
+        upscale           = self.base.getUpscale()
+
+        if 'info' in prepared:
+
+            size                         = f"{upscale['width']}x{upscale['height']}" if self.post_data['resize_mode'] == 1 else f"{upscale['scale']}x"
+            prepared['info']             = dict(prepared['info'])
+            prepared['info']['upscaled'] = f"{upscale['upscaler']} to {size}"
+
+        final          = copy.copy(self.base)
+        final.prepared = prepared
+
+        return {'job' : final}
+
+    def preparePost(self,
+                    metadata : dict,
+                    encoder  : Optional[ie.ImageEncoder] = None):
+
+        super().preparePost(metadata=metadata,
+                            encoder=encoder)
+
+        final = self.prepared['job']
+        final._encodePrepared(prepared=final.prepared,
+                              encoder=encoder)
+
+    async def post(self,
+                   metadata : dict):
+
+        await self._getPrepared(metadata)['job'].post(metadata)
+
+    def doRandomize(self,
+                    tag_src):
+        pass
+
 ##### Post Job Factory Class  #####
 
 class JobFactory:
@@ -852,44 +1649,160 @@ class JobFactory:
         match type:
 
             case JobTypeEnum.GENERATE:
-                return GenerateJob(ctx,
-                                   options)
+                job = GenerateJob(ctx,
+                                  options)
 
             case JobTypeEnum.ROLL:
-                return RollJob(ctx,
-                               options)
+                job = RollJob(ctx,
+                              options)
 
             case JobTypeEnum.SHOW_SUMMARY_CHARACTERS:
-                return ShowSummaryCharactersJob(ctx,
-                                                options)
+                job = ShowSummaryCharactersJob(ctx,
+                                               options)
 
             case JobTypeEnum.SHOW_SUMMARY_ECONOMY:
-                return ShowSummaryEconomyJob(ctx,
-                                             options)
+                job = ShowSummaryEconomyJob(ctx,
+                                            options)
 
             case JobTypeEnum.SHOW_SUMMARY_INVENTORY:
-                return ShowSummaryInventoryJob(ctx,
-                                               options)
+                job = ShowSummaryInventoryJob(ctx,
+                                              options)
 
             case JobTypeEnum.SHOW_PROFILE:
-                return ShowProfileJob(ctx,
-                                      options)
+                job = ShowProfileJob(ctx,
+                                     options)
 
             case JobTypeEnum.TEST_POST:
-                return TestPostJob(ctx,
-                                   options)
+                job = TestPostJob(ctx,
+                                  options)
 
             case JobTypeEnum.TEST_GET:
-                return TestGetJob(ctx,
-                                  options)
+                job = TestGetJob(ctx,
+                                 options)
 
             case JobTypeEnum.TEST_ROLL:
-                return TestRollJob(ctx,
-                                   options)
+                job = TestRollJob(ctx,
+                                  options)
 
             case JobTypeEnum.TEST_SHOW:
-                return TestShowJob(ctx,
-                                   options)
+                job = TestShowJob(ctx,
+                                  options)
 
             case _:
-                raise NotImplementedError
\ No newline at end of file
+                raise NotImplementedError
+
+        job.setJobId(uuid.uuid4().hex)
+
+        return job
+
+#####  Package Functions  #####
+
+def _getBatchData(jobs : list) -> dict:
+    """Returns the txt2img body that renders every job in a batch.
+
+       Input: jobs - The jobs to render together.
+
+       Output: dict - The first job's body with a batch size for all of them.
+    """
+
+    post_data                     = dict(jobs[0].post_data)
+    post_data['batch_size']       = len(jobs)
+    #A grid would otherwise be added to the front of the image list.
+    post_data['do_not_save_grid'] = True
+
+    return post_data
+
+def _getBatchTimeout(jobs : list) -> Optional[float]:
+    """Returns how long a batch may take before the first of its jobs'
+       deadlines passes.
+
+       Input: jobs - The jobs to render together.
+
+       Output: float - Seconds left, or None if no job has a deadline.
+    """
+
+    timeouts = [x.getTimeout() for x in jobs if x.getTimeout() != None]
+
+    return min(timeouts) if len(timeouts) > 0 else None
+
+def _splitBatch(jobs   : list,
+                result):
+    """Gives each job in a batch its own image and info, as if it had been
+       run alone.
+
+       Input: jobs - The jobs that were rendered together.
+              result - The webui's response to the batched request.
+
+       Output: N/A - Throws exceptions on error.
+    """
+
+    #An error has no images to split, so every job gets it, the same as if
+    #each had been sent alone.
+    if result.status_code != 200:
+
+        for job in jobs:
+
+            job.setResult(result)
+
+        return
+
+    json_result = result.json()
+    info_dict   = json.loads(json_result['info'])
+    images      = json_result['images'][-len(jobs):]
+
+    for x, job in enumerate(jobs):
+
+        job_info = dict(info_dict)
+
+        #Per-image values are lists that line up with the batch's images.
+        for key in BATCH_IMAGE_KEYS:
+
+            if key in info_dict:
+
+                job_info[key] = [info_dict[key][x]]
+
+        job_info['batch_size']           = 1
+        job_info['index_of_first_image'] = 0
+        job_info['prompt']               = info_dict['all_prompts'][x]
+        job_info['seed']                 = info_dict['all_seeds'][x]
+        job_info['subseed']              = info_dict['all_subseeds'][x]
+
+        job.setResult(BatchResult(status_code = result.status_code,
+                                  reason      = result.reason,
+                                  data        = {'images'     : [images[x]],
+                                                 'parameters' : json_result['parameters'],
+                                                 'info'       : json.dumps(job_info)}))
+
+def doBatchWork(jobs    : list,
+                web_url : str):
+    """Renders several txt2img jobs with a single webui call and gives each
+       job its own image and info, as if it had been run alone.  The jobs must
+       all share the same batch key.
+
+       Input: jobs - The jobs to render together.
+              web_url - a URL to a place to do work.
+
+       Output: N/A - Throws exceptions on error.
+    """
+
+    result = req.post(url=urljoin(web_url, '/sdapi/v1/txt2img'), json=_getBatchData(jobs), timeout=_getBatchTimeout(jobs))
+
+    _splitBatch(jobs=jobs,
+                result=result)
+
+async def doBatchWorkAsync(jobs    : list,
+                           web_url : str,
+                           client):
+    """The same as doBatchWork, but sent through the asyncio SD client.
+
+       Input: jobs - The jobs to render together.
+              web_url - a URL to a place to do work.
+              client - The SDClient to send requests with.
+
+       Output: N/A - Throws exceptions on error.
+    """
+
+    result = await client.post(web_url=web_url, path='/sdapi/v1/txt2img', json=_getBatchData(jobs), timeout=_getBatchTimeout(jobs))
+
+    _splitBatch(jobs=jobs,
+                result=result)
@@ -0,0 +1,271 @@
+#Caches webui responses for requests that always produce the same image, like
+#a /generate with a fixed seed.  Results are kept on disk with least-recently
+#used eviction, and identical requests that arrive while the first is still
+#rendering wait for it instead of rendering again.
+
+
+#####  Imports  #####
+
+import asyncio
+import collections as co
+import json
+import os
+import pathlib as pl
+import src.utilities.SDClient as sc
+import threading as th
+from typing import Awaitable, Callable, Optional
+
+#####  Cache Class  #####
+
+class ResultCache:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates the cache directory if needed and indexes any results left
+           by a previous run, oldest use first.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict with the cache 'path' and 'max_bytes'.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.in_flight = {}
+        self.index     = co.OrderedDict()
+        self.lock      = th.Lock()
+        self.max_bytes = int(opts['max_bytes'])
+        self.path      = pl.Path(opts['path']).absolute()
+        self.size      = 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        #File modification times are updated on every hit, so they double as
+        #the LRU order across restarts.
+        for entry in sorted(self.path.glob('*.json'), key=lambda x: x.stat().st_mtime):
+
+            size                    = entry.stat().st_size
+            self.index[entry.stem]  = size
+            self.size              += size
+
+        with self.lock:
+
+            self._evict()
+
+    def _getPath(self,
+                 key : str) -> pl.Path:
+        """Returns where a result is stored.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+
+           Output: Path - The result's file.
+        """
+
+        return self.path / f"{key}.json"
+
+    def _evict(self):
+        """Removes the least recently used results until the cache fits in
+           'max_bytes'.  Must be called with the lock held.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        while self.size > self.max_bytes and len(self.index) > 0:
+
+            key, size  = self.index.popitem(last=False)
+            self.size -= size
+            self._getPath(key).unlink(missing_ok=True)
+
+    def get(self,
+            key : str) -> Optional[sc.SDResponse]:
+        """Returns a cached result and marks it as recently used.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+
+           Output: SDResponse - The cached response, or None on a miss.
+        """
+
+        with self.lock:
+
+            if key not in self.index:
+
+                return None
+
+            self.index.move_to_end(key)
+
+            try:
+                os.utime(self._getPath(key))
+
+                with open(self._getPath(key), 'r', encoding='utf-8') as cached:
+                    entry = json.load(cached)
+
+            except (OSError, ValueError):
+                #Treat a missing or damaged file as a miss.
+                self.size -= self.index.pop(key)
+                return None
+
+        return sc.SDResponse(status_code = entry['status_code'],
+                             reason      = entry['reason'],
+                             data        = entry['data'])
+
+    def put(self,
+            key    : str,
+            result):
+        """Stores a successful result, evicting older ones if needed.  The file
+           is written under a temporary name and renamed so readers never see
+           a partial result.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+                  result - A requests.Response or SDResponse.
+
+           Output: None.
+        """
+
+        if result == None or result.status_code != 200:
+
+            return
+
+        path      = self._getPath(key)
+        temp_path = path.with_suffix('.tmp')
+
+        with open(temp_path, 'w', encoding='utf-8') as cached:
+            json.dump({'status_code' : result.status_code,
+                       'reason'      : result.reason,
+                       'data'        : result.json()}, cached)
+
+        with self.lock:
+
+            os.replace(temp_path, path)
+
+            if key in self.index:
+
+                self.size -= self.index.pop(key)
+
+            self.index[key]  = path.stat().st_size
+            self.size       += self.index[key]
+            self._evict()
+
+    def _begin(self,
+               key : str) -> Optional[th.Event]:
+        """Registers the caller as the one rendering a result, unless another
+           caller already is.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+
+           Output: Event - Set when the other render finishes, or None if the
+                           caller should render the result itself.
+        """
+
+        with self.lock:
+
+            if key in self.in_flight:
+
+                return self.in_flight[key]
+
+            self.in_flight[key] = th.Event()
+
+        return None
+
+    def _finish(self,
+                key    : str,
+                result):
+        """Stores a rendered result and wakes anyone waiting for it.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+                  result - The response, or None if rendering failed.
+
+           Output: None.
+        """
+
+        try:
+            self.put(key=key,
+                     result=result)
+
+        except (OSError, ValueError):
+            #Failing to cache a result shouldn't fail the job that made it.
+            pass
+
+        finally:
+            with self.lock:
+
+                self.in_flight.pop(key).set()
+
+    def fetch(self,
+              key     : str,
+              compute : Callable):
+        """Returns a cached result, rendering it with 'compute' on a miss.
+           Callers asking for a result that's already being rendered wait for
+           it.  If that render fails, one of them renders it instead.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+                  compute - Renders and returns the result when called.
+
+           Output: The cached or newly rendered response.
+        """
+
+        while True:
+
+            result = self.get(key)
+
+            if result != None:
+
+                return result
+
+            event = self._begin(key)
+
+            if event == None:
+
+                result = None
+
+                try:
+                    result = compute()
+                    return result
+
+                finally:
+                    self._finish(key=key,
+                                 result=result)
+
+            event.wait()
+
+    async def fetchAsync(self,
+                         key     : str,
+                         compute : Callable[[], Awaitable]):
+        """The same as fetch, for callers on an asyncio loop.
+
+           Input: self - Pointer to the current object instance.
+                  key - The result's cache key.
+                  compute - Returns an awaitable that renders the result.
+
+           Output: The cached or newly rendered response.
+        """
+
+        while True:
+
+            result = self.get(key)
+
+            if result != None:
+
+                return result
+
+            event = self._begin(key)
+
+            if event == None:
+
+                result = None
+
+                try:
+                    result = await compute()
+                    return result
+
+                finally:
+                    self._finish(key=key,
+                                 result=result)
+
+            await asyncio.to_thread(event.wait)
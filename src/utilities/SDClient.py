@@ -0,0 +1,220 @@
+#An asyncio client for the Stable Diffusion webui API.  The client runs its own
+#event loop in a background thread so the Queue Managers can keep many
+#requests in flight without needing a thread for each one.
+#
+#Each backend gets a session with its own pool of keep-alive connections,
+#avoiding a new TCP (and possibly TLS) handshake for every image.
+
+
+#####  Imports  #####
+
+import aiohttp
+import asyncio
+import concurrent.futures as cf
+import threading as th
+from typing import Coroutine, Optional
+from urllib.parse import urljoin, urlsplit
+
+#####  Response Class  #####
+
+class SDResponse:
+
+    def __init__(self,
+                 status_code : int,
+                 reason      : str,
+                 data        : dict):
+        """Holds a fully read webui response.  Provides the parts of
+           requests.Response the jobs use so post() works with either client.
+
+           Input: self - Pointer to the current object instance.
+                  status_code - The HTTP status of the request.
+                  reason - The HTTP reason of the request.
+                  data - The decoded JSON body.
+
+           Output: N/A.
+        """
+
+        self.data        = data
+        self.reason      = reason
+        self.status_code = status_code
+
+    def json(self) -> dict:
+        """Returns the decoded response body.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: dict - The webui's JSON response.
+        """
+
+        return self.data
+
+#####  Client Class  #####
+
+class SDClient:
+
+    def __init__(self,
+                 opts : dict):
+        """Creates the client's event loop and starts the thread that runs it.
+           Sessions are made on first use, since they must be created on the
+           loop they run in.
+
+           Input: self - Pointer to the current object instance.
+                  opts - A dict of connection pool sizes and timeouts.
+
+           Output: None - Throws exceptions on error.
+        """
+
+        self.connect_timeout   = float(opts['connect_timeout'])
+        self.keepalive_timeout = float(opts['keepalive_timeout'])
+        self.pool_size         = int(opts['pool_size'])
+        self.read_timeout      = float(opts['read_timeout'])
+        self.sessions          = {}
+        self.loop              = asyncio.new_event_loop()
+        self.thread            = th.Thread(target = self.loop.run_forever,
+                                           name   = "SD client loop",
+                                           daemon = True)
+
+        self.thread.start()
+
+    def _getSession(self,
+                    web_url : str) -> aiohttp.ClientSession:
+        """Returns the session for a backend, creating it if needed.  Must be
+           called from the client's loop.
+
+           Input: self - Pointer to the current object instance.
+                  web_url - Any URL on the backend.
+
+           Output: ClientSession - A session pooling the backend's connections.
+        """
+
+        parts = urlsplit(web_url)
+        host  = f"{parts.scheme}://{parts.netloc}"
+
+        if host not in self.sessions:
+
+            connector = aiohttp.TCPConnector(limit             = self.pool_size,
+                                             keepalive_timeout = self.keepalive_timeout)
+            timeout   = aiohttp.ClientTimeout(sock_connect = self.connect_timeout,
+                                              sock_read    = self.read_timeout)
+
+            self.sessions[host] = aiohttp.ClientSession(connector = connector,
+                                                        timeout   = timeout)
+
+        return self.sessions[host]
+
+    async def _request(self,
+                       method  : str,
+                       web_url : str,
+                       path    : str,
+                       json    : Optional[dict] = None,
+                       timeout : Optional[float] = None) -> SDResponse:
+        """Sends a request to a backend and reads the whole response.
+
+           Input: self - Pointer to the current object instance.
+                  method - The HTTP method to use.
+                  web_url - The backend's base URL.
+                  path - The API path to request.
+                  json - An optional body to send.
+                  timeout - An optional total timeout, on top of the socket
+                            timeouts.
+
+           Output: SDResponse - The decoded response.
+        """
+
+        session = self._getSession(web_url)
+        kwargs  = {}
+
+        #A total timeout is added to the session's socket timeouts rather
+        #than replacing them, so a stalled backend is still noticed early.
+        if timeout != None:
+
+            kwargs['timeout'] = aiohttp.ClientTimeout(total        = timeout,
+                                                      sock_connect = self.connect_timeout,
+                                                      sock_read    = self.read_timeout)
+
+        async with session.request(method, urljoin(web_url, path), json=json, **kwargs) as response:
+
+            data = await response.json(content_type=None)
+
+            return SDResponse(status_code = response.status,
+                              reason      = response.reason,
+                              data        = data)
+
+    async def get(self,
+                  web_url : str,
+                  path    : str,
+                  timeout : Optional[float] = None) -> SDResponse:
+        """GETs a webui API path.
+
+           Input: self - Pointer to the current object instance.
+                  web_url - The backend's base URL.
+                  path - The API path to request.
+                  timeout - An optional total timeout overriding the defaults.
+
+           Output: SDResponse - The decoded response.
+        """
+
+        return await self._request(method  = 'GET',
+                                   web_url = web_url,
+                                   path    = path,
+                                   timeout = timeout)
+
+    async def post(self,
+                   web_url : str,
+                   path    : str,
+                   json    : dict,
+                   timeout : Optional[float] = None) -> SDResponse:
+        """POSTs a JSON body to a webui API path.
+
+           Input: self - Pointer to the current object instance.
+                  web_url - The backend's base URL.
+                  path - The API path to request.
+                  json - The body to send.
+                  timeout - An optional total timeout overriding the defaults.
+
+           Output: SDResponse - The decoded response.
+        """
+
+        return await self._request(method  = 'POST',
+                                   web_url = web_url,
+                                   path    = path,
+                                   json    = json,
+                                   timeout = timeout)
+
+    def submit(self,
+               coro : Coroutine) -> cf.Future:
+        """Schedules a coroutine on the client's loop from any other thread.
+
+           Input: self - Pointer to the current object instance.
+                  coro - The coroutine to run.
+
+           Output: Future - Resolves to the coroutine's result.
+        """
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _closeSessions(self):
+        """Closes every open session.  Must be run on the client's loop.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        for session in self.sessions.values():
+
+            await session.close()
+
+        self.sessions = {}
+
+    def close(self):
+        """Closes all pooled connections and stops the client's loop.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: None.
+        """
+
+        self.submit(self._closeSessions()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,202 @@
+#Defines all unit tests for the files under the /benchmarks folder.  This file
+#must be defined at a Package level that encapsulates all includes for the
+#benchmarks Packages.
+
+#####  Imports  #####
+
+import base64 as b64
+import benchmarks.FakeWebui as fw
+import benchmarks.LoadGenerator as lg
+import os
+import requests as req
+import tempfile
+import threading as th
+import unittest
+
+#####  Fake Webui Class  #####
+
+class TestFakeWebui(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = fw.FakeWebui(opts={'latency' : {'kind'   : "fixed",
+                                                   'mean'   : "0.0",
+                                                   'spread' : "0.0",
+                                                   'seed'   : "0"},
+                                      'slots'   : "1",
+                                      'width'   : "16",
+                                      'height'  : "8",
+                                      'port'    : "0"})
+        self.url     = self.uut.start()
+        #Other test files replace requests.post without restoring it, so the
+        #fake is called through a session of its own.
+        self.session = req.Session()
+
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.session.close()
+        self.uut.stop()
+
+    def testTxt2ImgReturnsBatch(self):
+        """Verifies that txt2img returns a PNG and seed for every image in
+           the batch.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        result = self.session.post(url=f"{self.url}sdapi/v1/txt2img",
+                                   json={'prompt' : "good", 'seed' : 10, 'batch_size' : 2},
+                                   timeout=5).json()
+
+        self.assertEqual(len(result['images']), 2)
+        self.assertTrue(b64.b64decode(result['images'][0]).startswith(b'\x89PNG'))
+        self.assertIn('"all_seeds": [10, 11]', result['info'])
+        self.assertEqual(self.uut.renders, 1)
+
+    def testOtherEndpoints(self):
+        """Verifies that the health, progress, and interrupt endpoints answer,
+           and unknown paths don't.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertEqual(self.session.get(url=f"{self.url}sdapi/v1/memory", timeout=5).status_code, 200)
+        self.assertEqual(self.session.get(url=f"{self.url}sdapi/v1/progress", timeout=5).json()['progress'], 0.0)
+        self.assertEqual(self.session.post(url=f"{self.url}sdapi/v1/interrupt", timeout=5).status_code, 200)
+        self.assertEqual(self.session.get(url=f"{self.url}sdapi/v1/options", timeout=5).status_code, 404)
+
+    def testInterruptStopsRender(self):
+        """Verifies that an interrupt ends a running render early.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        done   = th.Event()
+        worker = th.Thread(target = lambda: (self.uut._render(duration=30.0, steps=20), done.set()),
+                           daemon = True)
+
+        worker.start()
+
+        for attempt in range(100):
+
+            if len(self.uut.running) > 0:
+
+                break
+
+            done.wait(0.01)
+
+        self.uut.interrupt()
+
+        self.assertTrue(done.wait(5.0))
+
+    def testLatencyIsSeeded(self):
+        """Verifies that render times are repeatable and scale with cost.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts   = {'kind' : "lognormal", 'mean' : "1.0", 'spread' : "0.5", 'seed' : "3"}
+        first  = fw.LatencyModel(opts=opts)
+        second = fw.LatencyModel(opts=opts)
+
+        self.assertEqual([first.sample() for x in range(5)], [second.sample() for x in range(5)])
+        self.assertEqual(fw.LatencyModel(opts=dict(opts, kind="fixed")).sample(cost=2.0), 2.0)
+
+        with self.assertRaises(ValueError):
+            fw.LatencyModel(opts=dict(opts, kind="gaussian"))
+
+#####  Load Generator Class  #####
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.opts = {'seed'       : "7",
+                     'guilds'     : "3",
+                     'users'      : "4",
+                     'duration'   : "30.0",
+                     'rate'       : "2.0",
+                     'fixed_seed' : "0.5"}
+
+    def testMakeTraceIsRepeatable(self):
+        """Verifies that the same seed makes the same trace, in time order,
+           from the configured Guilds.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        trace = lg.makeTrace(opts=self.opts)
+
+        self.assertEqual(trace, lg.makeTrace(opts=self.opts))
+        self.assertNotEqual(trace, lg.makeTrace(opts=dict(self.opts, seed="8")))
+        self.assertGreater(len(trace), 0)
+        self.assertEqual(trace, sorted(trace, key=lambda x: x['at']))
+        self.assertTrue(all(x['guild'] in (1000, 1001, 1002) for x in trace))
+
+    def testTraceRoundTrips(self):
+        """Verifies that a saved trace loads back unchanged.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        trace = lg.makeTrace(opts=self.opts)
+
+        with tempfile.TemporaryDirectory() as path:
+
+            lg.saveTrace(trace=trace,
+                         path=os.path.join(path, "trace.jsonl"))
+
+            self.assertEqual(lg.loadTrace(os.path.join(path, "trace.jsonl")), trace)
+
+    def testGetPercentile(self):
+        """Verifies nearest-rank percentiles.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        values = [5.0, 1.0, 4.0, 2.0, 3.0]
+
+        self.assertEqual(lg.getPercentile(values, 50), 3.0)
+        self.assertEqual(lg.getPercentile(values, 99), 5.0)
+        self.assertEqual(lg.getPercentile([], 50), 0.0)
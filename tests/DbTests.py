@@ -6,10 +6,16 @@ import json
 import sys
 import pathlib as pl
 import src.characters.ProfileGenerator as pg
+import src.db.ConnectionPool as cp
+import src.db.ImageStore as ims
 import src.db.MariadbIfc as mdb
 import src.characters.RarityClass as rc
 import src.characters.CharacterJobs as cj
+import hashlib
 import mariadb
+import os
+import tempfile
+import threading as th
 import unittest
 from unittest.mock import patch
 from unittest.mock import MagicMock
@@ -41,7 +47,9 @@ class TestMariadbIfc(unittest.TestCase):
         self.options = params['db_opts']
         self.uut     = mdb.MariadbIfc.getInstance(options=self.options)
         self.patch   = patch
-        self.cursor  = self.uut.con.cursor()
+
+        with self.uut.pool.connection() as connection:
+            self.cursor = connection.cursor()
 
     @patch('mariadb.connect')
     def testGetInstanceNew(self, db_patch):
@@ -334,6 +342,38 @@ class TestMariadbIfc(unittest.TestCase):
         self.assertTrue(results)
         self.cursor.execute.assert_called_once()
 
+    def testQueriesArePreparedOncePerConnection(self):
+        """Verifies that query values are bound instead of formatted into the
+           SQL, and that each connection prepares a template only once.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.cursor.execute.reset_mock()
+        self.cursor.fetchone.return_value = {0 : True}
+
+        with self.uut.pool.connection() as connection:
+
+            self.uut.pool.getStatements().clear()
+            connection.cursor.reset_mock()
+
+            self.uut.getDropdown(user_id = 5)
+            self.uut.getDropdown(user_id = 6)
+
+            connection.cursor.assert_called_once_with(buffered=True, prepared=True)
+
+        self.cursor.execute.assert_called_with(self.uut.cmds['user']['get_dropdown'], (6,))
+
+        for table in self.uut.cmds.values():
+
+            for key, cmd in table.items():
+
+                if key.startswith(('get_', 'put_', 'set_')):
+
+                    self.assertNotIn('%', cmd.replace("'%'", ""), key)
+
     def testGetImageReturnsImageFromPictureId(self):
         """Verifies that the getImage function behaves correctly with valid
            input. If picture id is provided, it should return the picture data
@@ -344,14 +384,14 @@ class TestMariadbIfc(unittest.TestCase):
         """
 
         pic_index = int(self.uut.cmds['prof']['pic_id_index'])
-        self.cursor.fetchone.return_value = {0         : "success",
+        self.cursor.fetchone.return_value = {0         : b"success",
                                              pic_index : "id"}
         self.cursor.execute.reset_mock()
 
         img = self.uut.getImage(picture_id = "id")
 
         self.cursor.execute.assert_called_once()
-        self.assertEqual(img, "success")
+        self.assertEqual(img, b"success")
 
     def testGetImageReturnsEmptyFromNoneWithPictureId(self):
         """Verifies that the getImage function behaves correctly with valid
@@ -369,7 +409,7 @@ class TestMariadbIfc(unittest.TestCase):
         img = self.uut.getImage(picture_id = "invalid_id")
 
         self.cursor.execute.assert_called_once()
-        self.assertEqual(img, "")
+        self.assertEqual(img, b"")
 
     def testGetImageReturnsImageGettingPictureId(self):
         """Verifies that the getImage function behaves correctly with valid
@@ -381,14 +421,14 @@ class TestMariadbIfc(unittest.TestCase):
         """
 
         pic_index = int(self.uut.cmds['prof']['pic_id_index'])
-        self.cursor.fetchone.return_value = {0         : "success",
+        self.cursor.fetchone.return_value = {0         : b"success",
                                              pic_index : "id"}
         self.cursor.execute.reset_mock()
 
         img = self.uut.getImage(profile_id = "id")
 
         self.assertEqual(self.cursor.execute.call_count, 2)
-        self.assertEqual(img, "success")
+        self.assertEqual(img, b"success")
 
     def testGetImageReturnsEmptyWithInvalidProfile(self):
         """Verifies that the getImage function behaves correctly with valid
@@ -406,7 +446,7 @@ class TestMariadbIfc(unittest.TestCase):
         img = self.uut.getImage(profile_id = "invalid_id")
 
         self.cursor.execute.assert_called_once()
-        self.assertEqual(img, "")
+        self.assertEqual(img, b"")
 
     def testGetProfileReturnsProfileWithValidId(self):
         """Verifies that the getProfile function behaves correctly with valid
@@ -459,7 +499,7 @@ class TestMariadbIfc(unittest.TestCase):
         self.cursor.execute.reset_mock()
         self.cursor.__iter__ = MagicMock(return_value=iter([1, 2, 3]))
 
-        with patch.object(self.uut, "mapQueryToProfile") as map_mock:
+        with patch.object(self.uut, "mapQueryToSummary") as map_mock:
             profile = self.uut.getProfiles(name    = "name",
                                            rarity  = [],
                                            user_id = 0)
@@ -516,7 +556,7 @@ class TestMariadbIfc(unittest.TestCase):
                                     "tier1": {"workers": [0,1,2], "count": 3},
                                     "tier2": {"workers": [4,5]  , "count": 2}}}
 
-        with patch.object(self.uut, "mapQueryToProfile") as map_mock:
+        with patch.object(self.uut, "mapQueryToSummary") as map_mock:
             profile = self.uut.getKeyGenProfiles(tier_data = tier_data_dict,
                                                  user_id   = 0)
 
@@ -596,7 +636,7 @@ class TestMariadbIfc(unittest.TestCase):
         self.cursor.execute.reset_mock()
         self.cursor.__iter__ = MagicMock(return_value=iter([1, 2, 3]))
 
-        with patch.object(self.uut, "mapQueryToProfile") as map_mock:
+        with patch.object(self.uut, "mapQueryToSummary") as map_mock:
             profile = self.uut.getUnoccupiedProfiles(user_id = 0)
 
             self.cursor.execute.assert_called_once()
@@ -618,7 +658,7 @@ class TestMariadbIfc(unittest.TestCase):
         self.cursor.execute.reset_mock()
         self.cursor.__iter__ = MagicMock(return_value=iter([1, 2, 3]))
 
-        with patch.object(self.uut, "mapQueryToProfile") as map_mock:
+        with patch.object(self.uut, "mapQueryToSummary") as map_mock:
             profile = self.uut.getUsersProfiles(user_id = 0,
                                                 rarity = [])
 
@@ -695,6 +735,27 @@ class TestMariadbIfc(unittest.TestCase):
         self.assertNotEqual(profile, None)
         self.assertEqual(profile.wins, 22)
 
+    def testMapQueryToSummaryWorks(self):
+        """Verifies that the mapQueryToSummary function behaves correctly
+            with valid input, and that list queries only select its columns.
+
+            Input: self - Pointer to the current object instance.
+
+            Output: none.
+        """
+
+        summary = self.uut.mapQueryToSummary(query = ("id", "Sally", 0, 1.5, 0))
+
+        self.assertEqual(summary.id, "id")
+        self.assertEqual(summary.name, "Sally")
+        self.assertEqual(summary.rarity, rc.RarityList(0))
+        self.assertEqual(summary.average, 1.5)
+        self.assertEqual(summary.job, cj.CharacterJobTypeEnum.UNOCCUPIED)
+
+        for key in ('get_all_workers', 'get_owned_profs', 'get_owned_profs_byname', 'get_unoccupied_profs'):
+
+            self.assertTrue(self.uut.cmds['prof'][key].startswith("SELECT pr_ID, name, rarity, stats_avg, job FROM"), key)
+
     def testPutDropdownWorks(self):
         """Verifies that the putDropdown function behaves correctly with valid
            input.
@@ -744,7 +805,7 @@ class TestMariadbIfc(unittest.TestCase):
         self.uut.resetDailyRoll()
 
         self.cursor.execute.assert_called_once()
-        self.cursor.execute.assert_called_with(self.uut.cmds['user']['reset_daily'])
+        self.cursor.execute.assert_called_with(self.uut.cmds['user']['reset_daily'], ())
 
     def testResetDailyRollFails(self):
         """Verifies that the resetDailyRoll function behaves correctly if the
@@ -761,7 +822,7 @@ class TestMariadbIfc(unittest.TestCase):
         self.uut.resetDailyRoll()
 
         self.cursor.execute.assert_called_once()
-        self.cursor.execute.assert_called_with(self.uut.cmds['user']['reset_daily'])
+        self.cursor.execute.assert_called_with(self.uut.cmds['user']['reset_daily'], ())
 
         self.cursor.execute.side_effect = None
 
@@ -824,8 +885,49 @@ class TestMariadbIfc(unittest.TestCase):
 
         self.assertEqual(self.cursor.execute.call_count, 7)
 
+        #New profiles start out pointing at the configured default picture.
+        params = next(x.args[1] for x in self.cursor.execute.call_args_list if x.args[0] == self.uut.cmds['prof']['put_new'])
+        self.assertEqual(params[0], bytes.fromhex(self.uut.db_cmds['default_id'][2:]))
+
         self.cursor.fetchone.side_effect = None
 
+    def testPicturesUseImageStore(self):
+        """Verifies that with an image store, rolls save the picture to it and
+           only the hash to the DB, and that getImage reads it back.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with tempfile.TemporaryDirectory() as path:
+
+            self.uut.store = ims.ImageStore(opts={'path' : path, 'fsync' : "False"})
+
+            try:
+                self.cursor.execute.reset_mock()
+                self.cursor.__iter__ = MagicMock(return_value=iter([]))
+                self.cursor.fetchone.side_effect = [["00", "now"], ["id"], ['{}']]
+
+                self.uut.saveRoll(img     = b"picture",
+                                  info    = {},
+                                  profile = pg.getDefaultProfile())
+
+                digest = hashlib.sha256(b"picture").hexdigest()
+                params = self.cursor.execute.call_args_list[2][0][1]
+
+                self.assertEqual(params[3:], (b"", digest))
+
+                self.cursor.fetchone.side_effect  = None
+                self.cursor.fetchone.return_value = (b"", digest)
+
+                self.assertEqual(self.uut.getImage(picture_id = "id"), b"picture")
+
+            finally:
+                self.uut.store                    = None
+                self.cursor.fetchone.side_effect  = None
+                self.cursor.fetchone.return_value = None
+
     def testUpdateDailyKeyGenWorkWorks(self):
         """Verifies that the updateDailyKeyGenWork function behaves correctly
            with valid input.
@@ -858,3 +960,250 @@ class TestMariadbIfc(unittest.TestCase):
 
         self.cursor.execute.assert_called_once()
         self.cursor.execute.side_effect = None
+
+#####  Connection Pool Class  #####
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.connect = MagicMock(side_effect=lambda: MagicMock())
+        self.opts    = {'size'             : "2",
+                        'ping_interval'    : "60",
+                        'idle_timeout'     : "3600",
+                        'checkout_timeout' : "0.1"}
+        self.uut     = cp.ConnectionPool(connect=self.connect,
+                                         opts=self.opts)
+
+    def testNestedCheckoutsShareConnection(self):
+        """Verifies that checkouts on the same thread share a connection, and
+           that it's reused by the next checkout.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with self.uut.connection() as outer:
+
+            with self.uut.connection() as inner:
+
+                self.assertIs(inner, outer)
+                self.assertIs(self.uut.getCurrent(), outer)
+
+        self.assertEqual(self.uut.getCurrent(), None)
+
+        with self.uut.connection() as again:
+
+            self.assertIs(again, outer)
+
+        self.connect.assert_called_once()
+
+    def testThreadsGetOwnConnections(self):
+        """Verifies that another thread gets its own connection, and waits
+           for one once the pool is full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        results = []
+
+        def checkout():
+
+            try:
+                with self.uut.connection() as connection:
+                    results.append(connection)
+
+            except TimeoutError as err:
+                results.append(err)
+
+        with self.uut.connection() as connection:
+
+            worker = th.Thread(target=checkout)
+            worker.start()
+            worker.join()
+
+            self.assertIsNot(results[0], connection)
+
+            with self.uut.connection():
+
+                self.uut.slots.acquire()
+                worker = th.Thread(target=checkout)
+                worker.start()
+                worker.join()
+                self.uut.slots.release()
+
+        self.assertIsInstance(results[1], TimeoutError)
+        self.assertEqual(self.uut.getOpenCount(), 2)
+
+    def testIdleConnectionsAreChecked(self):
+        """Verifies that an idle connection is pinged before reuse, and
+           replaced if the ping fails.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        uut  = cp.ConnectionPool(connect=self.connect,
+                                 opts=dict(self.opts, ping_interval="0"))
+        dead = MagicMock()
+        dead.ping.side_effect = mariadb.Error
+
+        uut.add(dead)
+
+        with uut.connection() as connection:
+
+            self.assertIsNot(connection, dead)
+
+        dead.close.assert_called_once()
+
+        with uut.connection() as again:
+
+            self.assertIs(again, connection)
+
+        connection.ping.assert_called_once()
+        self.assertEqual(uut.getOpenCount(), 1)
+
+    def testStaleConnectionsAreClosed(self):
+        """Verifies that connections idle past the timeout, or whose link
+           failed, are closed instead of reused.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        uut   = cp.ConnectionPool(connect=self.connect,
+                                  opts=dict(self.opts, idle_timeout="0"))
+        stale = MagicMock()
+
+        uut.add(stale)
+
+        with self.assertRaises(mariadb.InterfaceError):
+            with uut.connection() as connection:
+
+                uut.getStatements()['SELECT 1;'] = MagicMock()
+                raise mariadb.InterfaceError
+
+        stale.close.assert_called_once()
+        connection.close.assert_called_once()
+        self.assertEqual(uut.statements, {})
+        self.assertEqual(uut.getOpenCount(), 0)
+
+        with self.assertRaises(ValueError):
+            cp.ConnectionPool(connect=self.connect,
+                              opts=dict(self.opts, size="0"))
+
+    def testFailedStatementsArePreparedAgain(self):
+        """Verifies that a statement error drops the connection's prepared
+           statements but keeps the connection.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with self.assertRaises(mariadb.ProgrammingError):
+            with self.uut.connection() as connection:
+
+                cursor = MagicMock()
+                self.uut.getStatements()['SELECT 1;'] = cursor
+                raise mariadb.ProgrammingError
+
+        cursor.close.assert_called_once()
+        connection.close.assert_not_called()
+        self.assertEqual(self.uut.statements, {})
+        self.assertEqual(self.uut.getOpenCount(), 1)
+
+        with self.uut.connection() as reused:
+
+            self.assertIs(reused, connection)
+
+#####  Image Store Class  #####
+
+class TestImageStore(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.folder = tempfile.TemporaryDirectory()
+        self.uut    = ims.ImageStore(opts={'path'  : os.path.join(self.folder.name, "images"),
+                                           'fsync' : "True"})
+
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.folder.cleanup()
+
+    def testPutThenGet(self):
+        """Verifies that an image is stored under its sharded hash and can be
+           read back.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        digest = self.uut.put(b"image data")
+
+        self.assertEqual(digest, hashlib.sha256(b"image data").hexdigest())
+        self.assertEqual(self.uut.getPath(digest),
+                         self.uut.root / digest[0:2] / digest[2:4] / f"{digest}.png")
+        self.assertEqual(self.uut.get(digest), b"image data")
+        self.assertEqual(self.uut.get("0" * 64), b"")
+
+    def testDuplicatesAreStoredOnce(self):
+        """Verifies that storing the same image twice keeps one file, and no
+           temporary files are left behind.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        first  = self.uut.put(b"same")
+        second = self.uut.put(b"same")
+
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(self.uut.getPath(first).parent), [f"{first}.png"])
+
+    def testRejectsInvalidHashes(self):
+        """Verifies that only SHA-256 hashes can be turned into paths.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        for digest in ("../../etc/passwd", "ABC", "g" * 64):
+
+            with self.assertRaises(ValueError):
+                self.uut.get(digest)
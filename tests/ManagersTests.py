@@ -5,23 +5,241 @@
 #####  Imports  #####
 
 from . import MockClasses as mc
+import asyncio
 import discord as dis
 import json
 import multiprocessing as mp
+import multiprocessing.connection as mpc
 import pathlib as pl
+import os
 import queue
+import requests as req
 import src.db.MariadbIfc as mdb
+import src.managers.BackendMgr as bm
 import src.managers.DailyEventMgr as dem
+import src.managers.DegradePolicy as dp
+import src.managers.JobBroker as jb
+import src.managers.JobJournal as jj
+import src.managers.JobScheduler as js
+import src.managers.MetricsRegistry as mr
+import src.managers.ProgressReporter as pr
 import src.managers.QueueMgr as qm
+import src.managers.RateLimiter as rl
+import src.managers.RollReservoir as rr
+import src.managers.ServiceEstimator as se
+import src.utilities.ImageEncoder as ie
 import src.utilities.JobFactory as jf
 import src.utilities.NameRandomizer as nr
+import src.utilities.ResultCache as rc
+import src.utilities.SDClient as sc
+import tempfile
+import threading as th
 import time
 from typing import Callable, Optional, Any
 import unittest
 from unittest.mock import patch
+from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import PropertyMock
 
+#####  Backend Manager Class  #####
+
+class TestBackendManager(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = bm.Backend(backend_id = 0,
+                              opts       = {'url'       : "http://127.0.0.1:7860/",
+                                            'job_count' : "2"})
+
+    def testGetBackendOptionsHandlesLegacyURL(self):
+        """Verifies that a config with only 'webui_URL' becomes a single
+           backend using the queue-wide job count.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        result = bm.getBackendOptions(opts={'job_count' : "3",
+                                            'webui_URL' : "http://a/"})
+
+        self.assertEqual(result, [{'url' : "http://a/", 'job_count' : "3", 'max_batch' : 1}])
+
+    def testGetBackendOptionsMixesEntries(self):
+        """Verifies that backends can be given as bare URLs or dicts, and
+           only inherit the queue-wide job count if they don't set their own.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        result = bm.getBackendOptions(opts={'backends'  : ["http://a/",
+                                                           {'url' : "http://b/", 'job_count' : "4"}],
+                                            'job_count' : "1",
+                                            'max_batch' : "2"})
+
+        self.assertEqual(result, [{'url' : "http://a/", 'job_count' : "1", 'max_batch' : "2"},
+                                  {'url' : "http://b/", 'job_count' : "4", 'max_batch' : "2"}])
+
+    def testGetBackendOptionsRejectsEmptyList(self):
+        """Verifies that a Manager can't be configured without a backend.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with self.assertRaises(ValueError):
+            bm.getBackendOptions(opts={'backends' : []})
+
+    def testAcquireRespectsJobCount(self):
+        """Verifies that a backend never hands out more slots than its
+           job count.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertTrue(self.uut.acquire())
+        self.assertTrue(self.uut.acquire())
+        self.assertFalse(self.uut.acquire())
+        self.assertEqual(self.uut.active, 2)
+
+    def testReleaseTracksHealth(self):
+        """Verifies that failures mark a backend unhealthy and a success
+           restores it.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.acquire()
+        self.uut.release(success=False)
+
+        self.assertFalse(self.uut.healthy)
+        self.assertFalse(self.uut.isIdle())
+        self.assertEqual(self.uut.failures, 1)
+
+        self.uut.acquire()
+        self.uut.release(success=True)
+
+        self.assertTrue(self.uut.healthy)
+        self.assertTrue(self.uut.isIdle())
+        self.assertEqual(self.uut.completed, 1)
+
+    def testCircuitOpensAndRecovers(self):
+        """Verifies that consecutive failures open a backend's circuit, that
+           it half-opens after 'open_time', and that the next outcome decides
+           whether it closes or opens again.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = bm.Backend(backend_id = 0,
+                              opts       = {'url'               : "http://127.0.0.1:7860/",
+                                            'job_count'         : "1",
+                                            'failure_threshold' : "2",
+                                            'open_time'         : "0.05"})
+
+        self.uut.record(success=False)
+        self.assertTrue(self.uut.isAvailable())
+        self.uut.record(success=False)
+
+        self.assertEqual(self.uut.state, bm.BreakerStateEnum.OPEN)
+        self.assertFalse(self.uut.isAvailable())
+        self.assertFalse(self.uut.acquire())
+
+        time.sleep(0.06)
+
+        self.assertTrue(self.uut.isAvailable())
+        self.assertEqual(self.uut.state, bm.BreakerStateEnum.HALF_OPEN)
+        self.uut.record(success=False)
+        self.assertFalse(self.uut.isAvailable())
+
+        time.sleep(0.06)
+
+        self.assertTrue(self.uut.acquire())
+        self.uut.release(success=True)
+        self.assertEqual(self.uut.state, bm.BreakerStateEnum.CLOSED)
+        self.assertEqual(self.uut.failures, 0)
+
+    def testPauseFollowsLoad(self):
+        """Verifies that the pause after a job grows with the share of time
+           the backend has recently been busy.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertEqual(self.uut.getPause(1.0), 0.0)
+
+        with patch('time.monotonic') as time_patch:
+            #Idle for 9 seconds, then busy for 1.
+            time_patch.side_effect = [9.0, 10.0]
+            self.uut.changed_at    = 0.0
+
+            self.uut.acquire()
+            self.uut.release(success=True)
+
+        self.assertAlmostEqual(self.uut.getPause(1.0), 0.1)
+
+        with patch('time.monotonic') as time_patch:
+            #Immediately busy again, for 9 seconds.
+            time_patch.side_effect = [10.0, 19.0]
+
+            self.uut.acquire()
+            self.uut.release(success=True)
+
+        self.assertGreater(self.uut.getPause(1.0), 0.5)
+
+    @patch('requests.get')
+    def testProbeRecordsHealth(self, mock_get):
+        """Verifies that health probes update the circuit and are skipped
+           while it's open.
+
+           Input: self - Pointer to the current object instance.
+                  mock_get - A mock of requests.get.
+
+           Output: none.
+        """
+
+        mock_get.side_effect = req.exceptions.ConnectionError()
+
+        self.assertFalse(self.uut.probe(timeout=1.0))
+        self.assertFalse(self.uut.healthy)
+        mock_get.assert_called_once_with(url="http://127.0.0.1:7860/sdapi/v1/memory", timeout=1.0)
+
+        self.uut.open_time = 60.0
+        self.uut.record(success=False)
+
+        self.assertIsNone(self.uut.probe(timeout=1.0))
+        self.assertEqual(mock_get.call_count, 1)
+
+        self.uut.open_time    = 0.0
+        mock_get.side_effect  = None
+        mock_get.return_value = mc.MockBatchResult()
+
+        self.assertTrue(self.uut.probe(timeout=1.0))
+        self.assertTrue(self.uut.healthy)
+        self.assertEqual(self.uut.state, bm.BreakerStateEnum.CLOSED)
+
 #####  Daily Event Manager Class  #####
 
 class TestDailyEventManager(unittest.TestCase):
@@ -78,9 +296,59 @@ class TestDailyEventManager(unittest.TestCase):
         self.uut.dailyReset()
         self.assertTrue(True)
 
-#####  Queue Manager Class  #####
+#####  Degrade Policy Class  #####
 
-class TestQueueManager(unittest.TestCase):
+class TestDegradePolicy(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.opts = {'queue_depth' : "5",
+                     'wait'        : "60.0",
+                     'max_steps'   : "30",
+                     'hires'       : "False",
+                     'scale'       : "0.5",
+                     'min_size'    : "256",
+                     'step_size'   : "64"}
+        self.uut  = dp.DegradePolicy(opts=self.opts)
+
+    def testProfileOnlyWhenBusy(self):
+        """Verifies that a profile is only given once either threshold is
+           reached, and that a threshold of 0 is never reached.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertEqual(self.uut.getProfile(depth=4, wait=59.0), None)
+        self.assertEqual(self.uut.getProfile(depth=5, wait=0.0), {'max_steps' : 30,
+                                                                  'hires'     : False,
+                                                                  'scale'     : 0.5,
+                                                                  'min_size'  : 256,
+                                                                  'step_size' : 64})
+        self.assertNotEqual(self.uut.getProfile(depth=0, wait=60.0), None)
+
+        self.uut = dp.DegradePolicy(opts=dict(self.opts, wait="0.0"))
+
+        self.assertFalse(self.uut.usesWait())
+        self.assertEqual(self.uut.getProfile(depth=0, wait=1000.0), None)
+
+        with self.assertRaises(ValueError):
+            dp.DegradePolicy(opts=dict(self.opts, scale="1.5"))
+
+#####  Job Broker Class  #####
+
+class TestJobBroker(unittest.TestCase):
 
     def setUp(self):
         """Method called to prepare the test fixture. This is called
@@ -94,208 +362,2273 @@ class TestQueueManager(unittest.TestCase):
            Output: none.
         """
 
-        #This section is intentionally written like the actual code in
-        #imageGenSD.py.
         cfg_path = pl.Path('src/config/config.json')
 
         with open(cfg_path.absolute()) as json_file:
             params = json.load(json_file)
 
-        self.options = params['queue_opts']
+        self.options                 = params['queue_opts']
+        self.options['post_workers'] = "0"
+        self.broker_opts             = dict(self.options['broker'], enabled="True", port="0", retry_delay="0.0")
+        self.options['broker']       = self.broker_opts
 
         self.uut = qm.Manager(manager_id = 1,
-                              opts=self.options)
+                              opts       = self.options)
 
         self.metadata = {'ctx'     : mc.MockInteraction(),
-                         'db_ifc'  : mc.MockDbInterface(),
-                         'loop'    : mc.MockLoop(),
+                         'loop'    : MagicMock(wraps=mc.MockLoop()),
                          'post_fn' : mc.post,
                          'tag_rng' : mc.MockTagSource()
         }
+        self.job      = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                             ctx=self.metadata['ctx'])
 
-        nr.getRandomName              = MagicMock()
-        nr.getRandomName.return_value = "Default Sally"
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
 
-        self.job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
-                                        ctx=self.metadata['ctx'])
+    def waitFor(self,
+                check : Callable) -> bool:
+        """Waits up to a few seconds for another thread to make 'check'
+           true.
 
-    def testQueueManagerBuilds(self):
-        """A simple verification that the Queue Manager class will build
-           correctly if given valid inputs.
+           Input: self - Pointer to the current object instance.
+                  check - Returns whether the wait is over.
+
+           Output: bool - The last result of 'check'.
+        """
+
+        #time.sleep may have been mocked out by an earlier test.
+        pause = th.Event()
+
+        for x in range(500):
+
+            if check():
+
+                return True
+
+            pause.wait(0.01)
+
+        return check()
+
+    @patch('requests.get')
+    def testWorkerRunsBrokerJobs(self, mock_get):
+        """Verifies that a remote worker runs the Manager's job against its
+           own webui and the Manager posts the result it sends back.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.assertTrue(True)
+        mock_get.return_value = mc.MockResult()
+        broker_end, worker_end = mp.Pipe()
+        worker                 = jb.JobWorker(opts    = self.broker_opts,
+                                              web_url = "http://remote/")
+        threads                = [th.Thread(target=self.uut.broker.serveWorker, args=(broker_end,), daemon=True),
+                                  th.Thread(target=worker.serve, args=(worker_end,), daemon=True)]
 
-    def testFlushSetsFlush(self):
-        """Verifies that the Flush function correctly sets the 'flush' flag
+        for thread in threads:
+            thread.start()
+
+        self.assertTrue(self.waitFor(lambda: self.metadata['loop'].create_task.called))
+        self.uut.keep_going = False
+
+        for thread in threads:
+            thread.join(timeout=5.0)
+
+        mock_get.assert_called_once_with(url="http://remote/sdapi/v1/memory", timeout=5)
+        self.assertEqual(self.job.getStatusCode(), 200)
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+        self.assertEqual(self.uut.broker.getWorkerCount(), 0)
+
+    def testLostWorkerFailsJob(self):
+        """Verifies that a job is failed and posted if its worker goes away
+           before sending the result.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
-        self.uut.flush()
 
-        self.assertTrue(self.uut.flush)
+        broker_end, worker_end = mp.Pipe()
+        thread                 = th.Thread(target=self.uut.broker.serveWorker, args=(broker_end,), daemon=True)
 
-    def testAddAcceptsValidInput(self):
-        """Verifies that the add function behaves correctly with valid input.
+        thread.start()
+        worker_end.send((jb.BrokerMessageEnum.GET, None))
+        kind, payload = worker_end.recv()
+        worker_end.close()
+        thread.join(timeout=5.0)
+
+        self.assertEqual(kind, jb.BrokerMessageEnum.JOB)
+        self.assertEqual(payload[0].getJobId(), self.job.getJobId())
+        self.assertEqual(self.job.getStatusCode(), 502)
+        self.metadata['loop'].create_task.assert_called_once()
+
+    def testFailedSendFailsJob(self):
+        """Verifies that a job is failed and its reservation released if it
+           can't be sent to a worker for any reason.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.job.randomize = True
+        conn      = MagicMock()
+        conn.send = MagicMock(side_effect=TypeError("cannot pickle"))
 
-        result = self.uut.add(metadata=self.metadata,
-                              job=self.job)
-        self.uut.jobs = {}
+        with self.assertRaises(TypeError):
+            self.uut.broker.runJob(conn=conn,
+                                   job=self.job)
 
-        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+        self.assertEqual(self.job.getStatusCode(), 502)
+        self.assertNotIn(self.job.getGuild(), self.uut.queue.jobs)
+        self.metadata['loop'].create_task.assert_called_once()
 
-    def testAddRejectsExcessiveGuildCount(self):
-        """Verifies that the add function rejects adding jobs if it is already
-           serving the maximum number of Guilds.
+    def testAcceptRejectsWrongKey(self):
+        """Verifies that the broker only accepts workers with its key.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        for x in range (self.uut.max_guilds + 1):
-            self.uut.jobs[x] = x
-        result = self.uut.add(metadata=self.metadata,
-                              job=self.job)
-        self.uut.jobs = {}
+        broker = self.uut.broker
+        broker.listen()
+        address = broker.listener.address
+        result  = []
+        thread  = th.Thread(target=lambda: result.append(broker.accept()), daemon=True)
 
-        self.assertEqual(result, "Bot is currently servicing the maximum number of allowed Guilds.")
+        thread.start()
 
-    def testAddRejectsExcessiveJobCount(self):
-        """Verifies that the add function rejects adding jobs if it is already
-           at the job limit for a Guild.
+        with self.assertRaises(mp.AuthenticationError):
+            mpc.Client(address=address, authkey=b"wrong")
+
+        thread.join(timeout=5.0)
+        broker.close()
+
+        self.assertEqual(result, [None])
+
+#####  Job Journal Class  #####
+
+class TestJobJournal(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.uut.max_guild_reqs = 0
+        self.dir  = tempfile.TemporaryDirectory()
+        self.opts = {'compact_every' : "100",
+                     'fsync'         : "False",
+                     'path'          : os.path.join(self.dir.name, 'journal')}
+        self.uut  = jj.JobJournal(opts=self.opts)
+        self.jobs = [jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                          ctx=mc.MockInteraction()) for x in range(3)]
 
-        result = self.uut.add(metadata=self.metadata,
-                              job=self.job)
-        self.uut.jobs = {}
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
 
-        self.assertEqual(result, "Unable to add your job, too many jobs from this Guild are already in the queue.")
+           Input: self - Pointer to the current object instance.
 
-    def testAddRejectsDuplicateJobs(self):
-        """Verifies that the add function rejects adding jobs if it is already
-           has a job from that user in the queue (per guild).
+           Output: none.
+        """
+
+        self.uut.close()
+        self.dir.cleanup()
+
+    def testUnfinishedJobsSurviveRestart(self):
+        """Verifies that only jobs that were never posted are reloaded, with
+           their last recorded state.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.uut.jobs[mc.DEFAULT_GUILD_ID] = {}
+        for job in self.jobs:
+            self.uut.record(state=jj.JournalStateEnum.QUEUED,
+                            job=job,
+                            info={'channel_id' : 5})
 
-        result = self.uut.add(metadata=self.metadata,
-                              job=self.job)
+        self.uut.record(state=jj.JournalStateEnum.DISPATCHED, job=self.jobs[0])
+        self.uut.record(state=jj.JournalStateEnum.POSTED, job=self.jobs[1])
+        self.uut.close()
 
-        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+        self.uut = jj.JobJournal(opts=self.opts)
+        pending  = self.uut.getPending()
 
-        result = self.uut.add(metadata=self.metadata,
-                              job=self.job)
-        self.uut.jobs = {}
+        self.assertEqual([(x[0], x[1].getJobId(), x[2]) for x in pending],
+                         [(jj.JournalStateEnum.DISPATCHED, self.jobs[0].getJobId(), {'channel_id' : 5}),
+                          (jj.JournalStateEnum.QUEUED, self.jobs[2].getJobId(), {'channel_id' : 5})])
 
-        self.assertEqual(result, "You already have a job on the queue, please wait until it's finished.")
+    def testPrerenderedRollIsJournaledAsLiveRoll(self):
+        """Verifies that a roll answered from the reservoir is journaled
+           without its image, as a roll that can be replayed.
 
-    def testAddFailsWhenFull(self):
-        """Verifies that the add function rejects adding jobs if it is already
-           alraedy full.
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                   ctx=mc.MockInteraction(),
+                                   options={'prompt' : "base",
+                                            'random' : True,
+                                            'seed'   : -1})
+        job.usePrerendered({'post_data' : {'prompt' : "base,Default,Tag", 'seed' : -1},
+                            'prompt'    : "base",
+                            'result'    : sc.SDResponse(status_code = 200,
+                                                        reason      = "OK",
+                                                        data        = {'images' : ["A" * 100000]})})
+
+        self.uut.record(state=jj.JournalStateEnum.QUEUED,
+                        job=job)
+        self.uut.close()
+
+        self.assertLess(os.path.getsize(self.opts['path']), 10000)
+
+        self.uut = jj.JobJournal(opts=self.opts)
+        replay   = self.uut.getPending()[0][1]
+
+        self.assertTrue(job.prerendered)
+        self.assertFalse(replay.prerendered)
+        self.assertTrue(replay.isReplayable())
+        self.assertEqual(replay.getJobId(), job.getJobId())
+        self.assertEqual(replay.getPriority(), jf.JobPriorityEnum.DAILY)
+        self.assertEqual(replay.post_data['prompt'], "base,Default,Tag")
+        self.assertFalse(self.jobs[0].isReplayable())
+
+    def testIgnoresPartialRecord(self):
+        """Verifies that a record cut off by a crash doesn't stop the rest of
+           the journal from loading.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        with patch.object(self.uut.queue, 'put') as put_patch:
-            put_patch.side_effect = queue.Full
+        self.uut.record(state=jj.JournalStateEnum.QUEUED, job=self.jobs[0])
+        self.uut.close()
 
-            result = self.uut.add(metadata=self.metadata,
-                                  job=self.job)
+        with open(self.opts['path'], 'ab') as journal:
+            journal.write(jj.RECORD_HEADER.pack(500) + b'cut off')
 
-        self.assertEqual(result, "The work queue is currently full, please wait a bit before making another job.")
+        self.uut = jj.JobJournal(opts=self.opts)
 
-    def testAddFailsWhenGenericError(self):
-        """Verifies that the add function rejects adding jobs if it is already
-           alraedy full.
+        self.assertEqual(len(self.uut.getPending()), 1)
+
+    def testCompactsFinishedJobs(self):
+        """Verifies that the journal is rewritten without finished jobs once
+           enough records have been written.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        with patch.object(self.uut.queue, 'put') as put_patch:
-            put_patch.side_effect = Exception
+        self.uut.compact_every = 4
 
-            result = self.uut.add(metadata=self.metadata,
-                                  job=self.job)
+        for job in self.jobs[:2]:
+            self.uut.record(state=jj.JournalStateEnum.QUEUED, job=job)
+            self.uut.record(state=jj.JournalStateEnum.POSTED, job=job)
 
-        self.assertEqual(result, "Unable to add your job to the queue.  Are you sending more than text and numbers?")
+        self.assertEqual(os.path.getsize(self.opts['path']), 0)
+        self.assertEqual(self.uut.getPending(), [])
 
-    def testPutJobMainPathWorks(self):
-        """Verifies that the putJob function runs correctly with valid input.
+#####  Metrics Registry Class  #####
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.uut.flush_queue         = True
-        self.uut.job_cooldown        = 0.01
-        self.uut.jobs[mc.DEFAULT_GUILD_ID] = {}
-        self.uut.jobs[mc.DEFAULT_GUILD_ID][mc.DEFAULT_PROFILE_ID] = self.metadata
+        self.uut = mr.MetricsRegistry()
 
-        with patch.object(self.uut.queue, 'get') as get_patch:
-            # the first job will be run normally (but throw on job.doWork),
-            # after the second job, self.jobs will be seen as empty
-            #   so the guild will be removed from the list
-            # third, we throw an AssertionError to get putJob to stop
-            # this third option could also be done by patching keep_going
-            #   but it couldn't be done gracefully
-            get_patch.side_effect = [self.job, self.job, AssertionError]
+    def testHistogramRendersCumulativeBuckets(self):
+        """Verifies that histogram buckets count every value at or under
+           their bound, with the sum and count after them.
 
-            with self.assertRaises(AssertionError):
-                self.uut.putJob()
+           Input: self - Pointer to the current object instance.
 
-        self.assertTrue(self.uut.flush)
+           Output: none.
+        """
 
-    def testPutJobCanBeStopped(self):
-        """Verifies that the putJob function will halt if told to.
+        hist = self.uut.histogram(name      = 'test_seconds',
+                                  help_text = "A test histogram.",
+                                  buckets   = (1.0, 5.0),
+                                  labels    = ('lane',))
+
+        for value in (0.5, 1.0, 3.0, 10.0):
+            hist.observe(value, lane="generate")
+
+        self.assertEqual(self.uut.render(), "# HELP test_seconds A test histogram.\n"
+                                            "# TYPE test_seconds histogram\n"
+                                            'test_seconds_bucket{lane="generate",le="1.0"} 2.0\n'
+                                            'test_seconds_bucket{lane="generate",le="5.0"} 3.0\n'
+                                            'test_seconds_bucket{lane="generate",le="+Inf"} 4.0\n'
+                                            'test_seconds_sum{lane="generate"} 14.5\n'
+                                            'test_seconds_count{lane="generate"} 4.0\n')
+
+    def testCounterChecksLabels(self):
+        """Verifies that counters add up per label set, escape their label
+           values, and refuse labels they weren't created with.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        self.uut.keep_going = False
+        counter = self.uut.counter(name      = 'test_total',
+                                   help_text = "A test counter.",
+                                   labels    = ('reason',))
 
-        self.uut.putJob()
+        counter.inc(reason='a "quoted" reason')
+        counter.inc(2, reason='a "quoted" reason')
 
-        self.assertTrue(True)
+        self.assertEqual(counter.get(reason='a "quoted" reason'), 3.0)
+        self.assertIn('test_total{reason="a \\"quoted\\" reason"} 3.0\n', self.uut.render())
 
-    def testRunWorks(self):
-        """A simple verification that the Queue Manager class will run
+        with self.assertRaises(ValueError):
+            counter.inc(scope="user")
+
+        with self.assertRaises(ValueError):
+            self.uut.counter(name      = 'test_total',
+                             help_text = "A duplicate.")
+
+    def testServerServesMetrics(self):
+        """Verifies that the server answers the metrics path in the text
+           format and nothing else.
 
            Input: self - Pointer to the current object instance.
 
            Output: none.
         """
 
-        # run is currently a stub method, so this test is too
-        self.uut.run()
-        self.assertTrue(True)
+        self.uut.gauge(name      = 'test_depth',
+                       help_text = "A test gauge.",
+                       read      = lambda: {() : 3})
+        server = mr.MetricsServer(opts     = {'host' : "127.0.0.1", 'port' : "0"},
+                                  registry = self.uut)
+        server.start()
+
+        try:
+            url    = f"http://127.0.0.1:{server.getPort()}"
+            result = req.get(url=f"{url}/metrics", timeout=5)
+            missed = req.get(url=f"{url}/other", timeout=5)
+
+        finally:
+            server.stop()
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers['Content-Type'], mr.CONTENT_TYPE)
+        self.assertIn("test_depth 3.0\n", result.text)
+        self.assertEqual(missed.status_code, 404)
+
+#####  Queue Manager Class  #####
+
+class TestQueueManager(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        #This section is intentionally written like the actual code in
+        #imageGenSD.py.
+        cfg_path = pl.Path('src/config/config.json')
+
+        with open(cfg_path.absolute()) as json_file:
+            params = json.load(json_file)
+
+        self.options = params['queue_opts']
+        #Posting on the worker keeps results in step with the tests.
+        self.options['post_workers'] = "0"
+
+        self.uut = qm.Manager(manager_id = 1,
+                              opts=self.options)
+
+        self.metadata = {'ctx'     : mc.MockInteraction(),
+                         'db_ifc'  : mc.MockDbInterface(),
+                         'loop'    : mc.MockLoop(),
+                         'post_fn' : mc.post,
+                         'tag_rng' : mc.MockTagSource()
+        }
+
+        nr.getRandomName              = MagicMock()
+        nr.getRandomName.return_value = "Default Sally"
+
+        self.job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                        ctx=self.metadata['ctx'])
+        #Stands in for the webui's answer when doWork is mocked.
+        self.job.result.status_code = 200
+
+    def testQueueManagerBuilds(self):
+        """A simple verification that the Queue Manager class will build
+           correctly if given valid inputs.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertTrue(True)
+
+    def testWarnsWithoutPillow(self):
+        """Verifies that enabling image encoding or previews without Pillow
+           is logged instead of silently doing nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        options = json.loads(json.dumps(self.options))
+        options['image_encoding']['enabled'] = "True"
+        options['progress']['enabled']       = "True"
+        options['progress']['preview']       = "True"
+
+        with patch.object(ie, 'Image', None), patch.object(pr, 'Image', None):
+
+            with self.assertLogs('queue_2', level='WARNING') as logs:
+                qm.Manager(manager_id = 2,
+                           opts       = options)
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertTrue(all("Pillow isn't installed" in x for x in logs.output))
+
+    def testFlushRemovesQueuedJobs(self):
+        """Verifies that flushing a Guild removes its queued jobs and leaves
+           other Guilds alone.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        other = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                     ctx=self.metadata['ctx'])
+        other.guild = mc.DEFAULT_GUILD_ID + 1
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+        self.uut.add(metadata=self.metadata,
+                     job=other)
+
+        self.assertEqual(self.uut.flush(guild_id=mc.DEFAULT_GUILD_ID), 1)
+        self.assertEqual(self.uut.queue.qsize(), 1)
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+        self.assertEqual(self.uut.queue.get(block=False), other)
+
+        #A job a worker already took is dropped once the worker is done.
+        self.assertEqual(self.uut.flush(), 1)
+        self.assertEqual(self.uut.queue.jobs, {})
+        self.assertEqual(self.uut.cancelled, {other.getJobId()})
+
+        self.uut._finishJobs([other])
+        self.assertEqual(self.uut.accepted, {})
+
+    def testCancelRemovesQueuedJob(self):
+        """Verifies that cancelling removes the user's queued job so they can
+           post another right away.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+
+        self.assertEqual(self.uut.cancel(user_id=self.job.getUserId()), 1)
+        self.assertEqual(self.uut.queue.qsize(), 0)
+        self.assertEqual(self.uut.user_jobs, {})
+        self.assertEqual(self.uut.cancel(user_id=self.job.getUserId()), 0)
+
+        job    = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                      ctx=self.metadata['ctx'])
+        result = self.uut.add(metadata=self.metadata,
+                              job=job)
+
+        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+
+    @patch('requests.post')
+    def testCancelInterruptsRunningJob(self, mock_post):
+        """Verifies that cancelling a running job interrupts its webui call
+           and drops its result, while a job still waiting on the backend is
+           only interrupted once it's the one being rendered.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 0,
+                             opts       = {'url' : "http://a/", 'job_count' : 2})
+        jobs    = []
+        self.metadata['loop'] = MagicMock(wraps=mc.MockLoop())
+        mock_post.return_value.status_code = 200
+
+        for x in range(2):
+            job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                       ctx=self.metadata['ctx'])
+            job.user_id = x
+            jobs.append(job)
+
+            self.uut.add(metadata=self.metadata,
+                         job=job)
+            self.uut.queue.get(block=False)
+            self.uut._startRunning(backend=backend,
+                                   batch=[job])
+
+        self.assertEqual(self.uut.cancel(user_id=1), 1)
+        mock_post.assert_not_called()
+
+        self.assertEqual(self.uut.cancel(user_id=0), 1)
+        mock_post.assert_called_once_with(url="http://a/sdapi/v1/interrupt",
+                                          timeout=self.uut.interrupt_timeout)
+
+        self.uut._stopRunning(backend=backend,
+                              batch=[jobs[0]])
+        self.assertEqual(mock_post.call_count, 2)
+
+        self.uut._stopRunning(backend=backend,
+                              batch=[jobs[1]])
+        self.uut._finishJobs(jobs)
+
+        self.metadata['loop'].create_task.assert_not_called()
+        self.assertEqual(self.uut.running, {})
+        self.assertEqual(self.uut.cancelled, set())
+        self.assertEqual(self.uut.accepted, {})
+
+    def testPostPoolPreparesJobs(self):
+        """Verifies that finished jobs are prepared in the post pool before
+           being handed to the loop thread-safely, and failed jobs skip
+           preparation.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.options['post_workers'] = "1"
+        self.metadata['loop']        = MagicMock(wraps=mc.MockLoop())
+        failed                       = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                                            ctx=self.metadata['ctx'])
+        failed.user_id               = mc.DEFAULT_PROFILE_ID + 1
+
+        uut = qm.Manager(manager_id = 1,
+                         opts       = self.options)
+
+        for job in [self.job, failed]:
+            job.preparePost = MagicMock()
+            uut.add(metadata=self.metadata,
+                    job=job)
+
+        self.job.setResult(sc.SDResponse(status_code = 200,
+                                         reason      = "OK",
+                                         data        = {}))
+        failed.setResult(sc.SDResponse(status_code = 500,
+                                       reason      = "Error",
+                                       data        = {}))
+
+        uut._finishJobs([self.job, failed])
+        uut.post_pool.shutdown(wait=True)
+
+        self.job.preparePost.assert_called_once_with(metadata=self.metadata,
+                                                     encoder=None)
+        failed.preparePost.assert_not_called()
+        #The pool's thread only hands the posts to the loop.
+        self.assertEqual(self.metadata['loop'].call_soon_threadsafe.call_count, 2)
+        self.assertEqual(self.metadata['loop'].call_soon_threadsafe.call_args.args[0], uut._sendPost)
+        self.assertEqual(self.metadata['loop'].create_task.call_count, 2)
+
+    def testAddAcceptsValidInput(self):
+        """Verifies that the add function behaves correctly with valid input.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.job.randomize = True
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.uut.queue.jobs = {}
+
+        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+
+    def testAddRejectsExcessiveGuildCount(self):
+        """Verifies that the add function rejects adding jobs if it is already
+           serving the maximum number of Guilds.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        for x in range (self.uut.max_guilds + 1):
+            self.uut.queue.jobs[x] = x
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.uut.queue.jobs = {}
+
+        self.assertEqual(result, "Bot is currently servicing the maximum number of allowed Guilds.")
+
+    def testAddRejectsExcessiveJobCount(self):
+        """Verifies that the add function rejects adding jobs if it is already
+           at the job limit for a Guild.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.max_guild_reqs = 0
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.uut.queue.jobs = {}
+
+        self.assertEqual(result, "Unable to add your job, too many jobs from this Guild are already in the queue.")
+
+    def testAddRejectsDuplicateJobs(self):
+        """Verifies that the add function rejects adding jobs if it is already
+           has a job from that user in the queue (per guild).
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {}
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+
+        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.uut.queue.jobs = {}
+
+        self.assertEqual(result, "You already have a job on the queue, please wait until it's finished.")
+
+    def testAddFailsWhenFull(self):
+        """Verifies that the add function rejects adding jobs if it is already
+           alraedy full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch.object(self.uut.queue, 'put') as put_patch:
+            put_patch.side_effect = queue.Full
+
+            result = self.uut.add(metadata=self.metadata,
+                                  job=self.job)
+
+        self.assertEqual(result, "The work queue is currently full, please wait a bit before making another job.")
+
+    def testAddWatchesProgressBeforeQueueing(self):
+        """Verifies that a job's progress is watched before a worker can take
+           it, and isn't watched if the job is rejected or replayed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.progress = pr.ProgressReporter(opts={'edit_interval' : "60.0",
+                                                      'poll_interval' : "1.0",
+                                                      'preview'       : "False",
+                                                      'preview_size'  : "256"})
+
+        def put(job):
+            self.assertTrue(self.uut.progress.isWatching(job))
+            raise queue.Full
+
+        with patch.object(self.uut.queue, 'put') as put_patch:
+            put_patch.side_effect = put
+
+            self.uut.add(metadata=self.metadata,
+                         job=self.job)
+
+        put_patch.assert_called_once()
+        self.assertFalse(self.uut.progress.isWatching(self.job))
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job,
+                     replay=True)
+
+        self.assertEqual(self.uut.queue.qsize(), 1)
+        self.assertFalse(self.uut.progress.isWatching(self.job))
+
+    def testAddFailsWhenGenericError(self):
+        """Verifies that the add function rejects adding jobs if it is already
+           alraedy full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch.object(self.uut.queue, 'put') as put_patch:
+            put_patch.side_effect = Exception
+
+            result = self.uut.add(metadata=self.metadata,
+                                  job=self.job)
+
+        self.assertEqual(result, "Unable to add your job to the queue.  Are you sending more than text and numbers?")
+
+    def testPutJobMainPathWorks(self):
+        """Verifies that the putJob function runs correctly with valid input.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.job_cooldown        = 0.01
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {}
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID][mc.DEFAULT_PROFILE_ID] = self.metadata
+
+        with patch.object(self.uut.queue, 'get') as get_patch:
+            # the first job will be run normally (but throw on job.doWork),
+            # after the second job, self.jobs will be seen as empty
+            #   so the guild will be removed from the list
+            # third, we throw an AssertionError to get putJob to stop
+            # this third option could also be done by patching keep_going
+            #   but it couldn't be done gracefully
+            get_patch.side_effect = [self.job, self.job, AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob()
+
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testPutJobCanBeStopped(self):
+        """Verifies that the putJob function will halt if told to.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.keep_going = False
+
+        self.uut.putJob()
+
+        self.assertTrue(True)
+
+    def testRunWorks(self):
+        """Verifies that the Queue Manager spawns a worker for every job slot
+           of every backend, plus the health probe.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.backends            = [bm.Backend(backend_id = 0,
+                                        opts       = {'url' : "http://a/", 'job_count' : 2}),
+                             bm.Backend(backend_id = 1,
+                                        opts       = {'url' : "http://b/", 'job_count' : 1})]
+        self.uut.interactive_workers = 1
+        #Stopping the workers immediately keeps them from blocking on the queue.
+        self.uut.keep_going          = False
+
+        self.uut.run()
+
+        self.assertEqual(len(self.uut.workers), 5)
+
+    def testBuildsBackendPool(self):
+        """Verifies that the Queue Manager creates a backend for each
+           configured webui instance.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.options['backends'] = ["http://a/",
+                                    {'url' : "http://b/", 'job_count' : "3"}]
+
+        uut = qm.Manager(manager_id = 1,
+                         opts       = self.options)
+
+        self.assertEqual([x.url for x in uut.backends], ["http://a/", "http://b/"])
+        self.assertEqual([x.max_jobs for x in uut.backends], [int(self.options['job_count']), 3])
+        self.assertEqual(uut.web_url, "http://a/")
+
+    def testPutJobUsesGivenBackend(self):
+        """Verifies that a worker sends its work to the backend it was bound
+           to and returns the backend's slot afterwards.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.job_cooldown = 0.0
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {mc.DEFAULT_PROFILE_ID : self.metadata}
+        self.job.doWork = MagicMock()
+
+        with patch.object(self.uut.queue, 'get') as get_patch:
+            get_patch.side_effect = [self.job, AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob(backend=backend)
+
+        self.job.doWork.assert_called_once_with(web_url="http://b/")
+        self.assertTrue(backend.isIdle())
+        self.assertEqual(backend.completed, 1)
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testPutJobRequeuesWithoutSlot(self):
+        """Verifies that a worker that can't claim its backend's slot puts
+           the job back instead of running it.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {mc.DEFAULT_PROFILE_ID : self.metadata}
+        self.job.doWork = MagicMock()
+
+        self.assertTrue(backend.acquire())
+
+        with patch.object(self.uut.queue, 'get') as get_patch, patch('time.sleep'):
+            get_patch.side_effect = [self.job, AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob(backend=backend)
+
+        self.job.doWork.assert_not_called()
+        self.assertEqual(backend.active, 1)
+        self.assertEqual(self.uut.queue.qsize(), 1)
+        self.assertIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testRetriesFailedWork(self):
+        """Verifies that failed requests are retried until they succeed, and
+           aren't retried once the backend's circuit opens.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.retry_attempts = 3
+        self.uut.retry_base     = 0.0
+        self.job.doWork         = MagicMock(side_effect=[req.exceptions.ConnectionError(), req.exceptions.Timeout(), None])
+
+        self.assertTrue(self.uut._doWork(batch=[self.job],
+                                         backend=backend))
+        self.assertEqual(self.job.doWork.call_count, 3)
+
+        backend.open_time = 60.0
+        backend.record(success=False)
+        self.job.doWork   = MagicMock(side_effect=req.exceptions.ConnectionError())
+
+        self.assertFalse(self.uut._doWork(batch=[self.job],
+                                          backend=backend))
+        self.job.doWork.assert_called_once()
+
+    def testRetriesErrorResponses(self):
+        """Verifies that a webui answering with an error is retried, and
+           counts against the backend if it never succeeds.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.retry_attempts = 2
+        self.uut.retry_base     = 0.0
+
+        def answer(status_code : int):
+            response             = req.Response()
+            response.status_code = status_code
+
+            return response
+
+        def doWork(web_url : str):
+            self.job.result = responses.pop(0)
+
+        responses       = [answer(503), answer(200)]
+        self.job.doWork = MagicMock(side_effect=doWork)
+
+        self.assertTrue(self.uut._doWork(batch=[self.job],
+                                         backend=backend))
+        self.assertEqual(self.job.doWork.call_count, 2)
+
+        responses       = [answer(500), answer(500)]
+        self.job.doWork = MagicMock(side_effect=doWork)
+
+        self.assertFalse(self.uut._doWork(batch=[self.job],
+                                          backend=backend))
+        self.assertEqual(self.job.doWork.call_count, 2)
+        self.assertEqual(self.job.getStatusCode(), 500)
+        self.assertEqual(self.uut.request_times.getCount(backend="1", result="failure"), 1)
+
+    def testInteractiveJobsSkipServiceTimes(self):
+        """Verifies that only jobs the webui rendered feed the service time
+           estimates used for admission.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend         = bm.Backend(backend_id = 1,
+                                     opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.job.doWork = MagicMock()
+
+        self.job.priority = jf.JobPriorityEnum.INTERACTIVE
+        self.assertTrue(self.uut._doWork(batch=[self.job],
+                                         backend=backend))
+        self.assertEqual(self.uut.estimator.averages, {})
+
+        self.job.priority = jf.JobPriorityEnum.ADMIN
+        self.assertTrue(self.uut._doWork(batch=[self.job],
+                                         backend=backend))
+        self.assertNotEqual(self.uut.estimator.averages, {})
+
+    def testPutJobDropsExpiredJobs(self):
+        """Verifies that a job whose deadline passed while it waited is failed
+           without being sent to the webui.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.job_cooldown = 0.0
+        self.job.doWork       = MagicMock()
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+        self.job.setDeadline(time.monotonic() - 1.0)
+
+        with patch.object(self.uut.queue, 'get') as get_patch:
+            get_patch.side_effect = [self.job, AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob()
+
+        self.job.doWork.assert_not_called()
+        self.assertEqual(self.job.getStatusCode(), 504)
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testSeparatesInteractiveReservations(self):
+        """Verifies that a user can have an interactive job alongside a job
+           waiting on the webui, as they could with the old show queue.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        show = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_SHOW,
+                                    ctx=self.metadata['ctx'])
+        show.priority = jf.JobPriorityEnum.INTERACTIVE
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=show)
+        self.assertEqual(result, "Your job was added to the queue.  Please wait for it to finish before posting another.")
+
+        self.assertEqual(self.uut.queue.get(block=False), show)
+        self.assertEqual(self.uut.queue.release(show), self.metadata)
+        self.assertEqual(len(self.uut.queue.jobs[mc.DEFAULT_GUILD_ID]), 1)
+
+    def testPutJobBatchesCompatibleJobs(self):
+        """Verifies that a worker for a batching backend sends compatible jobs
+           in a single webui call and posts every job's result.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 0,
+                             opts       = {'url' : "http://a/", 'job_count' : 1, 'max_batch' : 2})
+        jobs    = []
+
+        self.uut.job_cooldown = 0.0
+        self.uut.batch_window = 0.0
+        self.metadata['loop'] = MagicMock(wraps=mc.MockLoop())
+
+        for x in range(3):
+            job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_POST,
+                                       ctx=self.metadata['ctx'])
+            job.user_id            = x
+            job.post_data['seed']  = -1
+            job.result.status_code = 200
+            jobs.append(job)
+
+            self.uut.add(metadata=self.metadata,
+                         job=job)
+
+        with patch.object(jf, 'doBatchWork') as batch_patch:
+            #Stop once the batch has been posted.
+            self.metadata['loop'].create_task.side_effect = [MagicMock(), AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob(backend=backend)
+
+        batch_patch.assert_called_once_with(jobs=jobs[:2],
+                                            web_url="http://a/")
+        self.assertEqual(self.uut.queue.qsize(), 1)
+        self.assertTrue(backend.isIdle())
+
+    def testDispatchJobsUsesAsyncClient(self):
+        """Verifies that the async dispatcher runs jobs through the SD client
+           and gives back the backend's slot when the job is done.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.job_cooldown        = 0.0
+        self.uut.free_slots          = th.Semaphore(1)
+        self.uut.sd_client           = MagicMock()
+        self.uut.sd_client.get       = AsyncMock(return_value=mc.MockResult())
+        #Running the coroutine right away stands in for the client's loop.
+        self.uut.sd_client.submit.side_effect = lambda coro: asyncio.run(coro)
+        self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {mc.DEFAULT_PROFILE_ID : self.metadata}
+
+        with patch.object(self.uut.queue, 'get') as get_patch:
+            get_patch.side_effect = [self.job, AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.dispatchJobs()
+
+        self.uut.sd_client.get.assert_awaited_once_with(web_url=self.uut.web_url, path='/sdapi/v1/memory', timeout=5)
+        self.assertEqual(self.job.result, self.uut.sd_client.get.return_value)
+        self.assertTrue(self.uut.backends[0].isIdle())
+        self.assertTrue(self.uut.free_slots.acquire(blocking=False))
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testReservoirRefillsTakeFreeSlots(self):
+        """Verifies that with the async dispatcher, reservoir refills wait
+           for one of its free slots and give it back once they're done.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.free_slots = th.Semaphore(1)
+        self.uut.setReservoir(rr.RollReservoir(opts={'depth'         : "2",
+                                                     'poll_interval' : "0.0"},
+                                               prompt="base",
+                                               tag_rng=mc.MockTagSource()))
+
+        #Stops the refill loop after a render, or after it skips one.
+        def stop(**kwargs):
+
+            self.uut.keep_going = False
+
+            return True
+
+        with patch.object(self.uut.reservoir, 'render') as render_patch, patch('time.sleep') as sleep_patch:
+            render_patch.side_effect = stop
+            sleep_patch.side_effect  = lambda x: stop()
+
+            self.assertTrue(self.uut.free_slots.acquire(blocking=False))
+            self.uut.fillReservoir()
+            render_patch.assert_not_called()
+            self.assertTrue(self.uut.backends[0].isIdle())
+
+            self.uut.free_slots.release()
+            self.uut.keep_going = True
+            self.uut.fillReservoir()
+            render_patch.assert_called_once()
+
+        self.assertTrue(self.uut.backends[0].isIdle())
+        self.assertTrue(self.uut.free_slots.acquire(blocking=False))
+
+    def testJournalsJobsAndRecovers(self):
+        """Verifies that the Manager journals a job from queueing to posting,
+           and that unfinished jobs are handed back on recovery.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with tempfile.TemporaryDirectory() as journal_dir:
+
+            self.options['journal'] = {'enabled'       : "True",
+                                       'compact_every' : "100",
+                                       'fsync'         : "False",
+                                       'path'          : os.path.join(journal_dir, 'journal')}
+            uut              = qm.Manager(manager_id = 1,
+                                          opts       = self.options)
+            uut.job_cooldown = 0.0
+            second           = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                                    ctx=self.metadata['ctx'])
+            second.user_id   = 5
+
+            uut.add(metadata=self.metadata,
+                    job=self.job)
+            uut.add(metadata=self.metadata,
+                    job=second)
+
+            with patch.object(uut.queue, 'get') as get_patch:
+                get_patch.side_effect = [self.job, AssertionError]
+
+                with self.assertRaises(AssertionError):
+                    uut.putJob()
+
+            uut.journal.close()
+
+            uut     = qm.Manager(manager_id = 1,
+                                 opts       = self.options)
+            pending = uut.recover()
+
+            self.assertEqual([(x[0], x[1].getJobId()) for x in pending],
+                             [(jj.JournalStateEnum.QUEUED, second.getJobId())])
+            self.assertEqual(uut.recover(), [])
+            uut.journal.close()
+
+    def testPutJobUsesResultCache(self):
+        """Verifies that a repeated fixed-seed job is answered from the result
+           cache instead of the webui, without taking the backend's slot or
+           counting as one of its requests.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.job_cooldown = 0.0
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            self.uut.result_cache = rc.ResultCache(opts={'max_bytes' : "100000",
+                                                         'path'      : cache_dir})
+            self.job.getCacheKey  = MagicMock(return_value="key")
+
+            def doWork(web_url):
+                self.job.result = sc.SDResponse(status_code = 200,
+                                                reason      = "OK",
+                                                data        = mc.MockResult().json())
+
+            self.job.doWork = MagicMock(side_effect=doWork)
+
+            self.assertTrue(self.uut._doWork(batch=[self.job],
+                                             backend=backend))
+            self.job.result = None
+            #The only slot is taken, so the job can't have used it.
+            self.assertTrue(backend.acquire())
+            self.uut.queue.jobs[mc.DEFAULT_GUILD_ID] = {mc.DEFAULT_PROFILE_ID : self.metadata}
+
+            with patch.object(self.uut.queue, 'get') as get_patch:
+                get_patch.side_effect = [self.job, AssertionError]
+
+                with self.assertRaises(AssertionError):
+                    self.uut.putJob(backend=backend)
+
+        self.job.doWork.assert_called_once()
+        self.assertEqual(self.job.result.json(), mc.MockResult().json())
+        self.assertEqual(self.uut.queue.qsize(), 0)
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+        self.assertEqual(self.uut.request_times.getCount(backend="1", result="success"), 1)
+
+    def testResultCacheWaitDoesNotCountAsRequest(self):
+        """Verifies that a job that waited for another request to render its
+           result doesn't count towards the backend's requests or circuit.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.result_cache       = MagicMock()
+        self.uut.result_cache.fetch = MagicMock(return_value=sc.SDResponse(status_code = 200,
+                                                                          reason      = "OK",
+                                                                          data        = {}))
+        self.job.getCacheKey        = MagicMock(return_value="key")
+        self.job.doWork             = MagicMock()
+
+        self.assertEqual(self.uut._doWork(batch=[self.job],
+                                          backend=backend), None)
+        self.job.doWork.assert_not_called()
+        self.assertEqual(self.uut.request_times.getCount(backend="1", result="success"), 0)
+        self.assertEqual(self.uut.estimator.averages, {})
+
+        backend.state = bm.BreakerStateEnum.HALF_OPEN
+        self.assertTrue(backend.acquire())
+        backend.release(success=None)
+
+        self.assertEqual(backend.state, bm.BreakerStateEnum.HALF_OPEN)
+        self.assertTrue(backend.isIdle())
+
+    def testAddUsesReservoirRoll(self):
+        """Verifies that a roll is answered from the reservoir and moved to the
+           interactive lane, and that the roll is returned if the job is
+           rejected.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        entry = {'post_data' : {'prompt' : "base,Default,Tag", 'seed' : -1},
+                 'prompt'    : "base",
+                 'result'    : sc.SDResponse(status_code = 200,
+                                             reason      = "OK",
+                                             data        = mc.MockResult().json())}
+        job   = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                     ctx=self.metadata['ctx'],
+                                     options={'prompt' : "base",
+                                              'random' : True,
+                                              'seed'   : -1})
+
+        self.uut.setReservoir(rr.RollReservoir(opts={'depth'         : "2",
+                                                     'poll_interval' : "0.1"},
+                                               prompt="base",
+                                               tag_rng=mc.MockTagSource()))
+        self.uut.reservoir.putBack(entry)
+        self.uut.max_guild_reqs = 0
+
+        self.uut.add(metadata=self.metadata,
+                     job=job)
+
+        self.assertTrue(job.prerendered)
+        self.assertEqual(job.getPriority(), jf.JobPriorityEnum.INTERACTIVE)
+        self.assertEqual(len(self.uut.reservoir), 1)
+
+        self.uut.max_guild_reqs = 10
+        job                     = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                                       ctx=self.metadata['ctx'],
+                                                       options={'prompt' : "base",
+                                                                'random' : True,
+                                                                'seed'   : -1})
+
+        self.uut.add(metadata=self.metadata,
+                     job=job)
+        self.uut.queue.jobs = {}
+
+        self.assertTrue(job.prerendered)
+        self.assertEqual(job.post_data['prompt'], "base,Default,Tag")
+        self.assertEqual(len(self.uut.reservoir), 0)
+
+    def testPrerenderedRollIsKeyedAsRoll(self):
+        """Verifies that a roll answered from the reservoir can't be taken
+           while the user's live roll is queued, and doesn't block their
+           profile reads.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        entry = {'post_data' : {'prompt' : "base,Default,Tag", 'seed' : -1},
+                 'prompt'    : "base",
+                 'result'    : sc.SDResponse(status_code = 200,
+                                             reason      = "OK",
+                                             data        = mc.MockResult().json())}
+        live  = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                     ctx=self.metadata['ctx'],
+                                     options={'prompt' : "base",
+                                              'random' : True,
+                                              'seed'   : -1})
+
+        self.uut.add(metadata=self.metadata,
+                     job=live)
+        self.uut.setReservoir(rr.RollReservoir(opts={'depth'         : "2",
+                                                     'poll_interval' : "0.1"},
+                                               prompt="base",
+                                               tag_rng=mc.MockTagSource()))
+        self.uut.reservoir.putBack(entry)
+
+        job    = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                      ctx=self.metadata['ctx'],
+                                      options={'prompt' : "base",
+                                               'random' : True,
+                                               'seed'   : -1})
+        result = self.uut.add(metadata=self.metadata,
+                              job=job)
+
+        self.assertEqual(result, "You already have a job on the queue, please wait until it's finished.")
+        self.assertEqual(len(self.uut.reservoir), 1)
+
+        self.uut.queue.release(live)
+        self.uut.add(metadata=self.metadata,
+                     job=job)
+
+        self.assertTrue(job.prerendered)
+        self.assertIn(job.getUserId(), self.uut.queue.jobs[mc.DEFAULT_GUILD_ID])
+
+    def testUnsavedRollReturnsToReservoir(self):
+        """Verifies that a pre-rendered roll the user couldn't save, because
+           they already rolled today, goes back in the reservoir.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        entry = {'post_data' : {'prompt' : "base,Default,Tag", 'seed' : -1},
+                 'prompt'    : "base",
+                 'result'    : sc.SDResponse(status_code = 200,
+                                             reason      = "OK",
+                                             data        = mc.MockResult().json())}
+        job   = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                     ctx=self.metadata['ctx'],
+                                     options={'prompt' : "base",
+                                              'random' : True,
+                                              'seed'   : -1})
+
+        self.uut.setReservoir(rr.RollReservoir(opts={'depth'         : "2",
+                                                     'poll_interval' : "0.1"},
+                                               prompt="base",
+                                               tag_rng=mc.MockTagSource()))
+        job.usePrerendered(entry)
+        self.metadata['db_ifc'] = MagicMock()
+        self.metadata['db_ifc'].dailyDone.return_value = True
+
+        self.uut._postJob(job=job,
+                          metadata=self.metadata)
+
+        self.metadata['db_ifc'].saveRoll.assert_not_called()
+        self.assertEqual(self.uut.reservoir.take("base"), entry)
+
+    def testAddShedsLoadOverSlo(self):
+        """Verifies that a job expected to finish after the SLO is rejected
+           with an ETA, or accepted with one when deferring.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.admission = True
+        self.uut.slo       = 60.0
+        self.uut.estimator.record(job=self.job,
+                                  seconds=50.0)
+
+        for x in range(2):
+
+            queued          = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                                   ctx=self.metadata['ctx'])
+            queued.user_id += x + 1
+            self.uut.queue.put(queued)
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+
+        self.assertEqual(result, "The queue is too busy right now, your job would take about 2 minutes.  Please try again later.")
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+        self.uut.defer = True
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+        self.uut.queue.jobs = {}
+
+        self.assertEqual(result, "Your job was added to the queue, but the queue is busy and it will take about 2 minutes.  Please wait for it to finish before posting another.")
+
+    def testAddRateLimitsJobs(self):
+        """Verifies that a user's jobs are limited once their burst is spent,
+           without touching other users' buckets.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.rate_limiter = rl.RateLimiter(opts={'user'   : {'per_minute' : "1", 'burst' : "1"},
+                                                     'guild'  : {'per_minute' : "60", 'burst' : "10"},
+                                                     'global' : {'per_minute' : "60", 'burst' : "10"}})
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+        self.uut.queue.jobs = {}
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=self.job)
+
+        self.assertEqual(result, "You're sending jobs too quickly, please wait 60 seconds before trying again.")
+        self.assertNotIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+        #A roll answered from the reservoir is limited like any other roll.
+        entry = {'post_data' : {'prompt' : "base,Default,Tag", 'seed' : -1},
+                 'prompt'    : "base",
+                 'result'    : sc.SDResponse(status_code = 200,
+                                             reason      = "OK",
+                                             data        = mc.MockResult().json())}
+        job   = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                     ctx=self.metadata['ctx'],
+                                     options={'prompt' : "base",
+                                              'random' : True,
+                                              'seed'   : -1})
+
+        self.uut.setReservoir(rr.RollReservoir(opts={'depth'         : "2",
+                                                     'poll_interval' : "0.1"},
+                                               prompt="base",
+                                               tag_rng=mc.MockTagSource()))
+        self.uut.reservoir.putBack(entry)
+
+        result = self.uut.add(metadata=self.metadata,
+                              job=job)
+
+        self.assertEqual(result, "You're sending jobs too quickly, please wait 60 seconds before trying again.")
+        self.assertEqual(len(self.uut.reservoir), 1)
+
+    def testRejectedJobsKeepRateLimitTokens(self):
+        """Verifies that a job turned away after the rate limiter counted it
+           gets its tokens back.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.rate_limiter = rl.RateLimiter(opts={'user'   : {'per_minute' : "1", 'burst' : "1"},
+                                                     'guild'  : {'per_minute' : "60", 'burst' : "10"},
+                                                     'global' : {'per_minute' : "60", 'burst' : "10"}})
+
+        with patch.object(self.uut.queue, 'put') as put_patch:
+            put_patch.side_effect = queue.Full
+
+            result = self.uut.add(metadata=self.metadata,
+                                  job=self.job)
+
+        self.assertEqual(result, "The work queue is currently full, please wait a bit before making another job.")
+        self.assertNotEqual(self.uut.add(metadata=self.metadata,
+                                         job=self.job),
+                            "You're sending jobs too quickly, please wait 60 seconds before trying again.")
+        self.assertIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+    def testAddDegradesJobsWhenBusy(self):
+        """Verifies that new generate jobs are degraded once the queue is
+           deep enough, and replayed jobs never are.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.degrade_policy = dp.DegradePolicy(opts={'queue_depth' : "1",
+                                                         'wait'        : "0.0",
+                                                         'max_steps'   : "20",
+                                                         'hires'       : "True",
+                                                         'scale'       : "1.0",
+                                                         'min_size'    : "256",
+                                                         'step_size'   : "64"})
+        opts = {'cfg_scale' : 1.0,
+                'height'    : 512,
+                'n_prompt'  : "bad",
+                'prompt'    : "good",
+                'random'    : False,
+                'sampler'   : "Euler a",
+                'seed'      : -1,
+                'steps'     : 40,
+                'tag_cnt'   : 0,
+                'width'     : 512}
+        jobs = [jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                     ctx=self.metadata['ctx'],
+                                     options=dict(opts)) for x in range(3)]
+
+        for x, job in enumerate(jobs):
+            job.user_id = x
+
+        self.uut.add(metadata=self.metadata,
+                     job=jobs[0])
+        self.uut.add(metadata=self.metadata,
+                     job=jobs[1])
+        self.uut.add(metadata=self.metadata,
+                     job=jobs[2],
+                     replay=True)
+
+        self.assertEqual(jobs[0].post_data['steps'], 40)
+        self.assertEqual(jobs[1].post_data['steps'], 20)
+        self.assertEqual(jobs[1].degraded, ["40 to 20 steps"])
+        self.assertEqual(jobs[2].post_data['steps'], 40)
+        self.assertEqual(self.uut.degraded.get(lane="generate"), 1.0)
+
+    def testUpscaleRunsAsItsOwnStage(self):
+        """Verifies that a split job's upscale is queued in its own lane once
+           the base image is done, and a failed upscale posts the base image.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.split_upscale = True
+        opts = {'cfg_scale' : 1.0,
+                'height'    : 512,
+                'n_prompt'  : "bad",
+                'prompt'    : "good",
+                'random'    : False,
+                'sampler'   : "Euler a",
+                'seed'      : -1,
+                'steps'     : 20,
+                'tag_cnt'   : 0,
+                'width'     : 512}
+        job  = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                    ctx=self.metadata['ctx'],
+                                    options=opts)
+
+        self.uut.add(metadata=self.metadata,
+                     job=job)
+
+        self.assertNotEqual(job.getUpscale(), None)
+        self.assertEqual(self.uut.queue.get(block=False), job)
+
+        job.result = mc.MockResult()
+
+        with patch.object(self.uut, '_postJob') as post_patch:
+            self.uut._finishJobs([job])
+
+            post_patch.assert_not_called()
+
+            #Only workers serving the upscale lane pick up the second stage.
+            with self.assertRaises(queue.Empty):
+                self.uut.queue.get(block=False,
+                                   lanes=(jf.JobPriorityEnum.GENERATE,))
+
+            upscale = self.uut.queue.get(block=False,
+                                         lanes=(jf.JobPriorityEnum.UPSCALE,))
+
+            self.assertEqual(upscale.getBaseJob(), job)
+            self.assertIn(mc.DEFAULT_GUILD_ID, self.uut.queue.jobs)
+
+            upscale.result             = req.Response()
+            upscale.result.status_code = 500
+
+            self.uut._finishJobs([upscale])
+
+            self.assertEqual(post_patch.call_args.kwargs['job'], job)
+
+        self.assertEqual(self.uut.queue.jobs, {})
+
+    def testGetBackendLanesFollowsStages(self):
+        """Verifies that a backend's workers only serve the lanes of the
+           stages it runs.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        both     = bm.Backend(backend_id = 1,
+                              opts       = {'url' : "http://b/", 'job_count' : 1})
+        upscaler = bm.Backend(backend_id = 2,
+                              opts       = {'url' : "http://c/", 'job_count' : 1, 'stages' : "upscale"})
+        base     = bm.Backend(backend_id = 3,
+                              opts       = {'url' : "http://d/", 'job_count' : 1, 'stages' : "txt2img"})
+
+        self.assertEqual(self.uut._getBackendLanes(both), None)
+        self.assertEqual(self.uut._getBackendLanes(upscaler), (jf.JobPriorityEnum.UPSCALE,))
+        self.assertNotIn(jf.JobPriorityEnum.UPSCALE, self.uut._getBackendLanes(base))
+
+        with self.assertRaises(ValueError):
+            bm.Backend(backend_id = 4,
+                       opts       = {'url' : "http://e/", 'job_count' : 1, 'stages' : "img2img"})
+
+    def testMetricsRecordJobs(self):
+        """Verifies that rejections, queue waits, and backend work are
+           recorded and show up in the served metrics.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        backend = bm.Backend(backend_id = 1,
+                             opts       = {'url' : "http://b/", 'job_count' : 1})
+        self.uut.job_cooldown = 0.0
+        self.job.doWork       = MagicMock()
+
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+        self.uut.add(metadata=self.metadata,
+                     job=self.job)
+
+        self.assertEqual(self.uut.rejections.get(reason="duplicate_job"), 1.0)
+        self.assertIn('igsd_queue_depth{lane="admin"} 1.0', self.uut.metrics.render())
+
+        with patch.object(self.uut.queue, 'get') as get_patch:
+            get_patch.side_effect = [self.uut.queue._next(tuple(jf.JobPriorityEnum)), AssertionError]
+
+            with self.assertRaises(AssertionError):
+                self.uut.putJob(backend=backend)
+
+        text = self.uut.metrics.render()
+
+        self.assertEqual(self.uut.job_waits.getCount(lane="admin"), 1)
+        self.assertEqual(self.uut.request_times.getCount(backend="1", result="success"), 1)
+        self.assertEqual(self.uut.backend_jobs.get(backend="1", result="success"), 1.0)
+        self.assertIn('igsd_queue_depth{lane="admin"} 0.0', text)
+        self.assertIn('igsd_sd_request_seconds_count{backend="1",result="success"} 1.0', text)
+
+#####  Progress Reporter Class  #####
+
+class TestProgressReporter(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut      = pr.ProgressReporter(opts={'edit_interval' : "60.0",
+                                                  'poll_interval' : "1.0",
+                                                  'preview'       : "False",
+                                                  'preview_size'  : "256"})
+        self.loop     = asyncio.new_event_loop()
+        self.ctx      = MagicMock()
+        self.ctx.edit_original_response   = AsyncMock()
+        self.ctx.delete_original_response = AsyncMock()
+        self.metadata = {'ctx'  : self.ctx,
+                         'loop' : self.loop}
+        self.backend  = bm.Backend(backend_id = 0,
+                                   opts       = {'url' : "http://127.0.0.1:7860/", 'job_count' : "1"})
+        self.job      = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                             ctx=mc.MockInteraction())
+
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.loop.close()
+
+    @patch('requests.get')
+    def testPollCoalescesEdits(self, mock_get):
+        """Verifies that running jobs get their progress, and that polls
+           between edits don't send more edits.
+
+           Input: self - Pointer to the current object instance.
+                  mock_get - A mock of requests.get.
+
+           Output: none.
+        """
+
+        mock_get.return_value = mc.MockBatchResult()
+        mock_get.return_value.json = MagicMock(return_value={'progress'     : 0.5,
+                                                             'eta_relative' : 12.0,
+                                                             'state'        : {'sampling_step'  : 10,
+                                                                               'sampling_steps' : 20}})
+
+        self.uut.poll()
+        self.assertEqual(mock_get.call_count, 0)
+
+        self.uut.watch(job=self.job,
+                       metadata=self.metadata)
+        self.uut.start(backend=self.backend,
+                       batch=[self.job])
+        self.uut.poll()
+        self.uut.poll()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.ctx.edit_original_response.assert_awaited_once_with(content="Your image is 50% done (step 10 of 20), about 12 seconds left.")
+
+        self.uut.watched[self.job.getJobId()]['last_edit'] = 0.0
+        self.uut.poll()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(self.ctx.edit_original_response.await_count, 2)
+
+    def testFinishDeletesResponse(self):
+        """Verifies that finishing a job stops polling its backend and removes
+           its progress response.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.watch(job=self.job,
+                       metadata=self.metadata)
+        self.uut.start(backend=self.backend,
+                       batch=[self.job])
+
+        self.assertTrue(self.uut.isWatching(self.job))
+
+        self.uut.finish([self.job])
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertFalse(self.uut.isWatching(self.job))
+        self.assertEqual(self.uut.running, {})
+        self.ctx.delete_original_response.assert_awaited_once()
+
+    def testTracksStepRate(self):
+        """Verifies that each backend's sampling rate is measured from the
+           steps reported by successive polls.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertIsNone(self.uut.getStepRate(0))
+
+        with patch('time.monotonic') as time_patch:
+            time_patch.side_effect = [10.0, 12.0]
+
+            self.uut._updateStepRate(backend_id=0, state={'sampling_step' : 2})
+            self.uut._updateStepRate(backend_id=0, state={'sampling_step' : 10})
+
+        self.assertEqual(self.uut.getStepRate(0), 4.0)
+
+#####  Rate Limiter Class  #####
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = rl.RateLimiter(opts={'user'   : {'per_minute' : "60", 'burst' : "2"},
+                                        'guild'  : {'per_minute' : "60", 'burst' : "3"},
+                                        'global' : {'per_minute' : "60", 'burst' : "10"}})
+
+    def testBucketRefills(self):
+        """Verifies that a bucket allows a burst, then refills at its rate.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        bucket = rl.TokenBucket(rate=0.5, burst=2.0, now=0.0)
+
+        for x in range(2):
+
+            self.assertEqual(bucket.getWait(0.0), 0.0)
+            bucket.take()
+
+        self.assertEqual(bucket.getWait(0.0), 2.0)
+        self.assertEqual(bucket.getWait(1.0), 1.0)
+        self.assertEqual(bucket.getWait(2.0), 0.0)
+        self.assertFalse(bucket.isFull(2.0))
+        self.assertTrue(bucket.isFull(4.0))
+
+    def testCheckLimitsEachScope(self):
+        """Verifies that users and Guilds are limited separately, and that a
+           rejected job doesn't spend any tokens.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch('time.monotonic') as time_patch:
+            time_patch.return_value = 0.0
+
+            self.assertIsNone(self.uut.check(user_id=1, guild_id=1))
+            self.assertIsNone(self.uut.check(user_id=1, guild_id=1))
+            self.assertEqual(self.uut.check(user_id=1, guild_id=1), (rl.LimitScopeEnum.USER, 1.0))
+            self.assertIsNone(self.uut.check(user_id=2, guild_id=1))
+            self.assertEqual(self.uut.check(user_id=3, guild_id=1), (rl.LimitScopeEnum.GUILD, 1.0))
+            self.assertIsNone(self.uut.check(user_id=3, guild_id=2))
+
+        self.assertEqual(self.uut.buckets[rl.LimitScopeEnum.USER][3].tokens, 1.0)
+        self.assertEqual(self.uut.buckets[rl.LimitScopeEnum.GLOBAL][None].tokens, 6.0)
+
+    def testRefundReturnsTokens(self):
+        """Verifies that refunding a job gives back the tokens it took, but
+           never more than a bucket holds.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch('time.monotonic') as time_patch:
+            time_patch.return_value = 0.0
+
+            self.assertIsNone(self.uut.check(user_id=1, guild_id=1))
+            self.assertIsNone(self.uut.check(user_id=1, guild_id=1))
+            self.uut.refund(user_id=1, guild_id=1)
+            self.assertIsNone(self.uut.check(user_id=1, guild_id=1))
+            self.uut.refund(user_id=1, guild_id=1)
+            self.uut.refund(user_id=1, guild_id=1)
+            self.uut.refund(user_id=1, guild_id=1)
+
+        self.assertEqual(self.uut.buckets[rl.LimitScopeEnum.USER][1].tokens, 2.0)
+        self.assertEqual(self.uut.buckets[rl.LimitScopeEnum.GUILD][1].tokens, 3.0)
+        self.assertEqual(self.uut.buckets[rl.LimitScopeEnum.GLOBAL][None].tokens, 10.0)
+
+    def testForgetsRefilledBuckets(self):
+        """Verifies that buckets which have refilled are dropped as new IDs
+           are seen.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch('time.monotonic') as time_patch:
+            time_patch.return_value = 0.0
+
+            for user in range(3):
+
+                self.uut.check(user_id=user, guild_id=user)
+
+            time_patch.return_value = 10.0
+            self.uut.check(user_id=5, guild_id=5)
+
+        self.assertEqual(list(self.uut.buckets[rl.LimitScopeEnum.USER].keys()), [1, 2, 5])
+
+#####  Roll Reservoir Class  #####
+
+class TestRollReservoir(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = rr.RollReservoir(opts={'depth'         : "2",
+                                          'poll_interval' : "0.1"},
+                                    prompt="base",
+                                    tag_rng=mc.MockTagSource())
+
+    @patch('requests.post')
+    def testRenderStopsAtDepth(self, mock_post):
+        """Verifies that rendered rolls are stored with the random tags added,
+           and no more than 'depth' are kept.
+
+           Input: self - Pointer to the current object instance.
+                  mock_post - A mock of requests.post.
+
+           Output: none.
+        """
+
+        mock_post.return_value = mc.MockBatchResult()
+        mock_post.return_value.json = MagicMock(return_value=mc.MockResult().json())
+
+        self.assertTrue(self.uut.render(web_url="http://127.0.0.1:7860",
+                                        timeout=900.0))
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], 900.0)
+        self.assertTrue(self.uut.render(web_url="http://127.0.0.1:7860"))
+        self.assertTrue(self.uut.isFull())
+        self.assertFalse(self.uut.render(web_url="http://127.0.0.1:7860"))
+        self.assertEqual(len(self.uut), 2)
+
+        entry = self.uut.take("base")
+
+        self.assertEqual(entry['post_data']['prompt'], "baseDefault,Tag")
+        self.assertEqual(entry['post_data']['seed'], -1)
+        self.assertEqual(entry['result'].json(), mc.MockResult().json())
+
+    @patch('requests.post')
+    def testRenderIgnoresFailures(self, mock_post):
+        """Verifies that a failed render isn't stored.
+
+           Input: self - Pointer to the current object instance.
+                  mock_post - A mock of requests.post.
+
+           Output: none.
+        """
+
+        mock_post.return_value = mc.MockBatchResult()
+        mock_post.return_value.status_code = 500
+
+        self.assertFalse(self.uut.render(web_url="http://127.0.0.1:7860"))
+        self.assertEqual(len(self.uut), 0)
+
+    def testTakeMatchesPrompt(self):
+        """Verifies that only rolls from the same base prompt are handed out,
+           and that returned rolls are handed out first.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        first  = {'prompt' : "base"}
+        second = {'prompt' : "base"}
+
+        self.uut.putBack(second)
+        self.uut.putBack(first)
+
+        self.assertIsNone(self.uut.take(None))
+        self.assertIsNone(self.uut.take("other"))
+        self.assertIs(self.uut.take("base"), first)
+
+        self.uut.putBack(first)
+
+        self.assertIs(self.uut.take("base"), first)
+        self.assertIs(self.uut.take("base"), second)
+        self.assertIsNone(self.uut.take("base"))
+
+#####  Service Estimator Class  #####
+
+class TestServiceEstimator(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = se.ServiceEstimator(opts={'alpha'            : "0.5",
+                                             'initial_estimate' : "10.0"})
+        self.ctx = mc.MockInteraction()
+
+    def testRecordAveragesServiceTimes(self):
+        """Verifies that each job type starts at the initial estimate and is
+           then averaged separately.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        get  = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                    ctx=self.ctx)
+        post = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_POST,
+                                    ctx=self.ctx)
+
+        self.assertEqual(self.uut.estimate(get), 10.0)
+
+        self.uut.record(job=get, seconds=4.0)
+        self.uut.record(job=get, seconds=8.0)
+
+        self.assertEqual(self.uut.estimate(get), 6.0)
+        self.assertEqual(self.uut.estimate(post), 10.0)
+
+    def testEstimateWaitCountsWeightedLanes(self):
+        """Verifies that a job waits behind its own lane and a weighted share
+           of the others, spread across the backend slots.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        job     = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                       ctx=self.ctx)
+        weights = {jf.JobPriorityEnum.INTERACTIVE : 8,
+                   jf.JobPriorityEnum.DAILY       : 4,
+                   jf.JobPriorityEnum.GENERATE    : 2,
+                   jf.JobPriorityEnum.ADMIN       : 1}
+        waiting = {jf.JobPriorityEnum.INTERACTIVE : [job] * 5,
+                   jf.JobPriorityEnum.DAILY       : [job] * 10,
+                   jf.JobPriorityEnum.GENERATE    : [],
+                   jf.JobPriorityEnum.ADMIN       : [job]}
+
+        #1 admin job ahead, then 8 of the daily jobs for the 2 admin rounds,
+        #plus its own 10 seconds.
+        self.assertEqual(self.uut.estimateWait(job       = job,
+                                               waiting   = waiting,
+                                               weights   = weights,
+                                               in_flight = 0,
+                                               slots     = 1), 100.0)
+        self.assertEqual(self.uut.estimateWait(job       = job,
+                                               waiting   = waiting,
+                                               weights   = weights,
+                                               in_flight = 2,
+                                               slots     = 2), 60.0)
+        self.assertEqual(self.uut.estimateWait(job       = job,
+                                               waiting   = waiting,
+                                               weights   = weights,
+                                               in_flight = 0,
+                                               slots     = 0), float('inf'))
+
+    def testFormatDuration(self):
+        """Verifies that durations are rounded to a readable unit.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.assertEqual(se.formatDuration(0.2), "1 second")
+        self.assertEqual(se.formatDuration(45.0), "45 seconds")
+        self.assertEqual(se.formatDuration(150.0), "2 minutes")
+        self.assertEqual(se.formatDuration(7200.0), "2 hours")
+
+#####  Job Scheduler Class  #####
+
+class TestJobScheduler(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = js.JobScheduler(depth   = 10,
+                                   weights = {jf.JobPriorityEnum.INTERACTIVE : 3,
+                                              jf.JobPriorityEnum.DAILY       : 1,
+                                              jf.JobPriorityEnum.GENERATE    : 1,
+                                              jf.JobPriorityEnum.ADMIN       : 1,
+                                              jf.JobPriorityEnum.UPSCALE     : 1})
+
+    def makeJob(self,
+                guild    : int,
+                user     : int,
+                priority : jf.JobPriorityEnum) -> jf.Job:
+        """Builds and schedules a minimal job for the given Guild and user.
+
+           Input: self - Pointer to the current object instance.
+                  guild - The job's Guild ID.
+                  user - The job's user ID.
+                  priority - Which lane the job goes in.
+
+           Output: Job - The scheduled job.
+        """
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_GET,
+                                   ctx=mc.MockInteraction())
+        job.guild    = guild
+        job.user_id  = user
+        job.priority = priority
+
+        result = self.uut.reserve(job            = job,
+                                  metadata       = {},
+                                  max_guilds     = 10,
+                                  max_guild_reqs = 10)
+
+        self.assertEqual(result, js.ScheduleResultEnum.ACCEPTED)
+        self.uut.put(job)
+
+        return job
+
+    def testRejectsBadWeights(self):
+        """Verifies that every lane must get a share of the workers.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with self.assertRaises(ValueError):
+            js.JobScheduler(depth   = 1,
+                            weights = {lane : 0 for lane in jf.JobPriorityEnum})
+
+    def testLanesAreWeighted(self):
+        """Verifies that lanes are served in proportion to their weights
+           without starving the lighter lane.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        for x in range(4):
+            self.makeJob(guild=1, user=x, priority=jf.JobPriorityEnum.INTERACTIVE)
+            self.makeJob(guild=1, user=x + 10, priority=jf.JobPriorityEnum.GENERATE)
+
+        lanes = [self.uut.get(block=False).getPriority() for x in range(4)]
+
+        self.assertEqual(lanes.count(jf.JobPriorityEnum.INTERACTIVE), 3)
+        self.assertEqual(lanes.count(jf.JobPriorityEnum.GENERATE), 1)
+        self.assertEqual(self.uut.qsize(), 4)
+
+    def testGuildsTakeTurns(self):
+        """Verifies that a busy Guild can't starve another Guild in the same
+           lane.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        for x in range(3):
+            self.makeJob(guild=1, user=x, priority=jf.JobPriorityEnum.GENERATE)
+
+        self.makeJob(guild=2, user=0, priority=jf.JobPriorityEnum.GENERATE)
+
+        guilds = [self.uut.get(block=False).getGuild() for x in range(4)]
+
+        self.assertEqual(guilds, [1, 2, 1, 1])
+
+    def testGetOnlyServesRequestedLanes(self):
+        """Verifies that a worker limited to some lanes ignores the others.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.makeJob(guild=1, user=0, priority=jf.JobPriorityEnum.GENERATE)
+
+        with self.assertRaises(queue.Empty):
+            self.uut.get(timeout=0.01,
+                         lanes=(jf.JobPriorityEnum.INTERACTIVE,))
+
+        self.assertEqual(self.uut.get(block=False).getPriority(), jf.JobPriorityEnum.GENERATE)
+
+    def testPutRespectsDepth(self):
+        """Verifies that the scheduler refuses jobs once it is full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.depth = 1
+        self.makeJob(guild=1, user=0, priority=jf.JobPriorityEnum.DAILY)
+
+        with self.assertRaises(queue.Full):
+            self.makeJob(guild=1, user=1, priority=jf.JobPriorityEnum.DAILY)
+
+    def testTakeOnlyMatchingJobs(self):
+        """Verifies that taking jobs for a batch leaves incompatible jobs and
+           other lanes alone.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        jobs = [self.makeJob(guild=x % 2, user=x, priority=jf.JobPriorityEnum.GENERATE) for x in range(3)]
+        jobs[1].getBatchKey = MagicMock(return_value="other")
+
+        self.makeJob(guild=0, user=5, priority=jf.JobPriorityEnum.DAILY)
+
+        taken = self.uut.take(priority = jf.JobPriorityEnum.GENERATE,
+                              key      = None,
+                              limit    = 5)
+
+        self.assertEqual(taken, [jobs[0], jobs[2]])
+        self.assertEqual(self.uut.qsize(), 2)
+        self.assertEqual(self.uut.get(block=False,
+                                      lanes=(jf.JobPriorityEnum.GENERATE,)), jobs[1])
+
+    def testRemoveQueuedJob(self):
+        """Verifies that a queued job can be removed by its ID without
+           disturbing the order of the rest.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        jobs = [self.makeJob(guild=1, user=x, priority=jf.JobPriorityEnum.GENERATE) for x in range(3)]
+
+        self.assertEqual(self.uut.remove(jobs[1].getJobId()), jobs[1])
+        self.assertEqual(self.uut.remove(jobs[1].getJobId()), None)
+        self.assertEqual(self.uut.qsize(), 2)
+        self.assertEqual(self.uut.get(block=False), jobs[0])
+        self.assertEqual(self.uut.get(block=False), jobs[2])
+        self.assertEqual(self.uut.remove(jobs[2].getJobId()), None)
+        self.assertEqual(self.uut.lanes[jf.JobPriorityEnum.GENERATE], {})
+
+    def testRequeuedJobsAreServedFirst(self):
+        """Verifies that jobs put back by a worker are the next ones served,
+           even when the scheduler is full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.depth = 3
+        jobs  = [self.makeJob(guild=1, user=x, priority=jf.JobPriorityEnum.GENERATE) for x in range(2)]
+        taken = [self.uut.get(block=False) for x in range(2)]
+
+        self.makeJob(guild=2, user=0, priority=jf.JobPriorityEnum.GENERATE)
+        self.makeJob(guild=2, user=1, priority=jf.JobPriorityEnum.GENERATE)
+        self.makeJob(guild=2, user=2, priority=jf.JobPriorityEnum.GENERATE)
+        self.uut.requeue(taken)
+
+        self.assertEqual(self.uut.qsize(), 5)
+        self.assertEqual(self.uut.get(block=False), jobs[0])
+        self.assertEqual(self.uut.get(block=False).getGuild(), 2)
+        self.assertEqual(self.uut.get(block=False), jobs[1])
+
+    def testReleaseRemovesEmptyGuild(self):
+        """Verifies that releasing a Guild's last job forgets the Guild.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        job = self.makeJob(guild=1, user=0, priority=jf.JobPriorityEnum.DAILY)
+
+        self.assertEqual(self.uut.release(job), {})
+        self.assertEqual(self.uut.jobs, {})
+        self.assertEqual(self.uut.release(job), None)
@@ -68,7 +68,7 @@ class MockDbInterface():
         pass
 
     def getImage(self,
-                 profile_id : Optional[str] = DEFAULT_PROFILE_ID) -> Optional[str]:
+                 profile_id : Optional[str] = DEFAULT_PROFILE_ID) -> Optional[bytes]:
         """A bare minimum mock to ensure test compatability.
 
            Input: self - Pointer to the current object instance.
@@ -79,7 +79,7 @@ class MockDbInterface():
 
         if profile_id != None and profile_id == DEFAULT_PROFILE_ID:
 
-            return "iVBORw0KGgoAAAANSUhEUgAABAAA"
+            return b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x04\x00\x00'
 
         else:
 
@@ -277,14 +277,14 @@ class MockDbInterface():
 
     def saveRoll(self,
                  id      : int,
-                 img     : str,
+                 img     : bytes,
                  info    : dict,
                  profile : pg.Profile):
         """A bare minimum mock to ensure test compatability.
 
            Input: self - Pointer to the current object instance.
                   id - the Discord user id for the command author.
-                  img - the image string to save.
+                  img - the decoded image to save.
                   info - the SD info used to generate the image.
                   profile - the profile associated with the image.
 
@@ -438,10 +438,24 @@ class MockLoop():
                   coro - the coroutine to run.
                   name - task name for the coroutine.
 
-           Output: message - a mock Discord message.
+           Output: task - a mock asyncio task.
         """
 
-        pass
+        return MagicMock()
+
+    def call_soon_threadsafe(self,
+                             callback : Callable,
+                             *args    : Any):
+        """Runs the callback right away, as if the loop got to it.
+
+           Input: self - Pointer to the current object instance.
+                  callback - The function to call.
+                  args - The callback's arguments.
+
+           Output: None.
+        """
+
+        callback(*args)
 
 
 #####  Mock Post  #####
@@ -490,6 +504,9 @@ class MockQueue():
 
 class MockResult():
 
+    reason      = "OK"
+    status_code = 200
+
     def json(self):
         """A bare minimum mock to ensure test compatability.
 
@@ -502,6 +519,45 @@ class MockResult():
                 'images' : ["iVBORw0KGgoAAAANSUhEUgAABAAA"]}
 
 
+#####  Mock Batch Result Class  #####
+
+class MockBatchResult():
+
+    reason      = "OK"
+    status_code = 200
+
+    def json(self):
+        """A bare minimum mock of a 2-image txt2img batch.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: json - A string formatted like a json file.
+        """
+
+        return {'info'       : '{"prompt":"good","all_prompts":["good","good"],"negative_prompt":"bad","all_negative_prompts":["bad","bad"],"steps":"10","height":"256","width":"256","sampler_name":"Euler a","seed":"10","all_seeds":[10,11],"subseed":"20","all_subseeds":[20,21],"cfg_scale":"1.0","infotexts":["first","second"]}',
+                'images'     : ["iVBORw0KGgoAAAANSUhEUgAABAAA", "iVBORw0KGgoAAAANSUhEUgAABAAB"],
+                'parameters' : {}}
+
+
+#####  Mock Upscale Result Class  #####
+
+class MockUpscaleResult():
+
+    reason      = "OK"
+    status_code = 200
+
+    def json(self):
+        """A bare minimum mock of an extra-single-image response.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: json - A string formatted like a json file.
+        """
+
+        return {'html_info' : "",
+                'image'     : "iVBORw0KGgoAAAANSUhEUgAABAAC"}
+
+
 #####  Mock Tag Source Class  #####
 
 class MockTagSource():
@@ -82,12 +82,12 @@ class TestDropdownFactory(iatc):
 
         self.uut_show = ddf.DropdownView(ctx      = self.interaction,
                                          type     = ddf.DropDownTypeEnum.SHOW,
-                                         choices  = [pg.getDefaultProfile() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT)],
+                                         choices  = [pg.getDefaultProfile().getSummary() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT)],
                                          metadata = self.metadata)
 
         self.uut_key_gen = ddf.DropdownView(ctx      = self.interaction,
                                             type     = ddf.DropDownTypeEnum.ASSIGN_KEY_GEN,
-                                            choices  = [pg.getDefaultProfile() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT)],
+                                            choices  = [pg.getDefaultProfile().getSummary() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT)],
                                             metadata = self.metadata,
                                             options  = self.opts)
 
@@ -128,14 +128,14 @@ class TestDropdownFactory(iatc):
 
         view = ddf.DropdownView(ctx      = self.interaction,
                                 type     = ddf.DropDownTypeEnum.SHOW,
-                                choices  = [pg.getDefaultProfile() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT_WITH_NAV)],
+                                choices  = [pg.getDefaultProfile().getSummary() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT_WITH_NAV)],
                                 metadata = self.metadata)
 
         self.assertNotEqual(view, None)
 
         view = ddf.DropdownView(ctx      = self.interaction,
                                 type     = ddf.DropDownTypeEnum.ASSIGN_KEY_GEN,
-                                choices  = [getMockNormalProfile() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT_WITH_NAV)],
+                                choices  = [getMockNormalProfile().getSummary() for x in range(0,ddf.DROPDOWN_ITEM_LIMIT_WITH_NAV)],
                                 metadata = self.metadata,
                                 options  = self.opts)
 
@@ -160,14 +160,14 @@ class TestDropdownFactory(iatc):
 
         view = ddf.DropdownView(ctx      = self.interaction,
                                 type     = ddf.DropDownTypeEnum.SHOW,
-                                choices  = [pg.getDefaultProfile() for x in range(0, ddf.DROPDOWN_ITEM_LIMIT * 5)],
+                                choices  = [pg.getDefaultProfile().getSummary() for x in range(0, ddf.DROPDOWN_ITEM_LIMIT * 5)],
                                 metadata = self.metadata)
 
         self.assertNotEqual(view, None)
 
         view = ddf.DropdownView(ctx      = self.interaction,
                                 type     = ddf.DropDownTypeEnum.ASSIGN_KEY_GEN,
-                                choices  = [getMockNormalProfile() for x in range(0, ddf.DROPDOWN_ITEM_LIMIT * 5)],
+                                choices  = [getMockNormalProfile().getSummary() for x in range(0, ddf.DROPDOWN_ITEM_LIMIT * 5)],
                                 metadata = self.metadata,
                                 options  = self.opts)
 
@@ -5,22 +5,129 @@
 #####  Imports  #####
 
 from . import MockClasses as mc
+import asyncio
+import base64 as b64
 import discord as dis
+import http.server as hs
 import json
 import pathlib as pl
 import re
 import requests as req
 import src.characters.ProfileGenerator as pg
+import src.utilities.ImageEncoder as ie
 import src.utilities.JobFactory as jf
 import src.utilities.NameRandomizer as nr
+import src.utilities.ResultCache as rc
+import src.utilities.SDClient as sc
 import src.utilities.TagRandomizer as tr
 import statistics as stat
+import tempfile
+import threading as th
 from typing import Callable, Optional, Any
 import unittest
 from unittest import IsolatedAsyncioTestCase as iatc
+from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
+#####  Image Encoder Class  #####
+
+class TestImageEncoder(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut = ie.ImageEncoder(opts={'format'   : "webp",
+                                         'quality'  : "90",
+                                         'max_size' : "1024"})
+
+    def testRejectsBadOptions(self):
+        """Verifies that unknown formats and out of range qualities are
+           refused.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with self.assertRaises(ValueError):
+            ie.ImageEncoder(opts={'format' : "gif", 'quality' : "90", 'max_size' : "0"})
+
+        with self.assertRaises(ValueError):
+            ie.ImageEncoder(opts={'format' : "jpeg", 'quality' : "101", 'max_size' : "0"})
+
+    def testEncodeShrinksImage(self):
+        """Verifies that the display copy is scaled and saved in the
+           configured format, and the original is kept if it's smaller.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        image = MagicMock()
+        image.__enter__.return_value = image
+        image.copy.return_value      = image
+        image.mode                   = "RGB"
+        image.save.side_effect       = lambda x, **kwargs: x.write(b"small")
+
+        with patch.object(ie, 'Image') as image_patch:
+            image_patch.open.return_value = image
+
+            self.assertEqual(self.uut.encode(b"a large png"), (b"small", 'image.webp'))
+            image.thumbnail.assert_called_once_with((1024, 1024))
+            self.assertEqual(image.save.call_args.kwargs['format'], 'WEBP')
+            self.assertEqual(image.save.call_args.kwargs['quality'], 90)
+
+            self.assertEqual(self.uut.encode(b"tiny"), (b"tiny", 'image.png'))
+
+            image_patch.open.side_effect = OSError
+
+            self.assertEqual(self.uut.encode(b"not a png"), (b"not a png", 'image.png'))
+
+    def testEncodeInProcesses(self):
+        """Verifies that an encoder with processes hands images to its
+           process pool.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch.object(ie, 'Image'), patch.object(ie.cf, 'ProcessPoolExecutor') as pool_patch:
+            pool_patch.return_value.submit.return_value.result.return_value = (b"small", 'image.webp')
+
+            uut = ie.ImageEncoder(opts={'format'    : "webp",
+                                        'quality'   : "90",
+                                        'max_size'  : "0",
+                                        'processes' : "2"})
+
+            self.assertEqual(uut.encode(b"a large png"), (b"small", 'image.webp'))
+            self.assertEqual(pool_patch.call_args.kwargs['max_workers'], 2)
+            pool_patch.return_value.submit.assert_called_once_with(ie.encodeImage, b"a large png", "webp", 90, 0)
+
+    def testEncodeWithoutPillow(self):
+        """Verifies that images are posted as-is if Pillow isn't installed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        with patch.object(ie, 'Image', None):
+
+            self.assertFalse(self.uut.isNeeded())
+            self.assertEqual(self.uut.encode(b"a large png"), (b"a large png", 'image.png'))
+
 #####  Job Factory Class  #####
 
 class TestJobFactory(iatc):
@@ -136,8 +243,13 @@ class TestJobFactory(iatc):
                        'db_ifc' : mc.MockDbInterface()}
         job.profile = pg.getDefaultProfile()
 
+        metadata['db_ifc'].saveRoll = MagicMock()
+
         await job.post(metadata=metadata)
-        self.assertTrue(True)
+
+        #Rolls are saved as the decoded PNG, not the webui's base64.
+        self.assertEqual(metadata['db_ifc'].saveRoll.call_args[1]['img'], job.prepared['image'])
+        self.assertTrue(job.prepared['image'].startswith(b'\x89PNG'))
 
     async def testRunShowProfileJobFlow(self):
         """Verifies that the ShowProfileJob object returned from the Job
@@ -192,6 +304,32 @@ class TestJobFactory(iatc):
         await job.post(metadata=metadata)
         self.assertTrue(True)
 
+    async def testPreparePostDoesSlowWorkOnce(self):
+        """Verifies that a job prepared before posting doesn't repeat its DB
+           reads or image decoding in post().
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.SHOW_PROFILE,
+                                   ctx=self.interaction,
+                                   options={'id' : mc.DEFAULT_PROFILE_ID})
+
+        db_ifc                         = MagicMock()
+        db_ifc.getProfile.return_value = pg.getDefaultProfile()
+        db_ifc.getImage.return_value   = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x04\x00\x00'
+        metadata                       = {'ctx'    : self.interaction,
+                                          'db_ifc' : db_ifc}
+
+        job.preparePost(metadata)
+        await job.post(metadata=metadata)
+
+        db_ifc.getProfile.assert_called_once_with(mc.DEFAULT_PROFILE_ID)
+        db_ifc.getImage.assert_called_once()
+        self.assertEqual(job.prepared['image'], b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x04\x00\x00')
+
     async def testRunShowSummaryCharacterJobFlow(self):
         """Verifies that the ShowSummaryCharacter object returned from the Job
            Factory will follow all its execution paths.
@@ -421,6 +559,298 @@ class TestJobFactory(iatc):
         await job.post(metadata=metadata)
         self.assertTrue(True)
 
+    def testBatchKeysMatchCompatibleJobs(self):
+        """Verifies that only txt2img jobs with random seeds and identical
+           settings share a batch key.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts = {
+                'prompt'    : "good",
+                'random'    : False,
+                'seed'      : -1
+        }
+
+        nr.getRandomName              = MagicMock()
+        nr.getRandomName.return_value = "Default Sally"
+
+        first  = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                      ctx=self.interaction,
+                                      options=opts)
+        second = jf.JobFactory.getJob(type=jf.JobTypeEnum.ROLL,
+                                      ctx=self.interaction,
+                                      options=opts)
+        self.assertNotEqual(first.getBatchKey(), None)
+        self.assertEqual(first.getBatchKey(), second.getBatchKey())
+
+        second.post_data['prompt'] = "different"
+        self.assertNotEqual(first.getBatchKey(), second.getBatchKey())
+
+        second.post_data['prompt'] = "good"
+        second.post_data['seed']   = 1234
+        self.assertEqual(second.getBatchKey(), None)
+
+        show = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_SHOW,
+                                    ctx=self.interaction)
+        self.assertEqual(show.getBatchKey(), None)
+
+    async def testRunBatchedGenerateJobFlow(self):
+        """Verifies that a batch of GenerateJobs is sent as a single request
+           and each job gets back its own image and seed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts = {
+                'cfg_scale' : 1.0,
+                'height'    : 256,
+                'n_prompt'  : "bad",
+                'prompt'    : "good",
+                'random'    : False,
+                'sampler'   : "Euler a",
+                'seed'      : -1,
+                'steps'     : 10,
+                'tag_cnt'   : 0,
+                'width'     : 256
+        }
+
+        jobs = [jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                     ctx=self.interaction,
+                                     options=opts) for x in range(2)]
+
+        for job in jobs:
+            job.post_data['tags_added'] = ""
+
+        req.post              = MagicMock()
+        req.post.return_value = mc.MockBatchResult()
+
+        jf.doBatchWork(jobs=jobs,
+                       web_url=self.web_url)
+
+        req.post.assert_called_once()
+        self.assertEqual(req.post.call_args.kwargs['json']['batch_size'], 2)
+
+        for x, job in enumerate(jobs):
+            info = json.loads(job.result.json()['info'])
+
+            self.assertEqual(job.getStatusCode(), 200)
+            self.assertEqual(info['seed'], 10 + x)
+            self.assertEqual(info['all_seeds'], [10 + x])
+            self.assertEqual(job.result.json()['images'], [mc.MockBatchResult().json()['images'][x]])
+
+        metadata = {'ctx' : self.interaction}
+
+        await jobs[1].post(metadata=metadata)
+        self.assertTrue(True)
+
+        #A failed batch has no info to split.
+        req.post.return_value             = MagicMock()
+        req.post.return_value.status_code = 500
+        req.post.return_value.json        = MagicMock(return_value={'error' : "OutOfMemoryError"})
+
+        jf.doBatchWork(jobs=jobs,
+                       web_url=self.web_url)
+
+        for job in jobs:
+            self.assertEqual(job.getStatusCode(), 500)
+
+    async def testRunGenerateJobAsync(self):
+        """Verifies that a txt2img job can be run through the async client.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        client                   = MagicMock()
+        client.post              = AsyncMock()
+        client.post.return_value = mc.MockResult()
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_POST,
+                                   ctx=self.interaction)
+
+        await job.doWorkAsync(web_url=self.web_url,
+                              client=client)
+
+        client.post.assert_awaited_once_with(web_url=self.web_url, path='/sdapi/v1/txt2img', json=job.post_data, timeout=None)
+        self.assertEqual(job.result, client.post.return_value)
+
+    async def testRunShowJobAsync(self):
+        """Verifies that jobs that don't use the webui still work when run
+           through the async client.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        client = MagicMock()
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_SHOW,
+                                   ctx=self.interaction)
+
+        await job.doWorkAsync(web_url=self.web_url,
+                              client=client)
+
+        client.assert_not_called()
+
+    def testCacheKeysOnlyForFixedSeeds(self):
+        """Verifies that GenerateJobs with a fixed seed get a cache key that
+           ignores IGSD-only settings, and random seeds get none.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts = {
+                'cfg_scale' : 1.0,
+                'height'    : 256,
+                'n_prompt'  : "bad",
+                'prompt'    : "good",
+                'random'    : False,
+                'sampler'   : "Euler a",
+                'seed'      : 1234,
+                'steps'     : 10,
+                'tag_cnt'   : 0,
+                'width'     : 256
+        }
+
+        first  = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                      ctx=self.interaction,
+                                      options=opts)
+        second = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                      ctx=self.interaction,
+                                      options=opts)
+        second.post_data['tags_added'] = "ignored"
+
+        self.assertNotEqual(first.getCacheKey(), None)
+        self.assertEqual(first.getCacheKey(), second.getCacheKey())
+
+        second.post_data['steps'] = 11
+        self.assertNotEqual(first.getCacheKey(), second.getCacheKey())
+
+        second.post_data['seed'] = -1
+        self.assertEqual(second.getCacheKey(), None)
+
+    def testGenerateJobsDegrade(self):
+        """Verifies that GenerateJobs are only held to the settings of a
+           degraded profile they go over, and note what was changed.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts    = {
+                   'cfg_scale' : 1.0,
+                   'height'    : 768,
+                   'n_prompt'  : "bad",
+                   'prompt'    : "good",
+                   'random'    : False,
+                   'sampler'   : "Euler a",
+                   'seed'      : -1,
+                   'steps'     : 50,
+                   'tag_cnt'   : 0,
+                   'width'     : 512
+        }
+        profile = {'max_steps' : 30,
+                   'hires'     : False,
+                   'scale'     : 0.75,
+                   'min_size'  : 448,
+                   'step_size' : 64}
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                   ctx=self.interaction,
+                                   options=opts)
+
+        self.assertTrue(job.degrade(profile))
+        self.assertEqual(job.post_data['steps'], 30)
+        self.assertFalse(job.post_data['enable_hr'])
+        self.assertEqual((job.post_data['width'], job.post_data['height']), (448, 576))
+        self.assertEqual(job.degraded, ["50 to 30 steps", "no hires pass", "512x768 to 448x576"])
+
+        #A job already under the profile is left alone.
+        small = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                     ctx=self.interaction,
+                                     options=dict(opts, height=448, steps=20, width=448))
+        small.post_data['enable_hr'] = False
+
+        self.assertFalse(small.degrade(profile))
+        self.assertEqual(small.degraded, None)
+
+        roll = jf.JobFactory.getJob(type=jf.JobTypeEnum.TEST_ROLL,
+                                    ctx=self.interaction)
+
+        self.assertFalse(roll.degrade(profile))
+        self.assertEqual(roll.degraded, None)
+
+    async def testGenerateJobsSplitUpscale(self):
+        """Verifies that a GenerateJob's hires pass can be split into an
+           UpscaleJob that posts the base job's response with a new image.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        opts = {
+                'cfg_scale' : 1.0,
+                'height'    : 768,
+                'n_prompt'  : "bad",
+                'prompt'    : "good",
+                'random'    : False,
+                'sampler'   : "Euler a",
+                'seed'      : -1,
+                'steps'     : 20,
+                'tag_cnt'   : 0,
+                'width'     : 512
+        }
+
+        job = jf.JobFactory.getJob(type=jf.JobTypeEnum.GENERATE,
+                                   ctx=self.interaction,
+                                   options=opts)
+        job.post_data['hr_resize_x'] = 1024
+        job.post_data['hr_resize_y'] = 1536
+
+        self.assertTrue(job.splitUpscale())
+        self.assertFalse(job.post_data['enable_hr'])
+        self.assertEqual(job.getUpscale(), {'upscaler' : job.post_data['hr_upscaler'],
+                                            'scale'    : 2.0,
+                                            'width'    : 1024,
+                                            'height'   : 1536})
+        self.assertFalse(job.splitUpscale())
+
+        job.result = mc.MockResult()
+        upscale    = jf.UpscaleJob(job)
+
+        self.assertEqual(upscale.getPriority(), jf.JobPriorityEnum.UPSCALE)
+        self.assertEqual(upscale.getJobId(), job.getJobId())
+        self.assertEqual(upscale.getBaseJob(), job)
+        self.assertEqual(upscale.post_data['image'], "iVBORw0KGgoAAAANSUhEUgAABAAA")
+        self.assertEqual(upscale.post_data['resize_mode'], 1)
+
+        with patch.object(req, 'post') as post_patch:
+            post_patch.return_value = mc.MockUpscaleResult()
+            upscale.doWork(web_url=self.web_url)
+
+            self.assertTrue(post_patch.call_args.kwargs['url'].endswith('/sdapi/v1/extra-single-image'))
+
+        metadata = {'ctx' : self.interaction}
+        upscale.preparePost(metadata)
+        prepared = upscale.prepared['job'].prepared
+
+        self.assertEqual(prepared['image'], b64.b64decode("iVBORw0KGgoAAAANSUhEUgAABAAC"))
+        self.assertEqual(prepared['info']['upscaled'], f"{job.post_data['hr_upscaler']} to 1024x1536")
+        self.assertNotIn('upscaled', job.prepared['info'])
+
+        await upscale.post(metadata=metadata)
+
 
 #####  Name Randomizer Class  #####
 
@@ -484,6 +914,286 @@ class TestNameRandomizer(unittest.TestCase):
         self.assertEqual(len(parts), 2)
 
 
+#####  Result Cache Class  #####
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.dir    = tempfile.TemporaryDirectory()
+        self.uut    = rc.ResultCache(opts={'max_bytes' : "100000",
+                                           'path'      : self.dir.name})
+        self.result = sc.SDResponse(status_code = 200,
+                                    reason      = "OK",
+                                    data        = mc.MockResult().json())
+
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.dir.cleanup()
+
+    def testFetchCachesResults(self):
+        """Verifies that a result is only rendered once and survives the
+           cache being reopened.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        compute = MagicMock(return_value=self.result)
+
+        self.uut.fetch(key="a", compute=compute)
+        result = self.uut.fetch(key="a", compute=compute)
+
+        compute.assert_called_once()
+        self.assertEqual(result.json(), self.result.json())
+
+        self.uut = rc.ResultCache(opts={'max_bytes' : "100000",
+                                        'path'      : self.dir.name})
+
+        self.assertEqual(self.uut.get("a").json(), self.result.json())
+
+    def testFailuresAreNotCached(self):
+        """Verifies that error responses are rendered again next time.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        compute = MagicMock(return_value=sc.SDResponse(status_code = 500,
+                                                       reason      = "Error",
+                                                       data        = {}))
+
+        self.uut.fetch(key="a", compute=compute)
+        self.uut.fetch(key="a", compute=compute)
+
+        self.assertEqual(compute.call_count, 2)
+
+    def testEvictsLeastRecentlyUsed(self):
+        """Verifies that the least recently used result is removed once the
+           cache is full.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.put(key="a", result=self.result)
+        self.uut.max_bytes = self.uut.size * 2
+        self.uut.put(key="b", result=self.result)
+        self.uut.get("a")
+        self.uut.put(key="c", result=self.result)
+
+        self.assertNotEqual(self.uut.get("a"), None)
+        self.assertEqual(self.uut.get("b"), None)
+        self.assertNotEqual(self.uut.get("c"), None)
+        self.assertEqual(len(list(pl.Path(self.dir.name).glob('*.json'))), 2)
+
+    def testCoalescesInFlightRequests(self):
+        """Verifies that identical requests made while the first is rendering
+           wait for it instead of rendering again.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        started = th.Event()
+        release = th.Event()
+        calls   = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            return self.result
+
+        leader = th.Thread(target=self.uut.fetch, kwargs={'key' : "a", 'compute' : compute})
+        leader.start()
+        started.wait(timeout=5)
+
+        results = []
+        waiter  = th.Thread(target=lambda: results.append(self.uut.fetch(key="a", compute=compute)))
+        waiter.start()
+        release.set()
+        leader.join(timeout=5)
+        waiter.join(timeout=5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0].json(), self.result.json())
+
+#####  SD Client Class  #####
+
+class FakeWebuiHandler(hs.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    ports            = set()
+
+    def _reply(self,
+               data : dict):
+        """Sends a JSON body over the kept-alive connection.
+
+           Input: self - Pointer to the current object instance.
+                  data - The body to send.
+
+           Output: none.
+        """
+
+        body = json.dumps(data).encode()
+
+        FakeWebuiHandler.ports.add(self.client_address[1])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Echoes the requested path, after a second for the slow path.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        if self.path == '/slow':
+
+            th.Event().wait(1.0)
+
+        self._reply({'path' : self.path})
+
+    def do_POST(self):
+        """Echoes the requested path and the JSON body.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        length = int(self.headers['Content-Length'])
+        self._reply({'path' : self.path, 'body' : json.loads(self.rfile.read(length))})
+
+    def log_message(self, format, *args):
+        """Keeps the server from printing every request during the tests.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        pass
+
+class TestSDClient(unittest.TestCase):
+
+    def setUp(self):
+        """Method called to prepare the test fixture. This is called
+           immediately before calling the test method; other than
+           AssertionError or SkipTest, any exception raised by this method will
+           be considered an error rather than a test failure. The default
+           implementation does nothing.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        FakeWebuiHandler.ports = set()
+
+        self.server = hs.ThreadingHTTPServer(('127.0.0.1', 0), FakeWebuiHandler)
+        self.thread = th.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.web_url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.uut     = sc.SDClient(opts={'connect_timeout'   : "1.0",
+                                         'keepalive_timeout' : "30.0",
+                                         'pool_size'         : "2",
+                                         'read_timeout'      : "5.0"})
+
+    def tearDown(self):
+        """Method called immediately after the test method has been called and
+           the result recorded.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testPostAndGet(self):
+        """Verifies that requests made from other threads are run on the
+           client's loop and return their decoded bodies.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        result = self.uut.submit(self.uut.post(web_url=self.web_url,
+                                               path='/sdapi/v1/txt2img',
+                                               json={'prompt' : "good"})).result(timeout=5)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json(), {'path' : '/sdapi/v1/txt2img', 'body' : {'prompt' : "good"}})
+
+        result = self.uut.submit(self.uut.get(web_url=self.web_url,
+                                              path='/sdapi/v1/memory',
+                                              timeout=5)).result(timeout=5)
+
+        self.assertEqual(result.json(), {'path' : '/sdapi/v1/memory'})
+
+    def testReusesConnections(self):
+        """Verifies that sequential requests to a backend share one pooled
+           connection.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        for x in range(3):
+            self.uut.submit(self.uut.get(web_url=self.web_url,
+                                         path='/sdapi/v1/memory')).result(timeout=5)
+
+        self.assertEqual(len(self.uut.sessions), 1)
+        self.assertEqual(len(FakeWebuiHandler.ports), 1)
+
+    def testTimeoutKeepsReadTimeout(self):
+        """Verifies that a request's own timeout doesn't lift the client's
+           socket read timeout.
+
+           Input: self - Pointer to the current object instance.
+
+           Output: none.
+        """
+
+        self.uut.read_timeout = 0.1
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.uut.submit(self.uut.get(web_url=self.web_url,
+                                         path='/slow',
+                                         timeout=10)).result(timeout=5)
+
 #####  Tag Randomizer Class  #####
 
 class TestTagRandomizer(unittest.TestCase):
@@ -0,0 +1,41 @@
+USE IGSD;
+
+-- Pictures used to be stored as base64 text.  They're decoded into a binary
+-- column in batches, so a large table isn't locked by one huge UPDATE, and
+-- then the binary column replaces the text one.  The whole conversion is
+-- skipped if the picture column is already binary.
+DELIMITER //
+
+CREATE OR REPLACE PROCEDURE IGSDDecodePictures(IN batch_size INT)
+BEGIN
+    DECLARE converted INT DEFAULT 1;
+
+    IF (SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = 'IGSD' AND TABLE_NAME = 'IGSDPictures' AND COLUMN_NAME = 'picture') = 'longtext' THEN
+
+        ALTER TABLE IGSDPictures ADD COLUMN IF NOT EXISTS picture_bin LONGBLOB;
+
+        WHILE converted > 0 DO
+
+            -- Anything that isn't valid base64 is kept as it was.
+            UPDATE IGSDPictures SET picture_bin = COALESCE(FROM_BASE64(picture), picture)
+                WHERE picture_bin IS NULL LIMIT batch_size;
+            SET converted = ROW_COUNT();
+            COMMIT;
+
+        END WHILE;
+
+        ALTER TABLE IGSDPictures DROP COLUMN picture,
+                                 CHANGE COLUMN picture_bin picture LONGBLOB NOT NULL;
+
+    END IF;
+END //
+
+DELIMITER ;
+
+CALL IGSDDecodePictures(500);
+
+DROP PROCEDURE IGSDDecodePictures;
+
+-- Pictures saved to the optional on-disk image store are referenced by hash.
+ALTER TABLE IGSDPictures ADD COLUMN IF NOT EXISTS picture_hash CHAR(64) DEFAULT NULL;